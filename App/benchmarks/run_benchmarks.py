@@ -0,0 +1,369 @@
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+import argparse
+import json
+import platform
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timezone
+from unittest import mock
+
+# =========================================================
+# Benchmark Suite
+# =========================================================
+# Usage (from the App directory):
+#   python benchmarks/run_benchmarks.py --output results.json
+#   python benchmarks/run_benchmarks.py --compare results.json --threshold 0.1
+#
+# All inputs are generated from a fixed seed and the database benchmarks run on the
+# embedded SQLite backend, so results are repeatable without network or MySQL.
+
+SEED = 42
+CATALOG_SIZES = (1_000, 10_000, 100_000)
+
+
+def dly_lines(station_id, first_year, last_year):
+    """
+    Creates the TMAX/TMIN lines of a station for a range of years with the synthetic dataset generator.
+    """
+
+    import synthetic_data
+    from station import Station
+
+    station = Station(station_id, "BENCHMARK", 48.0, 7.8, last_measure_tmax=last_year, first_measure_tmax=first_year,
+                      last_measure_tmin=last_year, first_measure_tmin=first_year)
+    return synthetic_data.generate_dly(station, 0, SEED, missing_ratio=0.1).decode().splitlines(keepends=True)
+
+
+def random_catalog(rng, size):
+    """
+    Creates station rows (station_id, station_name, latitude, longitude).
+    """
+
+    return [(f"BM{index:09d}", f"STATION {index}", rng.uniform(-90, 90), rng.uniform(-180, 180))
+            for index in range(size)]
+
+
+def station_files(size):
+    """
+    Creates the contents of ghcnd-stations.txt and ghcnd-inventory.txt for a number of stations.
+    """
+
+    import synthetic_data
+
+    stations = synthetic_data.generate_stations(size, 1950, 2020, SEED)
+    return ("\n".join(synthetic_data.format_station_line(station) for station in stations),
+            "\n".join(line for station in stations
+                      for line in synthetic_data.format_inventory_lines(station, ("TMAX", "TMIN", "PRCP"))))
+
+
+def sqlite_dataset(directory, rng, stations=20, first_year=1950, last_year=2020):
+    """
+    Fills an SQLite backend with stations around Freiburg and monthly datapoints.
+
+    :return: SQLiteBackend.
+    """
+
+    import datapoint as dp
+    from station import Station
+    from sqlite_backend import SQLiteBackend
+
+    backend = SQLiteBackend(os.path.join(directory, "benchmark.sqlite3"))
+    with backend.write_session() as session:
+        session.insert_stations([
+            Station(f"BM{index:09d}", f"STATION {index}", 48.0 + rng.uniform(-0.5, 0.5), 7.8 + rng.uniform(-0.5, 0.5),
+                    last_measure_tmax=last_year, first_measure_tmax=first_year,
+                    last_measure_tmin=last_year, first_measure_tmin=first_year)
+            for index in range(stations)])
+        for sid, station_id, *_ in session.get_stations():
+            session.insert_datapoints(sid, [
+                dp.DataPoint(year * 100 + month, tmax=rng.uniform(0, 30), tmin=rng.uniform(-10, 15))
+                for year in range(first_year, last_year + 1) for month in range(1, 13)])
+        session.commit()
+    return backend
+
+
+def sqlite_region(directory, rng, stations=500, first_year=1950, last_year=2020):
+    """
+    Fills an SQLite backend with stations around Freiburg and their precomputed yearly
+    aggregates (without the monthly datapoints).
+
+    :return: SQLiteBackend.
+    """
+
+    from station import Station
+    from sqlite_backend import SQLiteBackend
+
+    backend = SQLiteBackend(os.path.join(directory, "region.sqlite3"))
+    catalog = [Station(f"RG{index:09d}", f"STATION {index}", 48.0 + rng.uniform(-1, 1), 7.8 + rng.uniform(-1, 1),
+                       last_measure_tmax=last_year, first_measure_tmax=first_year,
+                       last_measure_tmin=last_year, first_measure_tmin=first_year)
+               for index in range(stations)]
+    with backend.write_session() as session:
+        session.insert_stations(catalog)
+        session.commit()
+
+    connection = backend.connection()
+    connection.executemany("INSERT INTO YearlyAggregate VALUES (?, ?, ?, ?, ?);", [
+        (station.id, year, period, rng.uniform(-10, 15), rng.uniform(0, 30))
+        for station in catalog for year in range(first_year, last_year + 1)
+        for period in ("annual", "spring", "summer", "autumn", "winter")])
+    connection.commit()
+    return backend
+
+
+def build_benchmarks(quick=False):
+    """
+    Creates the benchmark cases.
+
+    :param quick: Use smaller inputs, e.g. for a smoke test.
+    :return: List of (name, setup) tuples. setup() prepares the input and returns the function to time.
+    """
+
+    import calculations as calc
+    import datapoint as dp
+    import station as st
+
+    rng = random.Random(SEED)
+    sizes = CATALOG_SIZES[:1] if quick else CATALOG_SIZES
+    benchmarks = []
+
+    def extract_average_value():
+        line = dly_lines("BM000000001", 2000, 2000)[0]
+        return lambda: dp.extract_average_value(line)
+    benchmarks.append(("parser.extract_average_value", extract_average_value))
+
+    def parse_dly():
+        lines = dly_lines("BM000000001", 1950, 1960 if quick else 2020)
+        return lambda: dp.create_datapoints_from_lines(lines, "BM000000001")
+    benchmarks.append(("parser.create_datapoints_from_lines", parse_dly))
+
+    def parse_dly_daily():
+        lines = dly_lines("BM000000001", 1950, 1960 if quick else 2020)
+        return lambda: dp.create_records_from_lines(lines, "BM000000001", ("TMAX", "TMIN"), ("TMAX", "TMIN"))
+    benchmarks.append(("parser.create_records_from_lines.daily", parse_dly_daily))
+
+    def parse_dly_local():
+        lines = dly_lines("BM000000001", 1950, 1960 if quick else 2020)
+        contents = "".join(lines)
+
+        def run():
+            with mock.patch("os.path.exists", return_value=True), \
+                    mock.patch("builtins.open", mock.mock_open(read_data=contents)):
+                return dp.download_and_create_datapoints_local("BM000000001")
+        return run
+    benchmarks.append(("parser.download_and_create_datapoints_local", parse_dly_local))
+
+    def load_stations():
+        stations_txt, inventory_txt = station_files(1_000 if quick else 10_000)
+
+        def run():
+            with mock.patch("requests.get", side_effect=[
+                mock.Mock(status_code=200, text=stations_txt),
+                mock.Mock(status_code=200, text=inventory_txt),
+            ]), mock.patch("builtins.print"):
+                return st.load_stations_from_url("inventory", "stations")
+        return run
+    benchmarks.append(("station.load_stations_from_url", load_stations))
+
+    for size in sizes:
+        def radius_search(size=size):
+            catalog = random_catalog(rng, size)
+            return lambda: calc.find_stations_within_radius(catalog, 48.0, 7.8, 500, -1)
+        benchmarks.append((f"calculations.find_stations_within_radius[{size}]", radius_search))
+
+    datasets = []
+
+    def use_sqlite_dataset():
+        # One dataset is shared by all database benchmarks
+        import data_services as ds
+        if not datasets:
+            datasets.append(sqlite_dataset(tempfile.mkdtemp(prefix="benchmarks-"), rng, stations=5 if quick else 20))
+        ds.backend = datasets[0]
+        ds.station_catalog = None
+        return ds
+
+    def aggregation():
+        ds = use_sqlite_dataset()
+        return lambda: ds.get_datapoints_for_station("BM000000001", 1950, 2020)
+    benchmarks.append(("data_services.get_datapoints_for_station", aggregation))
+
+    def regional_aggregates():
+        import data_services as ds
+        ds.backend = sqlite_region(tempfile.mkdtemp(prefix="benchmarks-"), rng, stations=50 if quick else 500)
+        with mock.patch("builtins.print"):
+            ds.load_station_catalog()
+        import trends
+
+        def run():
+            # Uncached: every run searches the stations of the region
+            ds.radius_cache = trends.StatisticsCache()
+            return ds.get_regional_aggregates(48.0, 7.8, 500, 1950, 2020, -1, idw=True)
+        return run
+    benchmarks.append(("data_services.get_regional_aggregates[500]", regional_aggregates))
+
+    def trend_ranking():
+        import data_services as ds
+        import trends
+        ds.backend = sqlite_region(tempfile.mkdtemp(prefix="benchmarks-"), rng, stations=50 if quick else 500)
+        with mock.patch("builtins.print"):
+            ds.load_station_catalog()
+
+        def run():
+            # Uncached: every run computes the trends of all stations
+            ds.trend_cache = trends.StatisticsCache()
+            ds.radius_cache = trends.StatisticsCache()
+            return ds.rank_stations_by_trend(48.0, 7.8, 500, 1950, 2020, -1, min_coverage=0.0)
+        return run
+    benchmarks.append(("data_services.rank_stations_by_trend[500]", trend_ranking))
+
+    def surface_tile():
+        import data_services as ds
+        import trends
+        ds.backend = sqlite_region(tempfile.mkdtemp(prefix="benchmarks-"), rng, stations=50 if quick else 500)
+        with mock.patch("builtins.print"):
+            ds.load_station_catalog()
+
+        def run():
+            # Uncached tile, the station values of the year stay cached
+            ds.surface_tiles = trends.StatisticsCache()
+            return ds.get_surface_tile(5, 16, 11, 2000)
+        return run
+    benchmarks.append(("data_services.get_surface_tile[500]", surface_tile))
+
+    def endpoint(path, payload):
+        def setup():
+            from app import create_app
+            use_sqlite_dataset()
+            client = create_app().test_client()
+            return lambda: client.post(path, json=payload)
+        return setup
+    benchmarks.append(("endpoint./submit", endpoint("/submit", {
+        "latitude": 48.0, "longitude": 7.8, "radius": 100, "yearStart": 1960, "yearEnd": 2010, "stations": 10})))
+    benchmarks.append(("endpoint./get_weather_data", endpoint("/get_weather_data", {
+        "stationName": "BM000000001", "yearStart": 1950, "yearEnd": 2020})))
+
+    return benchmarks
+
+
+def measure(function, repeat=5, min_time=0.2):
+    """
+    Times a function. The number of calls per round is calibrated so one round takes at
+    least min_time seconds; the statistics are per call over all rounds.
+
+    :return: Dictionary with the timing statistics in seconds.
+    """
+
+    function()  # warm-up
+
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time or number >= 1_000_000:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9)))
+
+    rounds = [elapsed / number]
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            function()
+        rounds.append((time.perf_counter() - started) / number)
+
+    return {
+        "number": number,
+        "repeat": repeat,
+        "min": min(rounds),
+        "median": statistics.median(rounds),
+        "mean": statistics.mean(rounds),
+        "stdev": statistics.stdev(rounds) if len(rounds) > 1 else 0.0,
+        "ops_per_sec": 1 / statistics.median(rounds),
+    }
+
+
+def run_benchmarks(selection=None, quick=False, repeat=5, min_time=0.2):
+    """
+    Runs all benchmarks whose name contains one of the selection strings.
+
+    :return: Dictionary with metadata and the results per benchmark.
+    """
+
+    results = {}
+    for name, setup in build_benchmarks(quick):
+        if selection and not any(part in name for part in selection):
+            continue
+        results[name] = measure(setup(), repeat=repeat, min_time=min_time)
+        print(f"{name:<55} {results[name]['median'] * 1000:10.3f} ms/op")
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": SEED,
+            "quick": quick,
+        },
+        "results": results,
+    }
+
+
+def compare_results(baseline, current, threshold=0.1):
+    """
+    Compares the median times of two benchmark runs.
+
+    :param baseline: Result dictionary of the reference run.
+    :param current: Result dictionary of the new run.
+    :param threshold: Relative slowdown counted as regression (0.1 = 10 %).
+    :return: List of (name, baseline median, current median, relative change, regression) tuples.
+    """
+
+    comparison = []
+    for name, result in current["results"].items():
+        if name not in baseline["results"]:
+            continue
+        before = baseline["results"][name]["median"]
+        after = result["median"]
+        change = (after - before) / before
+        comparison.append((name, before, after, change, change > threshold))
+    return comparison
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Runs the performance benchmarks.")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    parser.add_argument("--compare", help="Compare with the results in this JSON file.")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Relative slowdown reported as regression (default: 0.1).")
+    parser.add_argument("--filter", action="append", help="Only run benchmarks containing this text.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--quick", action="store_true", help="Use small inputs.")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.filter, args.quick, args.repeat)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        comparison = compare_results(baseline, results, args.threshold)
+        print(f"\n{'Benchmark':<55} {'Before':>10} {'After':>10} {'Change':>8}")
+        for name, before, after, change, regression in comparison:
+            marker = "  REGRESSION" if regression else ""
+            print(f"{name:<55} {before * 1000:8.3f}ms {after * 1000:8.3f}ms {change:+8.1%}{marker}")
+        if any(regression for *_, regression in comparison):
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,14 +4,31 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from flask import Flask
 from flask_cors import CORS
 from routes import init_routes
+from profiling import init_profiling
 import data_services as ds
+from config import RUN_STARTUP_TESTS
 from tests.run_tests import run_all_tests
 
-app = Flask(__name__)
-CORS(app)
-init_routes(app)
-ds.save_data_to_db()
-run_all_tests()
+
+def create_app():
+    """
+    Creates the Flask application with all routes registered.
+
+    :return: Flask application.
+    """
+
+    app = Flask(__name__)
+    CORS(app)
+    init_routes(app)
+    init_profiling(app)
+    return app
+
+
+app = create_app()
 
 if __name__ == "__main__":
+    if RUN_STARTUP_TESTS:
+        run_all_tests()
+    # Loads the station catalog of the existing data, ingests missing data and reloads it
+    ds.start_background_ingest()
     app.run(host='0.0.0.0', port=8000)
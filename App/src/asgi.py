@@ -0,0 +1,136 @@
+import asyncio
+import json
+import time
+from asgiref.wsgi import WsgiToAsgi
+import async_data_services as ads
+import data_services as ds
+import metrics
+import deadlines
+from config import REQUEST_TIMEOUT
+from app import app as flask_app
+
+# Everything that is not served asynchronously (index page, static files) is handled by Flask.
+wsgi_fallback = WsgiToAsgi(flask_app)
+
+
+async def read_json_body(receive):
+    """
+    Reads the complete request body of an ASGI HTTP request and decodes it as JSON.
+
+    :param receive: ASGI receive callable.
+    :return: Decoded JSON object, or an empty dict if the body is empty or invalid.
+    """
+
+    body = b""
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+    try:
+        return json.loads(body or b"{}")
+    except ValueError:
+        return {}
+
+
+async def send_json(send, payload, status=200):
+    """
+    Sends a JSON response through the ASGI send callable.
+
+    :param send: ASGI send callable.
+    :param payload: JSON serializable response body.
+    :param status: HTTP status code.
+    :return: No return value.
+    """
+
+    body = json.dumps(payload, default=str).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"access-control-allow-origin", b"*"),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def receive_data(data):
+    """
+    Async counterpart of the '/submit' route.
+    """
+
+    stations_in_radius = await ads.get_stations_in_radius(
+        data.get('latitude'), data.get('longitude'), data.get('radius'),
+        data.get('yearStart'), data.get('yearEnd'), data.get('stations'))
+    return stations_in_radius, 200
+
+
+async def get_weather_data(data):
+    """
+    Async counterpart of the '/get_weather_data' route.
+    """
+
+    station_name = data.get('stationName')
+    year_start = data.get('yearStart')
+    year_end = data.get('yearEnd')
+
+    if not station_name or not year_start or not year_end:
+        return {"message": "Fehlende Parameter"}, 400
+
+    weather_data = await ads.get_datapoints_for_station(station_name, year_start, year_end)
+    return weather_data, 200
+
+
+async_routes = {
+    "/submit": receive_data,
+    "/get_weather_data": get_weather_data,
+}
+
+
+async def lifespan(receive, send):
+    """
+    Handles the ASGI lifespan protocol. The async pool is opened by the first request
+    and closed on shutdown. The station catalog for the routes served by Flask is loaded
+    in the background on startup.
+    """
+
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            ds.start_background_catalog_load()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await ads.close_async_pool()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    """
+    ASGI entry point, e.g. 'uvicorn asgi:app --host 0.0.0.0 --port 8000' from the src directory.
+    The data routes are answered on the event loop, all other requests are passed to Flask.
+    """
+
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+
+    handler = async_routes.get(scope.get("path"))
+    if scope["type"] == "http" and scope["method"] == "POST" and handler is not None:
+        started = time.perf_counter()
+        timeout = deadlines.request_timeout(dict(scope.get("headers", [])).get(b"x-request-timeout"), REQUEST_TIMEOUT)
+        token = deadlines.start(timeout)
+        try:
+            payload, status = await asyncio.wait_for(handler(await read_json_body(receive)), timeout)
+        except (asyncio.TimeoutError, deadlines.DeadlineExceeded):
+            payload, status = {"message": "Zeitlimit der Anfrage überschritten"}, 504
+        finally:
+            deadlines.reset(token)
+        await send_json(send, payload, status)
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, route=scope["path"], method="POST", status=status)
+        return
+
+    await wsgi_fallback(scope, receive, send)
@@ -0,0 +1,126 @@
+import asyncio
+import aiomysql
+import pymysql
+import deadlines
+import calculations as calc
+import metrics
+import queries
+from config import dbconfig, ASYNC_POOL_SIZE
+
+async_pool = None
+
+
+async def get_async_pool():
+    """
+    Returns the asyncio connection pool of this process and creates it on first use.
+
+    :return: aiomysql pool bound to the running event loop.
+    """
+
+    global async_pool
+
+    if async_pool is None:
+        async_pool = await aiomysql.create_pool(
+            host=dbconfig["host"],
+            port=int(dbconfig["port"]),
+            user=dbconfig["user"],
+            password=dbconfig["password"],
+            db=dbconfig["database"],
+            minsize=1,
+            maxsize=ASYNC_POOL_SIZE,
+            autocommit=True
+        )
+    return async_pool
+
+
+async def close_async_pool():
+    """
+    Closes the asyncio connection pool and waits until all connections are released.
+
+    :return: No return value.
+    """
+
+    global async_pool
+
+    if async_pool is not None:
+        async_pool.close()
+        await async_pool.wait_closed()
+        async_pool = None
+
+
+def to_pyformat(query):
+    """
+    Escapes literal percent signs (e.g. the modulo in the leap year check) for drivers
+    that substitute parameters with Python's %-formatting.
+
+    :param query: SQL statement using %s placeholders.
+    :return: SQL statement safe for aiomysql.
+    """
+
+    return query.replace("%", "%%").replace("%%s", "%s")
+
+
+async def fetch_all(query, params):
+    """
+    Executes a single statement on its own pooled connection and returns all rows.
+
+    :param query: SQL statement using %s placeholders.
+    :param params: Statement parameters.
+    :return: List of result rows.
+    """
+
+    pool = await get_async_pool()
+    async with pool.acquire() as connection:
+        async with connection.cursor() as cursor:
+            try:
+                await cursor.execute(to_pyformat(deadlines.with_max_execution_time(query)), params)
+            except pymysql.err.OperationalError as error:
+                # Aborted by MAX_EXECUTION_TIME
+                if error.args and error.args[0] == 3024:
+                    raise deadlines.DeadlineExceeded(str(error)) from error
+                raise
+            return list(await cursor.fetchall())
+
+
+async def get_stations_in_radius(latitude, longitude, radius, first_year, last_year, max_stations):
+    """
+    Async version of data_services.get_stations_in_radius.
+
+    :param latitude: Latitude of the search position.
+    :param longitude: Longitude of the search position.
+    :param radius: Search radius in kilometers.
+    :param first_year: First year of the desired time period.
+    :param last_year: Last year of the desired time period.
+    :param max_stations: Maximum number of stations to return.
+
+    :return: List of stations with their distances within the radius.
+    """
+
+    with metrics.query_timer("stations_for_period") as result:
+        stations = await fetch_all(queries.STATIONS_FOR_PERIOD_QUERY, (first_year, last_year, first_year, last_year))
+        result["rows"] = len(stations)
+
+    return calc.find_stations_within_radius(stations, latitude, longitude, radius, max_stations)
+
+
+async def get_datapoints_for_station(station_id, first_year, last_year):
+    """
+    Async version of data_services.get_datapoints_for_station. The ten aggregation
+    queries run concurrently, each on its own pooled connection.
+
+    :param station_id: Name of the station.
+    :param first_year: First year of the time period.
+    :param last_year: Last year of the time period.
+
+    :return: List with 10 records in the same order as the synchronous version.
+    """
+
+    with metrics.query_timer("aggregates") as result:
+        sid = await fetch_all(queries.SID_QUERY, (station_id,))
+        sid = sid[0][0]
+
+        ten_datasets = list(await asyncio.gather(
+            *(fetch_all(query, params) for query, params in queries.build_aggregation_queries(sid, first_year, last_year))
+        ))
+        result["rows"] = sum(len(dataset) for dataset in ten_datasets)
+    return ten_datasets
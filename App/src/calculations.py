@@ -1,4 +1,10 @@
 from math import radians, sin, cos, atan2, sqrt
+import deadlines
+
+# Inverse distance weighting: weight = 1 / distance^IDW_POWER, distances below
+# IDW_MIN_DISTANCE (km) count as IDW_MIN_DISTANCE so a station at the center does not dominate
+IDW_POWER = 2
+IDW_MIN_DISTANCE = 1.0
 
 def find_stations_within_radius(stations, latitude, longitude, radius, max_stations):
     """
@@ -13,7 +19,9 @@ def find_stations_within_radius(stations, latitude, longitude, radius, max_stati
     """
 
     result = []
-    for station in stations:
+    for index, station in enumerate(stations):
+        if index % deadlines.CHECK_INTERVAL == 0:
+            deadlines.check()
         distance = haversine(latitude, longitude, station[2], station[3])
         if distance <= radius:
             result.append((station, distance))
@@ -46,3 +54,15 @@ def haversine(lat1, lon1, lat2, lon2):
     c = 2 * atan2(sqrt(a), sqrt(1 - a))
     return r * c
 
+
+def idw_weights(stations_with_distance):
+    """
+    Calculates the inverse distance weights of the stations found by find_stations_within_radius.
+
+    :param stations_with_distance: List of (station, distance) tuples.
+    :return: Dictionary station ID -> weight.
+    """
+
+    return {station[0]: 1 / max(distance, IDW_MIN_DISTANCE) ** IDW_POWER
+            for station, distance in stations_with_distance}
+
@@ -0,0 +1,484 @@
+import sys
+import os
+sys.path.append(os.path.dirname(__file__))
+import argparse
+import collections
+import multiprocessing
+import tarfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import year_coverage
+import datapoint as dp
+import station as st
+import data_services as ds
+import queries
+import work_queue
+import export
+
+# =========================================================
+# Ingestion CLI
+# =========================================================
+# Usage (from the App directory):
+#   python src/cli.py ingest --source url --workers 8
+#   python src/cli.py ingest --source local --path /data
+#   python src/cli.py ingest --source tar --path /data --archive /data/ghcnd_all.tar.gz
+#   python src/cli.py update --source url
+#   python src/cli.py coordinate --source url --workers 4        (on one host)
+#   python src/cli.py worker --source url --workers 8            (on any number of hosts)
+#   python src/cli.py verify
+#   python src/cli.py rebuild-aggregates                         (also rebuilds the year coverage)
+#   python src/cli.py export --stations GME00122458,GME00132346 --first-year 1950 --last-year 2020 --output a.csv
+#   python src/cli.py export --latitude 48 --longitude 7.8 --radius 100 --first-year 1950 --last-year 2020 \
+#                            --resolution yearly --periods annual,summer --format parquet --output region.parquet
+#   python src/cli.py bench --quick
+#
+# Downloading and parsing run in worker processes, the main process writes the results
+# in station order into the shadow tables and swaps them in (see reingest_dataset).
+
+PROGRESS_INTERVAL = 1.0
+
+
+class Progress:
+    def __init__(self, total: int, interval: float = PROGRESS_INTERVAL):
+        """
+        Prints the processed stations and datapoints with their throughput on one line.
+
+        :param total: Number of stations (int).
+        :param interval: Minimum number of seconds between two updates (float).
+        """
+        self.total = total
+        self.interval = interval
+        self.stations = 0
+        self.rows = 0
+        self.started = time.perf_counter()
+        self.printed = 0.0
+
+    def update(self, rows: int):
+        self.stations += 1
+        self.rows += rows
+        now = time.perf_counter()
+        if now - self.printed >= self.interval or self.stations == self.total:
+            self.printed = now
+            print(f"\r{self.line()}", end="", flush=True)
+
+    def line(self):
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        return (f"{self.stations}/{self.total} stations, {self.rows} datapoints, "
+                f"{self.stations / elapsed:.1f} stations/s, {self.rows / elapsed:.0f} rows/s")
+
+    def finish(self):
+        print(f"\r{self.line()}")
+        return time.perf_counter() - self.started
+
+
+def load_stations(source: str, path: str):
+    """
+    Loads the station catalog of the source.
+
+    :param source: "url", "local" or "tar".
+    :param path: Directory with ghcnd-stations.txt and ghcnd-inventory.txt for local and tar.
+    :return: List of station objects.
+    """
+
+    if source == "url":
+        return st.load_stations_from_url(ds.INVENTORY_URL, ds.STATIONS_URL)
+    return st.load_stations_from_files(os.path.join(path, "ghcnd-inventory.txt"),
+                                       os.path.join(path, "ghcnd-stations.txt"))
+
+
+def fetch_station(source: str, directory: str, station_id: str):
+    """
+    Downloads or reads the .dly file of a station and parses it (runs in a worker process).
+
+    :return: Tuple (station ID, list of DataPoint objects, list of element values, list of daily values).
+    """
+
+    return (station_id,) + dp.fetch_records(source, directory, station_id)
+
+
+def parse_dly(station_id: str, content: bytes):
+    """
+    Parses the contents of a .dly file read from the archive (runs in a worker process).
+
+    :return: Tuple (station ID, list of DataPoint objects, list of element values, list of daily values).
+    """
+
+    return (station_id,) + dp.create_records_from_lines(content.decode().splitlines(keepends=True), station_id)
+
+
+def read_archive(path: str, station_ids):
+    """
+    Streams the .dly files of the requested stations from a (compressed) tar archive such as
+    NOAA's ghcnd_all.tar.gz, without extracting it to disk.
+
+    :param path: Path of the archive.
+    :param station_ids: Set of the station IDs to read.
+    :return: Generator of (station ID, file contents) tuples in archive order.
+    """
+
+    with tarfile.open(path, "r|*") as archive:
+        for member in archive:
+            name = os.path.basename(member.name)
+            if not member.isfile() or not name.endswith(".dly") or name[:-4] not in station_ids:
+                continue
+            yield name[:-4], archive.extractfile(member).read()
+
+
+def bounded_map(function, items, workers: int):
+    """
+    Applies the function to the argument tuples in worker processes and yields the results
+    in input order. At most 4 tasks per worker are pending, so a large archive is not read
+    into memory ahead of the writer. With one worker everything runs in this process.
+
+    :param function: Picklable function.
+    :param items: Iterable of argument tuples.
+    :param workers: Number of worker processes (int).
+    :return: Generator of the results.
+    """
+
+    if workers <= 1:
+        for item in items:
+            yield function(*item)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = collections.deque()
+        for item in items:
+            pending.append(executor.submit(function, *item))
+            if len(pending) >= 4 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def ingest(source: str, path: str = None, archive: str = None, workers: int = 1, limit: int = None,
+           stations=None, aggregates: bool = True):
+    """
+    Loads a complete dataset version from the source into the shadow tables and publishes it.
+
+    :param source: "url", "local" or "tar".
+    :param path: Data directory for local and tar.
+    :param archive: Path of the tar archive, defaults to path/ghcnd_all.tar.gz.
+    :param workers: Number of worker processes for downloading and parsing (int).
+    :param limit: Only ingest the first stations of the catalog (int, optional).
+    :param stations: Station catalog, loaded from the source if None.
+    :param aggregates: Rebuild the YearlyAggregate table after the swap.
+    :return: New dataset version (int).
+    """
+
+    if stations is None:
+        stations = load_stations(source, path)
+    if limit:
+        stations = stations[:limit]
+    print(f"Ingesting {len(stations)} stations from {source} with {workers} workers...")
+
+    with ds.backend.shadow_session() as session:
+        session.insert_stations(stations)
+        session.commit()
+        sids = {row[1]: row[0] for row in session.get_stations()}
+
+        if source == "tar":
+            items = read_archive(archive or os.path.join(path, "ghcnd_all.tar.gz"), set(sids))
+            results = bounded_map(parse_dly, items, workers)
+        else:
+            directory = os.path.join(path, "ghcnd_all") if path else None
+            results = bounded_map(fetch_station, ((source, directory, station_id) for station_id in sids), workers)
+
+        progress = Progress(len(sids))
+        for station_id, datapoints, element_values, daily_values in results:
+            session.insert_datapoints(sids[station_id], datapoints)
+            session.insert_element_values(sids[station_id], element_values)
+            session.insert_daily_values(sids[station_id], daily_values)
+            progress.update(len(datapoints))
+        session.commit()
+        elapsed = progress.finish()
+
+    version = ds.backend.publish_shadow()
+    print(f"Dataset version {version} published after {elapsed:.1f}s.")
+
+    if aggregates:
+        rebuild_aggregates()
+    return version
+
+
+def start_workers(source: str, directory: str, workers: int):
+    """
+    Starts queue workers in fresh processes. They open their own database connections
+    from the environment, like workers started on other hosts.
+
+    :return: List of futures of work_queue.run_worker.
+    """
+
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    futures = [executor.submit(work_queue.run_worker, source, directory) for _ in range(workers)]
+    executor.shutdown(wait=False)
+    return futures
+
+
+def coordinate(source: str, path: str = None, workers: int = 0, limit: int = None, stations=None,
+               poll_interval: float = work_queue.POLL_INTERVAL, aggregates: bool = True):
+    """
+    Runs a distributed ingestion: loads the station catalog into the shadow tables, queues
+    one work item per station and reports the progress of all workers until the queue is
+    drained. Then the new dataset version is published.
+
+    :param source: "url" or "local".
+    :param path: Data directory for local.
+    :param workers: Number of queue workers started on this host (int), 0 to only coordinate.
+    :param limit: Only ingest the first stations of the catalog (int, optional).
+    :param stations: Station catalog, loaded from the source if None.
+    :param poll_interval: Seconds between two progress reports (float).
+    :param aggregates: Rebuild the YearlyAggregate table after the swap.
+    :return: New dataset version (int).
+    """
+
+    if stations is None:
+        stations = load_stations(source, path)
+    if limit:
+        stations = stations[:limit]
+    directory = os.path.join(path, "ghcnd_all") if path else None
+
+    with ds.backend.shadow_session() as session:
+        session.insert_stations(stations)
+        session.commit()
+        work_queue.fill(session, [row[1] for row in session.get_stations()])
+        print(f"{len(stations)} stations queued, waiting for workers "
+              f"(python src/cli.py worker --source {source}{' --path ' + path if path else ''}).")
+
+        futures = start_workers(source, directory, workers) if workers else []
+
+        started = time.perf_counter()
+        while True:
+            counts = work_queue.progress(session)
+            (done, rows), (failed, _) = counts["done"], counts["failed"]
+            elapsed = max(time.perf_counter() - started, 1e-9)
+            print(f"\r{done + failed}/{len(stations)} stations ({counts['leased'][0]} leased, {failed} failed), "
+                  f"{rows} datapoints, {done / elapsed:.1f} stations/s, {rows / elapsed:.0f} rows/s",
+                  end="", flush=True)
+            if not counts["pending"][0] and not counts["leased"][0]:
+                break
+            time.sleep(poll_interval)
+        print()
+
+        for station_id, attempts, error in session.fetch_all(queries.FAILED_WORK):
+            print(f"Failed after {attempts} attempts: {station_id} ({error})")
+        session.commit()
+
+    for future in futures:
+        future.result()
+
+    version = ds.backend.publish_shadow()
+    print(f"Dataset version {version} published after {time.perf_counter() - started:.1f}s.")
+
+    if aggregates:
+        rebuild_aggregates()
+    return version
+
+
+def run_workers(source: str, path: str = None, workers: int = 1):
+    """
+    Joins the running distributed ingestion with queue workers on this host.
+
+    :return: Number of stations processed (int).
+    """
+
+    directory = os.path.join(path, "ghcnd_all") if path else None
+    if workers <= 1:
+        return work_queue.run_worker(source, directory)
+    return sum(future.result() for future in start_workers(source, directory, workers))
+
+
+def is_up_to_date(stations):
+    """
+    Compares the station catalog of the source with the live Station table.
+
+    :param stations: List of station objects.
+    :return: True if the stations and their measurement years are unchanged.
+    """
+
+    live = {(row[0], row[4], row[5], row[6], row[7]) for row in ds.backend.get_station_catalog()}
+    source = {(station.id, station.first_measure_tmin, station.last_measure_tmin,
+               station.first_measure_tmax, station.last_measure_tmax) for station in stations}
+    return live == source
+
+
+def update(source: str, path: str = None, archive: str = None, workers: int = 1, force: bool = False):
+    """
+    Ingests a new dataset version if the inventory of the source differs from the live data.
+
+    :return: New dataset version (int) or None if the data is up to date.
+    """
+
+    stations = load_stations(source, path)
+    if not force and is_up_to_date(stations):
+        print("Dataset is up to date.")
+        return None
+    return ingest(source, path, archive, workers, stations=stations)
+
+
+def verify():
+    """
+    Runs the consistency checks of queries.VERIFY_QUERIES on the live tables.
+
+    :return: List of the failed checks.
+    """
+
+    failed = []
+    for name, (query, is_error) in queries.VERIFY_QUERIES.items():
+        count = ds.backend.fetch_all(query)[0][0]
+        # An empty catalog is an error as well
+        if (is_error and count > 0) or (name == "stations" and count == 0):
+            failed.append(name)
+        print(f"{name:<30} {count:>12}  {'ERROR' if name in failed else 'ok'}")
+
+    print(f"Dataset version {ds.backend.get_dataset_version()}: "
+          f"{'verification failed: ' + ', '.join(failed) if failed else 'all checks passed'}.")
+    return failed
+
+
+def rebuild_aggregates():
+    """
+    Recomputes the precomputed annual and seasonal aggregates of all stations.
+
+    :return: Number of aggregate rows (int).
+    """
+
+    started = time.perf_counter()
+    rows = ds.backend.rebuild_aggregates()
+    print(f"YearlyAggregate rebuilt: {rows} rows in {time.perf_counter() - started:.1f}s.")
+    return rows
+
+
+def rebuild_coverage():
+    """
+    Recomputes the year coverage bitmaps of all live stations from their datapoints, e.g.
+    for data ingested before the bitmaps existed.
+
+    :return: Number of stations (int).
+    """
+
+    with ds.backend.write_session() as session:
+        complete_years = {}
+        for sid, year in session.fetch_all(queries.COMPLETE_YEARS_QUERY):
+            complete_years.setdefault(sid, []).append(year)
+        rows = [(year_coverage.encode(year_coverage.from_years(complete_years.get(row[0], ()))), row[0])
+                for row in session.get_stations()]
+        session.execute_many(queries.UPDATE_COVERAGE, rows)
+        session.commit()
+
+    print(f"Year coverage of {len(rows)} stations rebuilt.")
+    return len(rows)
+
+
+def export_file(output: str, station_ids, first_year: int, last_year: int, resolution: str = "monthly",
+                periods=("annual",), file_format: str = "csv"):
+    """
+    Writes a bulk export of the given stations into a file, chunk by chunk.
+
+    :return: Number of bytes written (int).
+    """
+
+    started = time.perf_counter()
+    written = 0
+    with open(output, "wb") as file:
+        for chunk in export.export_chunks(station_ids, first_year, last_year, resolution, periods, file_format,
+                                          timeout=None):
+            file.write(chunk)
+            written += len(chunk)
+
+    elapsed = time.perf_counter() - started
+    print(f"Exported {len(set(station_ids))} stations to {output}: {written / 1e6:.1f} MB in {elapsed:.1f}s.")
+    return written
+
+
+def add_source_arguments(parser):
+    parser.add_argument("--source", choices=("url", "local", "tar"), default="url")
+    parser.add_argument("--path", help="Directory with ghcnd-stations.txt, ghcnd-inventory.txt and ghcnd_all/.")
+    parser.add_argument("--archive", help="tar archive of the .dly files (default: PATH/ghcnd_all.tar.gz).")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Loads and maintains the weather dataset.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = commands.add_parser("ingest", help="Load a complete new dataset version.")
+    add_source_arguments(ingest_parser)
+    ingest_parser.add_argument("--limit", type=int, help="Only ingest the first LIMIT stations.")
+
+    update_parser = commands.add_parser("update", help="Ingest if the inventory has changed.")
+    add_source_arguments(update_parser)
+    update_parser.add_argument("--force", action="store_true")
+
+    coordinate_parser = commands.add_parser("coordinate", help="Queue a distributed ingestion and report its progress.")
+    add_source_arguments(coordinate_parser)
+    coordinate_parser.set_defaults(workers=0)
+    coordinate_parser.add_argument("--limit", type=int, help="Only ingest the first LIMIT stations.")
+
+    worker_parser = commands.add_parser("worker", help="Process stations of a distributed ingestion.")
+    add_source_arguments(worker_parser)
+
+    commands.add_parser("verify", help="Check the consistency of the live tables.")
+    commands.add_parser("rebuild-aggregates", help="Recompute the YearlyAggregate table and the year coverage.")
+
+    export_parser = commands.add_parser("export", help="Export the series of stations as CSV or Parquet file.")
+    export_parser.add_argument("--stations", help="Comma-separated station IDs.")
+    export_parser.add_argument("--latitude", type=float)
+    export_parser.add_argument("--longitude", type=float)
+    export_parser.add_argument("--radius", type=float, help="Radius in km around --latitude/--longitude.")
+    export_parser.add_argument("--first-year", type=int, required=True)
+    export_parser.add_argument("--last-year", type=int, required=True)
+    export_parser.add_argument("--resolution", choices=tuple(export.COLUMNS), default="monthly")
+    export_parser.add_argument("--periods", default="annual", help="Comma-separated periods of a yearly export.")
+    export_parser.add_argument("--format", choices=tuple(export.FORMATS), default="csv")
+    export_parser.add_argument("--output", required=True)
+
+    bench_parser = commands.add_parser("bench", help="Run the benchmark suite.")
+    bench_parser.add_argument("arguments", nargs=argparse.REMAINDER)
+
+    args = parser.parse_args(argv)
+
+    if args.command in ("ingest", "update", "coordinate", "worker") and args.source != "url" and not args.path:
+        parser.error("--path is required for the local and tar sources")
+    if args.command in ("coordinate", "worker") and args.source == "tar":
+        parser.error("the distributed ingestion reads single stations, use --source url or local")
+
+    if args.command == "export":
+        if not args.stations and None in (args.latitude, args.longitude, args.radius):
+            parser.error("--stations or --latitude, --longitude and --radius are required")
+        periods = tuple(args.periods.split(","))
+        if any(period not in ds.PERIODS for period in periods):
+            parser.error(f"--periods must be one of {', '.join(ds.PERIODS)}")
+        if args.format == "parquet" and not export.parquet_available():
+            parser.error("the Parquet export needs the package pyarrow")
+
+    if args.command == "ingest":
+        ingest(args.source, args.path, args.archive, args.workers, args.limit)
+    elif args.command == "update":
+        update(args.source, args.path, args.archive, args.workers, args.force)
+    elif args.command == "coordinate":
+        coordinate(args.source, args.path, args.workers, args.limit)
+    elif args.command == "worker":
+        run_workers(args.source, args.path, args.workers)
+    elif args.command == "verify":
+        return 1 if verify() else 0
+    elif args.command == "rebuild-aggregates":
+        rebuild_aggregates()
+        rebuild_coverage()
+    elif args.command == "export":
+        if args.stations:
+            station_ids = args.stations.split(",")
+        else:
+            station_ids = export.region_station_ids(args.latitude, args.longitude, args.radius, args.first_year,
+                                                    args.last_year, ds.MIN_YEAR_COVERAGE)
+        export_file(args.output, station_ids, args.first_year, args.last_year, args.resolution, periods, args.format)
+    elif args.command == "bench":
+        sys.path.append(os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+        import run_benchmarks
+        return run_benchmarks.main(args.arguments)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+import os
+import tempfile
+
+# Datapoints are bulk loaded with LOAD DATA LOCAL INFILE from temporary CSV files in
+# BULK_LOAD_DIR (the server needs local_infile=1, otherwise INSERTs are used). Rows are
+# sent in batches of DB_BULK_LOAD_BATCH.
+DB_BULK_LOAD = os.environ.get("DB_BULK_LOAD", "1") == "1"
+DB_BULK_LOAD_BATCH = int(os.environ.get("DB_BULK_LOAD_BATCH", "100000"))
+BULK_LOAD_DIR = os.environ.get("BULK_LOAD_DIR", tempfile.gettempdir())
+
+# Database settings shared by the synchronous and asynchronous data services.
+# Every value can be overridden through an environment variable of the same name.
+dbconfig = {
+    "user": os.environ.get("DB_USER", "root"),
+    "password": os.environ.get("DB_PASSWORD", "root"),
+    "host": os.environ.get("DB_HOST", "mysql"),
+    "port": os.environ.get("DB_PORT", "3306"),
+    "database": os.environ.get("DB_NAME", "db"),
+    # LOAD DATA LOCAL INFILE may only read the bulk load files
+    "allow_local_infile_in_path": BULK_LOAD_DIR
+}
+
+# Read replicas for query traffic as comma separated host:port list, e.g.
+# "mysql-replica:3306". Writes (ingestion) always go to the primary in dbconfig.
+DB_READ_REPLICAS = [replica.strip() for replica in os.environ.get("DB_READ_REPLICAS", "").split(",")
+                    if replica.strip()]
+
+# Replica selection ("round_robin" or "least_loaded"), the maximum replication lag in
+# seconds for a replica to receive reads, and the seconds between two lag checks.
+DB_READ_STRATEGY = os.environ.get("DB_READ_STRATEGY", "round_robin")
+DB_REPLICA_MAX_LAG = float(os.environ.get("DB_REPLICA_MAX_LAG", "30"))
+DB_REPLICA_LAG_CHECK_INTERVAL = float(os.environ.get("DB_REPLICA_LAG_CHECK_INTERVAL", "5"))
+
+# Maximum number of connections held by the async pool of one ASGI process.
+ASYNC_POOL_SIZE = int(os.environ.get("ASYNC_POOL_SIZE", "50"))
+
+# Number of connections kept open by the synchronous pool of one process.
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "10"))
+
+# Upper limit the pool may grow to under load (defaults to DB_POOL_SIZE, i.e. no growth).
+DB_POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", "0")) or DB_POOL_SIZE
+
+# Callers that may wait for a free connection at the same time and their maximum wait in seconds.
+DB_POOL_MAX_WAITERS = int(os.environ.get("DB_POOL_MAX_WAITERS", "50"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "5"))
+
+# Idle seconds after which a connection is pinged before reuse, and after which
+# connections above DB_POOL_SIZE are closed again.
+DB_POOL_HEALTH_CHECK_INTERVAL = float(os.environ.get("DB_POOL_HEALTH_CHECK_INTERVAL", "30"))
+DB_POOL_IDLE_TIMEOUT = float(os.environ.get("DB_POOL_IDLE_TIMEOUT", "300"))
+
+# Connection budget of the MySQL server shared by all web workers. If unset, the
+# server's max_connections variable is queried at startup.
+DB_MAX_CONNECTIONS = int(os.environ.get("DB_MAX_CONNECTIONS", "0"))
+
+# Connections of the budget kept free for ingestion jobs and administration.
+DB_RESERVED_CONNECTIONS = int(os.environ.get("DB_RESERVED_CONNECTIONS", "10"))
+
+# Retries and initial backoff (seconds, doubled per attempt) while the database is unreachable.
+DB_CONNECT_RETRIES = int(os.environ.get("DB_CONNECT_RETRIES", "8"))
+DB_CONNECT_BACKOFF = float(os.environ.get("DB_CONNECT_BACKOFF", "0.5"))
+
+# Runs the backend and frontend test suites before the development server starts (0/1).
+RUN_STARTUP_TESTS = os.environ.get("RUN_STARTUP_TESTS", "0") == "1"
+
+# Storage of stations and datapoints: "mysql" (default) or "sqlite" for an embedded
+# single-file database that needs no database server.
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "mysql")
+SQLITE_PATH = os.environ.get("SQLITE_PATH", "weather.sqlite3")
+
+# Queries slower than this many seconds are written to the slow-query log together
+# with their plan (EXPLAIN FORMAT=JSON on MySQL). A negative value disables the log.
+SLOW_QUERY_THRESHOLD = float(os.environ.get("SLOW_QUERY_THRESHOLD", "0.5"))
+SLOW_QUERY_LOG_PATH = os.environ.get("SLOW_QUERY_LOG_PATH", "slow_queries.jsonl")
+
+# Per-request profiling of /submit and /get_weather_data: requests carrying the header
+# "X-Profile: <PROFILE_TOKEN>" and a random share of PROFILE_SAMPLE_RATE (0 to 1) of all
+# requests run under cProfile. The profiles are stored in PROFILE_DIR, only the newest
+# PROFILE_MAX_FILES are kept. Disabled by default.
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+PROFILE_MAX_FILES = int(os.environ.get("PROFILE_MAX_FILES", "100"))
+
+# Time budget of a /submit or /get_weather_data request in seconds. Clients may ask for a
+# shorter one with the header X-Request-Timeout. Expired requests are answered with 504.
+REQUEST_TIMEOUT = float(os.environ.get("REQUEST_TIMEOUT", "30"))
+
+# Seconds between checks whether another process swapped in a new dataset version
+# (see data_services.reingest_dataset); a loaded station catalog is reloaded then.
+DATASET_VERSION_CHECK_INTERVAL = float(os.environ.get("DATASET_VERSION_CHECK_INTERVAL", "5"))
+
+# Asynchronous jobs (POST /jobs): worker threads per process, jobs queued or running per
+# process before submissions are rejected with 503, time budget of a job in seconds,
+# seconds a finished job and its result are kept, and seconds between progress updates.
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_MAX_PENDING = int(os.environ.get("JOB_MAX_PENDING", "20"))
+JOB_TIMEOUT = float(os.environ.get("JOB_TIMEOUT", "900"))
+JOB_RESULT_TTL = float(os.environ.get("JOB_RESULT_TTL", "3600"))
+JOB_PROGRESS_INTERVAL = float(os.environ.get("JOB_PROGRESS_INTERVAL", "1"))
+
+# Seconds a GET /jobs/<id>/events stream stays open. Each open stream holds a sync worker,
+# so the stream ends after this time and the client reconnects (EventSource "retry").
+JOB_EVENTS_MAX_SECONDS = float(os.environ.get("JOB_EVENTS_MAX_SECONDS", "30"))
+
+# Results of /submit and /get_weather_data kept in memory per process (cleared when a new
+# dataset version is published); the caches are used once the station catalog is loaded.
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", "5000"))
+
+# Cache prewarming (see prewarm.py): most frequent recorded requests replayed after startup
+# and after a dataset swap (0 disables recording and replay), worker threads, wall-clock and
+# CPU seconds a prewarm run may use, seconds between writes of the request counts, and days
+# a request key is kept without being requested again.
+PREWARM_TOP_N = int(os.environ.get("PREWARM_TOP_N", "200"))
+PREWARM_WORKERS = int(os.environ.get("PREWARM_WORKERS", "2"))
+PREWARM_TIME_BUDGET = float(os.environ.get("PREWARM_TIME_BUDGET", "60"))
+PREWARM_CPU_BUDGET = float(os.environ.get("PREWARM_CPU_BUDGET", "30"))
+PREWARM_FLUSH_INTERVAL = float(os.environ.get("PREWARM_FLUSH_INTERVAL", "60"))
+PREWARM_RETENTION_DAYS = float(os.environ.get("PREWARM_RETENTION_DAYS", "7"))
+
+# Rows fetched from the server-side cursor and encoded per chunk of a bulk export (POST /export).
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", "10000"))
+
+# Seconds a bulk export may take. The export is streamed after the request handler has
+# returned, so it runs with its own deadline instead of REQUEST_TIMEOUT.
+EXPORT_TIMEOUT = float(os.environ.get("EXPORT_TIMEOUT", "600"))
+
+# Distributed ingestion (cli.py coordinate/worker): seconds a claimed station stays leased
+# to one worker before others may take it over, attempts per station before it is marked
+# as failed, and stations claimed per batch.
+INGEST_LEASE_SECONDS = float(os.environ.get("INGEST_LEASE_SECONDS", "300"))
+INGEST_MAX_ATTEMPTS = int(os.environ.get("INGEST_MAX_ATTEMPTS", "3"))
+INGEST_CLAIM_BATCH = int(os.environ.get("INGEST_CLAIM_BATCH", "10"))
+
+# Share of the requested years (0 to 1) a station needs complete Tmin/Tmax data for to be
+# returned by /submit. Requests may pass their own value as "minCoverage".
+MIN_YEAR_COVERAGE = float(os.environ.get("MIN_YEAR_COVERAGE", "0.8"))
+
+# Baseline period of the climate normals used by the trend and anomaly statistics, and the
+# number of per-station results kept in memory (cleared when a new dataset version is published).
+CLIMATE_NORMAL_FIRST_YEAR = int(os.environ.get("CLIMATE_NORMAL_FIRST_YEAR", "1991"))
+CLIMATE_NORMAL_LAST_YEAR = int(os.environ.get("CLIMATE_NORMAL_LAST_YEAR", "2020"))
+TREND_CACHE_SIZE = int(os.environ.get("TREND_CACHE_SIZE", "10000"))
+
+# Interpolated temperature surfaces (/surface tiles and /get_surface): search radius in km
+# and maximum number of stations per grid point of the inverse distance weighting, cached
+# tiles (cleared when a new dataset version is published) and grid points per /get_surface request.
+SURFACE_SEARCH_RADIUS = float(os.environ.get("SURFACE_SEARCH_RADIUS", "300"))
+SURFACE_NEIGHBOURS = int(os.environ.get("SURFACE_NEIGHBOURS", "8"))
+SURFACE_TILE_CACHE_SIZE = int(os.environ.get("SURFACE_TILE_CACHE_SIZE", "2000"))
+SURFACE_MAX_POINTS = int(os.environ.get("SURFACE_MAX_POINTS", "250000"))
+
+# GHCN-D elements whose monthly values are stored in the ElementValue table during the
+# ingestion (comma-separated). TMAX/TMIN are always parsed for the Datapoint table.
+INGEST_ELEMENTS = tuple(element.strip() for element in os.environ.get(
+    "INGEST_ELEMENTS", "TMAX,TMIN,TAVG,PRCP,SNOW,SNWD").split(",") if element.strip())
+
+# GHCN-D elements whose daily values are stored compressed per station and year in the
+# DailyValue table during the ingestion (comma-separated, empty to disable the daily store).
+DAILY_ELEMENTS = tuple(element.strip() for element in os.environ.get(
+    "DAILY_ELEMENTS", "TMAX,TMIN,PRCP").split(",") if element.strip())
@@ -0,0 +1,126 @@
+import datetime
+import zlib
+import numpy as np
+
+# =========================================================
+# Compressed daily values
+# =========================================================
+# The daily values of one station, element and year are kept as 366 int16 values in the
+# GHCN-D units (slot = day of a leap year, so February 29 always has a slot). The array is
+# delta-encoded (runs of equal or missing values become zeros) and compressed with zlib
+# into one blob of the DailyValue table. Reading a year decodes only that blob.
+
+MISSING = -9999
+DAYS_PER_YEAR = 366
+
+# First slot and length of every month in the leap-year calendar
+MONTH_LENGTHS = (31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+MONTH_OFFSETS = tuple(int(offset) for offset in np.cumsum((0,) + MONTH_LENGTHS[:-1]))
+
+# Slot of February 29
+LEAP_DAY = MONTH_OFFSETS[1] + 28
+
+INT16_MIN = np.iinfo(np.int16).min
+INT16_MAX = np.iinfo(np.int16).max
+
+
+def put_month(years, element: str, year: int, month: int, days):
+    """
+    Stores the daily values of a .dly line in the values of its element and year. The values
+    are collected in lists, numpy per line would cost more than the parsing itself.
+
+    :param years: Dictionary (element, year) -> list of DAYS_PER_YEAR values, filled in place.
+    :param days: Values of the days 1 to 31 in GHCN-D units, MISSING for missing days.
+    :return: No return value.
+    """
+
+    values = years.get((element, year))
+    if values is None:
+        values = years[(element, year)] = [MISSING] * DAYS_PER_YEAR
+    offset = MONTH_OFFSETS[month - 1]
+    values[offset:offset + MONTH_LENGTHS[month - 1]] = days[:MONTH_LENGTHS[month - 1]]
+
+
+def encode(values):
+    """
+    Delta-encodes and compresses the values of a year.
+
+    :param values: DAYS_PER_YEAR values (NumPy array or list), clipped to the int16 range.
+    :return: Blob (bytes).
+    """
+
+    values = np.clip(np.asarray(values), INT16_MIN, INT16_MAX).astype(np.int16)
+    deltas = np.empty_like(values)
+    deltas[0] = values[0]
+    # int16 arithmetic wraps around, the cumulative sum of decode() wraps back
+    np.subtract(values[1:], values[:-1], out=deltas[1:])
+    return zlib.compress(deltas.astype("<i2").tobytes(), 6)
+
+
+def decode(blob):
+    """
+    Restores the values of a year encoded by encode().
+
+    :return: NumPy array of DAYS_PER_YEAR int16 values.
+    """
+
+    deltas = np.frombuffer(zlib.decompress(blob), dtype="<i2")
+    return np.cumsum(deltas, dtype=np.int16)
+
+
+def encode_years(years):
+    """
+    Encodes all arrays collected by put_month().
+
+    :return: List of (element, year, blob) tuples.
+    """
+
+    return [(element, year, encode(values)) for (element, year), values in sorted(years.items())]
+
+
+def is_leap_year(year: int):
+    return year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+
+
+def valid_days(year: int, values):
+    """
+    Finds the slots with a value, February 29 only in leap years.
+
+    :return: Boolean NumPy array.
+    """
+
+    valid = values != MISSING
+    if not is_leap_year(year):
+        valid[LEAP_DAY] = False
+    return valid
+
+
+def to_series(year: int, values, divisor: float):
+    """
+    Converts the values of a year into dated values.
+
+    :param divisor: Divisor from the GHCN-D units, see datapoint.ELEMENT_DIVISORS.
+    :return: List of (ISO date, value) tuples of the days with a value.
+    """
+
+    slots = np.flatnonzero(valid_days(year, values))
+    start = datetime.date(year, 1, 1)
+    # Slots after February 28 are one day ahead of the date in common years
+    shift = 0 if is_leap_year(year) else 1
+    return [((start + datetime.timedelta(days=int(slot) - (shift if slot > LEAP_DAY else 0))).isoformat(),
+             round(float(values[slot]) / divisor, 2))
+            for slot in slots]
+
+
+def count_days(year: int, values, threshold: float, above: bool = True):
+    """
+    Counts the days of a year above (or below) a threshold, e.g. summer days or frost days.
+
+    :param threshold: Threshold in GHCN-D units.
+    :param above: Count values >= threshold, otherwise values < threshold.
+    :return: Tuple (number of days, number of days with a value).
+    """
+
+    valid = valid_days(year, values)
+    matches = (values >= threshold) if above else (values < threshold)
+    return int((matches & valid).sum()), int(valid.sum())
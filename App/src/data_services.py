@@ -1,91 +1,518 @@
 import station as st
 import datapoint as dp
 import calculations as calc
+import sqlite3
+import threading
 import time
-from mysql.connector import pooling
+from config import (dbconfig, DB_POOL_SIZE, DB_POOL_MAX_SIZE, DB_POOL_MAX_WAITERS, DB_POOL_TIMEOUT,
+                    DB_POOL_HEALTH_CHECK_INTERVAL, DB_POOL_IDLE_TIMEOUT, DB_MAX_CONNECTIONS,
+                    DB_RESERVED_CONNECTIONS, DB_CONNECT_RETRIES, DB_CONNECT_BACKOFF, DB_READ_REPLICAS,
+                    DB_READ_STRATEGY, DB_REPLICA_MAX_LAG, DB_REPLICA_LAG_CHECK_INTERVAL, STORAGE_BACKEND,
+                    SQLITE_PATH, DATASET_VERSION_CHECK_INTERVAL, MIN_YEAR_COVERAGE, CLIMATE_NORMAL_FIRST_YEAR,
+                    CLIMATE_NORMAL_LAST_YEAR, TREND_CACHE_SIZE, SURFACE_SEARCH_RADIUS, SURFACE_NEIGHBOURS,
+                    SURFACE_TILE_CACHE_SIZE, RESULT_CACHE_SIZE)
+import mysql.connector
+import numpy as np
+import year_coverage
+import daily_store
+import surface
+import trends
+import metrics
+import deadlines
+from pool_manager import PoolManager
+from replica_router import ReplicaRouter
+from versioned_cache import VersionedLRUCache
+from mysql_backend import MySQLBackend
+from sqlite_backend import SQLiteBackend
+
+
+def create_connection_pool(pool_size=DB_POOL_SIZE, max_size=DB_POOL_MAX_SIZE, config=dbconfig):
+    """
+    Creates a connection pool with the settings from config.py. No connection is opened
+    until the pool is used for the first time.
+
+    :param pool_size: Number of connections kept open.
+    :param max_size: Upper limit the pool may grow to under load.
+    :param config: Connection settings, the primary database by default.
+    :return: PoolManager.
+    """
+
+    return PoolManager(
+        config,
+        pool_size=min(pool_size, max_size),
+        max_size=max_size,
+        max_waiters=DB_POOL_MAX_WAITERS,
+        acquire_timeout=DB_POOL_TIMEOUT,
+        health_check_interval=DB_POOL_HEALTH_CHECK_INTERVAL,
+        idle_timeout=DB_POOL_IDLE_TIMEOUT,
+        retries=DB_CONNECT_RETRIES,
+        backoff=DB_CONNECT_BACKOFF
+    )
+
+
+def create_read_router(primary, max_size=DB_POOL_MAX_SIZE):
+    """
+    Creates the router for read-only queries if replicas are configured in DB_READ_REPLICAS.
+
+    :param primary: PoolManager of the primary database, used as fallback.
+    :param max_size: Upper limit for the connections per replica.
+    :return: ReplicaRouter, or None if no replicas are configured.
+    """
+
+    if not DB_READ_REPLICAS:
+        return None
+
+    replicas = {}
+    for replica in DB_READ_REPLICAS:
+        host, _, port = replica.partition(":")
+        replica_config = {**dbconfig, "host": host, "port": port or dbconfig["port"]}
+        replicas[replica] = create_connection_pool(DB_POOL_SIZE, max_size, replica_config)
+
+    return ReplicaRouter(primary, replicas, strategy=DB_READ_STRATEGY, max_lag=DB_REPLICA_MAX_LAG,
+                         lag_check_interval=DB_REPLICA_LAG_CHECK_INTERVAL)
+
+
+# Connection pool of the primary database, connects on first use
+connection_pool = create_connection_pool()
+
+# Router for read-only queries, None if all queries go to the primary
+read_router = create_read_router(connection_pool)
+
+
+def get_read_connection():
+    """
+    Returns a connection for read-only queries: from a replica if replicas are configured
+    and in sync, otherwise from the primary.
+
+    :return: Pooled connection.
+    """
+
+    if read_router is None:
+        return connection_pool.get_connection(timeout=pool_timeout())
+    return read_router.get_read_connection(timeout=pool_timeout())
+
+
+def pool_timeout():
+    """
+    Limits the wait for a pooled connection to the remaining time of the request.
+
+    :return: Wait time in seconds, None for the default DB_POOL_TIMEOUT.
+    """
+
+    left = deadlines.remaining()
+    return None if left is None else max(0.0, min(left, DB_POOL_TIMEOUT))
+
+
+def get_write_connection():
+    """
+    Returns a connection to the primary database for writes.
+
+    :return: Pooled connection.
+    """
+
+    return connection_pool.get_connection()
+
+
+def get_probe_connection():
+    """
+    Returns a connection for health probes: connecting is not retried and the wait for a
+    pooled connection is limited to one second, so an unreachable database fails fast.
+
+    :return: Pooled connection.
+    """
+
+    return connection_pool.get_connection(retry=False, timeout=1)
+
+
+def create_backend(name=STORAGE_BACKEND):
+    """
+    Creates the storage backend selected by STORAGE_BACKEND.
+
+    :param name: "mysql" or "sqlite".
+    :return: StorageBackend.
+    """
+
+    if name == "sqlite":
+        return SQLiteBackend(SQLITE_PATH)
+    if name == "mysql":
+        return MySQLBackend(get_write_connection, get_read_connection, get_probe_connection)
+    raise ValueError(f"Unknown storage backend: {name}")
 
-# Wait to make sure MYSQL DB is running
-time.sleep(10)
 
-dbconfig = {
-    "user": "root",
-    "password": "root",
-    "host": "mysql",
-    "port": "3306",
-    "database": "db"
+# Storage of stations and datapoints
+backend = create_backend()
+
+# Progress of the data ingestion, reported by the /readyz endpoint
+ingest_status = {
+    "state": "pending",  # pending, running, done or failed
+    "stations_total": 0,
+    "stations_done": 0,
+    "datapoints_written": 0,
+    "error": None,
 }
 
-# Initialize connection pool
-connection_pool = pooling.MySQLConnectionPool(
-    pool_name="mypool",
-    pool_size=10,
-    **dbconfig
-)
+# In-memory copy of the Station table, filled by load_station_catalog().
+# (station_id, station_name, latitude, longitude, first_tmin, latest_tmin, first_tmax, latest_tmax)
+station_catalog = None
 
+# Dataset version the station catalog was loaded from and time of the last version check
+dataset_version = None
+dataset_version_checked = 0.0
 
-def save_data_to_db():
+# Trend statistics per station, valid for one dataset version
+trend_cache = VersionedLRUCache(TREND_CACHE_SIZE)
+
+# Station values (per year and period) and rendered grids of the interpolated surfaces,
+# valid for one dataset version
+surface_layers = VersionedLRUCache(16)
+surface_tiles = VersionedLRUCache(SURFACE_TILE_CACHE_SIZE)
+
+# Results of get_stations_in_radius and get_datapoints_for_station, valid for one dataset version
+radius_cache = VersionedLRUCache(RESULT_CACHE_SIZE)
+aggregate_cache = VersionedLRUCache(RESULT_CACHE_SIZE)
+
+# Called with the dataset version whenever the station catalog of a serving process was
+# (re)loaded: on startup, after an ingestion and after a detected swap
+dataset_listeners = []
+
+INVENTORY_URL = "https://www1.ncdc.noaa.gov/pub/data/ghcn/daily/ghcnd-inventory.txt"
+STATIONS_URL = "https://www1.ncdc.noaa.gov/pub/data/ghcn/daily/ghcnd-stations.txt"
+
+
+def init_connection_pool(max_size=DB_POOL_MAX_SIZE):
     """
-    Populates the "Station" and "Datapoint" tables in the database if they are empty
-    by loading and inserting data from an external URL.
+    Replaces the connection pool of this process with a new one. Must be called in every
+    forked worker, because connections inherited from the parent process cannot be shared.
 
-    :return: No return value, performs database operations.
+    :param max_size: Upper limit for the connections of the new pool.
+    :return: No return value.
     """
 
-    connection = connection_pool.get_connection()
+    global connection_pool, read_router
+
+    connection_pool = create_connection_pool(DB_POOL_SIZE, max_size)
+    read_router = create_read_router(connection_pool, max_size)
+
+
+def close_connection_pools():
+    """
+    Closes the pool of the primary and the pools of the replicas, e.g. in the gunicorn
+    master before the workers are forked.
+
+    :return: No return value.
+    """
+
+    connection_pool.close()
+    if read_router is not None:
+        read_router.close()
 
+
+def get_max_connections():
+    """
+    Determines the connection budget of the MySQL server. DB_MAX_CONNECTIONS takes
+    precedence over the server variable max_connections.
+
+    :return: Maximum number of connections (int).
+    """
+
+    if DB_MAX_CONNECTIONS > 0:
+        return DB_MAX_CONNECTIONS
+
+    connection = connection_pool.get_connection()
     try:
         with connection.cursor() as cursor:
-
-            cursor.execute("SELECT * FROM Station;")
-            inhalt_station = cursor.fetchall()
-            if not inhalt_station:
-                stations = st.load_stations_from_url(
-                    "https://www1.ncdc.noaa.gov/pub/data/ghcn/daily/ghcnd-inventory.txt",
-                    "https://www1.ncdc.noaa.gov/pub/data/ghcn/daily/ghcnd-stations.txt")
-                for station in stations:
-                    cursor.execute(
-                        """
-                        INSERT INTO Station (station_id, station_name, latitude, longitude, first_tmax, latest_tmax, 
-                        first_tmin, latest_tmin)
-                        VALUES (%s,%s, %s, %s, %s, %s, %s, %s);
-                        """,
-                        (station.id, station.name, station.latitude, station.longitude, station.first_measure_tmax,
-                         station.last_measure_tmax, station.first_measure_tmin, station.last_measure_tmin))
-                connection.commit()
-
-                cursor.execute("SELECT * FROM Station;")
-                inhalt_station = cursor.fetchall()
-
-            else:
-                print("Station already filled.")
-
-            cursor.execute("SELECT * FROM Datapoint LIMIT 1;")
-            inhalt_datapoint = cursor.fetchall()
-
-            if not inhalt_datapoint:
-                for station in inhalt_station:
-                    datapoints = dp.download_and_create_datapoints(station[1])
-                    foreign_key = station[0]
-                    for datapoint in datapoints:
-                        cursor.execute(
-                            """
-                            INSERT INTO Datapoint (SID, year, month, tmax, tmin)
-                            VALUES (%s, %s, %s, %s, %s);
-                            """,
-                            (foreign_key, str(datapoint.date)[:4], str(datapoint.date)[-2:],
-                             datapoint.tmax, datapoint.tmin))
-                connection.commit()
-            else:
-                print("Datapoint already filled.")
+            cursor.execute("SHOW VARIABLES LIKE 'max_connections';")
+            max_connections = int(cursor.fetchall()[0][1])
     finally:
         cursor.close()
         connection.close()
 
+    return max_connections
+
+
+def worker_pool_size(workers, max_connections, reserved=DB_RESERVED_CONNECTIONS):
+    """
+    Splits the connection budget of the MySQL server evenly between the web workers.
+
+    :param workers: Number of worker processes.
+    :param max_connections: Connection budget of the server.
+    :param reserved: Connections kept free for ingestion and administration.
+    :return: Maximum pool size per worker (at least 1).
+    """
+
+    available = max(max_connections - reserved, workers)
+    return max(1, available // workers)
+
+
+def load_station_catalog():
+    """
+    Loads the complete Station table into memory. Once loaded, get_stations_in_radius
+    filters the catalog in-process instead of querying the database. When called in a
+    pre-fork server's master process, all workers share the catalog copy-on-write.
+
+    :return: Number of stations in the catalog.
+    """
+
+    global station_catalog, dataset_version, dataset_version_checked
+
+    # Read before the catalog, so a swap in between is detected by the next check
+    dataset_version = backend.get_dataset_version()
+    dataset_version_checked = time.monotonic()
+
+    with metrics.query_timer("station_catalog") as result:
+        rows = backend.get_station_catalog()
+        result["rows"] = len(rows)
+
+    # An empty Station table (ingestion still pending) keeps the database as source.
+    # The coverage column is decoded once here, so the filter only needs integer operations.
+    station_catalog = tuple(tuple(row[:8]) + (year_coverage.decode(row[8]),) for row in rows) if rows else None
+
+    # Reloaded after an ingestion into the live tables (same version) or a swap: cached
+    # results may be outdated
+    radius_cache.clear()
+    aggregate_cache.clear()
+
+    print(f"Station catalog loaded: {len(rows)} stations.")
+    return len(rows)
+
+
+def save_data_to_db():
+    """
+    Populates the "Station" and "Datapoint" tables in the database if they are empty
+    by loading and inserting data from an external URL.
+
+    :return: True if datapoints were inserted.
+    """
+
+    with backend.write_session() as session:
+
+        inhalt_station = session.get_stations()
+        if not inhalt_station:
+            stations = st.load_stations_from_url(INVENTORY_URL, STATIONS_URL)
+            session.insert_stations(stations)
+            session.commit()
+
+            inhalt_station = session.get_stations()
+
+        else:
+            print("Station already filled.")
+
+        if not session.has_datapoints():
+            insert_station_data(session, inhalt_station)
+            session.commit()
+            return True
+        else:
+            print("Datapoint already filled.")
+            return False
+
+
+def insert_station_data(session, stations):
+    """
+    Downloads and inserts the datapoints of all stations and reports the progress in
+    ingest_status and the ingestion metrics.
+
+    :param session: WriteSession of the storage backend.
+    :param stations: Rows of the Station table of the session.
+    :return: No return value.
+    """
+
+    ingest_status["stations_total"] = len(stations)
+    ingest_status["stations_done"] = 0
+    ingest_status["datapoints_written"] = 0
+    for station in stations:
+        started = time.perf_counter()
+        datapoints, element_values, daily_values = dp.download_and_create_records(station[1])
+        session.insert_datapoints(station[0], datapoints)
+        session.insert_element_values(station[0], element_values)
+        session.insert_daily_values(station[0], daily_values)
+        ingest_status["stations_done"] += 1
+        ingest_status["datapoints_written"] += len(datapoints)
+        metrics.INGEST_STATIONS.inc()
+        metrics.INGEST_DATAPOINTS.inc(len(datapoints))
+        metrics.INGEST_SECONDS.inc(time.perf_counter() - started)
+
+
+def reingest_dataset(stations=None):
+    """
+    Loads a complete new dataset version into the shadow tables while the live tables keep
+    answering requests, then swaps it in atomically. The replaced version is kept for
+    rollback_dataset().
+
+    :param stations: List of station.Station objects, downloaded from NOAA if None.
+    :return: New dataset version (int).
+    """
+
+    if stations is None:
+        stations = st.load_stations_from_url(INVENTORY_URL, STATIONS_URL)
+
+    with backend.shadow_session() as session:
+        session.insert_stations(stations)
+        session.commit()
+        insert_station_data(session, session.get_stations())
+        session.commit()
+
+    version = backend.publish_shadow()
+    print(f"Dataset version {version} published.")
+    backend.rebuild_aggregates()
+    check_dataset_version(force=True)
+    return version
+
+
+def rollback_dataset():
+    """
+    Swaps the previous dataset version back in.
+
+    :return: New dataset version (int).
+    """
+
+    version = backend.rollback_version()
+    print(f"Dataset version {version}: previous data restored.")
+    check_dataset_version(force=True)
+    return version
+
+
+def check_dataset_version(force=False):
+    """
+    Reloads the station catalog if a new dataset version was swapped in, by this or
+    another process, and notifies the dataset_listeners. Queries of the database always
+    see the live tables, so only the in-memory catalog and the caches have to follow.
+    Checked at most every DATASET_VERSION_CHECK_INTERVAL seconds.
+
+    :param force: Check immediately.
+    :return: No return value.
+    """
+
+    global dataset_version_checked
+
+    if station_catalog is None or dataset_version is None:
+        return
+    if not force and time.monotonic() - dataset_version_checked < DATASET_VERSION_CHECK_INTERVAL:
+        return
+
+    dataset_version_checked = time.monotonic()
+    try:
+        version = backend.get_dataset_version()
+    except (mysql.connector.Error, sqlite3.Error) as error:
+        print(f"Dataset version check failed: {error}")
+        return
+
+    if version != dataset_version:
+        load_station_catalog()
+        notify_dataset_listeners()
+
+
+def notify_dataset_listeners():
+    """
+    Calls the dataset_listeners with the version of the loaded station catalog. Not
+    called by load_station_catalog() itself, which also runs in the gunicorn master.
+
+    :return: No return value.
+    """
+
+    if station_catalog is None:
+        return
+    for listener in dataset_listeners:
+        listener(dataset_version)
+
+
+def load_station_catalog_on_startup():
+    """
+    Creates missing tables (see StorageBackend.ensure_schema) and loads the station
+    catalog when the server starts. A database that is not reachable yet, or an empty
+    Station table, leaves the requests on database queries until the catalog is loaded
+    after the ingestion.
+
+    :return: True if the catalog was loaded.
+    """
+
+    try:
+        backend.ensure_schema()
+        loaded = load_station_catalog() > 0
+    except (mysql.connector.Error, sqlite3.Error) as error:
+        print(f"Station catalog not loaded: {error}")
+        return False
+    notify_dataset_listeners()
+    return loaded
+
 
-def get_stations_in_radius(latitude, longitude, radius, first_year, last_year, max_stations):
+def run_ingest():
+    """
+    Loads the station catalog of the existing data, runs save_data_to_db and records the
+    outcome in ingest_status. After an ingestion the yearly aggregates are rebuilt, and the
+    station catalog is reloaded so newly inserted stations become searchable.
+
+    :return: No return value.
+    """
+
+    ingest_status["state"] = "running"
+    load_station_catalog_on_startup()
+    try:
+        ingested = save_data_to_db()
+        if ingested:
+            backend.rebuild_aggregates()
+        # Without an ingestion the catalog of the startup is current, reloading it would
+        # clear the result caches the listeners are filling
+        if ingested or station_catalog is None:
+            load_station_catalog()
+            notify_dataset_listeners()
+        ingest_status["state"] = "done"
+    except Exception as error:
+        ingest_status["state"] = "failed"
+        ingest_status["error"] = str(error)
+        print(f"Ingestion failed: {error}")
+
+
+def start_background_catalog_load():
+    """
+    Loads the station catalog in a daemon thread, for servers without ingestion (ASGI),
+    so they accept requests while the database is not reachable yet.
+
+    :return: The started thread.
+    """
+
+    thread = threading.Thread(target=load_station_catalog_on_startup, name="station-catalog", daemon=True)
+    thread.start()
+    return thread
+
+
+def start_background_ingest():
+    """
+    Starts the data ingestion in a daemon thread so the web server can accept requests
+    immediately. Progress is available in ingest_status.
+
+    :return: The started thread.
+    """
+
+    thread = threading.Thread(target=run_ingest, name="ingest", daemon=True)
+    thread.start()
+    return thread
+
+
+def is_ready():
+    """
+    Checks whether requests can be answered: the database must be reachable and the
+    Station table must contain data. Datapoints may still be loading.
+
+    :return: True if the service is ready, otherwise False.
+    """
+
+    if station_catalog is not None:
+        return True
+
+    try:
+        return backend.has_stations()
+    except (mysql.connector.Error, sqlite3.Error):
+        return False
+
+
+def get_stations_in_radius(latitude, longitude, radius, first_year, last_year, max_stations,
+                           min_coverage=MIN_YEAR_COVERAGE):
     """
     Retrieves stations located within a specified radius around the given position
-    that meet Tmin/Tmax conditions for the specified time period.
+    that meet Tmin/Tmax conditions for the specified time period. With the station catalog
+    loaded, stations also need complete Tmin/Tmax data for min_coverage of the years
+    (tested on the coverage bitmaps; stations without a computed bitmap are kept).
+    Results from the catalog are cached per dataset version.
 
     :param latitude: Latitude of the search position.
     :param longitude: Longitude of the search position.
@@ -93,29 +520,38 @@ def get_stations_in_radius(latitude, longitude, radius, first_year, last_year, m
     :param first_year: First year of the desired time period.
     :param last_year: Last year of the desired time period.
     :param max_stations: Maximum number of stations to return.
+    :param min_coverage: Required share of complete years, 0 to 1.
 
     :return: List of stations with their distances within the radius.
     """
 
-    connection = connection_pool.get_connection()
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute(
-                """
-                SELECT station_id, station_name, latitude, longitude 
-                FROM Station 
-                WHERE first_tmin <= %s 
-                  AND latest_tmin >= %s 
-                  AND first_tmax <= %s 
-                  AND latest_tmax >= %s;
-                """,
-                (first_year, last_year, first_year, last_year))
-            stations = cursor.fetchall()
-
-            stations_in_radius = calc.find_stations_within_radius(stations, latitude, longitude, radius, max_stations)
-    finally:
-        cursor.close()
-        connection.close()
+    check_dataset_version()
+    if station_catalog is not None:
+        metrics.CACHE_REQUESTS.inc(cache="station_catalog", result="hit")
+        version = dataset_version
+        key = (latitude, longitude, radius, first_year, last_year, max_stations, min_coverage)
+        if version is not None:
+            cached = radius_cache.get(version, key)
+            metrics.CACHE_REQUESTS.inc(cache="stations_in_radius", result="miss" if cached is None else "hit")
+            if cached is not None:
+                return cached
+
+        mask = year_coverage.range_mask(first_year, last_year)
+        required = year_coverage.required_years(first_year, last_year, min_coverage)
+        stations = [station[:4] for station in station_catalog
+                    if station[4] <= first_year and station[5] >= last_year
+                    and station[6] <= first_year and station[7] >= last_year
+                    and (station[8] is None or year_coverage.covers(station[8], mask, required))]
+        stations_in_radius = calc.find_stations_within_radius(stations, latitude, longitude, radius, max_stations)
+        if version is not None:
+            radius_cache.put(version, key, stations_in_radius)
+        return stations_in_radius
+
+    metrics.CACHE_REQUESTS.inc(cache="station_catalog", result="miss")
+    with metrics.query_timer("stations_for_period") as result:
+        stations = backend.get_stations_for_period(first_year, last_year)
+        result["rows"] = len(stations)
+    stations_in_radius = calc.find_stations_within_radius(stations, latitude, longitude, radius, max_stations)
 
     return stations_in_radius  # (('GMM00010591', 50.933, 14.217), 66.85437995060985)
 
@@ -123,7 +559,7 @@ def get_stations_in_radius(latitude, longitude, radius, first_year, last_year, m
 def get_datapoints_for_station(station_id, first_year, last_year):
     """
     Retrieves temperature average records (Tmin and Tmax) for a station,
-    grouped by year and seasons.
+    grouped by year and seasons. Cached per dataset version once the catalog is loaded.
 
     :param station_id: Name of the station.
     :param first_year: First year of the time period.
@@ -141,201 +577,353 @@ def get_datapoints_for_station(station_id, first_year, last_year):
              9. Winter Tmin
             10. Winter Tmax
     """
-    connection = connection_pool.get_connection()
-    try:
-        with (connection.cursor() as cursor):
-
-            ten_datasets = []
-
-            cursor.execute("SELECT SID FROM Station WHERE station_id = %s;", (station_id,))
-            sid = cursor.fetchall()
-            station_id = sid[0][0]
-
-            cursor.execute(
-                """
-                SELECT year,
-                       SUM(tmin * days_in_month) / SUM(days_in_month)
-                FROM (
-                    SELECT year,
-                           month,
-                           AVG(tmin) AS tmin,
-                           CASE
-                               WHEN month = 2 THEN
-                                   CASE
-                                       WHEN (year % 4 = 0 AND (year % 100 != 0 OR year % 400 = 0)) THEN 29
-                                       ELSE 28
-                                   END
-                               WHEN month IN (4, 6, 9, 11) THEN 30
-                               ELSE 31
-                           END AS days_in_month
-                    FROM Datapoint
-                    WHERE SID = %s
-                      AND year BETWEEN %s AND %s
-                    GROUP BY year, month
-                ) AS subquery
-                GROUP BY year
-                ORDER BY year;
-                """,
-                (station_id, first_year, last_year))
-            ten_datasets.append(cursor.fetchall())
-
-            cursor.execute(
-                """
-                SELECT year,
-                       SUM(tmax * days_in_month) / SUM(days_in_month)
-                FROM (
-                    SELECT year,
-                           month,
-                           AVG(tmax) AS tmax,
-                           CASE
-                               WHEN month = 2 THEN
-                                   CASE
-                                       WHEN (year % 4 = 0 AND (year % 100 != 0 OR year % 400 = 0)) THEN 29
-                                       ELSE 28
-                                   END
-                               WHEN month IN (4, 6, 9, 11) THEN 30
-                               ELSE 31
-                           END AS days_in_month
-                    FROM Datapoint
-                    WHERE SID = %s
-                      AND year BETWEEN %s AND %s
-                    GROUP BY year, month
-                ) AS subquery
-                GROUP BY year
-                ORDER BY year;
-                """,
-                (station_id, first_year, last_year))
-            ten_datasets.append(cursor.fetchall())
-
-            seasons = {
-                "spring": (3, 5),
-                "summer": (6, 8),
-                "autumn": (9, 11),
-            }
-
-            for season, (start_month, end_month) in seasons.items():
-
-                cursor.execute(
-                    """
-                    SELECT year,
-                           SUM(tmin * days_in_month) / SUM(days_in_month)
-                    FROM (
-                        SELECT year,
-                               month,
-                               AVG(tmin) AS tmin,
-                               CASE
-                                   WHEN month = 2 THEN
-                                       CASE
-                                           WHEN (year % 4 = 0 AND (year % 100 != 0 OR year % 400 = 0)) THEN 29
-                                           ELSE 28
-                                       END
-                                   WHEN month IN (4, 6, 9, 11) THEN 30
-                                   ELSE 31
-                               END AS days_in_month
-                        FROM Datapoint
-                        WHERE SID = %s
-                          AND month BETWEEN %s AND %s
-                          AND year BETWEEN %s AND %s
-                        GROUP BY year, month
-                    ) AS subquery
-                    GROUP BY year
-                    ORDER BY year;
-                    """,
-                    (station_id, start_month, end_month, first_year, last_year))
-                ten_datasets.append(cursor.fetchall())
-
-
-                cursor.execute(
-                    """
-                    SELECT year,
-                           SUM(tmax * days_in_month) / SUM(days_in_month)
-                    FROM (
-                        SELECT year,
-                               month,
-                               AVG(tmax) AS tmax,
-                               CASE
-                                   WHEN month = 2 THEN
-                                       CASE
-                                           WHEN (year % 4 = 0 AND (year % 100 != 0 OR year % 400 = 0)) THEN 29
-                                           ELSE 28
-                                       END
-                                   WHEN month IN (4, 6, 9, 11) THEN 30
-                                   ELSE 31
-                               END AS days_in_month
-                        FROM Datapoint
-                        WHERE SID = %s
-                          AND month BETWEEN %s AND %s
-                          AND year BETWEEN %s AND %s
-                        GROUP BY year, month
-                    ) AS subquery
-                    GROUP BY year
-                    ORDER BY year;
-                    """,
-                    (station_id, start_month, end_month, first_year, last_year))
-                ten_datasets.append(cursor.fetchall())
-
-            cursor.execute(
-                """
-                SELECT winter_year,
-                       SUM(tmin * days_in_month) / SUM(days_in_month) AS avg_tmin
-                FROM (
-                    SELECT CASE WHEN month = 12 THEN year + 1 ELSE year END AS winter_year,
-                           month,
-                           AVG(tmin) AS tmin,
-                           CASE
-                               WHEN month = 2 THEN 
-                                   CASE 
-                                       WHEN (year % 4 = 0 AND (year % 100 != 0 OR year % 400 = 0)) THEN 29 
-                                       ELSE 28 
-                                   END
-                               WHEN month = 12 THEN 31
-                               WHEN month = 1 THEN 31
-                               ELSE 30
-                           END AS days_in_month
-                    FROM Datapoint
-                    WHERE SID = %s
-                      AND (month = 12 OR month BETWEEN 1 AND 2)
-                      AND (CASE WHEN month = 12 THEN year + 1 ELSE year END) BETWEEN %s AND %s
-                    GROUP BY year, month
-                ) AS subquery
-                GROUP BY winter_year
-                ORDER BY winter_year;
-                """,
-                (station_id, first_year, last_year))
-            ten_datasets.append(cursor.fetchall())
-
-            cursor.execute(
-                """
-                SELECT winter_year,
-                       SUM(tmax * days_in_month) / SUM(days_in_month) AS avg_tmax
-                FROM (
-                    SELECT CASE WHEN month = 12 THEN year + 1 ELSE year END AS winter_year,
-                           month,
-                           AVG(tmax) AS tmax,
-                           CASE
-                               WHEN month = 2 THEN 
-                                   CASE 
-                                       WHEN (year % 4 = 0 AND (year % 100 != 0 OR year % 400 = 0)) THEN 29 
-                                       ELSE 28 
-                                   END
-                               WHEN month = 12 THEN 31
-                               WHEN month = 1 THEN 31
-                               ELSE 30
-                           END AS days_in_month
-                    FROM Datapoint
-                    WHERE SID = %s
-                      AND (month = 12 OR month BETWEEN 1 AND 2)
-                      AND (CASE WHEN month = 12 THEN year + 1 ELSE year END) BETWEEN %s AND %s
-                    GROUP BY year, month
-                ) AS subquery
-                GROUP BY winter_year
-                ORDER BY winter_year;
-                """,
-                (station_id, first_year, last_year))
-            ten_datasets.append(cursor.fetchall())
-
-    finally:
-        cursor.close()
-        connection.close()
 
+    # The dataset version is only followed with a loaded catalog, otherwise every call queries
+    check_dataset_version()
+    version = dataset_version if station_catalog is not None else None
+    if version is not None:
+        cached = aggregate_cache.get(version, (station_id, first_year, last_year))
+        metrics.CACHE_REQUESTS.inc(cache="aggregates", result="miss" if cached is None else "hit")
+        if cached is not None:
+            return cached
+
+    with metrics.query_timer("aggregates") as result:
+        ten_datasets = backend.get_aggregates(station_id, first_year, last_year)
+        result["rows"] = sum(len(dataset) for dataset in ten_datasets)
+
+    if version is not None:
+        aggregate_cache.put(version, (station_id, first_year, last_year), ten_datasets)
     return ten_datasets
+
+
+# Order of the periods in the ten series of get_datapoints_for_station
+PERIODS = ("annual", "spring", "summer", "autumn", "winter")
+
+
+def get_regional_aggregates(latitude, longitude, radius, first_year, last_year, max_stations, idw=False,
+                            min_coverage=MIN_YEAR_COVERAGE):
+    """
+    Calculates the annual and seasonal Tmin/Tmax series of a region as the average over
+    all stations selected like in get_stations_in_radius. The database sums the precomputed
+    YearlyAggregate rows of the stations per period and year (one query per 400 stations),
+    so only the averages are transferred.
+
+    :param latitude: Latitude of the search position.
+    :param longitude: Longitude of the search position.
+    :param radius: Search radius in kilometers.
+    :param first_year: First year of the time period.
+    :param last_year: Last year of the time period.
+    :param max_stations: Maximum number of stations, -1 for all.
+    :param idw: Weight the stations by their inverse squared distance instead of equally.
+    :param min_coverage: Required share of complete years, 0 to 1.
+
+    :return: Tuple (number of stations, ten lists of (year, value) in the order of get_datapoints_for_station).
+    """
+
+    stations = get_stations_in_radius(latitude, longitude, radius, first_year, last_year, max_stations, min_coverage)
+
+    weights = calc.idw_weights(stations) if idw else {station[0]: 1.0 for station, _ in stations}
+
+    with metrics.query_timer("regional_sums") as result:
+        rows = backend.get_regional_sums(list(weights.items()), first_year, last_year)
+        result["rows"] = len(rows)
+
+    # Sums of several queries are added before dividing
+    sums = {}
+    for period, year, weight, tmin, tmax in rows:
+        total = sums.setdefault((period, int(year)), [0.0, 0.0, 0.0])
+        total[0] += weight
+        total[1] += tmin
+        total[2] += tmax
+
+    ten_datasets = []
+    for period in PERIODS:
+        years = sorted(year for key_period, year in sums if key_period == period)
+        for column in (1, 2):
+            ten_datasets.append([(year, round(sums[period, year][column] / sums[period, year][0], 3))
+                                 for year in years])
+    return len(stations), ten_datasets
+
+
+def get_element_values(station_id, element, first_year, last_year):
+    """
+    Retrieves the monthly values of one GHCN-D element (e.g. "PRCP") of a station.
+
+    :param station_id: Name of the station.
+    :param element: Element code, one of INGEST_ELEMENTS.
+    :param first_year: First year of the time period.
+    :param last_year: Last year of the time period.
+
+    :return: List of (year, month, value, days) tuples; value in °C or mm (a sum for PRCP and SNOW),
+             days the number of valid days of the month.
+    """
+
+    with metrics.query_timer("element_values") as result:
+        rows = backend.get_element_values(station_id, element, first_year, last_year)
+        result["rows"] = len(rows)
+    return rows
+
+
+def get_daily_values(station_id, element, first_year, last_year):
+    """
+    Retrieves the daily values of one GHCN-D element of a station from the compressed
+    daily store. Only the blobs of the requested years are read and decoded.
+
+    :param station_id: Name of the station.
+    :param element: Element code, one of DAILY_ELEMENTS.
+    :param first_year: First year of the time period.
+    :param last_year: Last year of the time period.
+
+    :return: List of (ISO date, value) tuples of the days with a value, in °C or mm.
+    """
+
+    divisor = dp.ELEMENT_DIVISORS.get(element, 1)
+    with metrics.query_timer("daily_values") as result:
+        rows = backend.get_daily_values(station_id, element, first_year, last_year)
+        result["rows"] = len(rows)
+
+    series = []
+    for year, blob in rows:
+        series.extend(daily_store.to_series(year, daily_store.decode(blob), divisor))
+    return series
+
+
+def get_threshold_days(station_id, element, first_year, last_year, threshold, above=True):
+    """
+    Counts the days per year on which a daily value reaches a threshold, e.g. summer days
+    (TMAX >= 25 °C) or frost days (TMIN below 0 °C).
+
+    :param station_id: Name of the station.
+    :param element: Element code, one of DAILY_ELEMENTS.
+    :param first_year: First year of the time period.
+    :param last_year: Last year of the time period.
+    :param threshold: Threshold in °C or mm.
+    :param above: Count days with values >= threshold, otherwise days with values < threshold.
+
+    :return: List of (year, days, valid days) tuples.
+    """
+
+    # Compare in GHCN-D units, the values are stored in tenths for temperatures and PRCP
+    threshold = threshold * dp.ELEMENT_DIVISORS.get(element, 1)
+    with metrics.query_timer("daily_values") as result:
+        rows = backend.get_daily_values(station_id, element, first_year, last_year)
+        result["rows"] = len(rows)
+
+    return [(year,) + daily_store.count_days(year, daily_store.decode(blob), threshold, above)
+            for year, blob in rows]
+
+
+def current_dataset_version():
+    """
+    Returns the live dataset version, from the catalog state if it is loaded.
+
+    :return: Dataset version (int).
+    """
+
+    check_dataset_version()
+    return dataset_version if dataset_version is not None else backend.get_dataset_version()
+
+
+def get_trend_statistics(station_ids, period, first_year, last_year, baseline_first=CLIMATE_NORMAL_FIRST_YEAR,
+                         baseline_last=CLIMATE_NORMAL_LAST_YEAR):
+    """
+    Calculates the linear trends (°C/decade), the climate normals of the baseline period and
+    the anomalies of the Tmin and Tmax series of several stations. Stations missing in the
+    cache of the dataset version are computed together from the precomputed yearly aggregates.
+
+    :param station_ids: List of station IDs.
+    :param period: "annual", "spring", "summer", "autumn" or "winter".
+    :param first_year: First year of the trend and anomalies.
+    :param last_year: Last year of the trend and anomalies.
+    :param baseline_first: First year of the baseline period.
+    :param baseline_last: Last year of the baseline period.
+
+    :return: Dictionary station ID -> {"tmin": ..., "tmax": ...} (see trends.statistics).
+    """
+
+    version = current_dataset_version()
+    result = {}
+    missing = []
+    for station_id in station_ids:
+        cached = trend_cache.get(version, (station_id, period, first_year, last_year, baseline_first, baseline_last))
+        if cached is None:
+            missing.append(station_id)
+        else:
+            result[station_id] = cached
+
+    metrics.CACHE_REQUESTS.inc(len(result), cache="trends", result="hit")
+    metrics.CACHE_REQUESTS.inc(len(missing), cache="trends", result="miss")
+    if not missing:
+        return result
+
+    with metrics.query_timer("yearly_aggregates") as timer:
+        rows = backend.get_yearly_aggregates(missing, period, min(first_year, baseline_first),
+                                             max(last_year, baseline_last))
+        timer["rows"] = len(rows)
+
+    computed = trends.statistics(rows, missing, first_year, last_year, baseline_first, baseline_last)
+    for station_id, statistics in computed.items():
+        trend_cache.put(version, (station_id, period, first_year, last_year, baseline_first, baseline_last),
+                        statistics)
+        result[station_id] = statistics
+    return result
+
+
+def get_station_trends(station_id, first_year, last_year, baseline_first=CLIMATE_NORMAL_FIRST_YEAR,
+                       baseline_last=CLIMATE_NORMAL_LAST_YEAR):
+    """
+    Calculates trend, normal and anomalies of the ten series of a station.
+
+    :return: Ten dictionaries with "trend", "normal" and "anomalies" in the order of get_datapoints_for_station.
+    """
+
+    ten_statistics = []
+    for period in PERIODS:
+        statistics = get_trend_statistics([station_id], period, first_year, last_year, baseline_first, baseline_last)
+        ten_statistics.extend([statistics[station_id]["tmin"], statistics[station_id]["tmax"]])
+    return ten_statistics
+
+
+def rank_stations_by_trend(latitude, longitude, radius, first_year, last_year, max_stations, period="annual",
+                           element="tmax", min_coverage=MIN_YEAR_COVERAGE):
+    """
+    Ranks the stations selected like in get_stations_in_radius by their warming rate.
+
+    :param period: Period of the series, "annual" or a season.
+    :param element: "tmin" or "tmax", the trend used for the order.
+    :return: List of station dictionaries, the strongest warming first and stations without trend last.
+    """
+
+    stations = get_stations_in_radius(latitude, longitude, radius, first_year, last_year, max_stations, min_coverage)
+    statistics = get_trend_statistics([station[0] for station, _ in stations], period, first_year, last_year)
+
+    ranking = [{
+        "stationId": station[0],
+        "name": station[1],
+        "latitude": station[2],
+        "longitude": station[3],
+        "distance": distance,
+        "trendTmin": statistics[station[0]]["tmin"]["trend"],
+        "trendTmax": statistics[station[0]]["tmax"]["trend"],
+    } for station, distance in stations]
+
+    key = "trendTmin" if element == "tmin" else "trendTmax"
+    ranking.sort(key=lambda entry: (entry[key] is None, -(entry[key] or 0)))
+    return ranking
+
+
+def get_surface_layer(version, year, period):
+    """
+    Loads the values of all stations in one year and period and indexes their positions.
+
+    :param version: Dataset version the layer is cached for.
+    :return: Tuple (SpatialIndex, latitudes, longitudes, {"tmin": values, "tmax": values}) of NumPy arrays.
+    """
+
+    layer = surface_layers.get(version, (year, period))
+    if layer is not None:
+        return layer
+
+    with metrics.query_timer("surface_values") as timer:
+        rows = backend.get_surface_values(period, year)
+        timer["rows"] = len(rows)
+    columns = np.array(rows, dtype=float).reshape(len(rows), 4)
+    latitudes, longitudes = columns[:, 0], columns[:, 1]
+    layer = (surface.SpatialIndex(latitudes, longitudes), latitudes, longitudes,
+             {"tmin": columns[:, 2], "tmax": columns[:, 3]})
+    surface_layers.put(version, (year, period), layer)
+    return layer
+
+
+def interpolate_surface(key, year, period, element, grid_latitudes, grid_longitudes):
+    """
+    Interpolates the station values of a year on a grid, cached per dataset version.
+
+    :param key: Cache key of the grid, e.g. the tile or the bounding box.
+    :return: Matrix rows x columns (NumPy array), NaN without stations in SURFACE_SEARCH_RADIUS.
+    """
+
+    version = current_dataset_version()
+    key = key + (year, period, element)
+    grid = surface_tiles.get(version, key)
+    if grid is not None:
+        metrics.CACHE_REQUESTS.inc(cache="surface", result="hit")
+        return grid
+
+    metrics.CACHE_REQUESTS.inc(cache="surface", result="miss")
+    index, latitudes, longitudes, values = get_surface_layer(version, year, period)
+    grid = surface.interpolate_grid(index, latitudes, longitudes, values[element], grid_latitudes,
+                                    grid_longitudes, SURFACE_SEARCH_RADIUS, SURFACE_NEIGHBOURS)
+    surface_tiles.put(version, key, grid)
+    return grid
+
+
+def get_surface_tile(zoom, x, y, year, period="annual", element="tmax"):
+    """
+    Renders a web map tile of the interpolated Tmin or Tmax surface of a year.
+
+    :param zoom: Zoom level of the tile (0 to surface.MAX_ZOOM).
+    :param x: Column of the tile.
+    :param y: Row of the tile.
+    :param year: Year of the values.
+    :param period: "annual" or a season.
+    :param element: "tmin" or "tmax".
+
+    :return: PNG file (bytes).
+    """
+
+    grid_latitudes, grid_longitudes = surface.tile_grid(zoom, x, y)
+    grid = interpolate_surface(("tile", zoom, x, y), year, period, element, grid_latitudes, grid_longitudes)
+    return surface.render_tile(grid)
+
+
+def get_surface_grid(north, south, east, west, resolution, year, period="annual", element="tmax"):
+    """
+    Interpolates the Tmin or Tmax surface of a year on a regular grid over a bounding box.
+
+    :param resolution: Distance of the grid points in degrees.
+    :return: Dictionary with the "latitudes" of the rows (north to south), the "longitudes" of
+             the columns and the "values" as one list, row by row (None without stations in the search radius).
+    """
+
+    grid_latitudes, grid_longitudes = surface.bbox_grid(north, south, east, west, resolution)
+    grid = interpolate_surface(("bbox", north, south, east, west, resolution), year, period, element,
+                               grid_latitudes, grid_longitudes)
+    return {
+        "latitudes": grid_latitudes.round(6).tolist(),
+        "longitudes": grid_longitudes.round(6).tolist(),
+        "values": [None if np.isnan(value) else value for value in grid.round(2).ravel().tolist()],
+    }
+
+
+def collect_pool_metrics(fields):
+    """
+    Reads the statistics of the primary pool and the replica pools for the /metrics route.
+
+    :param fields: Keys of PoolManager.metrics() to export.
+    :return: List of ((pool, field), value) tuples.
+    """
+
+    pools = {"primary": connection_pool}
+    if read_router is not None:
+        pools.update(read_router.replicas)
+
+    values = []
+    for name, pool in pools.items():
+        pool_metrics = pool.metrics()
+        for field in fields:
+            values.append(((name, field.removesuffix("_total")), pool_metrics[field]))
+    return values
+
+
+metrics.register(metrics.Collector(
+    "weather_db_pool_connections", "Connections of the database pools by state.",
+    lambda: collect_pool_metrics(("size", "idle", "in_use", "waiting", "max_size")), ("pool", "state")))
+metrics.register(metrics.Collector(
+    "weather_db_pool_events_total", "Events of the database pools (acquisitions, waits, timeouts, ...).",
+    lambda: collect_pool_metrics(("acquired_total", "created_total", "closed_total", "health_check_failures_total",
+                                  "waits_total", "timeouts_total", "rejected_total")), ("pool", "event"),
+    kind="counter"))
+metrics.register(metrics.Collector(
+    "weather_ingest_stations_pending", "Stations the running ingestion still has to process.",
+    lambda: [((), ingest_status["stations_total"] - ingest_status["stations_done"])]))
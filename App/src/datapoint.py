@@ -1,5 +1,7 @@
 import requests
 import os
+import daily_store
+from config import INGEST_ELEMENTS, DAILY_ELEMENTS
 
 class DataPoint:
     def __init__(self, date: int, tmax: float, tmin: float, station: str = None):
@@ -27,22 +29,60 @@ class DataPoint:
         station_name = self.station if self.station else "None"
         return f"DataPoint(date={self.date}, station='{station_name}, tmax={self.tmax}, tmin={self.tmin}')"
 
-def extract_average_value(line: str):
+# Divisor from the GHCN-D units to °C and mm (TMAX/TMIN/TAVG and PRCP are stored in tenths)
+ELEMENT_DIVISORS = {"TMAX": 10, "TMIN": 10, "TAVG": 10, "PRCP": 10, "SNOW": 1, "SNWD": 1}
+
+# Elements whose monthly value is the sum of the days instead of the mean
+SUMMED_ELEMENTS = {"PRCP", "SNOW"}
+
+def parse_day_values(line: str):
     """
-    Extracts the VALUE values from the given string and calculates the average.
+    Extracts the valid daily VALUE fields of a .dly line (missing days are -9999).
 
     :param line: The given string containing the data.
-    :return: The average of the VALUE values.
+    :return: List of the values in GHCN-D units (int).
     """
 
-    value_werte = []
+    values = []
 
     # Loop over the starting position for the values (22, 30, 38, ..., 262)
     for start in range(21, len(line), 8):
         value_str = line[start:start + 5].strip()
 
         if value_str.isdigit() or (value_str.startswith('-') and value_str[1:].isdigit() and value_str != '-9999'):
-            value_werte.append(int(value_str))
+            values.append(int(value_str))
+
+    return values
+
+def parse_line_days(line: str):
+    """
+    Extracts the daily VALUE fields of a .dly line by day of the month.
+
+    :param line: The given string containing the data.
+    :return: List of 31 values in GHCN-D units (int), daily_store.MISSING for missing days.
+    """
+
+    days = []
+
+    for start in range(21, 269, 8):
+        value_str = line[start:start + 5].strip()
+
+        if value_str.isdigit() or (value_str.startswith('-') and value_str[1:].isdigit()):
+            days.append(int(value_str))
+        else:
+            days.append(daily_store.MISSING)
+
+    return days
+
+def extract_average_value(line: str):
+    """
+    Extracts the VALUE values from the given string and calculates the average.
+
+    :param line: The given string containing the data.
+    :return: The average of the VALUE values.
+    """
+
+    value_werte = parse_day_values(line)
 
     if len(value_werte) > 0:
         average_value = sum(value_werte) / len(value_werte) / 10
@@ -50,6 +90,94 @@ def extract_average_value(line: str):
     else:
         return 0
 
+def parse_elements(lines, elements, daily=None, daily_elements=()):
+    """
+    Extracts the monthly values of several elements from the lines of a .dly file in one pass.
+    Months without a valid day are left out.
+
+    :param lines: Iterable of lines in the GHCN-D .dly format (e.g. an open file).
+    :param elements: Collection of element codes, e.g. ("TMAX", "TMIN", "PRCP").
+    :param daily: Optional dictionary (element, year) -> array the daily values of the
+                  daily_elements are collected in (see daily_store.put_month).
+    :param daily_elements: Elements whose daily values are collected.
+    :return: List of (year, month, element, value, days) tuples; value is the mean of the valid
+             days in °C or mm (the sum for SUMMED_ELEMENTS), days the number of valid days.
+    """
+
+    daily_elements = frozenset(daily_elements) if daily is not None else frozenset()
+    elements = frozenset(elements) | daily_elements
+    records = []
+
+    for line in lines:
+        element = line[17:21]
+        if len(line) > 21 and element in elements:
+            if element in daily_elements:
+                days = parse_line_days(line)
+                daily_store.put_month(daily, element, int(line[11:15]), int(line[15:17]), days)
+                values = [value for value in days if value != daily_store.MISSING]
+            else:
+                values = parse_day_values(line)
+            if not values:
+                continue
+
+            value = sum(values) / ELEMENT_DIVISORS.get(element, 1)
+            if element not in SUMMED_ELEMENTS:
+                value /= len(values)
+            records.append((int(line[11:15]), int(line[15:17]), element, float(f"{value:.3f}"), len(values)))
+
+    return records
+
+def datapoints_from_elements(records, station_id: str):
+    """
+    Pairs the TMAX and TMIN values of the same month to DataPoint objects.
+
+    :param records: List of (year, month, element, value, days) tuples of parse_elements.
+    :param station_id: The station ID the records belong to.
+    :return: A list of DataPoint objects for the months with both values.
+    """
+
+    tmax = {}
+    tmin = {}
+    for year, month, element, value, days in records:
+        if element == "TMAX":
+            tmax[year * 100 + month] = value
+        elif element == "TMIN":
+            tmin[year * 100 + month] = value
+
+    return [DataPoint(date=date, tmax=value, tmin=tmin[date], station=station_id)
+            for date, value in tmax.items() if date in tmin]
+
+def create_datapoints_from_lines(lines, station_id: str):
+    """
+    Parses the lines of a .dly file and creates DataPoint objects from the TMAX/TMIN records.
+
+    :param lines: Iterable of lines in the GHCN-D .dly format (e.g. an open file).
+    :param station_id: The station ID the lines belong to.
+    :return: A list of DataPoint objects containing the extracted temperatures and the associated date.
+    """
+
+    return create_records_from_lines(lines, station_id, (), ())[0]
+
+def create_records_from_lines(lines, station_id: str, elements=INGEST_ELEMENTS, daily_elements=DAILY_ELEMENTS):
+    """
+    Parses the lines of a .dly file once into DataPoint objects, the monthly values of the
+    elements and the compressed daily values of the daily elements.
+
+    :param lines: Iterable of lines in the GHCN-D .dly format (e.g. an open file).
+    :param station_id: The station ID the lines belong to.
+    :param elements: Elements of the returned monthly values.
+    :param daily_elements: Elements of the returned daily values.
+    :return: Tuple (list of DataPoint objects, list of (year, month, element, value, days) tuples,
+             list of (element, year, blob) tuples, see daily_store.encode_years).
+    """
+
+    daily = {}
+    records = parse_elements(lines, set(elements) | {"TMAX", "TMIN"}, daily, daily_elements)
+    datapoints = datapoints_from_elements(records, station_id)
+    if not {"TMAX", "TMIN"} <= set(elements) or not set(daily_elements) <= set(elements):
+        records = [record for record in records if record[2] in elements]
+    return datapoints, records, daily_store.encode_years(daily)
+
 def download_and_create_datapoints(station_id: str):
     """
     Downloads the file for a given station ID, extracts the relevant lines, and creates DataPoint objects.
@@ -58,9 +186,22 @@ def download_and_create_datapoints(station_id: str):
     :return: A list of DataPoint objects containing the extracted temperatures and the associated date.
     """
 
+    return download_and_create_records(station_id, (), ())[0]
+
+def download_and_create_records(station_id: str, elements=INGEST_ELEMENTS, daily_elements=DAILY_ELEMENTS):
+    """
+    Downloads the file for a given station ID and parses it into DataPoint objects, the
+    monthly values and the daily values of the elements (see create_records_from_lines).
+
+    :param station_id: The station ID used to download the file (e.g., 'ACW00011604').
+    :param elements: Elements of the returned monthly values.
+    :param daily_elements: Elements of the returned daily values.
+    :return: Tuple (DataPoint objects, monthly values, daily values), see create_records_from_lines.
+    """
+
     url = f"https://www1.ncdc.noaa.gov/pub/data/ghcn/daily/all/{station_id}.dly"
     response = requests.get(url)
-    list_datapoints = []
+    records = ([], [], [])
 
     if response.status_code == 200:
         file_name = f"{station_id}.dly"
@@ -68,70 +209,64 @@ def download_and_create_datapoints(station_id: str):
         with open(file_name, 'wb') as file:
             file.write(response.content)
 
-        tmax_data = 0
-        tmin_data = 0
-
         with open(file_name, 'r') as file:
-            for line in file:
-                temp_element = line[17:21]
-                if len(line) > 21 and (temp_element == "TMAX" or temp_element == "TMIN"):
-                    # Extract date
-                    current_date = int(line[11:17])  # YYYYMM
-
-                    if temp_element == "TMAX":
-                        tmax_data = extract_average_value(line)
-                    elif temp_element == "TMIN":
-                        tmin_data = extract_average_value(line)
-
-                    if tmin_data != 0 and tmax_data != 0:
-                        data_point = DataPoint(date=current_date, tmax=tmax_data, tmin=tmin_data,
-                                               station=station_id)
-                        list_datapoints.append(data_point)
-                        tmax_data = 0
-                        tmin_data = 0
+            records = create_records_from_lines(file, station_id, elements, daily_elements)
 
         os.remove(file_name)
     else:
         print(f"Failed to load the file: HTTP {response.status_code}")
 
-    return list_datapoints
+    return records
 
-def download_and_create_datapoints_local(station_id: str):
+def download_and_create_datapoints_local(station_id: str, directory: str = "/data/ghcnd_all"):
     """
     Reads the file for a given station ID from the local directory,
     extracts the relevant lines, and creates DataPoint objects.
 
     :param station_id: The station ID of the file (e.g., 'ACW00011604').
+    :param directory: Directory containing the .dly files.
     :return: A list of DataPoint objects containing the extracted temperatures and the associated date.
     """
 
-    file_path = f"/data/ghcnd_all/{station_id}.dly"
-    list_datapoints = []
+    return download_and_create_records_local(station_id, directory, (), ())[0]
 
-    if os.path.exists(file_path):
+def download_and_create_records_local(station_id: str, directory: str = "/data/ghcnd_all",
+                                      elements=INGEST_ELEMENTS, daily_elements=DAILY_ELEMENTS):
+    """
+    Reads the file for a given station ID from the local directory and parses it into
+    DataPoint objects, the monthly values and the daily values of the elements (see
+    create_records_from_lines).
+
+    :param station_id: The station ID of the file (e.g., 'ACW00011604').
+    :param directory: Directory containing the .dly files.
+    :param elements: Elements of the returned monthly values.
+    :param daily_elements: Elements of the returned daily values.
+    :return: Tuple (DataPoint objects, monthly values, daily values), see create_records_from_lines.
+    """
+
+    file_path = f"{directory}/{station_id}.dly"
+    records = ([], [], [])
 
-        tmax_data = 0
-        tmin_data = 0
+    if os.path.exists(file_path):
 
         with open(file_path, 'r') as file:
-            for line in file:
-                line_17 = line[17:21]
-                if len(line) > 21 and (line_17 == "TMAX" or line_17 == "TMIN"):
-
-                    current_date = int(line[11:17])
-
-                    if line_17 == "TMAX":
-                        tmax_data = extract_average_value(line)
-                    elif line_17 == "TMIN":
-                        tmin_data = extract_average_value(line)
-
-                    if tmin_data != 0 and tmax_data != 0:
-                        data_point = DataPoint(date=current_date, tmax=tmax_data, tmin=tmin_data,
-                                               station=station_id)
-                        list_datapoints.append(data_point)
-                        tmax_data = 0
-                        tmin_data = 0
+            records = create_records_from_lines(file, station_id, elements, daily_elements)
     else:
         print(f"Error: File {file_path} not found.")
 
-    return list_datapoints
+    return records
+
+
+def fetch_records(source: str, directory: str, station_id: str):
+    """
+    Downloads or reads the .dly file of a station, depending on the source of the ingestion.
+
+    :param source: "url" to download the file, otherwise it is read from the directory.
+    :param directory: Directory containing the .dly files.
+    :param station_id: The station ID of the file (e.g., 'ACW00011604').
+    :return: Tuple (DataPoint objects, monthly values, daily values), see create_records_from_lines.
+    """
+
+    if source == "url":
+        return download_and_create_records(station_id)
+    return download_and_create_records_local(station_id, directory)
@@ -0,0 +1,106 @@
+import contextvars
+import re
+import time
+from contextlib import contextmanager
+
+# Absolute deadline (time.monotonic) of the current request, None if unlimited.
+# A context variable is used so the deadline follows threads and asyncio tasks.
+current_deadline = contextvars.ContextVar("current_deadline", default=None)
+
+# How often long Python loops check the deadline
+CHECK_INTERVAL = 10_000
+
+
+class DeadlineExceeded(Exception):
+    """Raised when the time budget of the current request is used up."""
+
+
+def request_timeout(header, maximum):
+    """
+    Determines the time budget of a request: the maximum, or the shorter value a client
+    asked for in the X-Request-Timeout header.
+
+    :param header: Header value in seconds (str or bytes), None if not sent.
+    :param maximum: Server-side limit in seconds (REQUEST_TIMEOUT).
+    :return: Time budget in seconds.
+    """
+
+    try:
+        requested = float(header) if header else maximum
+    except ValueError:
+        requested = maximum
+    return max(0.0, min(requested, maximum))
+
+
+def start(seconds):
+    """
+    Sets the deadline of the current context.
+
+    :param seconds: Time budget in seconds, None for no deadline.
+    :return: Token for reset().
+    """
+
+    return current_deadline.set(None if seconds is None else time.monotonic() + seconds)
+
+
+def reset(token):
+    current_deadline.reset(token)
+
+
+@contextmanager
+def deadline(seconds):
+    """
+    Runs the with block with a time budget.
+
+    :param seconds: Time budget in seconds, None for no deadline.
+    """
+
+    token = start(seconds)
+    try:
+        yield
+    finally:
+        reset(token)
+
+
+def remaining():
+    """
+    :return: Remaining seconds of the current deadline (may be negative), None if unlimited.
+    """
+
+    value = current_deadline.get()
+    return None if value is None else value - time.monotonic()
+
+
+def expired():
+    value = current_deadline.get()
+    return value is not None and time.monotonic() >= value
+
+
+def check():
+    """
+    Raises DeadlineExceeded if the deadline of the current request has passed.
+
+    :return: No return value.
+    """
+
+    if expired():
+        raise DeadlineExceeded("Request deadline exceeded")
+
+
+def with_max_execution_time(query):
+    """
+    Adds a MAX_EXECUTION_TIME optimizer hint with the remaining time to a SELECT statement,
+    so MySQL aborts the statement itself when the request has expired.
+
+    :param query: SQL statement.
+    :return: SQL statement with the hint, unchanged without deadline or if not a SELECT.
+    """
+
+    left = remaining()
+    if left is None:
+        return query
+
+    check()
+    milliseconds = max(1, int(left * 1000))
+    return re.sub(r"^(\s*SELECT)\b", rf"\1 /*+ MAX_EXECUTION_TIME({milliseconds}) */", query, count=1,
+                  flags=re.IGNORECASE)
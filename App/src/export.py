@@ -0,0 +1,173 @@
+import csv
+import importlib.util
+import io
+import data_services as ds
+import deadlines
+import metrics
+import queries
+from storage_backend import STATION_IDS_PER_QUERY
+from config import EXPORT_BATCH_SIZE, EXPORT_TIMEOUT
+
+# =========================================================
+# Bulk export
+# =========================================================
+# Exports the monthly datapoints or the yearly aggregates of many stations as one CSV or
+# Parquet file. The stations are queried in chunks of STATION_IDS_PER_QUERY, each with a
+# server-side cursor that yields EXPORT_BATCH_SIZE rows at a time, and every batch is
+# encoded and handed to the client before the next one is read. The memory use does not
+# depend on the number of stations or years. An export runs with a deadline of
+# EXPORT_TIMEOUT seconds, passed to MySQL as MAX_EXECUTION_TIME of every query.
+
+EXPORT_ROWS = metrics.register(metrics.Counter(
+    "weather_export_rows_total", "Rows written by bulk exports.", ("format",)))
+
+# Format -> MIME type
+FORMATS = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+COLUMNS = {
+    "monthly": ("station_id", "year", "month", "tmax", "tmin"),
+    "yearly": ("station_id", "year", "period", "tmin", "tmax"),
+}
+
+
+def parquet_available():
+    """
+    Parquet files are written with the optional package pyarrow.
+
+    :return: True if pyarrow is installed.
+    """
+
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def region_station_ids(latitude, longitude, radius, first_year, last_year, min_coverage):
+    """
+    Selects the stations of a region like get_stations_in_radius, without a station limit.
+
+    :return: List of station IDs.
+    """
+
+    stations = ds.get_stations_in_radius(latitude, longitude, radius, first_year, last_year, -1, min_coverage)
+    return [station[0] for station, _ in stations]
+
+
+def export_batches(station_ids, first_year, last_year, resolution="monthly", periods=("annual",),
+                   batch_size=EXPORT_BATCH_SIZE, timeout=EXPORT_TIMEOUT):
+    """
+    Streams the rows of an export in station order.
+
+    :param station_ids: Station IDs (iterable).
+    :param first_year: First year of the time period.
+    :param last_year: Last year of the time period.
+    :param resolution: "monthly" or "yearly", see COLUMNS for the columns of the rows.
+    :param periods: Periods of a yearly export ("annual" or seasons).
+    :param batch_size: Rows per batch (int).
+    :param timeout: Seconds the whole export may take, None for no limit (float).
+    :return: Generator of row lists.
+    """
+
+    station_ids = sorted(set(station_ids))
+    # The generator runs while the response is sent, after the deadline of the request has ended
+    with deadlines.deadline(timeout):
+        for start in range(0, len(station_ids), STATION_IDS_PER_QUERY):
+            chunk = station_ids[start:start + STATION_IDS_PER_QUERY]
+            params = chunk + [first_year, last_year]
+            if resolution == "yearly":
+                params += list(periods)
+            query = queries.build_export_query(len(chunk), resolution, len(periods))
+            yield from ds.backend.stream_rows(query, params, batch_size)
+
+
+def csv_chunks(batches, columns):
+    """
+    Encodes row batches as CSV with a header line.
+
+    :return: Generator of bytes, one chunk per batch.
+    """
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(columns)
+    for rows in batches:
+        writer.writerows(rows)
+        EXPORT_ROWS.inc(len(rows), format="csv")
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():
+        # Export without rows: only the header
+        yield buffer.getvalue().encode()
+
+
+class ChunkSink:
+    def __init__(self):
+        """
+        Write-only file object that collects the bytes written since the last take().
+        The position keeps counting, the Parquet footer refers to absolute offsets.
+        """
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def parquet_chunks(batches, columns):
+    """
+    Encodes row batches as a Parquet file with one row group per batch. Needs pyarrow.
+
+    :return: Generator of bytes, one chunk per row group and the footer.
+    """
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {"station_id": pa.string(), "year": pa.int32(), "month": pa.int32(), "period": pa.string(),
+             "tmin": pa.float32(), "tmax": pa.float32()}
+    schema = pa.schema([(name, types[name]) for name in columns])
+
+    sink = ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for rows in batches:
+            arrays = [pa.array(values, type=types[name]) for name, values in zip(columns, zip(*rows))]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            EXPORT_ROWS.inc(len(rows), format="parquet")
+            yield sink.take()
+    finally:
+        writer.close()
+    yield sink.take()
+
+
+def export_chunks(station_ids, first_year, last_year, resolution="monthly", periods=("annual",), file_format="csv",
+                  batch_size=EXPORT_BATCH_SIZE, timeout=EXPORT_TIMEOUT):
+    """
+    Streams an export as file contents.
+
+    :param file_format: "csv" or "parquet", a key of FORMATS.
+    :param timeout: Seconds the whole export may take, None for no limit (float).
+    :return: Generator of bytes.
+    """
+
+    batches = export_batches(station_ids, first_year, last_year, resolution, periods, batch_size, timeout)
+    if file_format == "parquet":
+        return parquet_chunks(batches, COLUMNS[resolution])
+    return csv_chunks(batches, COLUMNS[resolution])
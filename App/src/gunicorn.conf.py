@@ -0,0 +1,38 @@
+import multiprocessing
+import os
+
+# Production launch: gunicorn -c gunicorn.conf.py wsgi:app (from the src directory)
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get("WEB_THREADS", "1"))
+
+# Import the application (and with it the station catalog) in the master before forking
+preload_app = True
+
+# Graceful worker recycling: every worker is replaced after a jittered number of
+# requests and gets graceful_timeout seconds to finish in-flight requests
+max_requests = int(os.environ.get("WEB_MAX_REQUESTS", "5000"))
+max_requests_jitter = int(os.environ.get("WEB_MAX_REQUESTS_JITTER", "500"))
+graceful_timeout = int(os.environ.get("WEB_GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.environ.get("WEB_TIMEOUT", "120"))
+
+accesslog = "-"
+
+
+def post_fork(server, worker):
+    """
+    Gives every worker its own connection pool. The pool size is the MySQL connection
+    budget divided by the number of workers, so all workers together never exceed it.
+    """
+
+    import data_services as ds
+    import wsgi
+
+    pool_size = ds.worker_pool_size(workers, wsgi.max_connections)
+    ds.init_connection_pool(pool_size)
+    server.log.info(f"Worker {worker.pid}: connection pool size {pool_size}")
+
+    # Threads do not survive the fork: every worker fills its result caches in the
+    # background after it started serving
+    ds.notify_dataset_listeners()
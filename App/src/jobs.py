@@ -0,0 +1,302 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import mysql.connector
+import data_services as ds
+import deadlines
+import metrics
+import queries
+from config import (JOB_WORKERS, JOB_MAX_PENDING, JOB_TIMEOUT, JOB_RESULT_TTL, JOB_PROGRESS_INTERVAL,
+                    MIN_YEAR_COVERAGE)
+
+# =========================================================
+# Asynchronous jobs
+# =========================================================
+# Analytical requests that take longer than a synchronous request (regional series over
+# thousands of stations, many station series at once) are submitted as jobs. A bounded
+# thread pool per process runs them against data_services with a time budget of
+# JOB_TIMEOUT. Status, progress and the JSON result are stored in the Job table of the
+# storage backend, so every process of the server answers status requests and the
+# results survive until JOB_RESULT_TTL after the job finished. No broker is needed.
+
+JOBS = metrics.register(metrics.Counter(
+    "weather_jobs_total", "Asynchronous jobs by kind and outcome (done, failed, deduplicated).",
+    ("kind", "result")))
+
+# Marks parameters without a default value
+REQUIRED = object()
+
+FINISHED = ("done", "failed")
+
+
+class JobError(Exception):
+    """Invalid job request, the message is returned to the client."""
+
+
+class JobQueueFull(Exception):
+    """Raised when JOB_MAX_PENDING jobs of this process are queued or running."""
+
+
+def run_regional_data(params, progress):
+    station_count, weather_data = ds.get_regional_aggregates(
+        params["latitude"], params["longitude"], params["radius"], params["yearStart"], params["yearEnd"],
+        params["stations"], params["weighting"] == "idw", params["minCoverage"])
+    return {"stationCount": station_count, "weatherData": weather_data}
+
+
+def run_rank_stations(params, progress):
+    return ds.rank_stations_by_trend(params["latitude"], params["longitude"], params["radius"], params["yearStart"],
+                                     params["yearEnd"], params["stations"], params["period"], params["element"],
+                                     params["minCoverage"])
+
+
+def run_station_series(params, progress):
+    station_ids = params["stationNames"]
+    series = {}
+    for position, station_id in enumerate(station_ids):
+        deadlines.check()
+        series[station_id] = ds.get_datapoints_for_station(station_id, params["yearStart"], params["yearEnd"])
+        progress((position + 1) / len(station_ids))
+    return series
+
+
+# Kind -> (function (params, progress callback) -> JSON-serializable result,
+#          parameter name -> (type or tuple of allowed values, default or REQUIRED))
+REGION_PARAMETERS = {
+    "latitude": (float, REQUIRED),
+    "longitude": (float, REQUIRED),
+    "radius": (float, REQUIRED),
+    "yearStart": (int, REQUIRED),
+    "yearEnd": (int, REQUIRED),
+    "stations": (int, -1),
+    "minCoverage": (float, MIN_YEAR_COVERAGE),
+}
+
+JOB_KINDS = {
+    "regional_data": (run_regional_data, dict(REGION_PARAMETERS, weighting=(("mean", "idw"), "mean"))),
+    "rank_stations": (run_rank_stations, dict(REGION_PARAMETERS, period=(tuple(ds.PERIODS), "annual"),
+                                              element=(("tmin", "tmax"), "tmax"))),
+    "station_series": (run_station_series, {
+        "stationNames": (list, REQUIRED),
+        "yearStart": (int, REQUIRED),
+        "yearEnd": (int, REQUIRED),
+    }),
+}
+
+
+def normalize(kind, params):
+    """
+    Checks the parameters of a job and converts them to their types. Unknown parameters
+    are dropped, so equal requests get equal parameters for the deduplication.
+
+    :param kind: Kind of the job, a key of JOB_KINDS.
+    :param params: Parameters of the request (dict).
+    :return: Dictionary of all parameters of the kind.
+    """
+
+    if kind not in JOB_KINDS:
+        raise JobError("Ungültiger Parameter kind")
+    if not isinstance(params, dict):
+        raise JobError("Ungültiger Parameter params")
+
+    normalized = {}
+    for name, (kind_type, default) in JOB_KINDS[kind][1].items():
+        value = params.get(name)
+        if value is None:
+            if default is REQUIRED:
+                raise JobError("Fehlende Parameter")
+            value = default
+        if isinstance(kind_type, tuple):
+            valid = value in kind_type
+        elif kind_type is list:
+            valid = isinstance(value, list) and len(value) > 0 and all(isinstance(item, str) for item in value)
+        else:
+            try:
+                value = kind_type(value)
+                valid = True
+            except (TypeError, ValueError):
+                valid = False
+        if not valid:
+            raise JobError(f"Ungültiger Parameter {name}")
+        normalized[name] = value
+    return normalized
+
+
+def job_key(kind, params, version):
+    """
+    Identifies a job by its kind, its normalized parameters and the dataset version it reads.
+
+    :return: SHA-256 hex digest (str).
+    """
+
+    text = json.dumps({"kind": kind, "params": params, "version": version}, sort_keys=True)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def to_status(row):
+    """
+    Converts a row of queries.JOB_COLUMNS into the status response.
+
+    :return: Dictionary.
+    """
+
+    job_id, kind, params, status, progress, error, created_at, updated_at, expires_at = row
+    return {"jobId": job_id, "kind": kind, "params": json.loads(params), "status": status,
+            "progress": round(progress, 3), "error": error, "createdAt": created_at, "updatedAt": updated_at,
+            "expiresAt": expires_at}
+
+
+class JobManager:
+    def __init__(self, workers: int = JOB_WORKERS, max_pending: int = JOB_MAX_PENDING,
+                 timeout: float = JOB_TIMEOUT, ttl: float = JOB_RESULT_TTL,
+                 progress_interval: float = JOB_PROGRESS_INTERVAL):
+        """
+        Runs jobs in a thread pool of this process and keeps their state in the Job table
+        of data_services.backend.
+
+        :param workers: Number of worker threads (int).
+        :param max_pending: Maximum number of queued and running jobs of this process (int).
+        :param timeout: Time budget of a job in seconds (float).
+        :param ttl: Seconds a finished job is kept (float).
+        :param progress_interval: Minimum seconds between two progress updates of a job (float).
+        """
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.timeout = timeout
+        self.ttl = ttl
+        self.progress_interval = progress_interval
+        self.lock = threading.Lock()
+
+    def session(self):
+        """
+        Opens a write transaction of the backend. The Job table is created by
+        ensure_schema(), which only issues statements on its first call in the process.
+
+        :return: Context manager yielding a WriteSession.
+        """
+
+        ds.backend.ensure_schema()
+        return ds.backend.write_transaction()
+
+    def submit(self, kind, params):
+        """
+        Submits a job, or returns the unexpired job with the same kind, parameters and
+        dataset version. Failed jobs and jobs of a process that stopped (no update for the
+        time budget) are replaced.
+
+        :param kind: Kind of the job, a key of JOB_KINDS.
+        :param params: Parameters of the request (dict).
+        :return: Tuple (status dictionary, True if a new job was created).
+        """
+
+        params = normalize(kind, params)
+        key = job_key(kind, params, ds.current_dataset_version())
+
+        with self.lock, self.session() as session:
+            now = time.time()
+            session.execute(queries.DELETE_STALE_JOBS, (now, key, now - self.timeout))
+            rows = session.fetch_all(queries.JOB_BY_KEY, (key,))
+            if not rows:
+                if not self.slots.acquire(blocking=False):
+                    session.commit()
+                    raise JobQueueFull()
+
+                job_id = uuid.uuid4().hex
+                try:
+                    session.execute(queries.INSERT_JOB, (job_id, key, kind, json.dumps(params), now, now,
+                                                         now + self.timeout + self.ttl))
+                    session.commit()
+                except (sqlite3.IntegrityError, mysql.connector.IntegrityError):
+                    # Another process submitted the same job in the meantime
+                    session.rollback()
+                    self.slots.release()
+                    rows = session.fetch_all(queries.JOB_BY_KEY, (key,))
+                else:
+                    # Read before the worker starts, a fast job could already be finished
+                    job = to_status(session.fetch_all(queries.JOB_BY_KEY, (key,))[0])
+                    self.executor.submit(self.run, job_id, kind, params)
+                    return job, True
+
+            session.commit()
+        JOBS.inc(kind=kind, result="deduplicated")
+        return to_status(rows[0]), False
+
+    def update(self, job_id, status, progress):
+        with self.session() as session:
+            count = session.execute(queries.UPDATE_JOB_PROGRESS, (status, progress, time.time(), job_id))
+            session.commit()
+        return count
+
+    def finish(self, job_id, status, result, error):
+        now = time.time()
+        with self.session() as session:
+            session.execute(queries.FINISH_JOB, (status, 1.0 if status == "done" else 0.0, result, error, now,
+                                                 now + self.ttl, job_id))
+            session.commit()
+
+    def run(self, job_id, kind, params):
+        """
+        Runs a job in a worker thread and stores its result or error.
+
+        :return: No return value.
+        """
+
+        try:
+            if self.update(job_id, "running", 0.0) == 0:
+                # Replaced as stale while it was waiting in the queue
+                return
+
+            last_update = [time.monotonic()]
+
+            def progress(fraction):
+                if time.monotonic() - last_update[0] >= self.progress_interval:
+                    last_update[0] = time.monotonic()
+                    self.update(job_id, "running", fraction)
+
+            try:
+                with deadlines.deadline(self.timeout):
+                    result = json.dumps(JOB_KINDS[kind][0](params, progress))
+            except Exception as error:
+                print(f"Job {job_id} ({kind}) failed: {type(error).__name__}: {error}")
+                self.finish(job_id, "failed", None, f"{type(error).__name__}: {error}"[:255])
+                JOBS.inc(kind=kind, result="failed")
+            else:
+                self.finish(job_id, "done", result, None)
+                JOBS.inc(kind=kind, result="done")
+        except Exception as error:
+            print(f"Job {job_id} could not be updated: {error}")
+        finally:
+            self.slots.release()
+
+    def status(self, job_id):
+        """
+        :return: Status dictionary, None for unknown or expired jobs.
+        """
+
+        rows = self.fetch(queries.JOB_BY_ID, (job_id, time.time()))
+        return to_status(rows[0]) if rows else None
+
+    def result(self, job_id):
+        """
+        :return: Tuple (status, result as JSON text, error), None for unknown or expired jobs.
+        """
+
+        rows = self.fetch(queries.JOB_RESULT, (job_id, time.time()))
+        return tuple(rows[0]) if rows else None
+
+    def fetch(self, query, params):
+        """
+        Reads job rows from the primary, a replica may not know a job that was just submitted.
+
+        :return: List of rows.
+        """
+
+        ds.backend.ensure_schema()
+        return ds.backend.fetch_primary(query, params)
+
+
+manager = JobManager()
@@ -0,0 +1,201 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# =========================================================
+# Metrics in the Prometheus text format
+# =========================================================
+# Counters and histograms are kept per process and rendered by the /metrics route.
+# Recording a value costs one lock and a few additions, so the metrics stay enabled.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROW_BUCKETS = (0, 1, 10, 100, 1_000, 10_000, 100_000)
+
+
+def format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_value(value):
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels=()):
+        """
+        Monotonically increasing value, e.g. the number of processed stations.
+
+        :param name: Metric name.
+        :param documentation: HELP text.
+        :param labels: Names of the labels.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        # Counters without labels are exported as 0 before the first increment
+        self.values = {} if self.labels else {(): 0}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self.values.get(tuple(labels[name] for name in self.labels), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            values = list(self.values.items())
+        for key, value in values:
+            lines.append(f"{self.name}{format_labels(self.labels, key)} {format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels=(), buckets=LATENCY_BUCKETS):
+        """
+        Distribution of observed values in cumulative buckets, e.g. request latencies.
+
+        :param name: Metric name.
+        :param documentation: HELP text.
+        :param labels: Names of the labels.
+        :param buckets: Upper bounds of the buckets in ascending order.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.values = {}  # label values -> [bucket counts..., sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [0] * (len(self.buckets) + 2)
+            # Only the first matching bucket is counted, render() accumulates
+            if index < len(self.buckets):
+                entry[index] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def get_count(self, **labels):
+        entry = self.values.get(tuple(labels[name] for name in self.labels))
+        return entry[-1] if entry else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            values = [(key, list(entry)) for key, entry in self.values.items()]
+        for key, entry in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{format_labels(self.labels + ('le',), key + (bound,))} {cumulative}")
+            lines.append(f"{self.name}_bucket{format_labels(self.labels + ('le',), key + ('+Inf',))} {entry[-1]}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, key)} {format_value(float(entry[-2]))}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, key)} {entry[-1]}")
+        return lines
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Observes the duration of the with block in seconds, also if it raises.
+        """
+
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+
+class Collector:
+    def __init__(self, name: str, documentation: str, collect, labels=(), kind="gauge"):
+        """
+        Values read at scrape time from state kept elsewhere, e.g. the pool utilisation.
+
+        :param name: Metric name.
+        :param documentation: HELP text.
+        :param collect: Callable returning a list of (label values, value) tuples.
+        :param labels: Names of the labels.
+        :param kind: Metric type, "gauge" or "counter".
+        """
+        self.name = name
+        self.documentation = documentation
+        self.collect = collect
+        self.labels = tuple(labels)
+        self.kind = kind
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in self.collect():
+            lines.append(f"{self.name}{format_labels(self.labels, key)} {format_value(value)}")
+        return lines
+
+
+registry = []
+
+
+def register(metric):
+    registry.append(metric)
+    return metric
+
+
+def render():
+    """
+    Renders all registered metrics in the Prometheus text exposition format.
+
+    :return: Response body (str).
+    """
+
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_SECONDS = register(Histogram(
+    "weather_http_request_duration_seconds", "Latency of the HTTP requests.", ("route", "method", "status")))
+QUERY_SECONDS = register(Histogram(
+    "weather_db_query_duration_seconds", "Duration of the database queries in data_services.", ("query",)))
+QUERY_ROWS = register(Histogram(
+    "weather_db_rows_returned", "Rows returned per database query.", ("query",), ROW_BUCKETS))
+CACHE_REQUESTS = register(Counter(
+    "weather_cache_requests_total", "Cache lookups by result (hit or miss).", ("cache", "result")))
+INGEST_STATIONS = register(Counter(
+    "weather_ingest_stations_total", "Stations processed by the ingestion."))
+INGEST_DATAPOINTS = register(Counter(
+    "weather_ingest_datapoints_total", "Datapoints written by the ingestion."))
+INGEST_SECONDS = register(Counter(
+    "weather_ingest_seconds_total", "Time spent downloading, parsing and inserting station data."))
+
+
+@contextmanager
+def query_timer(query):
+    """
+    Times a database query. The with block may set result["rows"] to record the number of rows.
+
+    :param query: Name of the query for the label (str).
+    """
+
+    result = {}
+    started = time.perf_counter()
+    try:
+        yield result
+    finally:
+        QUERY_SECONDS.observe(time.perf_counter() - started, query=query)
+        if "rows" in result:
+            QUERY_ROWS.observe(result["rows"], query=query)
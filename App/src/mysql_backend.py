@@ -0,0 +1,520 @@
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+import mysql.connector
+from config import DB_BULK_LOAD, DB_BULK_LOAD_BATCH, BULK_LOAD_DIR
+import year_coverage
+import deadlines
+import queries
+import query_log
+from pool_manager import PoolBusyError
+from storage_backend import (StorageBackend, WriteSession, station_rows, datapoint_rows, element_value_rows,
+                             daily_value_rows, STATION_IDS_PER_QUERY)
+
+# MySQL error numbers of statements aborted by MAX_EXECUTION_TIME or KILL QUERY
+QUERY_TIMEOUT_ERRORS = (3024, 1317)
+
+# MySQL error number of a missing table
+NO_SUCH_TABLE = 1146
+
+# MySQL error numbers of an unknown and of an already existing column
+UNKNOWN_COLUMN = 1054
+DUPLICATE_COLUMN = 1060
+
+# Error numbers of LOAD DATA LOCAL INFILE disabled on the server or rejected by the client
+LOCAL_INFILE_ERRORS = (1148, 2068, 3948)
+
+LOAD_ROWS = """
+    LOAD DATA LOCAL INFILE %s INTO TABLE {table}
+    FIELDS TERMINATED BY ',' LINES TERMINATED BY '\\n'
+    ({columns});
+    """
+
+DATAPOINT_COLUMNS = "SID, year, month, tmax, tmin"
+ELEMENT_VALUE_COLUMNS = "SID, element, year, month, value, days"
+
+DATASET_VERSION_TABLE = """
+    CREATE TABLE IF NOT EXISTS DatasetVersion (
+        version INT PRIMARY KEY,
+        action VARCHAR(20) NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    """
+
+# Shadow tables of a new dataset version: secondary indexes and the foreign key are
+# added by publish_shadow() after the bulk load
+SHADOW_TABLES = [
+    "DROP TABLE IF EXISTS DailyValue_new, ElementValue_new, Datapoint_new, Station_new;",
+    """
+    CREATE TABLE Station_new (
+        SID INT AUTO_INCREMENT PRIMARY KEY,
+        station_id VARCHAR(50),
+        station_name VARCHAR(50),
+        latitude FLOAT NOT NULL,
+        longitude FLOAT NOT NULL,
+        first_tmax INT NOT NULL,
+        latest_tmax INT NOT NULL,
+        first_tmin INT NOT NULL,
+        latest_tmin INT NOT NULL,
+        coverage VARCHAR(128) NOT NULL DEFAULT ''
+    );
+    """,
+    """
+    CREATE TABLE Datapoint_new (
+        DID INT AUTO_INCREMENT PRIMARY KEY,
+        SID INT NOT NULL,
+        year INT NOT NULL,
+        month INT NOT NULL,
+        tmax FLOAT NOT NULL,
+        tmin FLOAT NOT NULL
+    );
+    """,
+    queries.for_tables(queries.ELEMENT_VALUE_TABLE, queries.SHADOW_SUFFIX),
+    queries.for_tables(queries.DAILY_VALUE_TABLE, queries.SHADOW_SUFFIX),
+    # Databases created before the ElementValue/DailyValue tables existed need live ones for the swap
+    queries.ELEMENT_VALUE_TABLE,
+    queries.DAILY_VALUE_TABLE,
+]
+
+# Tables created by ensure_schema() in databases set up before they existed
+SCHEMA_STATEMENTS = [
+    queries.ELEMENT_VALUE_TABLE,
+    queries.DAILY_VALUE_TABLE,
+    queries.JOB_TABLE,
+    queries.REQUEST_LOG_TABLE,
+]
+
+
+def execute(cursor, query, params):
+    """
+    Executes a read-only statement with the remaining request time as MAX_EXECUTION_TIME.
+
+    :return: List of result rows.
+    """
+
+    try:
+        return query_log.execute(cursor, deadlines.with_max_execution_time(query), params)
+    except mysql.connector.Error as error:
+        if error.errno in QUERY_TIMEOUT_ERRORS:
+            raise deadlines.DeadlineExceeded(str(error)) from error
+        raise
+
+
+def load_datapoints(cursor, table, rows, directory=BULK_LOAD_DIR, columns=DATAPOINT_COLUMNS):
+    """
+    Loads datapoint rows with LOAD DATA LOCAL INFILE from a temporary CSV file. Foreign
+    key and unique checks are switched off for the load, the rows come from the ingestion
+    of the same session and reference existing stations.
+
+    :param cursor: Cursor of the write connection.
+    :param table: Target table (str).
+    :param rows: List of (SID, year, month, tmax, tmin) tuples, or tuples of the given columns.
+    :param directory: Directory of the temporary file, must be allowed by allow_local_infile_in_path.
+    :param columns: Column list of the rows, ELEMENT_VALUE_COLUMNS for the ElementValue table.
+    :return: No return value.
+    """
+
+    with tempfile.NamedTemporaryFile("w", suffix=".csv", dir=directory, delete=False) as file:
+        file.writelines(",".join(map(str, row)) + "\n" for row in rows)
+
+    try:
+        cursor.execute("SET SESSION foreign_key_checks = 0, unique_checks = 0;")
+        cursor.execute(LOAD_ROWS.format(table=table, columns=columns), (file.name,))
+    finally:
+        cursor.execute("SET SESSION foreign_key_checks = 1, unique_checks = 1;")
+        os.remove(file.name)
+
+
+class MySQLWriteSession(WriteSession):
+    def __init__(self, connection, cursor, suffix="", bulk_load=DB_BULK_LOAD, batch_size=DB_BULK_LOAD_BATCH):
+        """
+        Write session on one MySQL connection. All inserts run in one transaction.
+
+        :param connection: Pooled MySQL connection.
+        :param cursor: Cursor of the connection.
+        :param suffix: Suffix of the tables written to, queries.SHADOW_SUFFIX for a new dataset version.
+        :param bulk_load: Buffer the datapoints and load them with LOAD DATA LOCAL INFILE.
+        :param batch_size: Buffered rows that trigger a load.
+        """
+        self.connection = connection
+        self.cursor = cursor
+        self.suffix = suffix
+        self.bulk_load = bulk_load
+        self.batch_size = batch_size
+        self.pending = []
+        self.pending_elements = []
+
+    def get_stations(self):
+        self.cursor.execute(queries.for_tables("SELECT * FROM Station;", self.suffix))
+        return self.cursor.fetchall()
+
+    def insert_stations(self, stations):
+        self.cursor.executemany(queries.for_tables(queries.INSERT_STATION, self.suffix), station_rows(stations))
+
+    def has_datapoints(self):
+        self.cursor.execute(queries.for_tables("SELECT * FROM Datapoint LIMIT 1;", self.suffix))
+        return len(self.cursor.fetchall()) > 0
+
+    def insert_datapoints(self, sid, datapoints):
+        self.cursor.execute(queries.for_tables(queries.UPDATE_COVERAGE, self.suffix),
+                            (year_coverage.encode(year_coverage.from_datapoints(datapoints)), sid))
+        if not datapoints:
+            return
+        if not self.bulk_load:
+            self.cursor.executemany(queries.for_tables(queries.INSERT_DATAPOINT, self.suffix),
+                                    datapoint_rows(sid, datapoints))
+            return
+
+        self.pending.extend(datapoint_rows(sid, datapoints))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def insert_element_values(self, sid, rows):
+        if not rows:
+            return
+        if not self.bulk_load:
+            self.cursor.executemany(queries.for_tables(queries.INSERT_ELEMENT_VALUE, self.suffix),
+                                    element_value_rows(sid, rows))
+            return
+
+        self.pending_elements.extend(element_value_rows(sid, rows))
+        if len(self.pending_elements) >= self.batch_size:
+            self.flush()
+
+    def insert_daily_values(self, sid, rows):
+        # Binary blobs do not fit the CSV files of the bulk load, there are only a few rows per station
+        if rows:
+            self.cursor.executemany(queries.for_tables(queries.INSERT_DAILY_VALUE, self.suffix),
+                                    daily_value_rows(sid, rows))
+
+    def flush(self):
+        """
+        Loads the buffered datapoints and element values. Falls back to INSERT statements
+        for the rest of the session if the server does not allow LOAD DATA LOCAL INFILE.
+
+        :return: No return value.
+        """
+
+        for table, columns, insert, attribute in (
+                ("Datapoint", DATAPOINT_COLUMNS, queries.INSERT_DATAPOINT, "pending"),
+                ("ElementValue", ELEMENT_VALUE_COLUMNS, queries.INSERT_ELEMENT_VALUE, "pending_elements")):
+            rows = getattr(self, attribute)
+            if not rows:
+                continue
+
+            setattr(self, attribute, [])
+            if self.bulk_load:
+                try:
+                    load_datapoints(self.cursor, f"{table}{self.suffix}", rows, columns=columns)
+                    continue
+                except mysql.connector.Error as error:
+                    if error.errno not in LOCAL_INFILE_ERRORS:
+                        raise
+                    print(f"LOAD DATA LOCAL INFILE not available ({error}), using INSERT statements.")
+                    self.bulk_load = False
+            self.cursor.executemany(queries.for_tables(insert, self.suffix), rows)
+
+    def commit(self):
+        self.flush()
+        self.connection.commit()
+
+    def rollback(self):
+        self.pending = []
+        self.pending_elements = []
+        self.connection.rollback()
+
+    def execute(self, query, params=()):
+        self.cursor.execute(query, params)
+        return self.cursor.rowcount
+
+    def execute_many(self, query, rows):
+        self.cursor.executemany(query, rows)
+
+    def fetch_all(self, query, params=()):
+        self.cursor.execute(query, params)
+        return self.cursor.fetchall()
+
+
+class MySQLBackend(StorageBackend):
+    def __init__(self, get_write_connection, get_read_connection, get_probe_connection=None):
+        """
+        Storage in the MySQL database (see MySQL/database.sql).
+
+        :param get_write_connection: Callable returning a pooled connection to the primary.
+        :param get_read_connection: Callable returning a pooled connection for read-only queries.
+        :param get_probe_connection: Callable returning a connection for health probes that fails
+                                     fast (no connect retries, short wait); get_write_connection if None.
+        """
+        self.get_write_connection = get_write_connection
+        self.get_read_connection = get_read_connection
+        self.get_probe_connection = get_probe_connection or get_write_connection
+        self.schema_ready = False
+        self.schema_lock = threading.Lock()
+
+    def add_coverage_column(self):
+        """
+        Adds the coverage column to a Station table created before it existed.
+
+        :return: No return value.
+        """
+
+        connection = self.get_write_connection()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(queries.ADD_COVERAGE_COLUMN)
+        except mysql.connector.Error as error:
+            if error.errno != DUPLICATE_COLUMN:
+                raise
+        finally:
+            connection.close()
+
+    def ensure_schema(self):
+        if self.schema_ready:
+            return
+        with self.schema_lock:
+            if self.schema_ready:
+                return
+            self.add_coverage_column()
+            connection = self.get_write_connection()
+            try:
+                with connection.cursor() as cursor:
+                    for statement in SCHEMA_STATEMENTS:
+                        cursor.execute(statement)
+            finally:
+                connection.close()
+            self.schema_ready = True
+
+    @contextmanager
+    def write_transaction(self):
+        connection = self.get_write_connection()
+        try:
+            with connection.cursor() as cursor:
+                yield MySQLWriteSession(connection, cursor)
+        finally:
+            connection.close()
+
+    @contextmanager
+    def write_session(self):
+        self.ensure_schema()
+        connection = self.get_write_connection()
+        try:
+            with connection.cursor() as cursor:
+                yield MySQLWriteSession(connection, cursor)
+        finally:
+            connection.close()
+
+    @contextmanager
+    def shadow_session(self, create=True):
+        connection = self.get_write_connection()
+        try:
+            with connection.cursor() as cursor:
+                for statement in SHADOW_TABLES if create else []:
+                    cursor.execute(statement)
+                yield MySQLWriteSession(connection, cursor, queries.SHADOW_SUFFIX)
+        finally:
+            connection.close()
+
+    def run_statements(self, statements, action):
+        """
+        Executes DDL statements on the primary and records the next dataset version.
+
+        :param statements: Callable (next version) -> list of statements.
+        :param action: Name of the change for the DatasetVersion table.
+        :return: New dataset version (int).
+        """
+
+        connection = self.get_write_connection()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(DATASET_VERSION_TABLE)
+                cursor.execute(queries.DATASET_VERSION_QUERY)
+                version = cursor.fetchall()[0][0] + 1
+
+                for statement in statements(version):
+                    cursor.execute(statement)
+
+                cursor.execute(queries.INSERT_DATASET_VERSION, (version, action))
+                connection.commit()
+        finally:
+            connection.close()
+
+        return version
+
+    def publish_shadow(self):
+        new, old = queries.SHADOW_SUFFIX, queries.PREVIOUS_SUFFIX
+        return self.run_statements(lambda version: queries.build_index_statements(new, version) + [
+            # The bulk loaded rows are consistent, so the foreign key is added without a table scan
+            "SET SESSION foreign_key_checks = 0;",
+            f"ALTER TABLE Datapoint{new} ADD CONSTRAINT fk_datapoint_station_v{version} "
+            f"FOREIGN KEY (SID) REFERENCES Station{new} (SID) ON DELETE CASCADE;",
+            f"ALTER TABLE ElementValue{new} ADD CONSTRAINT fk_element_value_station_v{version} "
+            f"FOREIGN KEY (SID) REFERENCES Station{new} (SID) ON DELETE CASCADE;",
+            f"ALTER TABLE DailyValue{new} ADD CONSTRAINT fk_daily_value_station_v{version} "
+            f"FOREIGN KEY (SID) REFERENCES Station{new} (SID) ON DELETE CASCADE;",
+            "SET SESSION foreign_key_checks = 1;",
+            f"DROP TABLE IF EXISTS DailyValue{old}, ElementValue{old}, Datapoint{old}, Station{old};",
+            # One RENAME TABLE statement swaps all tables atomically
+            f"RENAME TABLE Station TO Station{old}, Station{new} TO Station, "
+            f"Datapoint TO Datapoint{old}, Datapoint{new} TO Datapoint, "
+            f"ElementValue TO ElementValue{old}, ElementValue{new} TO ElementValue, "
+            f"DailyValue TO DailyValue{old}, DailyValue{new} TO DailyValue;",
+        ], "publish")
+
+    def rollback_version(self):
+        old = queries.PREVIOUS_SUFFIX
+        if not self.fetch_all(f"SHOW TABLES LIKE 'Station{old}';"):
+            raise ValueError("No previous dataset version to roll back to")
+
+        return self.run_statements(lambda version: [
+            # Versions published before the ElementValue/DailyValue tables existed get empty ones
+            queries.for_tables(queries.ELEMENT_VALUE_TABLE, old),
+            queries.for_tables(queries.DAILY_VALUE_TABLE, old),
+            f"RENAME TABLE Station TO Station_swap, Station{old} TO Station, Station_swap TO Station{old}, "
+            f"Datapoint TO Datapoint_swap, Datapoint{old} TO Datapoint, Datapoint_swap TO Datapoint{old}, "
+            f"ElementValue TO ElementValue_swap, ElementValue{old} TO ElementValue, "
+            f"ElementValue_swap TO ElementValue{old}, "
+            f"DailyValue TO DailyValue_swap, DailyValue{old} TO DailyValue, DailyValue_swap TO DailyValue{old};",
+        ], "rollback")
+
+    def get_dataset_version(self):
+        try:
+            return self.fetch_all(queries.DATASET_VERSION_QUERY)[0][0]
+        except mysql.connector.Error as error:
+            if error.errno == NO_SUCH_TABLE:
+                return 0
+            raise
+
+    def rebuild_aggregates(self):
+        connection = self.get_write_connection()
+        try:
+            with connection.cursor() as cursor:
+                for statement in queries.build_aggregate_statements():
+                    cursor.execute(statement)
+                cursor.execute(queries.AGGREGATE_INDEX.format(table="YearlyAggregate_new"))
+                connection.commit()
+                cursor.execute("DROP TABLE IF EXISTS YearlyAggregate_old;")
+                cursor.execute("RENAME TABLE YearlyAggregate TO YearlyAggregate_old, "
+                               "YearlyAggregate_new TO YearlyAggregate;")
+                cursor.execute("DROP TABLE YearlyAggregate_old;")
+        finally:
+            connection.close()
+
+        return self.fetch_all("SELECT COUNT(*) FROM YearlyAggregate;")[0][0]
+
+    def fetch_all(self, query, params=()):
+        """
+        Executes a read-only statement and returns all rows.
+
+        :param query: SQL statement using %s placeholders.
+        :param params: Statement parameters.
+        :return: List of result rows.
+        """
+
+        deadlines.check()
+        connection = self.get_read_connection()
+        try:
+            with connection.cursor() as cursor:
+                return execute(cursor, query, params)
+        finally:
+            connection.close()
+
+    def stream_rows(self, query, params=(), batch_size=10_000):
+        deadlines.check()
+        connection = self.get_read_connection()
+        # Cursors are unbuffered by default: the rows are read from the socket batch by batch
+        cursor = connection.cursor()
+        try:
+            cursor.execute(deadlines.with_max_execution_time(query), params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            # A generator closed early (e.g. the client disconnected) leaves unread rows.
+            # Reading the rest of a large result would hold the worker until MySQL has sent
+            # it, so the connection is dropped instead of returned to the pool.
+            if connection.unread_result:
+                connection.discard()
+            else:
+                cursor.close()
+                connection.close()
+
+    def fetch_primary(self, query, params=()):
+        deadlines.check()
+        connection = self.get_write_connection()
+        try:
+            with connection.cursor() as cursor:
+                return execute(cursor, query, params)
+        finally:
+            connection.close()
+
+    def get_station_catalog(self):
+        try:
+            return self.fetch_all(queries.STATION_CATALOG_QUERY)
+        except mysql.connector.Error as error:
+            if error.errno != UNKNOWN_COLUMN:
+                raise
+        self.add_coverage_column()
+        return self.fetch_all(queries.STATION_CATALOG_QUERY)
+
+    def get_stations_for_period(self, first_year, last_year):
+        return self.fetch_all(queries.STATIONS_FOR_PERIOD_QUERY, (first_year, last_year, first_year, last_year))
+
+    def get_aggregates(self, station_id, first_year, last_year):
+        deadlines.check()
+        connection = self.get_read_connection()
+        try:
+            with connection.cursor() as cursor:
+
+                ten_datasets = []
+
+                sid = execute(cursor, queries.SID_QUERY, (station_id,))[0][0]
+
+                for query, params in queries.build_aggregation_queries(sid, first_year, last_year):
+                    ten_datasets.append(execute(cursor, query, params))
+        finally:
+            connection.close()
+
+        return ten_datasets
+
+    def get_regional_sums(self, station_weights, first_year, last_year):
+        rows = []
+        for start in range(0, len(station_weights), STATION_IDS_PER_QUERY):
+            chunk = station_weights[start:start + STATION_IDS_PER_QUERY]
+            params = [value for station_weight in chunk for value in station_weight] + [first_year, last_year]
+            rows.extend(self.fetch_all(queries.build_regional_sums_query(len(chunk)), params))
+        return rows
+
+    def get_yearly_aggregates(self, station_ids, period, first_year, last_year):
+        rows = []
+        for start in range(0, len(station_ids), STATION_IDS_PER_QUERY):
+            chunk = list(station_ids[start:start + STATION_IDS_PER_QUERY])
+            rows.extend(self.fetch_all(queries.build_yearly_aggregates_query(len(chunk)),
+                                       chunk + [period, first_year, last_year]))
+        return rows
+
+    def get_surface_values(self, period, year):
+        return self.fetch_all(queries.SURFACE_VALUES_QUERY, (period, year))
+
+    def get_element_values(self, station_id, element, first_year, last_year):
+        return self.fetch_all(queries.ELEMENT_VALUES_QUERY, (station_id, element, first_year, last_year))
+
+    def get_daily_values(self, station_id, element, first_year, last_year):
+        return self.fetch_all(queries.DAILY_VALUES_QUERY, (station_id, element, first_year, last_year))
+
+    def has_stations(self):
+        # Readiness probe: an unreachable database must answer quickly instead of retrying
+        try:
+            connection = self.get_probe_connection()
+        except (mysql.connector.Error, PoolBusyError):
+            return False
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM Station LIMIT 1;")
+                return len(cursor.fetchall()) > 0
+        except mysql.connector.Error:
+            return False
+        finally:
+            connection.close()
@@ -0,0 +1,330 @@
+import threading
+import time
+from collections import deque
+import mysql.connector
+from mysql.connector.errors import PoolError
+
+
+class PoolBusyError(PoolError):
+    """
+    Raised when no connection becomes available within the acquisition timeout or
+    when the wait queue is full.
+    """
+
+
+class PooledConnection:
+    def __init__(self, manager, connection):
+        """
+        Wraps a connection handed out by the PoolManager. close() returns the connection
+        to the pool instead of closing it; all other attributes are passed through.
+
+        :param manager: The PoolManager the connection belongs to.
+        :param connection: The underlying MySQL connection.
+        """
+        self._manager = manager
+        self._connection = connection
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Returns the connection to the pool. Calling close() twice has no effect.
+
+        :return: No return value.
+        """
+
+        if self._connection is not None:
+            connection, self._connection = self._connection, None
+            self._manager.release(connection)
+
+    def discard(self):
+        """
+        Drops the connection instead of returning it to the pool, e.g. while it still has
+        unread rows of a large result. Calling discard() or close() afterwards has no effect.
+
+        :return: No return value.
+        """
+
+        if self._connection is not None:
+            connection, self._connection = self._connection, None
+            self._manager.discard(connection)
+
+
+class PoolManager:
+    def __init__(self, dbconfig: dict, pool_size: int = 10, max_size: int = None, max_waiters: int = 50,
+                 acquire_timeout: float = 5.0, health_check_interval: float = 30.0, idle_timeout: float = 300.0,
+                 retries: int = 8, backoff: float = 0.5):
+        """
+        Thread-safe MySQL connection pool with a bounded wait queue.
+
+        Connections are opened on demand. Up to pool_size connections are kept open; under
+        load the pool grows up to max_size and shrinks back after idle_timeout. If all
+        connections are busy, callers wait up to acquire_timeout seconds. At most max_waiters
+        callers wait at the same time, any further caller is rejected immediately.
+
+        :param dbconfig: Connection arguments for mysql.connector.connect (dict).
+        :param pool_size: Number of connections kept open (int).
+        :param max_size: Upper limit for the number of connections, defaults to pool_size (int).
+        :param max_waiters: Maximum number of callers waiting for a connection (int).
+        :param acquire_timeout: Maximum wait time for a connection in seconds (float).
+        :param health_check_interval: Idle time in seconds after which a connection is pinged before reuse (float).
+        :param idle_timeout: Idle time in seconds after which connections above pool_size are closed (float).
+        :param retries: Retries for the very first connection while MySQL is unreachable (int).
+        :param backoff: Wait time before the first retry in seconds, doubled per retry (float).
+        """
+        self.dbconfig = dbconfig
+        self.pool_size = pool_size
+        self.max_size = max(max_size or pool_size, pool_size)
+        self.max_waiters = max_waiters
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+        self.idle_timeout = idle_timeout
+        self.retries = retries
+        self.backoff = backoff
+
+        self.condition = threading.Condition()
+        self.connect_lock = threading.Lock()
+        self.idle = deque()  # (connection, time of release)
+        self.size = 0
+        self.in_use = 0
+        self.waiting = 0
+        self.connected = False
+        self.closed = False
+
+        self.stats = {
+            "acquired_total": 0,
+            "created_total": 0,
+            "closed_total": 0,
+            "health_check_failures_total": 0,
+            "waits_total": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+            "timeouts_total": 0,
+            "rejected_total": 0,
+        }
+
+    def connect(self, retry: bool):
+        """
+        Opens a new MySQL connection. Until the first connection succeeded, connecting is
+        retried with exponential backoff so the application can start before MySQL.
+
+        :param retry: If False, a failed connection attempt is not retried.
+        :return: MySQL connection.
+        """
+
+        retries = self.retries if retry and not self.connected else 0
+        delay = self.backoff
+        for attempt in range(retries + 1):
+            try:
+                connection = mysql.connector.connect(**self.dbconfig)
+                with self.condition:
+                    self.connected = True
+                    self.stats["created_total"] += 1
+                return connection
+            except mysql.connector.Error as error:
+                if attempt == retries:
+                    raise
+                print(f"Database not reachable ({error}), retrying in {delay:.1f} s...")
+                time.sleep(delay)
+                delay = min(delay * 2, 10)
+
+    def is_healthy(self, connection, idle_since):
+        """
+        Checks a connection before it is reused. Connections idle for less than
+        health_check_interval are trusted without a round trip.
+
+        :param connection: MySQL connection.
+        :param idle_since: Time the connection was returned to the pool (monotonic seconds).
+        :return: True if the connection can be used.
+        """
+
+        if time.monotonic() - idle_since < self.health_check_interval:
+            return True
+        try:
+            connection.ping(reconnect=False)
+            return True
+        except mysql.connector.Error:
+            with self.condition:
+                self.stats["health_check_failures_total"] += 1
+            return False
+
+    def close_connection(self, connection):
+        """
+        Closes a connection that leaves the pool, ignoring errors of already broken connections.
+
+        :param connection: MySQL connection.
+        :return: No return value.
+        """
+
+        with self.condition:
+            self.stats["closed_total"] += 1
+        try:
+            connection.close()
+        except mysql.connector.Error:
+            pass
+
+    def get_connection(self, retry: bool = True, timeout: float = None):
+        """
+        Returns a connection from the pool, waiting in the bounded queue if necessary.
+
+        :param retry: If False, connecting is not retried (e.g. for health probes).
+        :param timeout: Maximum wait time in seconds, defaults to acquire_timeout.
+        :return: PooledConnection, returned to the pool by close().
+        """
+
+        timeout = self.acquire_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        wait_started = None
+
+        with self.condition:
+            while not self.idle and self.size >= self.max_size:
+                if wait_started is None:
+                    if self.waiting >= self.max_waiters:
+                        self.stats["rejected_total"] += 1
+                        raise PoolBusyError("Connection pool wait queue is full")
+                    wait_started = time.monotonic()
+                    self.stats["waits_total"] += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats["timeouts_total"] += 1
+                    raise PoolBusyError(f"No connection available within {timeout} s")
+                self.waiting += 1
+                try:
+                    self.condition.wait(remaining)
+                finally:
+                    self.waiting -= 1
+
+            if wait_started is not None:
+                waited = time.monotonic() - wait_started
+                self.stats["wait_seconds_total"] += waited
+                self.stats["wait_seconds_max"] = max(self.stats["wait_seconds_max"], waited)
+
+            self.in_use += 1
+            if self.idle:
+                connection, idle_since = self.idle.pop()
+            else:
+                connection, idle_since = None, None
+                self.size += 1
+
+        try:
+            if connection is None:
+                if not self.connected:
+                    # Only one caller retries the first connection, the others fail fast or wait for it
+                    if not self.connect_lock.acquire(blocking=retry):
+                        raise PoolError("Connection pool is still connecting")
+                    try:
+                        connection = self.connect(retry)
+                    finally:
+                        self.connect_lock.release()
+                else:
+                    connection = self.connect(retry)
+            elif not self.is_healthy(connection, idle_since):
+                self.close_connection(connection)
+                connection = self.connect(retry=False)
+        except Exception:
+            with self.condition:
+                self.in_use -= 1
+                self.size -= 1
+                self.condition.notify()
+            raise
+
+        with self.condition:
+            self.stats["acquired_total"] += 1
+        return PooledConnection(self, connection)
+
+    def release(self, connection):
+        """
+        Takes a connection back into the pool. Open transactions are rolled back and
+        surplus connections idle for longer than idle_timeout are closed. After close(),
+        returned connections are closed instead of kept.
+
+        :param connection: MySQL connection.
+        :return: No return value.
+        """
+
+        try:
+            if connection.in_transaction:
+                connection.rollback()
+            reusable = not self.closed
+        except mysql.connector.Error:
+            reusable = False
+
+        now = time.monotonic()
+        surplus = []
+        with self.condition:
+            self.in_use -= 1
+            if reusable:
+                self.idle.append((connection, now))
+            else:
+                self.size -= 1
+                surplus.append(connection)
+
+            # Shrink back to pool_size: the least recently used connections are at the left
+            while self.size > self.pool_size and self.idle and now - self.idle[0][1] > self.idle_timeout:
+                surplus.append(self.idle.popleft()[0])
+                self.size -= 1
+
+            self.condition.notify()
+
+        for surplus_connection in surplus:
+            self.close_connection(surplus_connection)
+
+    def discard(self, connection):
+        """
+        Removes a connection in use from the pool and closes its socket. shutdown() neither
+        reads pending results nor sends QUIT, so it returns immediately; MySQL aborts the
+        running statement when it can no longer send rows.
+
+        :param connection: MySQL connection.
+        :return: No return value.
+        """
+
+        with self.condition:
+            self.in_use -= 1
+            self.size -= 1
+            self.stats["closed_total"] += 1
+            self.condition.notify()
+        try:
+            connection.shutdown()
+        except mysql.connector.Error:
+            pass
+
+    def close(self):
+        """
+        Closes all idle connections. Connections in use are closed when they are returned.
+
+        :return: No return value.
+        """
+
+        with self.condition:
+            self.closed = True
+            idle = [connection for connection, _ in self.idle]
+            self.idle.clear()
+            self.size -= len(idle)
+
+        for connection in idle:
+            self.close_connection(connection)
+
+    def metrics(self):
+        """
+        Returns the current utilisation and the accumulated wait statistics of the pool.
+
+        :return: Dictionary with gauges (size, idle, in_use, waiting, max_size) and counters.
+        """
+
+        with self.condition:
+            return {
+                "size": self.size,
+                "idle": len(self.idle),
+                "in_use": self.in_use,
+                "waiting": self.waiting,
+                "max_size": self.max_size,
+                **self.stats,
+            }
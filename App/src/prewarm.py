@@ -0,0 +1,298 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import mysql.connector
+import data_services as ds
+import deadlines
+import metrics
+import queries
+from config import (PREWARM_TOP_N, PREWARM_WORKERS, PREWARM_TIME_BUDGET, PREWARM_CPU_BUDGET,
+                    PREWARM_FLUSH_INTERVAL, PREWARM_RETENTION_DAYS, MIN_YEAR_COVERAGE)
+
+# =========================================================
+# Cache prewarming
+# =========================================================
+# Every successful request of /submit and /get_weather_data is recorded as a normalized
+# key (the arguments of the data_services function) and counted. The counts are written
+# to the RequestLog table of the storage backend every PREWARM_FLUSH_INTERVAL seconds, so
+# they survive a deploy and are shared by all processes. Whenever a serving process has
+# loaded its station catalog (startup, ingestion, dataset swap), the PREWARM_TOP_N most
+# frequent keys are replayed in the background by a small thread pool to fill the result
+# caches of data_services before the first users ask for them. A run stops after
+# PREWARM_TIME_BUDGET seconds or PREWARM_CPU_BUDGET seconds of CPU time.
+
+PREWARM_REQUESTS = metrics.register(metrics.Counter(
+    "weather_prewarm_requests_total", "Recorded requests replayed to fill the result caches (done, failed, skipped).",
+    ("route", "result")))
+
+# Marks parameters without a default value
+REQUIRED = object()
+
+# Route -> (name of the data_services function,
+#           request parameters in the order of the function arguments as (name, type, default or REQUIRED))
+ROUTES = {
+    "/submit": ("get_stations_in_radius", (
+        ("latitude", float, REQUIRED),
+        ("longitude", float, REQUIRED),
+        ("radius", float, REQUIRED),
+        ("yearStart", int, REQUIRED),
+        ("yearEnd", int, REQUIRED),
+        ("stations", int, REQUIRED),
+        ("minCoverage", float, MIN_YEAR_COVERAGE),
+    )),
+    "/get_weather_data": ("get_datapoints_for_station", (
+        ("stationName", str, REQUIRED),
+        ("yearStart", int, REQUIRED),
+        ("yearEnd", int, REQUIRED),
+    )),
+}
+
+# Length of the request_key column
+MAX_KEY_LENGTH = 255
+
+
+def request_key(route, data):
+    """
+    Normalizes the body of a request to the arguments the route passes to data_services.
+    Other fields are dropped and defaults filled in, so equal requests get equal keys.
+    Values of another type (e.g. years as strings) are not recorded, their replay would
+    not hit the cache entry of the original request.
+
+    :param route: Route of the request, a key of ROUTES.
+    :param data: JSON body of the request.
+    :return: Key as JSON list (str), None if the request is not recorded.
+    """
+
+    if route not in ROUTES or not isinstance(data, dict):
+        return None
+
+    arguments = []
+    for name, value_type, default in ROUTES[route][1]:
+        value = data.get(name, None if default is REQUIRED else default)
+        if isinstance(value, bool):
+            return None
+        if value_type is float and isinstance(value, int):
+            value = float(value)
+        if not isinstance(value, value_type):
+            return None
+        arguments.append(value)
+
+    key = json.dumps(arguments)
+    return key if len(key) <= MAX_KEY_LENGTH else None
+
+
+class RequestRecorder:
+    def __init__(self, enabled: bool = PREWARM_TOP_N > 0, flush_interval: float = PREWARM_FLUSH_INTERVAL,
+                 retention_days: float = PREWARM_RETENTION_DAYS):
+        """
+        Counts the normalized requests of this process and adds the counts to the
+        RequestLog table of data_services.backend.
+
+        :param enabled: Record requests at all (bool).
+        :param flush_interval: Minimum seconds between two writes of the counts (float).
+        :param retention_days: Days a key is kept without being requested again (float).
+        """
+        self.enabled = enabled
+        self.flush_interval = flush_interval
+        self.retention = retention_days * 86400
+        self.pending = Counter()
+        self.lock = threading.Lock()
+        self.last_flush = time.monotonic()
+
+    def record(self, route, data):
+        """
+        Counts a successful request. The counts are written in a background thread once
+        flush_interval has passed, never in the request itself.
+
+        :return: No return value.
+        """
+
+        if not self.enabled:
+            return
+        key = request_key(route, data)
+        if key is None:
+            return
+
+        with self.lock:
+            self.pending[route, key] += 1
+            due = time.monotonic() - self.last_flush >= self.flush_interval
+            if due:
+                self.last_flush = time.monotonic()
+        if due:
+            threading.Thread(target=self.flush, name="request-log", daemon=True).start()
+
+    def session(self):
+        """
+        Opens a write transaction of the backend. The RequestLog table is created by
+        ensure_schema(), which only issues statements on its first call in the process.
+
+        :return: Context manager yielding a WriteSession.
+        """
+
+        ds.backend.ensure_schema()
+        return ds.backend.write_transaction()
+
+    def flush(self):
+        """
+        Adds the pending counts to the RequestLog table and removes keys older than the
+        retention period. Counts that cannot be written are dropped.
+
+        :return: Number of written keys.
+        """
+
+        with self.lock:
+            pending, self.pending = self.pending, Counter()
+        if not pending:
+            return 0
+
+        now = time.time()
+        try:
+            with self.session() as session:
+                for (route, key), hits in sorted(pending.items()):
+                    params = (hits, now, route, key)
+                    if session.execute(queries.UPDATE_REQUEST_LOG, params) == 0:
+                        try:
+                            session.execute(queries.INSERT_REQUEST_LOG, params)
+                        except (sqlite3.IntegrityError, mysql.connector.IntegrityError):
+                            # Inserted by another process in the meantime
+                            session.execute(queries.UPDATE_REQUEST_LOG, params)
+                session.execute(queries.DELETE_OLD_REQUESTS, (now - self.retention,))
+                session.commit()
+        except (mysql.connector.Error, sqlite3.Error) as error:
+            print(f"Request log could not be written: {error}")
+            return 0
+        return len(pending)
+
+    def top_requests(self, count):
+        """
+        :param count: Maximum number of keys (int).
+        :return: List of (route, argument list), most frequent first.
+        """
+
+        try:
+            rows = ds.backend.fetch_all(queries.TOP_REQUESTS, (time.time() - self.retention, count))
+        except (mysql.connector.Error, sqlite3.Error) as error:
+            print(f"Request log could not be read: {error}")
+            return []
+        return [(route, json.loads(key)) for route, key in rows if route in ROUTES]
+
+
+recorder = RequestRecorder()
+
+# Held while a prewarm run is in progress, runs are never started twice in parallel
+running = threading.Lock()
+
+
+def prewarm(top_n=PREWARM_TOP_N, workers=PREWARM_WORKERS, time_budget=PREWARM_TIME_BUDGET,
+            cpu_budget=PREWARM_CPU_BUDGET):
+    """
+    Replays the most frequent recorded requests through data_services to fill the result
+    caches of the current dataset version. Returns when all requests are replayed or a
+    budget is used up; requests left are skipped, a running one is aborted by its deadline.
+
+    :param top_n: Number of requests to replay (int).
+    :param workers: Number of worker threads (int).
+    :param time_budget: Wall-clock seconds of the run (float).
+    :param cpu_budget: CPU seconds the workers may use together (float).
+    :return: Number of replayed requests.
+    """
+
+    # The result caches are only used with a loaded station catalog
+    if top_n <= 0 or ds.dataset_version is None:
+        return 0
+    if not running.acquire(blocking=False):
+        return 0
+
+    try:
+        started = time.monotonic()
+        requests = recorder.top_requests(top_n)
+        lock = threading.Lock()
+        cpu_used = [0.0]
+
+        def replay(route, arguments):
+            left = time_budget - (time.monotonic() - started)
+            with lock:
+                exhausted = left <= 0 or cpu_used[0] >= cpu_budget
+            if exhausted:
+                PREWARM_REQUESTS.inc(route=route, result="skipped")
+                return False
+
+            cpu_started = time.thread_time()
+            try:
+                with deadlines.deadline(left):
+                    getattr(ds, ROUTES[route][0])(*arguments)
+            except deadlines.DeadlineExceeded:
+                PREWARM_REQUESTS.inc(route=route, result="skipped")
+                return False
+            except Exception as error:
+                print(f"Prewarming {route} {arguments} failed: {error}")
+                PREWARM_REQUESTS.inc(route=route, result="failed")
+                return False
+            finally:
+                with lock:
+                    cpu_used[0] += time.thread_time() - cpu_started
+            PREWARM_REQUESTS.inc(route=route, result="done")
+            return True
+
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="prewarm") as executor:
+            replayed = sum(executor.map(lambda request: replay(*request), requests))
+
+        print(f"Prewarmed {replayed} of {len(requests)} requests in {time.monotonic() - started:.1f}s "
+              f"({cpu_used[0]:.1f}s CPU).")
+        return replayed
+    finally:
+        running.release()
+
+
+# Set by every request for a run. A request arriving while a run is in progress is
+# served by the running thread with another run, so the caches cleared by a catalog
+# reload are filled again.
+rerun = threading.Event()
+
+
+def prewarm_current_version():
+    """
+    Runs prewarm() until the caches of the live dataset version are filled: a run that was
+    requested during another run or overtaken by a swap is repeated.
+
+    :return: No return value.
+    """
+
+    rerun.set()
+    while rerun.is_set():
+        if running.locked():
+            # The running thread sees the flag after its run
+            return
+        rerun.clear()
+        version = ds.dataset_version
+        prewarm()
+        if ds.dataset_version != version:
+            rerun.set()
+
+
+def start_background_prewarm():
+    """
+    Runs the prewarming in a daemon thread, so requests are answered meanwhile.
+
+    :return: The started thread.
+    """
+
+    thread = threading.Thread(target=prewarm_current_version, name="prewarm", daemon=True)
+    thread.start()
+    return thread
+
+
+def on_catalog_loaded(version):
+    """
+    Listener of data_services: the result caches are empty after every catalog load.
+    """
+
+    if PREWARM_TOP_N > 0:
+        print(f"Dataset version {version}: prewarming the result caches.")
+        start_background_prewarm()
+
+
+ds.dataset_listeners.append(on_catalog_loaded)
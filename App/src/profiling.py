@@ -0,0 +1,124 @@
+import cProfile
+import glob
+import hmac
+import io
+import os
+import pstats
+import random
+import re
+import uuid
+from flask import request, g, jsonify, Response
+from config import PROFILE_TOKEN, PROFILE_SAMPLE_RATE, PROFILE_DIR, PROFILE_MAX_FILES
+# Profiled are the data routes, the same that run with a deadline
+from routes import DEADLINE_ROUTES
+
+PROFILE_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+def prune_profiles(directory, max_files):
+    """
+    Removes the oldest profiles until at most max_files are left.
+
+    :param directory: Directory of the stored profiles.
+    :param max_files: Number of profiles to keep (int).
+    :return: No return value.
+    """
+
+    paths = glob.glob(os.path.join(directory, "*.prof"))
+    if len(paths) <= max_files:
+        return
+
+    def modified(path):
+        try:
+            return os.path.getmtime(path)
+        except OSError:
+            return 0.0
+
+    for path in sorted(paths, key=modified)[:len(paths) - max_files]:
+        try:
+            os.remove(path)
+        except OSError:
+            # Already removed by another process
+            pass
+
+
+def summarize(path, limit=30):
+    """
+    Renders the functions with the highest cumulative time of a stored profile.
+
+    :param path: Path of a .prof file written by cProfile.
+    :param limit: Number of functions.
+    :return: Text report (str).
+    """
+
+    stream = io.StringIO()
+    pstats.Stats(path, stream=stream).sort_stats("cumulative").print_stats(limit)
+    return stream.getvalue()
+
+
+def init_profiling(app, token=PROFILE_TOKEN, sample_rate=PROFILE_SAMPLE_RATE, directory=PROFILE_DIR,
+                   max_files=PROFILE_MAX_FILES):
+    """
+    Registers the profiling hooks. Without token and sample rate no hook is registered,
+    so disabled profiling costs nothing.
+
+    A profiled request answers with the header X-Profile-ID, a random ID generated by the
+    server; the call statistics are stored as <directory>/<profile id>.prof (readable with
+    pstats, snakeviz or flameprof) and can be fetched as text report from /profiles/<profile id>
+    with the X-Profile header. Only the newest max_files profiles are kept.
+
+    :param app: Flask application.
+    :param token: Secret expected in the X-Profile header, empty to disable the header.
+    :param sample_rate: Share of requests profiled at random (0 to 1).
+    :param directory: Directory of the stored profiles.
+    :param max_files: Number of profiles kept in the directory (int).
+    :return: True if profiling is enabled, otherwise False.
+    """
+
+    if not token and sample_rate <= 0:
+        return False
+
+    def authorized():
+        return bool(token) and hmac.compare_digest(request.headers.get("X-Profile", ""), token)
+
+    @app.before_request
+    def start_profiler():
+        if request.url_rule is None or request.url_rule.rule not in DEADLINE_ROUTES:
+            return
+        if not authorized() and random.random() >= sample_rate:
+            return
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already active in this thread
+            return
+        g.profiler = profiler
+
+    @app.after_request
+    def stop_profiler(response):
+        profiler = g.pop("profiler", None)
+        if profiler is None:
+            return response
+
+        profiler.disable()
+        profile_id = uuid.uuid4().hex
+        os.makedirs(directory, exist_ok=True)
+        profiler.dump_stats(os.path.join(directory, f"{profile_id}.prof"))
+        prune_profiles(directory, max_files)
+        response.headers["X-Profile-ID"] = profile_id
+        return response
+
+    @app.route('/profiles/<profile_id>', methods=['GET'])
+    def get_profile(profile_id):
+        if not authorized():
+            return jsonify({"message": "Nicht berechtigt"}), 403
+
+        path = os.path.join(directory, f"{profile_id}.prof")
+        if not PROFILE_ID_PATTERN.match(profile_id) or not os.path.exists(path):
+            return jsonify({"message": "Profil nicht gefunden"}), 404
+
+        return Response(summarize(path), mimetype="text/plain")
+
+    return True
@@ -0,0 +1,581 @@
+import re
+
+STATION_CATALOG_QUERY = """
+    SELECT station_id, station_name, latitude, longitude,
+           first_tmin, latest_tmin, first_tmax, latest_tmax, coverage
+    FROM Station;
+    """
+
+STATIONS_FOR_PERIOD_QUERY = """
+    SELECT station_id, station_name, latitude, longitude 
+    FROM Station 
+    WHERE first_tmin <= %s 
+      AND latest_tmin >= %s 
+      AND first_tmax <= %s 
+      AND latest_tmax >= %s;
+    """
+
+SID_QUERY = "SELECT SID FROM Station WHERE station_id = %s;"
+
+INSERT_STATION = """
+    INSERT INTO Station (station_id, station_name, latitude, longitude, first_tmax, latest_tmax, 
+    first_tmin, latest_tmin)
+    VALUES (%s,%s, %s, %s, %s, %s, %s, %s);
+    """
+
+# Bitmap of the years with complete Tmin/Tmax data, see year_coverage.py
+UPDATE_COVERAGE = "UPDATE Station SET coverage = %s WHERE SID = %s;"
+
+# Tables created before the coverage column existed get it with an empty value
+ADD_COVERAGE_COLUMN = "ALTER TABLE Station ADD COLUMN coverage VARCHAR(128) NOT NULL DEFAULT '';"
+
+COMPLETE_YEARS_QUERY = """
+    SELECT SID, year FROM Datapoint
+    GROUP BY SID, year
+    HAVING COUNT(DISTINCT month) = 12
+    ORDER BY SID;
+    """
+
+INSERT_DATAPOINT = """
+    INSERT INTO Datapoint (SID, year, month, tmax, tmin)
+    VALUES (%s, %s, %s, %s, %s);
+    """
+
+# Monthly values of any GHCN-D element (long format), see datapoint.parse_elements
+INSERT_ELEMENT_VALUE = """
+    INSERT INTO ElementValue (SID, element, year, month, value, days)
+    VALUES (%s, %s, %s, %s, %s, %s);
+    """
+
+ELEMENT_VALUE_TABLE = """
+    CREATE TABLE IF NOT EXISTS ElementValue (
+        SID INT NOT NULL,
+        element CHAR(4) NOT NULL,
+        year INT NOT NULL,
+        month INT NOT NULL,
+        value FLOAT NOT NULL,
+        days INT NOT NULL,
+        PRIMARY KEY (SID, element, year, month)
+    );
+    """
+
+ELEMENT_VALUES_QUERY = """
+    SELECT ElementValue.year, ElementValue.month, ElementValue.value, ElementValue.days
+    FROM ElementValue
+    JOIN Station ON Station.SID = ElementValue.SID
+    WHERE Station.station_id = %s
+      AND ElementValue.element = %s
+      AND ElementValue.year BETWEEN %s AND %s
+    ORDER BY ElementValue.year, ElementValue.month;
+    """
+
+# Compressed daily values of one element and year (see daily_store.encode)
+INSERT_DAILY_VALUE = """
+    INSERT INTO DailyValue (SID, element, year, data)
+    VALUES (%s, %s, %s, %s);
+    """
+
+DAILY_VALUE_TABLE = """
+    CREATE TABLE IF NOT EXISTS DailyValue (
+        SID INT NOT NULL,
+        element CHAR(4) NOT NULL,
+        year INT NOT NULL,
+        data BLOB NOT NULL,
+        PRIMARY KEY (SID, element, year)
+    );
+    """
+
+DAILY_VALUES_QUERY = """
+    SELECT DailyValue.year, DailyValue.data
+    FROM DailyValue
+    JOIN Station ON Station.SID = DailyValue.SID
+    WHERE Station.station_id = %s
+      AND DailyValue.element = %s
+      AND DailyValue.year BETWEEN %s AND %s
+    ORDER BY DailyValue.year;
+    """
+
+YEARLY_AVERAGE_QUERY = """
+    SELECT year,
+           SUM({column} * days_in_month) / SUM(days_in_month)
+    FROM (
+        SELECT year,
+               month,
+               AVG({column}) AS {column},
+               CASE
+                   WHEN month = 2 THEN
+                       CASE
+                           WHEN (year % 4 = 0 AND (year % 100 != 0 OR year % 400 = 0)) THEN 29
+                           ELSE 28
+                       END
+                   WHEN month IN (4, 6, 9, 11) THEN 30
+                   ELSE 31
+               END AS days_in_month
+        FROM Datapoint
+        WHERE SID = %s
+          AND year BETWEEN %s AND %s
+        GROUP BY year, month
+    ) AS subquery
+    GROUP BY year
+    ORDER BY year;
+    """
+
+SEASONAL_AVERAGE_QUERY = """
+    SELECT year,
+           SUM({column} * days_in_month) / SUM(days_in_month)
+    FROM (
+        SELECT year,
+               month,
+               AVG({column}) AS {column},
+               CASE
+                   WHEN month = 2 THEN
+                       CASE
+                           WHEN (year % 4 = 0 AND (year % 100 != 0 OR year % 400 = 0)) THEN 29
+                           ELSE 28
+                       END
+                   WHEN month IN (4, 6, 9, 11) THEN 30
+                   ELSE 31
+               END AS days_in_month
+        FROM Datapoint
+        WHERE SID = %s
+          AND month BETWEEN %s AND %s
+          AND year BETWEEN %s AND %s
+        GROUP BY year, month
+    ) AS subquery
+    GROUP BY year
+    ORDER BY year;
+    """
+
+WINTER_AVERAGE_QUERY = """
+    SELECT winter_year,
+           SUM({column} * days_in_month) / SUM(days_in_month) AS avg_{column}
+    FROM (
+        SELECT CASE WHEN month = 12 THEN year + 1 ELSE year END AS winter_year,
+               month,
+               AVG({column}) AS {column},
+               CASE
+                   WHEN month = 2 THEN
+                       CASE
+                           WHEN (year % 4 = 0 AND (year % 100 != 0 OR year % 400 = 0)) THEN 29
+                           ELSE 28
+                       END
+                   WHEN month = 12 THEN 31
+                   WHEN month = 1 THEN 31
+                   ELSE 30
+               END AS days_in_month
+        FROM Datapoint
+        WHERE SID = %s
+          AND (month = 12 OR month BETWEEN 1 AND 2)
+          AND (CASE WHEN month = 12 THEN year + 1 ELSE year END) BETWEEN %s AND %s
+        GROUP BY year, month
+    ) AS subquery
+    GROUP BY winter_year
+    ORDER BY winter_year;
+    """
+
+SEASONS = {
+    "spring": (3, 5),
+    "summer": (6, 8),
+    "autumn": (9, 11),
+}
+
+
+def build_aggregation_queries(sid, first_year, last_year):
+    """
+    Builds the ten aggregation statements used for the temperature series of one station.
+    The statements are independent of each other, so they can be executed sequentially
+    on one connection or concurrently on several.
+
+    :param sid: Internal primary key (SID) of the station.
+    :param first_year: First year of the time period.
+    :param last_year: Last year of the time period.
+    :return: List of (sql, params) tuples in the order annual, spring, summer, autumn, winter
+             with Tmin before Tmax for every period.
+    """
+
+    queries = []
+
+    for column in ("tmin", "tmax"):
+        queries.append((YEARLY_AVERAGE_QUERY.format(column=column), (sid, first_year, last_year)))
+
+    for start_month, end_month in SEASONS.values():
+        for column in ("tmin", "tmax"):
+            queries.append((SEASONAL_AVERAGE_QUERY.format(column=column),
+                            (sid, start_month, end_month, first_year, last_year)))
+
+    for column in ("tmin", "tmax"):
+        queries.append((WINTER_AVERAGE_QUERY.format(column=column), (sid, first_year, last_year)))
+
+    return queries
+
+
+# =========================================================
+# Dataset versions
+# =========================================================
+# A new dataset version is loaded into the shadow tables Station_new/Datapoint_new and
+# swapped with the live tables; the replaced tables are kept as Station_old/Datapoint_old.
+
+SHADOW_SUFFIX = "_new"
+PREVIOUS_SUFFIX = "_old"
+
+DATASET_VERSION_QUERY = "SELECT COALESCE(MAX(version), 0) FROM DatasetVersion;"
+
+INSERT_DATASET_VERSION = "INSERT INTO DatasetVersion (version, action) VALUES (%s, %s);"
+
+
+def for_tables(query, suffix):
+    """
+    Rewrites a statement on the Station/Datapoint/ElementValue/DailyValue tables to the tables with the given suffix.
+
+    :param query: SQL statement.
+    :param suffix: Table suffix, e.g. SHADOW_SUFFIX.
+    :return: SQL statement.
+    """
+
+    return re.sub(r"\b(Station|Datapoint|ElementValue|DailyValue)\b", rf"\1{suffix}", query)
+
+
+def build_index_statements(suffix, version):
+    """
+    Creates the secondary indexes of a table pair after the bulk load. Index names carry
+    the version because SQLite index names must be unique in the whole database.
+
+    :return: List of CREATE INDEX statements.
+    """
+
+    return [
+        f"CREATE INDEX idx_station_id_v{version} ON Station{suffix} (station_id);",
+        f"CREATE INDEX idx_datapoint_sid_year_v{version} ON Datapoint{suffix} (SID, year, month);",
+    ]
+
+
+# =========================================================
+# Precomputed yearly aggregates
+# =========================================================
+# YearlyAggregate holds the day-weighted annual and seasonal Tmin/Tmax means of every
+# station and year, keyed by station_id so it stays valid across dataset versions.
+# It is rebuilt from the live Datapoint table into YearlyAggregate_new and swapped in.
+
+AGGREGATE_PERIOD_MONTHS = {
+    "annual": tuple(range(1, 13)),
+    "spring": (3, 4, 5),
+    "summer": (6, 7, 8),
+    "autumn": (9, 10, 11),
+    "winter": (12, 1, 2),
+}
+
+AGGREGATE_TABLE = """
+    CREATE TABLE {table} (
+        station_id VARCHAR(50) NOT NULL,
+        year INT NOT NULL,
+        period VARCHAR(10) NOT NULL,
+        tmin FLOAT NOT NULL,
+        tmax FLOAT NOT NULL,
+        PRIMARY KEY (station_id, period, year)
+    );
+    """
+
+# Secondary index for queries over all stations of one period and year
+AGGREGATE_INDEX = "CREATE INDEX idx_aggregate_period_year ON {table} (period, year);"
+
+AGGREGATE_INSERT = """
+    INSERT INTO {table} (station_id, year, period, tmin, tmax)
+    SELECT station_id, period_year, period,
+           SUM(tmin * days_in_month) / SUM(days_in_month),
+           SUM(tmax * days_in_month) / SUM(days_in_month)
+    FROM (
+        SELECT Station.station_id,
+               periods.period,
+               -- December belongs to the winter of the following year
+               CASE WHEN periods.period = 'winter' AND Datapoint.month = 12
+                    THEN Datapoint.year + 1 ELSE Datapoint.year END AS period_year,
+               Datapoint.tmin,
+               Datapoint.tmax,
+               CASE
+                   WHEN Datapoint.month = 2 THEN
+                       CASE
+                           WHEN (Datapoint.year % 4 = 0 AND (Datapoint.year % 100 != 0 OR Datapoint.year % 400 = 0)) THEN 29
+                           ELSE 28
+                       END
+                   WHEN Datapoint.month IN (4, 6, 9, 11) THEN 30
+                   ELSE 31
+               END AS days_in_month
+        FROM Datapoint
+        JOIN Station ON Station.SID = Datapoint.SID
+        JOIN ({periods}) AS periods ON periods.month = Datapoint.month
+    ) AS monthly
+    GROUP BY station_id, period, period_year;
+    """
+
+
+def build_aggregate_statements(suffix="_new"):
+    """
+    Builds the statements that fill a new aggregate table. Swapping it in is left to the backend.
+
+    :param suffix: Suffix of the table that is filled.
+    :return: List of SQL statements without parameters.
+    """
+
+    periods = " UNION ALL ".join(f"SELECT '{period}' AS period, {month} AS month"
+                                 for period, months in AGGREGATE_PERIOD_MONTHS.items() for month in months)
+    table = f"YearlyAggregate{suffix}"
+    return [
+        f"DROP TABLE IF EXISTS {table};",
+        AGGREGATE_TABLE.format(table=table),
+        AGGREGATE_INSERT.format(table=table, periods=periods),
+        AGGREGATE_TABLE.format(table="YearlyAggregate").replace("CREATE TABLE", "CREATE TABLE IF NOT EXISTS"),
+    ]
+
+
+def build_regional_sums_query(count):
+    """
+    Builds the query summing the weighted aggregates of several stations per period and year.
+    The weights are passed as a derived table, so the database joins and groups all rows
+    and only returns one row per period and year.
+
+    :param count: Number of stations (int).
+    :return: SQL statement with the parameters (station ID, weight, ..., first year, last year).
+    """
+
+    weights = " UNION ALL ".join(["SELECT %s AS station_id, %s AS weight"] * count)
+    return f"""
+        SELECT aggregate.period, aggregate.year,
+               SUM(weights.weight),
+               SUM(weights.weight * aggregate.tmin),
+               SUM(weights.weight * aggregate.tmax)
+        FROM ({weights}) AS weights
+        JOIN YearlyAggregate AS aggregate ON aggregate.station_id = weights.station_id
+        WHERE aggregate.year BETWEEN %s AND %s
+        GROUP BY aggregate.period, aggregate.year;
+        """
+
+
+SURFACE_VALUES_QUERY = """
+    SELECT Station.latitude, Station.longitude, YearlyAggregate.tmin, YearlyAggregate.tmax
+    FROM YearlyAggregate
+    JOIN Station ON Station.station_id = YearlyAggregate.station_id
+    WHERE YearlyAggregate.period = %s
+      AND YearlyAggregate.year = %s;
+    """
+
+
+def build_yearly_aggregates_query(count):
+    """
+    Builds the query for the precomputed aggregates of several stations in one period.
+
+    :param count: Number of station IDs (int).
+    :return: SQL statement with the parameters (station IDs..., period, first year, last year).
+    """
+
+    placeholders = ", ".join(["%s"] * count)
+    return f"""
+        SELECT station_id, year, tmin, tmax
+        FROM YearlyAggregate
+        WHERE station_id IN ({placeholders})
+          AND period = %s
+          AND year BETWEEN %s AND %s;
+        """
+
+
+def build_export_query(count, resolution, periods=1):
+    """
+    Builds the query of a bulk export (see export.py) for several stations, ordered by
+    station and date so the rows can be streamed in the order of the file.
+
+    :param count: Number of station IDs (int).
+    :param resolution: "monthly" (Datapoint rows) or "yearly" (YearlyAggregate rows).
+    :param periods: Number of periods of a yearly export (int).
+    :return: SQL statement with the parameters (station IDs..., first year, last year),
+             for "yearly" followed by the periods.
+    """
+
+    placeholders = ", ".join(["%s"] * count)
+    if resolution == "monthly":
+        return f"""
+            SELECT Station.station_id, Datapoint.year, Datapoint.month, Datapoint.tmax, Datapoint.tmin
+            FROM Datapoint
+            JOIN Station ON Station.SID = Datapoint.SID
+            WHERE Station.station_id IN ({placeholders})
+              AND Datapoint.year BETWEEN %s AND %s
+            ORDER BY Station.station_id, Datapoint.year, Datapoint.month;
+            """
+    return f"""
+        SELECT station_id, year, period, tmin, tmax
+        FROM YearlyAggregate
+        WHERE station_id IN ({placeholders})
+          AND year BETWEEN %s AND %s
+          AND period IN ({", ".join(["%s"] * periods)})
+        ORDER BY station_id, year, period;
+        """
+
+
+# =========================================================
+# Consistency checks (ingestion CLI "verify")
+# =========================================================
+# name -> (statement returning one count, counts above zero are errors)
+
+VERIFY_QUERIES = {
+    "stations": ("SELECT COUNT(*) FROM Station;", False),
+    "datapoints": ("SELECT COUNT(*) FROM Datapoint;", False),
+    "stations_without_datapoints": ("""
+        SELECT COUNT(*) FROM Station
+        WHERE NOT EXISTS (SELECT 1 FROM Datapoint WHERE Datapoint.SID = Station.SID);
+        """, False),
+    "invalid_months": ("SELECT COUNT(*) FROM Datapoint WHERE month NOT BETWEEN 1 AND 12;", True),
+    "duplicate_months": ("""
+        SELECT COUNT(*) FROM (
+            SELECT SID, year, month FROM Datapoint GROUP BY SID, year, month HAVING COUNT(*) > 1
+        ) AS duplicates;
+        """, True),
+    "orphaned_datapoints": ("""
+        SELECT COUNT(*) FROM Datapoint
+        WHERE NOT EXISTS (SELECT 1 FROM Station WHERE Station.SID = Datapoint.SID);
+        """, True),
+    "tmin_above_tmax": ("SELECT COUNT(*) FROM Datapoint WHERE tmin > tmax;", False),
+}
+
+
+# =========================================================
+# Ingestion work queue
+# =========================================================
+# One row per station of the dataset version being loaded. Workers lease batches of
+# pending stations; a lease that expires (crashed worker) makes the station claimable again.
+
+QUEUE_TABLE = """
+    CREATE TABLE IF NOT EXISTS IngestQueue (
+        station_id VARCHAR(50) PRIMARY KEY,
+        status VARCHAR(10) NOT NULL,
+        claim VARCHAR(100),
+        lease_until DOUBLE,
+        attempts INT NOT NULL DEFAULT 0,
+        datapoints INT NOT NULL DEFAULT 0,
+        error VARCHAR(255)
+    );
+    """
+
+ENQUEUE_STATION = "INSERT INTO IngestQueue (station_id, status) VALUES (%s, 'pending');"
+
+# Expired leases of stations without attempts left are not retried
+EXPIRE_LEASES = """
+    UPDATE IngestQueue SET status = 'failed', claim = NULL, error = 'lease expired'
+    WHERE status = 'leased' AND lease_until < %s AND attempts >= %s;
+    """
+
+# The derived table with LIMIT is materialized by MySQL, which allows the subquery on the
+# updated table. The outer condition is evaluated again on the locked rows, so two workers
+# never lease the same station.
+CLAIM_WORK = """
+    UPDATE IngestQueue SET status = 'leased', claim = %s, lease_until = %s, attempts = attempts + 1
+    WHERE station_id IN (
+        SELECT station_id FROM (
+            SELECT station_id FROM IngestQueue
+            WHERE status = 'pending' OR (status = 'leased' AND lease_until < %s)
+            ORDER BY station_id
+            LIMIT %s
+        ) AS candidates
+    )
+    AND (status = 'pending' OR (status = 'leased' AND lease_until < %s));
+    """
+
+CLAIMED_WORK = "SELECT station_id FROM IngestQueue WHERE claim = %s AND status = 'leased' ORDER BY station_id;"
+
+COMPLETE_WORK = """
+    UPDATE IngestQueue SET status = 'done', datapoints = %s, error = NULL
+    WHERE station_id = %s AND claim = %s AND status = 'leased';
+    """
+
+RELEASE_WORK = """
+    UPDATE IngestQueue
+    SET status = CASE WHEN attempts >= %s THEN 'failed' ELSE 'pending' END,
+        claim = NULL, lease_until = NULL, error = %s
+    WHERE station_id = %s AND claim = %s AND status = 'leased';
+    """
+
+QUEUE_PROGRESS = "SELECT status, COUNT(*), COALESCE(SUM(datapoints), 0) FROM IngestQueue GROUP BY status;"
+
+FAILED_WORK = "SELECT station_id, attempts, error FROM IngestQueue WHERE status = 'failed' ORDER BY station_id;"
+
+# =========================================================
+# Asynchronous jobs
+# =========================================================
+# One row per submitted job (see jobs.py). job_key identifies the kind, the parameters and
+# the dataset version, so an identical request is answered by the existing job; the unique
+# constraint also settles two processes submitting the same job at once.
+
+JOB_TABLE = """
+    CREATE TABLE IF NOT EXISTS Job (
+        job_id CHAR(32) PRIMARY KEY,
+        job_key CHAR(64) NOT NULL UNIQUE,
+        kind VARCHAR(20) NOT NULL,
+        params TEXT NOT NULL,
+        status VARCHAR(10) NOT NULL,
+        progress FLOAT NOT NULL DEFAULT 0,
+        result LONGTEXT,
+        error VARCHAR(255),
+        created_at DOUBLE NOT NULL,
+        updated_at DOUBLE NOT NULL,
+        expires_at DOUBLE NOT NULL
+    );
+    """
+
+INSERT_JOB = """
+    INSERT INTO Job (job_id, job_key, kind, params, status, created_at, updated_at, expires_at)
+    VALUES (%s, %s, %s, %s, 'queued', %s, %s, %s);
+    """
+
+# Failed jobs and jobs without an update for the time budget (their process stopped) are
+# replaced by a new submission instead of being deduplicated
+DELETE_STALE_JOBS = """
+    DELETE FROM Job
+    WHERE expires_at < %s
+       OR (job_key = %s AND (status = 'failed' OR (status IN ('queued', 'running') AND updated_at < %s)));
+    """
+
+JOB_COLUMNS = "job_id, kind, params, status, progress, error, created_at, updated_at, expires_at"
+
+JOB_BY_KEY = f"SELECT {JOB_COLUMNS} FROM Job WHERE job_key = %s;"
+
+JOB_BY_ID = f"SELECT {JOB_COLUMNS} FROM Job WHERE job_id = %s AND expires_at >= %s;"
+
+JOB_RESULT = "SELECT status, result, error FROM Job WHERE job_id = %s AND expires_at >= %s;"
+
+UPDATE_JOB_PROGRESS = "UPDATE Job SET status = %s, progress = %s, updated_at = %s WHERE job_id = %s;"
+
+FINISH_JOB = """
+    UPDATE Job SET status = %s, progress = %s, result = %s, error = %s, updated_at = %s, expires_at = %s
+    WHERE job_id = %s;
+    """
+
+
+# =========================================================
+# Request log
+# =========================================================
+# Frequency of the normalized requests of /submit and /get_weather_data (see prewarm.py).
+# The most frequent keys are replayed to fill the result caches after startup and after a
+# dataset swap. Rows not requested within the retention period are removed.
+
+REQUEST_LOG_TABLE = """
+    CREATE TABLE IF NOT EXISTS RequestLog (
+        route VARCHAR(32) NOT NULL,
+        request_key VARCHAR(255) NOT NULL,
+        hits BIGINT NOT NULL,
+        last_seen DOUBLE NOT NULL,
+        PRIMARY KEY (route, request_key)
+    );
+    """
+
+UPDATE_REQUEST_LOG = """
+    UPDATE RequestLog SET hits = hits + %s, last_seen = %s
+    WHERE route = %s AND request_key = %s;
+    """
+
+INSERT_REQUEST_LOG = "INSERT INTO RequestLog (hits, last_seen, route, request_key) VALUES (%s, %s, %s, %s);"
+
+DELETE_OLD_REQUESTS = "DELETE FROM RequestLog WHERE last_seen < %s;"
+
+TOP_REQUESTS = """
+    SELECT route, request_key FROM RequestLog
+    WHERE last_seen >= %s
+    ORDER BY hits DESC, last_seen DESC
+    LIMIT %s;
+    """
@@ -0,0 +1,94 @@
+import collections
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from config import SLOW_QUERY_THRESHOLD, SLOW_QUERY_LOG_PATH
+import metrics
+
+SLOW_QUERIES = metrics.register(metrics.Counter(
+    "weather_db_slow_queries_total", "Queries slower than SLOW_QUERY_THRESHOLD."))
+
+# Most recent slow queries of this process, served by /metrics/slow_queries
+recent_slow_queries = collections.deque(maxlen=100)
+
+log_lock = threading.Lock()
+
+
+def execute(cursor, query, params=(), explain_prefix="EXPLAIN FORMAT=JSON ", threshold=None):
+    """
+    Executes a statement on the cursor and returns all rows. Statements slower than the
+    threshold are recorded with their parameters, duration, row count and query plan.
+
+    :param cursor: DB-API cursor (MySQL or SQLite).
+    :param query: SQL statement in the placeholder style of the cursor.
+    :param params: Statement parameters.
+    :param explain_prefix: Prefix that turns the statement into a plan query for this database.
+    :param threshold: Threshold in seconds, SLOW_QUERY_THRESHOLD by default.
+    :return: List of result rows.
+    """
+
+    threshold = SLOW_QUERY_THRESHOLD if threshold is None else threshold
+
+    started = time.perf_counter()
+    cursor.execute(query, params)
+    rows = cursor.fetchall()
+    duration = time.perf_counter() - started
+
+    if 0 <= threshold < duration:
+        record_slow_query(query, params, duration, len(rows), explain(cursor, query, params, explain_prefix))
+
+    return rows
+
+
+def explain(cursor, query, params, explain_prefix):
+    """
+    Captures the plan of a statement. A failing EXPLAIN never fails the request.
+
+    :return: Plan as JSON-compatible object, or a dictionary with the error.
+    """
+
+    try:
+        cursor.execute(explain_prefix + query, params)
+        plan = cursor.fetchall()
+    except Exception as error:
+        return {"error": str(error)}
+
+    # MySQL returns the JSON plan as a single text column, SQLite one row per plan step
+    if len(plan) == 1 and isinstance(plan[0][0], str):
+        try:
+            return json.loads(plan[0][0])
+        except ValueError:
+            pass
+    return [[str(value) for value in row] for row in plan]
+
+
+def record_slow_query(query, params, duration, rows, plan):
+    """
+    Appends a slow query as one JSON line to SLOW_QUERY_LOG_PATH and keeps it in memory.
+
+    :return: The recorded entry (dict).
+    """
+
+    entry = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "duration": round(duration, 6),
+        "rows": rows,
+        "query": " ".join(query.split()),
+        "params": [str(param) for param in params],
+        "plan": plan,
+    }
+
+    SLOW_QUERIES.inc()
+    recent_slow_queries.append(entry)
+    print(f"Slow query ({duration:.3f} s, {rows} rows): {entry['query'][:200]} {entry['params']}")
+
+    if SLOW_QUERY_LOG_PATH:
+        with log_lock:
+            try:
+                with open(SLOW_QUERY_LOG_PATH, "a") as file:
+                    file.write(json.dumps(entry) + "\n")
+            except OSError as error:
+                print(f"Slow query log not writable: {error}")
+
+    return entry
@@ -0,0 +1,167 @@
+import itertools
+import threading
+import time
+import mysql.connector
+from pool_manager import PoolBusyError
+
+
+class ReplicaRouter:
+    def __init__(self, primary, replicas: dict, strategy: str = "round_robin", max_lag: float = 30.0,
+                 lag_check_interval: float = 5.0):
+        """
+        Distributes read-only queries between MySQL replicas. Replicas that lag behind the
+        primary by more than max_lag seconds, do not replicate at all or are unreachable are
+        skipped until the next lag check. If no replica is usable, reads go to the primary.
+
+        :param primary: PoolManager of the primary (write) database.
+        :param replicas: PoolManager per replica, keyed by a name such as "host:port" (dict).
+        :param strategy: "round_robin" or "least_loaded" (str).
+        :param max_lag: Maximum replication lag in seconds for a replica to receive reads (float).
+        :param lag_check_interval: Seconds between two lag checks of the same replica (float).
+        """
+        if strategy not in ("round_robin", "least_loaded"):
+            raise ValueError(f"Unknown replica strategy: {strategy}")
+
+        self.primary = primary
+        self.replicas = replicas
+        self.strategy = strategy
+        self.max_lag = max_lag
+        self.lag_check_interval = lag_check_interval
+
+        self.lock = threading.Lock()
+        self.counter = itertools.count()
+        # name -> (lag in seconds or None if unusable, time of the check)
+        self.lag = {name: (None, float("-inf")) for name in replicas}
+        self.stats = {"primary_reads_total": 0, **{f"{name}_reads_total": 0 for name in replicas}}
+
+    def measure_lag(self, pool):
+        """
+        Reads the replication lag of a replica from SHOW REPLICA STATUS.
+
+        :param pool: PoolManager of the replica.
+        :return: Lag in seconds, or None if the replica is not replicating or unreachable.
+        """
+
+        try:
+            connection = pool.get_connection(retry=False, timeout=1)
+        except mysql.connector.Error:
+            return None
+        try:
+            with connection.cursor(dictionary=True) as cursor:
+                try:
+                    cursor.execute("SHOW REPLICA STATUS;")
+                except mysql.connector.errors.ProgrammingError:
+                    cursor.execute("SHOW SLAVE STATUS;")  # MySQL before 8.0.22
+                status = cursor.fetchall()
+        except mysql.connector.Error:
+            return None
+        finally:
+            connection.close()
+
+        if not status:
+            return None
+        lag = status[0].get("Seconds_Behind_Source", status[0].get("Seconds_Behind_Master"))
+        return None if lag is None else float(lag)
+
+    def usable_replicas(self):
+        """
+        Returns the replicas whose last measured lag is within max_lag. Stale measurements
+        are refreshed first, outside the lock: reads of other threads go on with the last
+        measurement instead of waiting for the network round trips.
+
+        :return: List of replica names.
+        """
+
+        now = time.monotonic()
+        with self.lock:
+            due = [name for name, (_, checked) in self.lag.items() if now - checked >= self.lag_check_interval]
+            # Claim the checks, so concurrent reads do not measure the same replica again
+            for name in due:
+                self.lag[name] = (self.lag[name][0], now)
+
+        measured = {name: self.measure_lag(self.replicas[name]) for name in due}
+
+        with self.lock:
+            for name, lag in measured.items():
+                self.lag[name] = (lag, now)
+            return [name for name, (lag, _) in self.lag.items() if lag is not None and lag <= self.max_lag]
+
+    def order_replicas(self, names):
+        """
+        Orders the usable replicas by the configured strategy.
+
+        :param names: List of usable replica names.
+        :return: List of replica names, preferred replica first.
+        """
+
+        if self.strategy == "least_loaded":
+            def load(name):
+                metrics = self.replicas[name].metrics()
+                return (metrics["in_use"] + metrics["waiting"]) / metrics["max_size"]
+            return sorted(names, key=load)
+
+        if not names:
+            return names
+        start = next(self.counter) % len(names)
+        return names[start:] + names[:start]
+
+    def get_read_connection(self, timeout: float = None):
+        """
+        Returns a connection for read-only queries, from a replica if possible.
+
+        :param timeout: Maximum wait for a pooled connection in seconds, e.g. the remaining
+                        time of the request, shared by all replicas and the primary; the
+                        acquire_timeout of each pool if None.
+        :return: Pooled connection of a replica or of the primary.
+        """
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        def time_left():
+            return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+        usable = self.usable_replicas()
+        with self.lock:
+            candidates = self.order_replicas(usable)
+
+        for name in candidates:
+            try:
+                connection = self.replicas[name].get_connection(retry=False, timeout=time_left())
+            except PoolBusyError:
+                continue
+            except mysql.connector.Error:
+                # Skip the replica until its next lag check
+                with self.lock:
+                    self.lag[name] = (None, time.monotonic())
+                continue
+            with self.lock:
+                self.stats[f"{name}_reads_total"] += 1
+            return connection
+
+        with self.lock:
+            self.stats["primary_reads_total"] += 1
+        # With a timeout the connect backoff of the primary would ignore it
+        return self.primary.get_connection(retry=deadline is None, timeout=time_left())
+
+    def close(self):
+        """
+        Closes the idle connections of all replica pools, see PoolManager.close. The pool of
+        the primary belongs to the caller and is not closed.
+
+        :return: No return value.
+        """
+
+        for pool in self.replicas.values():
+            pool.close()
+
+    def metrics(self):
+        """
+        Returns the last measured lag and the number of reads routed to each database.
+
+        :return: Dictionary with lag per replica (None if unusable) and read counters.
+        """
+
+        return {
+            "lag_seconds": {name: lag for name, (lag, _) in self.lag.items()},
+            **self.stats,
+        }
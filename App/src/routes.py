@@ -1,12 +1,104 @@
-from flask import request, jsonify, render_template
+import json
+import time
+from flask import request, jsonify, render_template, g, Response
 import data_services as ds
+import metrics
+import query_log
+import deadlines
+import surface
+import jobs
+import export
+import prewarm
+from config import (REQUEST_TIMEOUT, MIN_YEAR_COVERAGE, CLIMATE_NORMAL_FIRST_YEAR, CLIMATE_NORMAL_LAST_YEAR,
+                    SURFACE_MAX_POINTS, INGEST_ELEMENTS, DAILY_ELEMENTS, JOB_PROGRESS_INTERVAL,
+                    JOB_EVENTS_MAX_SECONDS)
+from pool_manager import PoolBusyError
+
+# Routes running with a deadline of REQUEST_TIMEOUT (or the shorter X-Request-Timeout header)
+DEADLINE_ROUTES = {"/submit", "/get_weather_data", "/get_regional_data", "/get_station_trends", "/rank_stations",
+                   "/get_surface", "/surface/<int:zoom>/<int:x>/<int:y>.png", "/get_element_data",
+                   "/get_daily_data", "/get_threshold_days"}
+
+def valid_min_coverage(value):
+    """
+    Checks the minCoverage parameter of a request.
+
+    :param value: Share of the requested years a station must cover.
+    :return: True if the value is a number from 0 to 1.
+    """
+
+    return isinstance(value, (int, float)) and 0 <= value <= 1
+
 
 def init_routes(app):
 
+    @app.errorhandler(PoolBusyError)
+    def pool_busy(error):
+        # All database connections are busy: ask the client to retry instead of failing hard
+        return jsonify({"message": "Server ausgelastet, bitte erneut versuchen"}), 503, {"Retry-After": "1"}
+
+    @app.errorhandler(deadlines.DeadlineExceeded)
+    def deadline_exceeded(error):
+        return jsonify({"message": "Zeitlimit der Anfrage überschritten"}), 504
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+        if request.url_rule is not None and request.url_rule.rule in DEADLINE_ROUTES:
+            g.deadline_token = deadlines.start(
+                deadlines.request_timeout(request.headers.get("X-Request-Timeout"), REQUEST_TIMEOUT))
+
+    @app.teardown_request
+    def clear_deadline(error):
+        token = g.pop("deadline_token", None)
+        if token is not None:
+            deadlines.reset(token)
+
+    @app.after_request
+    def record_latency(response):
+        if "request_started" in g:
+            route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+            metrics.REQUEST_SECONDS.observe(time.perf_counter() - g.request_started,
+                                            route=route, method=request.method, status=response.status_code)
+        return response
+
+    @app.after_request
+    def record_request(response):
+        # Counted for the cache prewarming after the next startup or dataset swap
+        if response.status_code == 200 and request.url_rule is not None and request.url_rule.rule in prewarm.ROUTES:
+            prewarm.recorder.record(request.url_rule.rule, request.get_json(silent=True))
+        return response
+
     @app.route('/')
     def home():
         return render_template('index.html')
 
+    @app.route('/healthz', methods=['GET'])
+    def healthz():
+        return jsonify({"status": "ok"}), 200
+
+    @app.route('/readyz', methods=['GET'])
+    def readyz():
+        ready = ds.is_ready()
+        return jsonify({"ready": ready, "ingest": ds.ingest_status,
+                        "dataset_version": ds.dataset_version}), 200 if ready else 503
+
+    @app.route('/metrics/pool', methods=['GET'])
+    def pool_metrics():
+        metrics = ds.connection_pool.metrics()
+        if ds.read_router is not None:
+            metrics["replicas"] = {name: pool.metrics() for name, pool in ds.read_router.replicas.items()}
+            metrics["routing"] = ds.read_router.metrics()
+        return jsonify(metrics), 200
+
+    @app.route('/metrics/slow_queries', methods=['GET'])
+    def slow_queries():
+        return jsonify(list(query_log.recent_slow_queries)), 200
+
+    @app.route('/metrics', methods=['GET'])
+    def prometheus_metrics():
+        return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
     @app.route('/submit', methods=['POST'])
     def receive_data():
         data = request.json
@@ -16,8 +108,13 @@ def init_routes(app):
         year_start = data.get('yearStart')
         year_end = data.get('yearEnd')
         stations = data.get('stations')
+        min_coverage = data.get('minCoverage', MIN_YEAR_COVERAGE)
 
-        stations_in_radius = ds.get_stations_in_radius(latitude, longitude, radius, year_start, year_end, stations)
+        if not valid_min_coverage(min_coverage):
+            return jsonify({"message": "Ungültiger Parameter minCoverage"}), 400
+
+        stations_in_radius = ds.get_stations_in_radius(latitude, longitude, radius, year_start, year_end, stations,
+                                                       min_coverage)
         data["stationsInRadius"] = stations_in_radius
 
         return jsonify(data["stationsInRadius"]), 200
@@ -36,3 +133,301 @@ def init_routes(app):
         data["weatherData"] = weather_data
 
         return jsonify(data["weatherData"]), 200
+
+    @app.route('/get_element_data', methods=['POST'])
+    def get_element_data():
+        data = request.json
+        station_name = data.get('stationName')
+        element = data.get('element')
+        year_start = data.get('yearStart')
+        year_end = data.get('yearEnd')
+
+        if not station_name or not element or not year_start or not year_end:
+            return jsonify({"message": "Fehlende Parameter"}), 400
+        if element not in INGEST_ELEMENTS:
+            return jsonify({"message": "Ungültiger Parameter element"}), 400
+
+        element_values = ds.get_element_values(station_name, element, year_start, year_end)
+
+        return jsonify(element_values), 200
+
+    @app.route('/get_daily_data', methods=['POST'])
+    def get_daily_data():
+        data = request.json
+        station_name = data.get('stationName')
+        element = data.get('element')
+        year_start = data.get('yearStart')
+        year_end = data.get('yearEnd')
+
+        if not station_name or not element or not year_start or not year_end:
+            return jsonify({"message": "Fehlende Parameter"}), 400
+        if element not in DAILY_ELEMENTS:
+            return jsonify({"message": "Ungültiger Parameter element"}), 400
+        try:
+            year_start, year_end = int(year_start), int(year_end)
+        except (TypeError, ValueError):
+            return jsonify({"message": "Ungültiger Parameter yearStart/yearEnd"}), 400
+
+        daily_values = ds.get_daily_values(station_name, element, year_start, year_end)
+
+        return jsonify(daily_values), 200
+
+    @app.route('/get_threshold_days', methods=['POST'])
+    def get_threshold_days():
+        data = request.json
+        station_name = data.get('stationName')
+        element = data.get('element')
+        year_start = data.get('yearStart')
+        year_end = data.get('yearEnd')
+        threshold = data.get('threshold')
+        condition = data.get('condition', 'above')
+
+        if not station_name or not element or not year_start or not year_end or threshold is None:
+            return jsonify({"message": "Fehlende Parameter"}), 400
+        if element not in DAILY_ELEMENTS:
+            return jsonify({"message": "Ungültiger Parameter element"}), 400
+        if condition not in ('above', 'below'):
+            return jsonify({"message": "Ungültiger Parameter condition"}), 400
+        try:
+            year_start, year_end = int(year_start), int(year_end)
+        except (TypeError, ValueError):
+            return jsonify({"message": "Ungültiger Parameter yearStart/yearEnd"}), 400
+        try:
+            threshold = float(threshold)
+        except (TypeError, ValueError):
+            return jsonify({"message": "Ungültiger Parameter threshold"}), 400
+
+        days = ds.get_threshold_days(station_name, element, year_start, year_end, threshold, condition == 'above')
+
+        return jsonify(days), 200
+
+    @app.route('/get_regional_data', methods=['POST'])
+    def get_regional_data():
+        data = request.json
+        latitude = data.get('latitude')
+        longitude = data.get('longitude')
+        radius = data.get('radius')
+        year_start = data.get('yearStart')
+        year_end = data.get('yearEnd')
+        stations = data.get('stations', -1)
+        weighting = data.get('weighting', 'mean')
+        min_coverage = data.get('minCoverage', MIN_YEAR_COVERAGE)
+
+        if latitude is None or longitude is None or not radius or not year_start or not year_end:
+            return jsonify({"message": "Fehlende Parameter"}), 400
+        if weighting not in ("mean", "idw"):
+            return jsonify({"message": "Ungültiger Parameter weighting"}), 400
+        if not valid_min_coverage(min_coverage):
+            return jsonify({"message": "Ungültiger Parameter minCoverage"}), 400
+        try:
+            year_start, year_end = int(year_start), int(year_end)
+        except (TypeError, ValueError):
+            return jsonify({"message": "Ungültiger Parameter yearStart/yearEnd"}), 400
+
+        station_count, weather_data = ds.get_regional_aggregates(latitude, longitude, radius, year_start, year_end,
+                                                                 stations, weighting == "idw", min_coverage)
+
+        return jsonify({"stationCount": station_count, "weatherData": weather_data}), 200
+
+    @app.route('/get_station_trends', methods=['POST'])
+    def get_station_trends():
+        data = request.json
+        station_name = data.get('stationName')
+        year_start = data.get('yearStart')
+        year_end = data.get('yearEnd')
+        baseline_start = data.get('baselineStart', CLIMATE_NORMAL_FIRST_YEAR)
+        baseline_end = data.get('baselineEnd', CLIMATE_NORMAL_LAST_YEAR)
+
+        if not station_name or not year_start or not year_end:
+            return jsonify({"message": "Fehlende Parameter"}), 400
+        try:
+            years = [int(year) for year in (year_start, year_end, baseline_start, baseline_end)]
+        except (TypeError, ValueError):
+            return jsonify({"message": "Ungültiger Parameter yearStart/yearEnd"}), 400
+
+        trends = ds.get_station_trends(station_name, *years)
+
+        return jsonify(trends), 200
+
+    @app.route('/rank_stations', methods=['POST'])
+    def rank_stations():
+        data = request.json
+        latitude = data.get('latitude')
+        longitude = data.get('longitude')
+        radius = data.get('radius')
+        year_start = data.get('yearStart')
+        year_end = data.get('yearEnd')
+        stations = data.get('stations', -1)
+        period = data.get('period', 'annual')
+        element = data.get('element', 'tmax')
+        min_coverage = data.get('minCoverage', MIN_YEAR_COVERAGE)
+
+        if latitude is None or longitude is None or not radius or not year_start or not year_end:
+            return jsonify({"message": "Fehlende Parameter"}), 400
+        if period not in ds.PERIODS:
+            return jsonify({"message": "Ungültiger Parameter period"}), 400
+        if element not in ("tmin", "tmax"):
+            return jsonify({"message": "Ungültiger Parameter element"}), 400
+        if not valid_min_coverage(min_coverage):
+            return jsonify({"message": "Ungültiger Parameter minCoverage"}), 400
+        try:
+            year_start, year_end = int(year_start), int(year_end)
+        except (TypeError, ValueError):
+            return jsonify({"message": "Ungültiger Parameter yearStart/yearEnd"}), 400
+
+        ranking = ds.rank_stations_by_trend(latitude, longitude, radius, year_start, year_end, stations, period,
+                                            element, min_coverage)
+
+        return jsonify(ranking), 200
+
+    @app.route('/surface/<int:zoom>/<int:x>/<int:y>.png', methods=['GET'])
+    def surface_tile(zoom, x, y):
+        year = request.args.get('year', type=int)
+        period = request.args.get('period', 'annual')
+        element = request.args.get('element', 'tmax')
+
+        if year is None:
+            return jsonify({"message": "Fehlende Parameter"}), 400
+        if period not in ds.PERIODS:
+            return jsonify({"message": "Ungültiger Parameter period"}), 400
+        if element not in ("tmin", "tmax"):
+            return jsonify({"message": "Ungültiger Parameter element"}), 400
+        if zoom > surface.MAX_ZOOM or x >= 2 ** zoom or y >= 2 ** zoom:
+            return jsonify({"message": "Ungültige Kachel"}), 400
+
+        tile = ds.get_surface_tile(zoom, x, y, year, period, element)
+
+        return Response(tile, mimetype="image/png", headers={"Cache-Control": "public, max-age=300"})
+
+    @app.route('/get_surface', methods=['POST'])
+    def get_surface():
+        data = request.json
+        bounds = [data.get(name) for name in ('north', 'south', 'east', 'west')]
+        year = data.get('year')
+        resolution = data.get('resolution', 0.5)
+        period = data.get('period', 'annual')
+        element = data.get('element', 'tmax')
+
+        if any(bound is None for bound in bounds) or not year:
+            return jsonify({"message": "Fehlende Parameter"}), 400
+        north, south, east, west = bounds
+        if not -90 <= south < north <= 90 or not -180 <= west < east <= 180:
+            return jsonify({"message": "Ungültiger Parameter north/south/east/west"}), 400
+        if not isinstance(resolution, (int, float)) or resolution <= 0 \
+                or ((north - south) / resolution + 1) * ((east - west) / resolution + 1) > SURFACE_MAX_POINTS:
+            return jsonify({"message": "Ungültiger Parameter resolution"}), 400
+        if period not in ds.PERIODS:
+            return jsonify({"message": "Ungültiger Parameter period"}), 400
+        if element not in ("tmin", "tmax"):
+            return jsonify({"message": "Ungültiger Parameter element"}), 400
+
+        grid = ds.get_surface_grid(north, south, east, west, resolution, int(year), period, element)
+
+        return jsonify(grid), 200
+
+    @app.route('/export', methods=['POST'])
+    def export_series():
+        data = request.json
+        station_names = data.get('stationNames')
+        latitude = data.get('latitude')
+        longitude = data.get('longitude')
+        radius = data.get('radius')
+        year_start = data.get('yearStart')
+        year_end = data.get('yearEnd')
+        resolution = data.get('resolution', 'monthly')
+        periods = data.get('periods', ['annual'])
+        file_format = data.get('format', 'csv')
+        min_coverage = data.get('minCoverage', MIN_YEAR_COVERAGE)
+
+        region = latitude is not None and longitude is not None and radius
+        if not (station_names or region) or not year_start or not year_end:
+            return jsonify({"message": "Fehlende Parameter"}), 400
+        if station_names and (not isinstance(station_names, list)
+                              or not all(isinstance(name, str) for name in station_names)):
+            return jsonify({"message": "Ungültiger Parameter stationNames"}), 400
+        if resolution not in export.COLUMNS:
+            return jsonify({"message": "Ungültiger Parameter resolution"}), 400
+        if not isinstance(periods, list) or not periods or any(period not in ds.PERIODS for period in periods):
+            return jsonify({"message": "Ungültiger Parameter periods"}), 400
+        if file_format not in export.FORMATS:
+            return jsonify({"message": "Ungültiger Parameter format"}), 400
+        if not valid_min_coverage(min_coverage):
+            return jsonify({"message": "Ungültiger Parameter minCoverage"}), 400
+        if file_format == "parquet" and not export.parquet_available():
+            return jsonify({"message": "Parquet-Export nicht verfügbar (pyarrow fehlt)"}), 501
+        try:
+            year_start, year_end = int(year_start), int(year_end)
+        except (TypeError, ValueError):
+            return jsonify({"message": "Ungültiger Parameter yearStart/yearEnd"}), 400
+
+        if not station_names:
+            station_names = export.region_station_ids(latitude, longitude, radius, year_start, year_end, min_coverage)
+        chunks = export.export_chunks(station_names, year_start, year_end, resolution, periods, file_format)
+
+        return Response(chunks, mimetype=export.FORMATS[file_format],
+                        headers={"Content-Disposition": f'attachment; filename="export_{resolution}.{file_format}"'})
+
+    @app.route('/jobs', methods=['POST'])
+    def submit_job():
+        data = request.json
+        kind = data.get('kind')
+        params = data.get('params', {})
+
+        if not kind:
+            return jsonify({"message": "Fehlende Parameter"}), 400
+        try:
+            job, created = jobs.manager.submit(kind, params)
+        except jobs.JobError as error:
+            return jsonify({"message": str(error)}), 400
+        except jobs.JobQueueFull:
+            return jsonify({"message": "Server ausgelastet, bitte erneut versuchen"}), 503, {"Retry-After": "5"}
+
+        return jsonify(job), 202 if created else 200, {"Location": f"/jobs/{job['jobId']}"}
+
+    @app.route('/jobs/<job_id>', methods=['GET'])
+    def job_status(job_id):
+        job = jobs.manager.status(job_id)
+        if job is None:
+            return jsonify({"message": "Unbekannter Job"}), 404
+
+        return jsonify(job), 200
+
+    @app.route('/jobs/<job_id>/result', methods=['GET'])
+    def job_result(job_id):
+        result = jobs.manager.result(job_id)
+        if result is None:
+            return jsonify({"message": "Unbekannter Job"}), 404
+        status, body, error = result
+        if status == "failed":
+            return jsonify({"message": "Job fehlgeschlagen", "error": error}), 500
+        if status != "done":
+            return jsonify({"message": "Job noch nicht abgeschlossen", "status": status}), 409
+
+        # The result is stored as JSON text and sent without parsing it again
+        return Response(body, mimetype="application/json")
+
+    @app.route('/jobs/<job_id>/events', methods=['GET'])
+    def job_events(job_id):
+        if jobs.manager.status(job_id) is None:
+            return jsonify({"message": "Unbekannter Job"}), 404
+
+        def events():
+            # Server-sent events: one message per change of status or progress until the job ends.
+            # The stream is closed after JOB_EVENTS_MAX_SECONDS, the client reconnects after "retry"
+            # milliseconds and gets the current state first.
+            yield f"retry: {int(JOB_PROGRESS_INTERVAL * 1000)}\n\n"
+            ends = time.monotonic() + JOB_EVENTS_MAX_SECONDS
+            last = None
+            while True:
+                job = jobs.manager.status(job_id)
+                if job is None:
+                    return
+                state = (job["status"], job["progress"])
+                if state != last:
+                    last = state
+                    yield f"data: {json.dumps(job)}\n\n"
+                if job["status"] in jobs.FINISHED or time.monotonic() >= ends:
+                    return
+                time.sleep(JOB_PROGRESS_INTERVAL)
+
+        return Response(events(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
@@ -0,0 +1,408 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+import year_coverage
+import deadlines
+import queries
+import query_log
+from storage_backend import (StorageBackend, WriteSession, station_rows, datapoint_rows, element_value_rows,
+                             daily_value_rows, STATION_IDS_PER_QUERY)
+
+# Monthly values of all ingested elements, one row per station, element and month
+ELEMENT_VALUE_TABLE = """
+    CREATE TABLE IF NOT EXISTS ElementValue (
+        SID INT NOT NULL,
+        element CHAR(4) NOT NULL,
+        year INT NOT NULL,
+        month INT NOT NULL,
+        value FLOAT NOT NULL,
+        days INT NOT NULL,
+        PRIMARY KEY (SID, element, year, month),
+        FOREIGN KEY (SID) REFERENCES Station(SID) ON DELETE CASCADE
+    ) WITHOUT ROWID;
+    """
+
+# Compressed daily values, one blob per station, element and year
+DAILY_VALUE_TABLE = """
+    CREATE TABLE IF NOT EXISTS DailyValue (
+        SID INT NOT NULL,
+        element CHAR(4) NOT NULL,
+        year INT NOT NULL,
+        data BLOB NOT NULL,
+        PRIMARY KEY (SID, element, year),
+        FOREIGN KEY (SID) REFERENCES Station(SID) ON DELETE CASCADE
+    ) WITHOUT ROWID;
+    """
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS Station (
+        SID INTEGER PRIMARY KEY AUTOINCREMENT,
+        station_id VARCHAR(50),
+        station_name VARCHAR(50),
+        latitude FLOAT NOT NULL,
+        longitude FLOAT NOT NULL,
+        first_tmax INT NOT NULL,
+        latest_tmax INT NOT NULL,
+        first_tmin INT NOT NULL,
+        latest_tmin INT NOT NULL,
+        coverage VARCHAR(128) NOT NULL DEFAULT ''
+    );
+
+    CREATE TABLE IF NOT EXISTS Datapoint (
+        DID INTEGER PRIMARY KEY AUTOINCREMENT,
+        SID INT NOT NULL,
+        year INT NOT NULL,
+        month INT NOT NULL,
+        tmax FLOAT NOT NULL,
+        tmin FLOAT NOT NULL,
+        FOREIGN KEY (SID) REFERENCES Station(SID) ON DELETE CASCADE
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_station_id ON Station (station_id);
+    CREATE INDEX IF NOT EXISTS idx_datapoint_sid_year ON Datapoint (SID, year, month);
+
+    CREATE TABLE IF NOT EXISTS DatasetVersion (
+        version INT PRIMARY KEY,
+        action VARCHAR(20) NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+
+    CREATE TABLE IF NOT EXISTS YearlyAggregate (
+        station_id VARCHAR(50) NOT NULL,
+        year INT NOT NULL,
+        period VARCHAR(10) NOT NULL,
+        tmin FLOAT NOT NULL,
+        tmax FLOAT NOT NULL,
+        PRIMARY KEY (station_id, period, year)
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_aggregate_period_year ON YearlyAggregate (period, year);
+    """ + ELEMENT_VALUE_TABLE + DAILY_VALUE_TABLE + queries.JOB_TABLE + queries.REQUEST_LOG_TABLE
+
+# Shadow tables of a new dataset version, secondary indexes are created by publish_shadow().
+# SQLite cannot add a foreign key later, so it is part of the table definition.
+SHADOW_SCHEMA = """
+    DROP TABLE IF EXISTS DailyValue_new;
+    DROP TABLE IF EXISTS ElementValue_new;
+    DROP TABLE IF EXISTS Datapoint_new;
+    DROP TABLE IF EXISTS Station_new;
+
+    CREATE TABLE Station_new (
+        SID INTEGER PRIMARY KEY AUTOINCREMENT,
+        station_id VARCHAR(50),
+        station_name VARCHAR(50),
+        latitude FLOAT NOT NULL,
+        longitude FLOAT NOT NULL,
+        first_tmax INT NOT NULL,
+        latest_tmax INT NOT NULL,
+        first_tmin INT NOT NULL,
+        latest_tmin INT NOT NULL,
+        coverage VARCHAR(128) NOT NULL DEFAULT ''
+    );
+
+    CREATE TABLE Datapoint_new (
+        DID INTEGER PRIMARY KEY AUTOINCREMENT,
+        SID INT NOT NULL,
+        year INT NOT NULL,
+        month INT NOT NULL,
+        tmax FLOAT NOT NULL,
+        tmin FLOAT NOT NULL,
+        FOREIGN KEY (SID) REFERENCES Station_new(SID) ON DELETE CASCADE
+    );
+    """ + queries.for_tables(ELEMENT_VALUE_TABLE + DAILY_VALUE_TABLE, queries.SHADOW_SUFFIX)
+
+
+def to_qmark(query):
+    """
+    Converts the %s placeholders of the shared SQL statements to SQLite's ? style.
+
+    :param query: SQL statement using %s placeholders.
+    :return: SQL statement using ? placeholders.
+    """
+
+    return query.replace("%s", "?")
+
+
+class SQLiteWriteSession(WriteSession):
+    def __init__(self, connection, suffix=""):
+        """
+        Write session on the SQLite connection of the current thread.
+
+        :param connection: sqlite3 connection.
+        :param suffix: Suffix of the tables written to, queries.SHADOW_SUFFIX for a new dataset version.
+        """
+        self.connection = connection
+        self.suffix = suffix
+
+    def get_stations(self):
+        return self.connection.execute(queries.for_tables("SELECT * FROM Station;", self.suffix)).fetchall()
+
+    def insert_stations(self, stations):
+        self.connection.executemany(to_qmark(queries.for_tables(queries.INSERT_STATION, self.suffix)),
+                                    station_rows(stations))
+
+    def has_datapoints(self):
+        query = queries.for_tables("SELECT 1 FROM Datapoint LIMIT 1;", self.suffix)
+        return self.connection.execute(query).fetchone() is not None
+
+    def insert_datapoints(self, sid, datapoints):
+        self.connection.execute(to_qmark(queries.for_tables(queries.UPDATE_COVERAGE, self.suffix)),
+                                (year_coverage.encode(year_coverage.from_datapoints(datapoints)), sid))
+        self.connection.executemany(to_qmark(queries.for_tables(queries.INSERT_DATAPOINT, self.suffix)),
+                                    datapoint_rows(sid, datapoints))
+
+    def insert_element_values(self, sid, rows):
+        self.connection.executemany(to_qmark(queries.for_tables(queries.INSERT_ELEMENT_VALUE, self.suffix)),
+                                    element_value_rows(sid, rows))
+
+    def insert_daily_values(self, sid, rows):
+        self.connection.executemany(to_qmark(queries.for_tables(queries.INSERT_DAILY_VALUE, self.suffix)),
+                                    daily_value_rows(sid, rows))
+
+    def commit(self):
+        self.connection.commit()
+
+    def rollback(self):
+        self.connection.rollback()
+
+    def execute(self, query, params=()):
+        return self.connection.execute(to_qmark(query), params).rowcount
+
+    def execute_many(self, query, rows):
+        self.connection.executemany(to_qmark(query), rows)
+
+    def fetch_all(self, query, params=()):
+        return self.connection.execute(to_qmark(query), params).fetchall()
+
+
+class SQLiteBackend(StorageBackend):
+    def __init__(self, path: str):
+        """
+        Embedded storage in a single SQLite file. Needs no database server, so small
+        deployments, tests and benchmarks run in one process.
+
+        :param path: Path of the database file (str), created with the schema if missing.
+        """
+        self.path = path
+        self.local = threading.local()
+
+        with self.connection() as connection:
+            connection.executescript(SCHEMA)
+            columns = [row[1] for row in connection.execute("PRAGMA table_info(Station);")]
+            if "coverage" not in columns:
+                connection.execute(queries.ADD_COVERAGE_COLUMN)
+
+    def connection(self):
+        """
+        Returns the connection of the current thread. sqlite3 connections must not be
+        shared between threads, WAL mode lets readers run in parallel to the ingestion.
+
+        :return: sqlite3 connection.
+        """
+
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode = WAL;")
+            connection.execute("PRAGMA synchronous = NORMAL;")
+            connection.execute("PRAGMA foreign_keys = ON;")
+            self.local.connection = connection
+        return connection
+
+    @contextmanager
+    def write_session(self):
+        connection = self.connection()
+        try:
+            yield SQLiteWriteSession(connection)
+        except Exception:
+            connection.rollback()
+            raise
+
+    def ensure_schema(self):
+        # Created with SCHEMA when the backend is opened
+        pass
+
+    def write_transaction(self):
+        return self.write_session()
+
+    @contextmanager
+    def shadow_session(self, create=True):
+        connection = self.connection()
+        if create:
+            connection.executescript(SHADOW_SCHEMA)
+        try:
+            yield SQLiteWriteSession(connection, queries.SHADOW_SUFFIX)
+        except Exception:
+            connection.rollback()
+            raise
+
+    def table_exists(self, name):
+        query = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?;"
+        return self.connection().execute(query, (name,)).fetchone() is not None
+
+    def run_statements(self, statements, action):
+        """
+        Executes DDL statements in one transaction (SQLite's DDL is transactional, so the
+        renames become visible together) and records the next dataset version.
+
+        :param statements: Callable (next version) -> list of statements.
+        :param action: Name of the change for the DatasetVersion table.
+        :return: New dataset version (int).
+        """
+
+        connection = self.connection()
+        connection.commit()
+        connection.execute("BEGIN IMMEDIATE;")
+        try:
+            version = connection.execute(queries.DATASET_VERSION_QUERY).fetchone()[0] + 1
+            for statement in statements(version):
+                connection.execute(statement)
+            connection.execute(to_qmark(queries.INSERT_DATASET_VERSION), (version, action))
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        return version
+
+    def publish_shadow(self):
+        new, old = queries.SHADOW_SUFFIX, queries.PREVIOUS_SUFFIX
+        return self.run_statements(lambda version: queries.build_index_statements(new, version) + [
+            # Children first, dropping a parent table would cascade into its datapoints
+            f"DROP TABLE IF EXISTS DailyValue{old};",
+            f"DROP TABLE IF EXISTS ElementValue{old};",
+            f"DROP TABLE IF EXISTS Datapoint{old};",
+            f"DROP TABLE IF EXISTS Station{old};",
+            # Renaming a parent table also rewrites the foreign key of its child table
+            f"ALTER TABLE Station RENAME TO Station{old};",
+            f"ALTER TABLE Station{new} RENAME TO Station;",
+            f"ALTER TABLE Datapoint RENAME TO Datapoint{old};",
+            f"ALTER TABLE Datapoint{new} RENAME TO Datapoint;",
+            f"ALTER TABLE ElementValue RENAME TO ElementValue{old};",
+            f"ALTER TABLE ElementValue{new} RENAME TO ElementValue;",
+            f"ALTER TABLE DailyValue RENAME TO DailyValue{old};",
+            f"ALTER TABLE DailyValue{new} RENAME TO DailyValue;",
+        ], "publish")
+
+    def rollback_version(self):
+        old = queries.PREVIOUS_SUFFIX
+        if not self.table_exists(f"Station{old}"):
+            raise ValueError("No previous dataset version to roll back to")
+
+        return self.run_statements(lambda version: [
+            # Versions published before the ElementValue/DailyValue tables existed get empty ones
+            queries.for_tables(ELEMENT_VALUE_TABLE, old),
+            queries.for_tables(DAILY_VALUE_TABLE, old),
+            "ALTER TABLE Station RENAME TO Station_swap;",
+            f"ALTER TABLE Station{old} RENAME TO Station;",
+            f"ALTER TABLE Station_swap RENAME TO Station{old};",
+            "ALTER TABLE Datapoint RENAME TO Datapoint_swap;",
+            f"ALTER TABLE Datapoint{old} RENAME TO Datapoint;",
+            f"ALTER TABLE Datapoint_swap RENAME TO Datapoint{old};",
+            "ALTER TABLE ElementValue RENAME TO ElementValue_swap;",
+            f"ALTER TABLE ElementValue{old} RENAME TO ElementValue;",
+            f"ALTER TABLE ElementValue_swap RENAME TO ElementValue{old};",
+            "ALTER TABLE DailyValue RENAME TO DailyValue_swap;",
+            f"ALTER TABLE DailyValue{old} RENAME TO DailyValue;",
+            f"ALTER TABLE DailyValue_swap RENAME TO DailyValue{old};",
+        ], "rollback")
+
+    def get_dataset_version(self):
+        return self.fetch_all(queries.DATASET_VERSION_QUERY)[0][0]
+
+    def rebuild_aggregates(self):
+        connection = self.connection()
+        connection.commit()
+        connection.execute("BEGIN IMMEDIATE;")
+        try:
+            for statement in queries.build_aggregate_statements():
+                connection.execute(statement)
+            connection.execute("DROP TABLE YearlyAggregate;")
+            connection.execute("ALTER TABLE YearlyAggregate_new RENAME TO YearlyAggregate;")
+            # Index names are global in SQLite, so the index is created after the old table is gone
+            connection.execute(queries.AGGREGATE_INDEX.format(table="YearlyAggregate"))
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        return self.fetch_all("SELECT COUNT(*) FROM YearlyAggregate;")[0][0]
+
+    def fetch_all(self, query, params=()):
+        """
+        Executes a read-only statement and returns all rows.
+
+        :param query: SQL statement using %s placeholders.
+        :param params: Statement parameters.
+        :return: List of result rows.
+        """
+
+        deadlines.check()
+        connection = self.connection()
+        if deadlines.remaining() is None:
+            return query_log.execute(connection.cursor(), to_qmark(query), params, explain_prefix="EXPLAIN QUERY PLAN ")
+
+        # SQLite has no statement timeout: the progress handler aborts the statement
+        # once the request deadline has passed
+        connection.set_progress_handler(deadlines.expired, 10_000)
+        try:
+            return query_log.execute(connection.cursor(), to_qmark(query), params, explain_prefix="EXPLAIN QUERY PLAN ")
+        except sqlite3.OperationalError as error:
+            if deadlines.expired():
+                raise deadlines.DeadlineExceeded(str(error)) from error
+            raise
+        finally:
+            connection.set_progress_handler(None, 0)
+
+    def stream_rows(self, query, params=(), batch_size=10_000):
+        deadlines.check()
+        cursor = self.connection().execute(to_qmark(query), params)
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cursor.close()
+
+    def fetch_primary(self, query, params=()):
+        # A single database file: every read sees the committed writes
+        return self.fetch_all(query, params)
+
+    def get_station_catalog(self):
+        return self.fetch_all(queries.STATION_CATALOG_QUERY)
+
+    def get_stations_for_period(self, first_year, last_year):
+        return self.fetch_all(queries.STATIONS_FOR_PERIOD_QUERY, (first_year, last_year, first_year, last_year))
+
+    def get_aggregates(self, station_id, first_year, last_year):
+        sid = self.fetch_all(queries.SID_QUERY, (station_id,))[0][0]
+        return [self.fetch_all(query, params)
+                for query, params in queries.build_aggregation_queries(sid, first_year, last_year)]
+
+    def get_regional_sums(self, station_weights, first_year, last_year):
+        rows = []
+        for start in range(0, len(station_weights), STATION_IDS_PER_QUERY):
+            chunk = station_weights[start:start + STATION_IDS_PER_QUERY]
+            params = [value for station_weight in chunk for value in station_weight] + [first_year, last_year]
+            rows.extend(self.fetch_all(queries.build_regional_sums_query(len(chunk)), params))
+        return rows
+
+    def get_yearly_aggregates(self, station_ids, period, first_year, last_year):
+        rows = []
+        for start in range(0, len(station_ids), STATION_IDS_PER_QUERY):
+            chunk = list(station_ids[start:start + STATION_IDS_PER_QUERY])
+            rows.extend(self.fetch_all(queries.build_yearly_aggregates_query(len(chunk)),
+                                       chunk + [period, first_year, last_year]))
+        return rows
+
+    def get_surface_values(self, period, year):
+        return self.fetch_all(queries.SURFACE_VALUES_QUERY, (period, year))
+
+    def get_element_values(self, station_id, element, first_year, last_year):
+        return self.fetch_all(queries.ELEMENT_VALUES_QUERY, (station_id, element, first_year, last_year))
+
+    def get_daily_values(self, station_id, element, first_year, last_year):
+        return self.fetch_all(queries.DAILY_VALUES_QUERY, (station_id, element, first_year, last_year))
+
+    def has_stations(self):
+        return len(self.fetch_all("SELECT 1 FROM Station LIMIT 1;")) > 0
@@ -2,6 +2,7 @@ let map;
 let currentMarker = null;
 let currentCircle = null;
 let weatherStationMarkers = [];
+let surfaceLayer = null;
 
 async function initMap() {
     map = new google.maps.Map(document.getElementById("map"), {
@@ -125,6 +126,38 @@ function addWeatherStations(stations) {
     });
 }
 
+function surfaceTileUrl(coord, zoom, year, period, element) {
+    const tiles = 1 << zoom;
+    if (coord.y < 0 || coord.y >= tiles) {
+        return null;
+    }
+    const x = ((coord.x % tiles) + tiles) % tiles;
+    return `/surface/${zoom}/${x}/${coord.y}.png?year=${year}&period=${period}&element=${element}`;
+}
+
+function showSurface(year, period = "annual", element = "tmax") {
+    clearSurface();
+    surfaceLayer = new google.maps.ImageMapType({
+        getTileUrl: (coord, zoom) => surfaceTileUrl(coord, zoom, year, period, element),
+        tileSize: new google.maps.Size(256, 256),
+        maxZoom: 12,
+        opacity: 0.8,
+        name: "Temperature"
+    });
+    map.overlayMapTypes.push(surfaceLayer);
+}
+
+function clearSurface() {
+    if (!surfaceLayer) {
+        return;
+    }
+    const index = map.overlayMapTypes.getArray().indexOf(surfaceLayer);
+    if (index >= 0) {
+        map.overlayMapTypes.removeAt(index);
+    }
+    surfaceLayer = null;
+}
+
 /**
  * =========================================================
  * GLOBAL FUNCTIONS FOR TESTING
@@ -138,3 +171,6 @@ window.handleRightClick = handleRightClick;
 window.createCustomMarker = createCustomMarker;
 window.clearWeatherStations = clearWeatherStations;
 window.addWeatherStations = addWeatherStations;
+window.surfaceTileUrl = surfaceTileUrl;
+window.showSurface = showSurface;
+window.clearSurface = clearSurface;
@@ -34,6 +34,63 @@ class Station:
                 f"measure tmin first/last={self.first_measure_tmin}/{self.last_measure_tmin})")
 
 
+def parse_station_names(content: str):
+    """
+    Reads the station names from the contents of ghcnd-stations.txt.
+
+    :param content: File contents.
+    :return: Dictionary station ID -> station name.
+    """
+
+    station_dict = {}
+
+    for row in content.splitlines():
+        station_id = row[:11]
+        station_name = row[41:71].strip()
+        station_dict[station_id] = station_name
+
+    return station_dict
+
+
+def parse_inventory(content: str, station_dict: dict):
+    """
+    Creates the station objects from the contents of ghcnd-inventory.txt. Stations without
+    TMAX measurements are skipped.
+
+    :param content: File contents.
+    :param station_dict: Station names from parse_station_names.
+    :return: A list of station objects.
+    """
+
+    stations = []
+
+    latest_station_id = ""
+
+    station = Station(id="", name="", latitude=0, longitude=0) # Created so "station" variable exists.
+    stations.append(station)
+
+    for row in content.splitlines():
+        station_id = row[:11]
+        if latest_station_id != station_id:
+            if station.last_measure_tmax == 0:
+                stations.remove(station)
+            station = Station(
+                id=station_id,
+                name=station_dict[station_id],
+                latitude=float(row[12:20]),
+                longitude=float(row[21:30])
+            )
+            latest_station_id = station_id
+            stations.append(station)
+        if row[31:35] == "TMAX":
+            station.first_measure_tmax = int(row[36:40])
+            station.last_measure_tmax = int(row[41:45])
+        if row[31:35] == "TMIN":
+            station.first_measure_tmin = int(row[36:40])
+            station.last_measure_tmin = int(row[41:45])
+    return stations
+
+
 def load_stations_from_url(url_inventory: str, url_stations: str):
     """
     Loads the station data from a URL and creates a list of station objects.
@@ -50,13 +107,7 @@ def load_stations_from_url(url_inventory: str, url_stations: str):
     station_dict = {}
 
     if response.status_code == 200:
-
-        content = response.text
-
-        for row in content.splitlines():
-            station_id = row[:11]
-            station_name = row[41:71].strip()
-            station_dict[station_id] = station_name
+        station_dict = parse_station_names(response.text)
     else:
         print(f"Failed to load the file: HTTP {response.status_code}")
 
@@ -66,37 +117,24 @@ def load_stations_from_url(url_inventory: str, url_stations: str):
     response = requests.get(url_inventory)
     print(f"Status-Code: {response.status_code}")
 
-    stations = []
-
     if response.status_code == 200:
-
-        content = response.text
-
-        latest_station_id = ""
-
-        station = Station(id="", name="", latitude=0, longitude=0) # Created so "station" variable exists.
-        stations.append(station)
-
-        for row in content.splitlines():
-            station_id = row[:11]
-            if latest_station_id != station_id:
-                if station.last_measure_tmax == 0:
-                    stations.remove(station)
-                station = Station(
-                    id=station_id,
-                    name=station_dict[station_id],
-                    latitude=float(row[12:20]),
-                    longitude=float(row[21:30])
-                )
-                latest_station_id = station_id
-                stations.append(station)
-            if row[31:35] == "TMAX":
-                station.first_measure_tmax = int(row[36:40])
-                station.last_measure_tmax = int(row[41:45])
-            if row[31:35] == "TMIN":
-                station.first_measure_tmin = int(row[36:40])
-                station.last_measure_tmin = int(row[41:45])
-        return stations
+        return parse_inventory(response.text, station_dict)
     else:
         print(f"Failed to load the file: HTTP {response.status_code}")
         return []
+
+
+def load_stations_from_files(path_inventory: str, path_stations: str):
+    """
+    Loads the station data from local copies of ghcnd-inventory.txt and ghcnd-stations.txt.
+
+    :param path_inventory: Path of the inventory file.
+    :param path_stations: Path of the stations file.
+    :return: A list of station objects.
+    """
+
+    with open(path_stations) as file:
+        station_dict = parse_station_names(file.read())
+
+    with open(path_inventory) as file:
+        return parse_inventory(file.read(), station_dict)
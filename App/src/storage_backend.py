@@ -0,0 +1,328 @@
+from abc import ABC, abstractmethod
+
+
+class StorageBackend(ABC):
+    """
+    Interface of the storage used by data_services. A backend stores the station catalog
+    and the monthly datapoints and answers the aggregate queries of the API.
+
+    Station rows returned by get_stations() have the column order of the Station table:
+    (SID, station_id, station_name, latitude, longitude, first_tmax, latest_tmax, first_tmin, latest_tmin)
+    """
+
+    @abstractmethod
+    def write_session(self):
+        """
+        Opens a write session (context manager yielding a WriteSession) for the ingestion.
+        Changes become visible after WriteSession.commit().
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def ensure_schema(self):
+        """
+        Creates missing tables and columns, e.g. of databases set up before the Job,
+        RequestLog or ElementValue tables existed. The statements run once per process,
+        later calls return immediately.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def write_transaction(self):
+        """
+        Opens a write session (context manager yielding a WriteSession) on a plain write
+        connection for small writes outside the ingestion, e.g. the state of a job. Issues
+        no schema statements, see ensure_schema().
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_station_catalog(self):
+        """
+        Returns all stations as (station_id, station_name, latitude, longitude,
+        first_tmin, latest_tmin, first_tmax, latest_tmax, coverage).
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_stations_for_period(self, first_year, last_year):
+        """
+        Returns (station_id, station_name, latitude, longitude) of all stations with Tmin
+        and Tmax measurements covering the whole period.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_aggregates(self, station_id, first_year, last_year):
+        """
+        Returns the ten annual and seasonal Tmin/Tmax series of a station in the order
+        of queries.build_aggregation_queries.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_regional_sums(self, station_weights, first_year, last_year):
+        """
+        Sums the precomputed aggregates of the YearlyAggregate table (see rebuild_aggregates)
+        over several stations, multiplied by their weights.
+
+        :param station_weights: List of (station_id, weight) tuples.
+        :return: List of (period, year, weight sum, weighted Tmin sum, weighted Tmax sum),
+                 one query per STATION_IDS_PER_QUERY stations, so (period, year) may repeat.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_yearly_aggregates(self, station_ids, period, first_year, last_year):
+        """
+        Returns the precomputed aggregates of the stations in one period ("annual", "spring",
+        ..., "winter") as (station_id, year, tmin, tmax), one query per STATION_IDS_PER_QUERY stations.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_surface_values(self, period, year):
+        """
+        Returns the precomputed aggregates of all stations in one period and year together
+        with the station positions as (latitude, longitude, tmin, tmax).
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_element_values(self, station_id, element, first_year, last_year):
+        """
+        Returns the monthly values of one element of a station as (year, month, value, days).
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_daily_values(self, station_id, element, first_year, last_year):
+        """
+        Returns the compressed daily values of one element of a station as (year, blob),
+        only for the years of the range.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def has_stations(self):
+        """
+        Returns True if the station catalog is not empty. Used by the readiness probe:
+        returns False quickly if the storage is not reachable.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def shadow_session(self, create=True):
+        """
+        Opens a write session (context manager yielding a WriteSession) on empty shadow
+        tables for a new dataset version. The live tables are not touched, and the shadow
+        tables have no secondary indexes until publish_shadow().
+
+        :param create: Recreate the shadow tables. False joins the tables of a running
+                       ingestion, e.g. as worker of the distributed ingestion.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def publish_shadow(self):
+        """
+        Builds the indexes of the shadow tables and swaps them atomically with the live
+        tables. The previous version is kept for rollback_version().
+
+        :return: New dataset version (int).
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def rollback_version(self):
+        """
+        Swaps the previous dataset version back in. The replaced version is kept, so a
+        second rollback restores it again.
+
+        :return: New dataset version (int).
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_dataset_version(self):
+        """
+        Returns the number of the live dataset version, 0 before the first swap.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def rebuild_aggregates(self):
+        """
+        Recomputes the YearlyAggregate table from the live datapoints into a new table
+        and swaps it in, so readers see either the old or the new aggregates.
+
+        :return: Number of aggregate rows (int).
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def fetch_all(self, query, params=()):
+        """
+        Executes a read-only statement and returns all rows.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def stream_rows(self, query, params=(), batch_size=10_000):
+        """
+        Executes a read-only statement with a server-side cursor and yields the rows in
+        lists of up to batch_size, so large results are never held in memory at once. The
+        connection stays in use until the generator is exhausted or closed.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def fetch_primary(self, query, params=()):
+        """
+        Executes a read-only statement on the primary database, for rows that were just
+        written (e.g. the state of a job) and may not have reached a replica yet.
+        """
+        raise NotImplementedError
+
+
+class WriteSession(ABC):
+    """
+    Write access of a backend during the ingestion.
+    """
+
+    @abstractmethod
+    def get_stations(self):
+        """
+        Returns all rows of the Station table.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def insert_stations(self, stations):
+        """
+        Inserts a list of station.Station objects.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def has_datapoints(self):
+        """
+        Returns True if at least one datapoint is stored.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def insert_datapoints(self, sid, datapoints):
+        """
+        Inserts a list of datapoint.DataPoint objects for the station with the primary key sid
+        and stores the year coverage bitmap of the station.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def insert_element_values(self, sid, rows):
+        """
+        Inserts the monthly element values of the station with the primary key sid as
+        (year, month, element, value, days) tuples, see datapoint.parse_elements.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def insert_daily_values(self, sid, rows):
+        """
+        Inserts the compressed daily values of the station with the primary key sid as
+        (element, year, blob) tuples, see daily_store.encode_years.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def commit(self):
+        """
+        Commits all changes of the session.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def rollback(self):
+        """
+        Discards all uncommitted changes of the session.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def execute(self, query, params=()):
+        """
+        Executes a statement of queries.py in the session's transaction.
+
+        :return: Number of affected rows.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def execute_many(self, query, rows):
+        """
+        Executes a statement of queries.py once per parameter tuple.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def fetch_all(self, query, params=()):
+        """
+        Executes a query of queries.py in the session's transaction and returns all rows.
+        """
+        raise NotImplementedError
+
+
+# Stations per query of get_regional_sums, two parameters each stay below SQLite's
+# historic limit of 999 host parameters
+STATION_IDS_PER_QUERY = 400
+
+
+def station_rows(stations):
+    """
+    Converts Station objects into parameter tuples in the column order of the Station insert.
+
+    :param stations: List of station.Station objects.
+    :return: List of tuples.
+    """
+
+    return [(station.id, station.name, station.latitude, station.longitude, station.first_measure_tmax,
+             station.last_measure_tmax, station.first_measure_tmin, station.last_measure_tmin)
+            for station in stations]
+
+
+def datapoint_rows(sid, datapoints):
+    """
+    Converts DataPoint objects into parameter tuples (SID, year, month, tmax, tmin).
+
+    :param sid: Primary key of the station.
+    :param datapoints: List of datapoint.DataPoint objects.
+    :return: List of tuples.
+    """
+
+    return [(sid, str(datapoint.date)[:4], str(datapoint.date)[-2:], datapoint.tmax, datapoint.tmin)
+            for datapoint in datapoints]
+
+
+def element_value_rows(sid, rows):
+    """
+    Converts records of datapoint.parse_elements into parameter tuples (SID, element, year, month, value, days).
+
+    :param sid: Primary key of the station.
+    :param rows: List of (year, month, element, value, days) tuples.
+    :return: List of tuples.
+    """
+
+    return [(sid, element, year, month, value, days) for year, month, element, value, days in rows]
+
+
+def daily_value_rows(sid, rows):
+    """
+    Converts blobs of daily_store.encode_years into parameter tuples (SID, element, year, data).
+
+    :param sid: Primary key of the station.
+    :param rows: List of (element, year, blob) tuples.
+    :return: List of tuples.
+    """
+
+    return [(sid, element, year, blob) for element, year, blob in rows]
@@ -0,0 +1,243 @@
+import math
+import struct
+import zlib
+import numpy as np
+import calculations as calc
+import deadlines
+
+# =========================================================
+# Interpolated temperature surfaces
+# =========================================================
+# The yearly values of the stations are interpolated onto a regular grid by inverse
+# distance weighting of the SURFACE_NEIGHBOURS nearest stations within the search radius.
+# A SpatialIndex sorts the stations into cells of one degree, so every block of grid points
+# only computes distances to the stations of the cells around it.
+
+EARTH_RADIUS = 6371  # km, as in calculations.haversine
+KM_PER_DEGREE = EARTH_RADIUS * math.pi / 180
+
+# Grid points per side of a map tile; the PNG has TILE_PIXELS per side
+TILE_GRID = 64
+TILE_PIXELS = 256
+MAX_ZOOM = 12
+
+# Grid points per side of the blocks sharing one station lookup, and maximum number of
+# entries of a distance matrix (grid points x stations)
+BLOCK_SIDE = 32
+MATRIX_SIZE = 2_000_000
+
+# Color scale of the PNG tiles: (°C, red, green, blue), values outside are clipped
+COLOR_STOPS = (
+    (-30.0, 49, 54, 149),
+    (-15.0, 69, 117, 180),
+    (0.0, 171, 217, 233),
+    (10.0, 255, 255, 191),
+    (20.0, 253, 174, 97),
+    (30.0, 215, 48, 39),
+    (40.0, 165, 0, 38),
+)
+TILE_ALPHA = 170
+
+
+class SpatialIndex:
+    def __init__(self, latitudes, longitudes, cell_degrees: float = 1.0):
+        """
+        Sorts station positions into a grid of cells for range queries.
+
+        :param latitudes: Latitudes of the stations (NumPy array).
+        :param longitudes: Longitudes of the stations (NumPy array).
+        :param cell_degrees: Edge length of the cells in degrees (float).
+        """
+        self.cell_degrees = cell_degrees
+        self.columns = int(math.ceil(360 / cell_degrees))
+        rows = np.floor((np.asarray(latitudes) + 90) / cell_degrees).astype(np.int64)
+        columns = np.floor((np.asarray(longitudes) + 180) / cell_degrees).astype(np.int64)
+        keys = rows * self.columns + np.clip(columns, 0, self.columns - 1)
+        self.order = np.argsort(keys, kind="stable")
+        self.keys = keys[self.order]
+
+    def query(self, lat_min, lat_max, lon_min, lon_max):
+        """
+        Finds the stations in the cells overlapping a bounding box (without wrapping at the date line).
+
+        :return: Indices of the stations (NumPy array), a superset of the stations inside the box.
+        """
+
+        first_row = int(math.floor((max(lat_min, -90) + 90) / self.cell_degrees))
+        last_row = int(math.floor((min(lat_max, 90) + 90) / self.cell_degrees))
+        first_column = max(int(math.floor((lon_min + 180) / self.cell_degrees)), 0)
+        last_column = min(int(math.floor((lon_max + 180) / self.cell_degrees)), self.columns - 1)
+        if first_row > last_row or first_column > last_column:
+            return np.empty(0, dtype=np.int64)
+
+        row_starts = np.arange(first_row, last_row + 1) * self.columns
+        starts = np.searchsorted(self.keys, row_starts + first_column, side="left")
+        ends = np.searchsorted(self.keys, row_starts + last_column, side="right")
+        return np.concatenate([self.order[start:end] for start, end in zip(starts, ends)])
+
+
+def haversine_matrix(lat1, lon1, lat2, lon2):
+    """
+    Distances between all points of two sets in kilometers.
+
+    :param lat1: Latitudes of the first set (NumPy array of n values).
+    :param lon1: Longitudes of the first set.
+    :param lat2: Latitudes of the second set (NumPy array of m values).
+    :param lon2: Longitudes of the second set.
+    :return: Matrix n x m (NumPy array).
+    """
+
+    lat1, lon1 = np.radians(lat1)[:, None], np.radians(lon1)[:, None]
+    lat2, lon2 = np.radians(lat2)[None, :], np.radians(lon2)[None, :]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def interpolate(index, latitudes, longitudes, values, grid_latitudes, grid_longitudes, radius: float,
+                neighbours: int):
+    """
+    Interpolates station values at grid points by inverse distance weighting. The points
+    should lie close together (see interpolate_grid), as the stations around all of them are
+    compared with every point.
+
+    :param index: SpatialIndex of the stations.
+    :param latitudes: Latitudes of the stations (NumPy array).
+    :param longitudes: Longitudes of the stations.
+    :param values: Values of the stations.
+    :param grid_latitudes: Latitudes of the grid points (NumPy array).
+    :param grid_longitudes: Longitudes of the grid points.
+    :param radius: Search radius in kilometers.
+    :param neighbours: Maximum number of stations per grid point.
+    :return: Values at the grid points (NumPy array), NaN without a station in the radius.
+    """
+
+    result = np.full(len(grid_latitudes), np.nan)
+    if len(grid_latitudes) == 0:
+        return result
+
+    # A degree of longitude shrinks towards the poles
+    radius_degrees = radius / KM_PER_DEGREE
+    lat_min, lat_max = grid_latitudes.min() - radius_degrees, grid_latitudes.max() + radius_degrees
+    widest = max(abs(lat_min), abs(lat_max))
+    lon_margin = 180 if widest >= 89 else radius_degrees / math.cos(math.radians(widest))
+    candidates = index.query(lat_min, lat_max, grid_longitudes.min() - lon_margin, grid_longitudes.max() + lon_margin)
+    if len(candidates) == 0:
+        return result
+
+    candidate_latitudes, candidate_longitudes = latitudes[candidates], longitudes[candidates]
+    candidate_values = values[candidates]
+    step = max(1, MATRIX_SIZE // len(candidates))
+
+    for start in range(0, len(grid_latitudes), step):
+        deadlines.check()
+        distances = haversine_matrix(grid_latitudes[start:start + step], grid_longitudes[start:start + step],
+                                     candidate_latitudes, candidate_longitudes)
+        if len(candidates) > neighbours:
+            nearest = np.argpartition(distances, neighbours - 1, axis=1)[:, :neighbours]
+            distances = np.take_along_axis(distances, nearest, axis=1)
+            point_values = candidate_values[nearest]
+        else:
+            point_values = np.broadcast_to(candidate_values, distances.shape)
+
+        weights = np.where(distances <= radius,
+                           1 / np.maximum(distances, calc.IDW_MIN_DISTANCE) ** calc.IDW_POWER, 0)
+        total = weights.sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result[start:start + step] = np.where(total > 0, (weights * point_values).sum(axis=1) / total, np.nan)
+    return result
+
+
+def bbox_grid(north: float, south: float, east: float, west: float, resolution: float):
+    """
+    Creates a regular grid over a bounding box, the first row is the northern one.
+
+    :param resolution: Distance of the grid points in degrees.
+    :return: Tuple (latitudes, longitudes) of the rows and columns (NumPy arrays).
+    """
+
+    latitudes = np.arange(north, south - 1e-9, -resolution)
+    longitudes = np.arange(west, east + 1e-9, resolution)
+    return latitudes, longitudes
+
+
+def tile_grid(zoom: int, x: int, y: int, size: int = TILE_GRID):
+    """
+    Creates the grid of a web map tile (Web Mercator, as used by Google Maps) at the pixel centers.
+
+    :return: Tuple (latitudes, longitudes) of the rows and columns (NumPy arrays).
+    """
+
+    tiles = 2 ** zoom
+    offsets = (np.arange(size) + 0.5) / size
+    longitudes = (x + offsets) / tiles * 360 - 180
+    latitudes = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + offsets) / tiles))))
+    return latitudes, longitudes
+
+
+def interpolate_grid(index, latitudes, longitudes, values, grid_latitudes, grid_longitudes, radius, neighbours):
+    """
+    Interpolates the station values on the grid of all combinations of the row and column
+    coordinates, in square blocks of BLOCK_SIDE x BLOCK_SIDE points.
+
+    :return: Matrix rows x columns (NumPy array).
+    """
+
+    grid = np.full((len(grid_latitudes), len(grid_longitudes)), np.nan)
+    for row in range(0, len(grid_latitudes), BLOCK_SIDE):
+        for column in range(0, len(grid_longitudes), BLOCK_SIDE):
+            lat_mesh, lon_mesh = np.meshgrid(grid_latitudes[row:row + BLOCK_SIDE],
+                                             grid_longitudes[column:column + BLOCK_SIDE], indexing="ij")
+            block = interpolate(index, latitudes, longitudes, values, lat_mesh.ravel(), lon_mesh.ravel(), radius,
+                                neighbours)
+            grid[row:row + BLOCK_SIDE, column:column + BLOCK_SIDE] = block.reshape(lat_mesh.shape)
+    return grid
+
+
+def to_rgba(surface):
+    """
+    Colors a surface with COLOR_STOPS, missing values are transparent.
+
+    :return: Matrix rows x columns x 4 (NumPy array of uint8).
+    """
+
+    stops = np.array(COLOR_STOPS)
+    missing = np.isnan(surface)
+    values = np.where(missing, 0, surface)
+
+    rgba = np.empty(surface.shape + (4,), dtype=np.uint8)
+    for channel in range(3):
+        rgba[..., channel] = np.interp(values, stops[:, 0], stops[:, channel + 1]).round()
+    rgba[..., 3] = np.where(missing, 0, TILE_ALPHA)
+    return rgba
+
+
+def encode_png(rgba):
+    """
+    Encodes an RGBA image as PNG.
+
+    :param rgba: Matrix rows x columns x 4 (NumPy array of uint8).
+    :return: PNG file (bytes).
+    """
+
+    height, width = rgba.shape[:2]
+    # Every row starts with the filter type 0 (none)
+    raw = np.concatenate([np.zeros((height, 1), dtype=np.uint8), rgba.reshape(height, width * 4)], axis=1)
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw.tobytes(), 6))
+            + chunk(b"IEND", b""))
+
+
+def render_tile(surface, pixels: int = TILE_PIXELS):
+    """
+    Scales a tile grid up to the tile size and encodes it as PNG.
+
+    :return: PNG file (bytes).
+    """
+
+    factor = pixels // surface.shape[0]
+    return encode_png(to_rgba(np.repeat(np.repeat(surface, factor, axis=0), factor, axis=1)))
@@ -0,0 +1,260 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from station import Station
+
+# =========================================================
+# Synthetic GHCN-D dataset generator
+# =========================================================
+# Writes ghcnd-stations.txt, ghcnd-inventory.txt and one .dly file per station in the
+# fixed-width layouts of NOAA (see the GHCN-D readme.txt). Every station is generated
+# from (seed, station number) only, so the output is deterministic and stations can be
+# generated in parallel.
+
+STATION_PREFIX = "SYN"
+MISSING = -9999
+DAYS_IN_MONTH = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+# Fixed-width value field of a .dly line: VALUE (5), MFLAG, QFLAG, SFLAG
+VALUE_WIDTH = 8
+LINE_PREFIX_WIDTH = 21
+LINE_WIDTH = LINE_PREFIX_WIDTH + 31 * VALUE_WIDTH + 1  # including the newline
+
+# Lookup table from tenths of a unit (-9999 .. 9999) to the formatted value field
+VALUE_OFFSET = 9999
+VALUE_FIELDS = np.array([f"{value:5d}  S".encode() for value in range(-9999, 10000)], dtype="S8")
+VALUE_FIELDS[VALUE_OFFSET + MISSING] = b"-9999   "
+
+
+def generate_stations(count: int, first_year: int, last_year: int, seed: int = 0, clusters: int = 50,
+                      cluster_share: float = 0.8, cluster_spread: float = 2.0):
+    """
+    Creates the station catalog. A share of the stations is grouped around random cluster
+    centers (like the dense networks in the USA or Europe), the rest is spread over the globe.
+
+    :param count: Number of stations (int).
+    :param first_year: First year of the measurements (int).
+    :param last_year: Last year of the measurements (int).
+    :param seed: Random seed (int).
+    :param clusters: Number of cluster centers (int).
+    :param cluster_share: Share of the stations placed in clusters, 0 to 1 (float).
+    :param cluster_spread: Standard deviation of the distance to the cluster center in degrees (float).
+    :return: List of station objects with TMAX/TMIN first and last years.
+    """
+
+    rng = np.random.default_rng(seed)
+
+    centers_lat = np.degrees(np.arcsin(rng.uniform(-0.95, 0.95, max(clusters, 1))))
+    centers_lon = rng.uniform(-180, 180, max(clusters, 1))
+
+    clustered = rng.random(count) < cluster_share
+    cluster = rng.integers(0, max(clusters, 1), count)
+    # Uniform on the sphere for the stations outside of clusters
+    latitude = np.where(clustered, centers_lat[cluster] + rng.normal(0, cluster_spread, count),
+                        np.degrees(np.arcsin(rng.uniform(-1, 1, count))))
+    longitude = np.where(clustered, centers_lon[cluster] + rng.normal(0, cluster_spread, count),
+                         rng.uniform(-180, 180, count))
+    latitude = np.clip(latitude, -89.9, 89.9)
+    longitude = (longitude + 180) % 360 - 180
+
+    # Half of the stations cover the whole period, the others start or stop in between
+    span = last_year - first_year
+    full = rng.random(count) < 0.5
+    start = np.where(full, first_year, first_year + rng.integers(0, span + 1, count))
+    end = np.where(full | (rng.random(count) < 0.5), last_year, start + rng.integers(0, span + 1, count))
+    end = np.minimum(end, last_year)
+
+    return [
+        Station(id=f"{STATION_PREFIX}{index:08d}", name=f"SYNTHETIC STATION {index}",
+                latitude=round(float(latitude[index]), 4), longitude=round(float(longitude[index]), 4),
+                first_measure_tmax=int(start[index]), last_measure_tmax=int(end[index]),
+                first_measure_tmin=int(start[index]), last_measure_tmin=int(end[index]))
+        for index in range(count)
+    ]
+
+
+def format_station_line(station: Station):
+    """
+    Formats a station in the layout of ghcnd-stations.txt.
+
+    :param station: Station object.
+    :return: Line without newline (str).
+    """
+
+    return f"{station.id:<11} {station.latitude:8.4f} {station.longitude:9.4f} {100.0:6.1f}    {station.name:<30}"
+
+
+def format_inventory_lines(station: Station, elements=("TMAX", "TMIN")):
+    """
+    Formats the inventory entries of a station in the layout of ghcnd-inventory.txt.
+
+    :param station: Station object.
+    :param elements: Elements contained in the .dly file.
+    :return: List of lines without newline (str).
+    """
+
+    return [f"{station.id:<11} {station.latitude:8.4f} {station.longitude:9.4f} {element} "
+            f"{station.first_measure_tmax:4d} {station.last_measure_tmax:4d}"
+            for element in elements]
+
+
+def generate_dly(station: Station, index: int, seed: int = 0, missing_ratio: float = 0.05,
+                 elements=("TMAX", "TMIN")):
+    """
+    Creates the .dly file contents of a station. Temperatures follow a seasonal cycle
+    depending on the latitude (reversed on the southern hemisphere) with random weather
+    noise; PRCP is drawn from an exponential distribution.
+
+    :param station: Station object.
+    :param index: Number of the station, used with the seed for the random generator (int).
+    :param seed: Random seed (int).
+    :param missing_ratio: Share of daily values replaced by -9999, 0 to 1 (float).
+    :param elements: Elements to generate ("TMAX", "TMIN", "PRCP").
+    :return: File contents (bytes).
+    """
+
+    rng = np.random.default_rng([seed, index])
+
+    years = np.arange(station.first_measure_tmax, station.last_measure_tmax + 1)
+    months = len(years) * 12
+    if months == 0:
+        return b""
+
+    # Seasonal cycle in tenths of °C, one row per month and one column per day
+    month_of_row = np.tile(np.arange(12), len(years))
+    hemisphere = 1 if station.latitude >= 0 else -1
+    mean_temperature = 270 - 4.5 * abs(station.latitude)
+    amplitude = 20 + 3 * abs(station.latitude)
+    season = -hemisphere * np.cos((month_of_row + 0.5) / 12 * 2 * np.pi)
+    base = (mean_temperature + amplitude * season)[:, None] + rng.normal(0, 35, (months, 31))
+    diurnal = rng.uniform(60, 120, (months, 31))
+
+    values = {
+        "TMIN": np.rint(base - diurnal / 2),
+        "TMAX": np.rint(base + diurnal / 2),
+        "PRCP": np.rint(rng.exponential(25, (months, 31)) * (rng.random((months, 31)) < 0.35)),
+    }
+
+    # Days that do not exist in the month are always missing
+    days_in_month = np.tile(DAYS_IN_MONTH, len(years))
+    leap = (years % 4 == 0) & ((years % 100 != 0) | (years % 400 == 0))
+    days_in_month[np.arange(len(years)) * 12 + 1] += leap
+    nonexistent = np.arange(31)[None, :] >= days_in_month[:, None]
+
+    year_of_row = np.repeat(years, 12)
+    prefixes = np.array([f"{station.id:<11}{year:04d}{month + 1:02d}".encode()
+                         for year, month in zip(year_of_row, month_of_row)], dtype="S17")
+
+    blocks = []
+    for element in elements:
+        element_values = np.clip(values[element], -9998, 9999).astype(np.int32)
+        missing = nonexistent | (rng.random((months, 31)) < missing_ratio)
+        element_values[missing] = MISSING
+
+        block = np.empty((months, LINE_WIDTH), dtype=np.uint8)
+        block[:, :17] = prefixes.view(np.uint8).reshape(months, 17)
+        block[:, 17:21] = np.frombuffer(element.encode(), dtype=np.uint8)
+        block[:, 21:-1] = VALUE_FIELDS[element_values + VALUE_OFFSET].view(np.uint8).reshape(months, -1)
+        block[:, -1] = ord("\n")
+        blocks.append(block)
+
+    # Interleave the elements month by month like the NOAA files
+    return np.stack(blocks, axis=1).tobytes()
+
+
+def write_station_files(output_dir: str, stations, elements=("TMAX", "TMIN")):
+    """
+    Writes ghcnd-stations.txt and ghcnd-inventory.txt.
+
+    :param output_dir: Target directory (str).
+    :param stations: List of station objects.
+    :param elements: Elements listed in the inventory.
+    :return: No return value.
+    """
+
+    with open(os.path.join(output_dir, "ghcnd-stations.txt"), "w") as file:
+        for station in stations:
+            file.write(format_station_line(station) + "\n")
+
+    with open(os.path.join(output_dir, "ghcnd-inventory.txt"), "w") as file:
+        for station in stations:
+            for line in format_inventory_lines(station, elements):
+                file.write(line + "\n")
+
+
+def write_dly_files(output_dir: str, stations, first_index: int, seed: int, missing_ratio: float, elements):
+    """
+    Writes the .dly files of a consecutive range of stations (one unit of work of a worker process).
+
+    :return: Number of bytes written.
+    """
+
+    written = 0
+    for offset, station in enumerate(stations):
+        contents = generate_dly(station, first_index + offset, seed, missing_ratio, elements)
+        with open(os.path.join(output_dir, f"{station.id}.dly"), "wb") as file:
+            file.write(contents)
+        written += len(contents)
+    return written
+
+
+def write_dataset(output_dir: str, stations: int = 1000, first_year: int = 1950, last_year: int = 2020,
+                  missing_ratio: float = 0.05, clusters: int = 50, cluster_share: float = 0.8,
+                  cluster_spread: float = 2.0, seed: int = 0, elements=("TMAX", "TMIN"), workers: int = 1,
+                  chunk_size: int = 100):
+    """
+    Generates a complete dataset: output_dir/ghcnd-stations.txt, output_dir/ghcnd-inventory.txt
+    and output_dir/ghcnd_all/<station id>.dly.
+
+    :return: List of the generated station objects.
+    """
+
+    catalog = generate_stations(stations, first_year, last_year, seed, clusters, cluster_share, cluster_spread)
+
+    os.makedirs(os.path.join(output_dir, "ghcnd_all"), exist_ok=True)
+    write_station_files(output_dir, catalog, elements)
+
+    started = time.perf_counter()
+    chunks = [(catalog[start:start + chunk_size], start) for start in range(0, len(catalog), chunk_size)]
+    dly_dir = os.path.join(output_dir, "ghcnd_all")
+    done = 0
+    written = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(write_dly_files, dly_dir, chunk, start, seed, missing_ratio, elements)
+                   for chunk, start in chunks]
+        for future, (chunk, _) in zip(futures, chunks):
+            written += future.result()
+            done += len(chunk)
+            elapsed = time.perf_counter() - started
+            print(f"\r{done}/{len(catalog)} stations, {written / 1e6:.0f} MB, "
+                  f"{done / max(elapsed, 1e-9):.0f} stations/s", end="", flush=True)
+    print()
+
+    return catalog
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generates a synthetic GHCN-D dataset.")
+    parser.add_argument("output_dir")
+    parser.add_argument("--stations", type=int, default=1000)
+    parser.add_argument("--first-year", type=int, default=1950)
+    parser.add_argument("--last-year", type=int, default=2020)
+    parser.add_argument("--missing-ratio", type=float, default=0.05)
+    parser.add_argument("--clusters", type=int, default=50)
+    parser.add_argument("--cluster-share", type=float, default=0.8)
+    parser.add_argument("--cluster-spread", type=float, default=2.0)
+    parser.add_argument("--elements", default="TMAX,TMIN")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args(argv)
+
+    write_dataset(args.output_dir, args.stations, args.first_year, args.last_year, args.missing_ratio,
+                  args.clusters, args.cluster_share, args.cluster_spread, args.seed,
+                  tuple(args.elements.split(",")), args.workers)
+
+
+if __name__ == "__main__":
+    main()
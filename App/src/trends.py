@@ -0,0 +1,138 @@
+import math
+import numpy as np
+
+# =========================================================
+# Trend and anomaly statistics
+# =========================================================
+# The yearly values of many stations are arranged in a matrix (one row per station, one
+# column per year, NaN for missing years), so trends, normals and anomalies of all
+# stations are computed with a few array operations instead of a loop per station.
+
+# Trends need this many years with values, normals this share of the baseline years
+MIN_TREND_YEARS = 10
+MIN_NORMAL_SHARE = 0.8
+
+
+def station_matrix(rows, station_ids, first_year: int, last_year: int):
+    """
+    Arranges yearly values in matrices.
+
+    :param rows: List of (station_id, year, tmin, tmax) tuples.
+    :param station_ids: Station IDs in the order of the matrix rows.
+    :param first_year: Year of the first column.
+    :param last_year: Year of the last column.
+    :return: Tuple (years, tmin matrix, tmax matrix) of NumPy arrays.
+    """
+
+    years = np.arange(first_year, last_year + 1)
+    tmin = np.full((len(station_ids), len(years)), np.nan)
+    tmax = np.full((len(station_ids), len(years)), np.nan)
+
+    rows = [row for row in rows if first_year <= row[1] <= last_year]
+    if rows:
+        index = {station_id: position for position, station_id in enumerate(station_ids)}
+        stations, row_years, row_tmin, row_tmax = zip(*rows)
+        row_index = np.array([index[station_id] for station_id in stations])
+        column_index = np.array(row_years) - first_year
+        tmin[row_index, column_index] = row_tmin
+        tmax[row_index, column_index] = row_tmax
+
+    return years, tmin, tmax
+
+
+def linear_trends(values, years, min_years: int = MIN_TREND_YEARS):
+    """
+    Least-squares slopes of all rows, missing years are left out per row.
+
+    :param values: Matrix stations x years with NaN for missing values.
+    :param years: Years of the columns.
+    :param min_years: Rows with fewer values get NaN.
+    :return: Slopes in °C per decade (NumPy array).
+    """
+
+    valid = ~np.isnan(values)
+    count = valid.sum(axis=1)
+    safe_count = np.maximum(count, 1)
+
+    x_mean = np.where(valid, years, 0).sum(axis=1) / safe_count
+    y_mean = np.where(valid, values, 0).sum(axis=1) / safe_count
+    dx = np.where(valid, years - x_mean[:, None], 0)
+    dy = np.where(valid, values - y_mean[:, None], 0)
+
+    variance = (dx * dx).sum(axis=1)
+    usable = (count >= min_years) & (variance > 0)
+    slopes = (dx * dy).sum(axis=1) / np.where(usable, variance, 1)
+    return np.where(usable, slopes * 10, np.nan)
+
+
+def normals(values, years, baseline_first: int, baseline_last: int, min_share: float = MIN_NORMAL_SHARE):
+    """
+    Climate normals: mean of every row over the baseline period.
+
+    :param values: Matrix stations x years with NaN for missing values.
+    :param years: Years of the columns.
+    :param min_share: Rows with values for less than this share of the baseline years get NaN.
+    :return: Normals (NumPy array).
+    """
+
+    columns = (years >= baseline_first) & (years <= baseline_last)
+    baseline = values[:, columns]
+    valid = ~np.isnan(baseline)
+    count = valid.sum(axis=1)
+
+    required = max(1, math.ceil((baseline_last - baseline_first + 1) * min_share - 1e-9))
+    means = np.where(valid, baseline, 0).sum(axis=1) / np.maximum(count, 1)
+    return np.where(count >= required, means, np.nan)
+
+
+def anomalies(values, station_normals):
+    """
+    Deviations of all values from the normal of their row.
+
+    :return: Matrix stations x years (NaN where the value or the normal is missing).
+    """
+
+    return values - station_normals[:, None]
+
+
+def to_value(number):
+    """
+    Converts a NumPy number for the JSON response, NaN becomes None.
+    """
+
+    return None if np.isnan(number) else round(float(number), 3)
+
+
+def statistics(rows, station_ids, first_year: int, last_year: int, baseline_first: int, baseline_last: int):
+    """
+    Computes trend, normal and anomalies of the Tmin and Tmax series of several stations.
+
+    :param rows: List of (station_id, year, tmin, tmax) tuples covering the period and the baseline.
+    :param station_ids: Station IDs.
+    :param first_year: First year of the period (trend and anomalies).
+    :param last_year: Last year of the period.
+    :param baseline_first: First year of the baseline period (normals).
+    :param baseline_last: Last year of the baseline period.
+    :return: Dictionary station ID -> {"tmin": ..., "tmax": ...}, each with "trend" (°C/decade),
+             "normal" and "anomalies" (list of (year, value)).
+    """
+
+    years, tmin, tmax = station_matrix(rows, station_ids, min(first_year, baseline_first),
+                                      max(last_year, baseline_last))
+    period = (years >= first_year) & (years <= last_year)
+
+    result = {station_id: {} for station_id in station_ids}
+    for element, values in (("tmin", tmin), ("tmax", tmax)):
+        element_normals = normals(values, years, baseline_first, baseline_last)
+        element_trends = linear_trends(values[:, period], years[period])
+        element_anomalies = anomalies(values[:, period], element_normals)
+
+        for position, station_id in enumerate(station_ids):
+            present = ~np.isnan(element_anomalies[position])
+            result[station_id][element] = {
+                "trend": to_value(element_trends[position]),
+                "normal": to_value(element_normals[position]),
+                "anomalies": [(int(year), to_value(value)) for year, value
+                              in zip(years[period][present], element_anomalies[position][present])],
+            }
+    return result
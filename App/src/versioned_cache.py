@@ -0,0 +1,44 @@
+import threading
+from collections import OrderedDict
+
+# =========================================================
+# Versioned result caches
+# =========================================================
+# data_services caches results per process: trend statistics, surface layers and tiles,
+# radius searches and station series. An entry is only valid for the dataset version it
+# was computed from, so every lookup passes the version of the loaded data.
+
+
+class VersionedLRUCache:
+    def __init__(self, max_entries: int = 10_000):
+        """
+        Thread-safe LRU cache for results derived from the stored data. All entries belong
+        to one dataset version and are dropped when another version is requested.
+
+        :param max_entries: Maximum number of cached entries (int).
+        """
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.version = None
+        self.lock = threading.Lock()
+
+    def get(self, version, key):
+        with self.lock:
+            if version != self.version or key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def put(self, version, key, value):
+        with self.lock:
+            if version != self.version:
+                self.entries.clear()
+                self.version = version
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
@@ -0,0 +1,155 @@
+import os
+import socket
+import time
+import uuid
+import datapoint as dp
+import data_services as ds
+import metrics
+import queries
+from config import INGEST_LEASE_SECONDS, INGEST_MAX_ATTEMPTS, INGEST_CLAIM_BATCH
+
+# =========================================================
+# Distributed ingestion
+# =========================================================
+# The coordinator loads the station catalog into the shadow tables and fills the
+# IngestQueue table of the same database with one item per station. Any number of
+# worker processes, on this or other hosts, lease batches of stations, parse their .dly
+# files and write the datapoints into the shadow tables. A station is marked as done in
+# the transaction of its datapoints, so every station is written exactly once even if a
+# lease expires while its worker is still busy. Leases are compared with the clocks of
+# the workers, which therefore have to agree within a fraction of INGEST_LEASE_SECONDS.
+
+POLL_INTERVAL = 2.0
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def fill(session, station_ids):
+    """
+    Replaces the contents of the queue with one pending item per station.
+
+    :param session: WriteSession of the storage backend.
+    :param station_ids: Iterable of station IDs.
+    :return: No return value.
+    """
+
+    session.execute(queries.QUEUE_TABLE)
+    session.execute("DELETE FROM IngestQueue;")
+    session.execute_many(queries.ENQUEUE_STATION, [(station_id,) for station_id in station_ids])
+    session.commit()
+
+
+def claim(session, worker: str, count: int = INGEST_CLAIM_BATCH, lease_seconds: float = INGEST_LEASE_SECONDS,
+          max_attempts: int = INGEST_MAX_ATTEMPTS):
+    """
+    Leases up to count pending stations, or stations whose lease has expired.
+
+    :param session: WriteSession of the storage backend.
+    :param worker: Name of the worker (str).
+    :return: Tuple (claim token, list of station IDs).
+    """
+
+    now = time.time()
+    token = f"{worker}:{uuid.uuid4().hex[:12]}"
+    session.execute(queries.EXPIRE_LEASES, (now, max_attempts))
+    session.execute(queries.CLAIM_WORK, (token, now + lease_seconds, now, count, now))
+    session.commit()
+    return token, [row[0] for row in session.fetch_all(queries.CLAIMED_WORK, (token,))]
+
+
+def complete(session, token: str, station_id: str, datapoints: int):
+    """
+    Marks a station as done in the current transaction. The caller writes the datapoints
+    only if this succeeds and commits both together.
+
+    :return: False if the lease was lost to another worker.
+    """
+
+    return session.execute(queries.COMPLETE_WORK, (datapoints, station_id, token)) == 1
+
+
+def release(session, token: str, station_id: str, error: str, max_attempts: int = INGEST_MAX_ATTEMPTS):
+    """
+    Returns a station after an error. It is retried until max_attempts is reached.
+
+    :return: No return value.
+    """
+
+    session.execute(queries.RELEASE_WORK, (max_attempts, error[:255], station_id, token))
+
+
+def progress(session):
+    """
+    Counts the queue items per status.
+
+    :return: Dictionary status -> (stations, datapoints) with the keys pending, leased, done and failed.
+    """
+
+    counts = {status: (0, 0) for status in ("pending", "leased", "done", "failed")}
+    for status, stations, datapoints in session.fetch_all(queries.QUEUE_PROGRESS):
+        counts[status] = (stations, int(datapoints))
+    session.commit()
+    return counts
+
+
+def run_worker(source: str, directory: str = None, worker: str = None, batch: int = INGEST_CLAIM_BATCH,
+               lease_seconds: float = INGEST_LEASE_SECONDS, max_attempts: int = INGEST_MAX_ATTEMPTS,
+               poll_interval: float = POLL_INTERVAL):
+    """
+    Processes queue items until no station is pending or leased any more. Stations leased
+    by other workers are waited for, their leases may still expire.
+
+    :param source: "url" or "local" (tar archives cannot be read by station).
+    :param directory: Directory of the .dly files for local.
+    :param worker: Name of the worker, host and process ID by default.
+    :return: Number of stations processed by this worker (int).
+    """
+
+    worker = worker or worker_name()
+    processed = 0
+
+    with ds.backend.shadow_session(create=False) as session:
+        sids = {row[1]: row[0] for row in session.get_stations()}
+
+        while True:
+            token, station_ids = claim(session, worker, batch, lease_seconds, max_attempts)
+            if not station_ids:
+                counts = progress(session)
+                if not counts["pending"][0] and not counts["leased"][0]:
+                    break
+                # Pending stations were just taken by other workers: try again right away
+                time.sleep(poll_interval if not counts["pending"][0] else 0.1)
+                continue
+
+            results = []
+            for station_id in station_ids:
+                started = time.perf_counter()
+                try:
+                    results.append((station_id, dp.fetch_records(source, directory, station_id), None))
+                except Exception as error:
+                    results.append((station_id, None, f"{type(error).__name__}: {error}"))
+                metrics.INGEST_SECONDS.inc(time.perf_counter() - started)
+
+            # One transaction per batch: queue updates and datapoints become visible together
+            for station_id, records, error in results:
+                if error is not None:
+                    print(f"{worker}: {station_id} failed: {error}")
+                    release(session, token, station_id, error, max_attempts)
+                    continue
+
+                datapoints, element_values, daily_values = records
+                if complete(session, token, station_id, len(datapoints)):
+                    session.insert_datapoints(sids[station_id], datapoints)
+                    session.insert_element_values(sids[station_id], element_values)
+                    session.insert_daily_values(sids[station_id], daily_values)
+                    processed += 1
+                    metrics.INGEST_STATIONS.inc()
+                    metrics.INGEST_DATAPOINTS.inc(len(datapoints))
+                else:
+                    print(f"{worker}: lease of {station_id} expired, result discarded.")
+            session.commit()
+
+    print(f"{worker}: {processed} stations processed.")
+    return processed
@@ -0,0 +1,19 @@
+import mysql.connector
+import data_services as ds
+from app import app
+
+# With preload_app enabled (see gunicorn.conf.py) this module is imported once in the
+# gunicorn master. The station catalog loaded here is inherited by all workers
+# copy-on-write instead of being loaded once per worker.
+try:
+    ds.backend.ensure_schema()
+    ds.load_station_catalog()
+    max_connections = ds.get_max_connections()
+except mysql.connector.Error as error:
+    # Workers fall back to database queries and the MySQL default connection limit
+    print(f"Preloading failed: {error}")
+    max_connections = 151
+finally:
+    # Connections must not be inherited by the workers, each worker opens its own pools.
+    # The catalog is read through the replicas, so their pools are closed as well.
+    ds.close_connection_pools()
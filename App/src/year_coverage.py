@@ -0,0 +1,92 @@
+import math
+
+# =========================================================
+# Year coverage bitmaps
+# =========================================================
+# Bit (year - BASE_YEAR) of a station's bitmap is set if the station has Tmin and Tmax
+# values for all twelve months of that year. The bitmap is computed during the ingestion
+# and stored hex-encoded in Station.coverage; an empty string means "not computed yet".
+
+BASE_YEAR = 1750  # GHCN-D starts in 1763
+
+
+def from_datapoints(datapoints):
+    """
+    Computes the coverage bitmap of a station.
+
+    :param datapoints: List of DataPoint objects (monthly Tmin/Tmax averages).
+    :return: Bitmap (int).
+    """
+
+    months = {}
+    for datapoint in datapoints:
+        year = datapoint.date // 100
+        months.setdefault(year, set()).add(datapoint.date % 100)
+
+    bitmap = 0
+    for year, months_of_year in months.items():
+        if year >= BASE_YEAR and len(months_of_year) == 12:
+            bitmap |= 1 << (year - BASE_YEAR)
+    return bitmap
+
+
+def from_years(years):
+    """
+    Creates the bitmap of a collection of complete years.
+
+    :return: Bitmap (int).
+    """
+
+    bitmap = 0
+    for year in years:
+        if year >= BASE_YEAR:
+            bitmap |= 1 << (year - BASE_YEAR)
+    return bitmap
+
+
+def encode(bitmap: int):
+    return format(bitmap, "x")
+
+
+def decode(text):
+    """
+    :param text: Value of Station.coverage.
+    :return: Bitmap (int), None if the coverage was not computed.
+    """
+
+    return int(text, 16) if text else None
+
+
+def range_mask(first_year: int, last_year: int):
+    """
+    Creates the bitmap of all years of a period.
+
+    :return: Bitmap (int).
+    """
+
+    first = max(first_year - BASE_YEAR, 0)
+    last = last_year - BASE_YEAR
+    if last < first:
+        return 0
+    return ((1 << (last - first + 1)) - 1) << first
+
+
+def required_years(first_year: int, last_year: int, min_coverage: float):
+    """
+    Number of complete years a station needs in the period.
+
+    :param min_coverage: Required share of complete years, 0 to 1 (float).
+    :return: Number of years (int), at least 1.
+    """
+
+    return max(1, math.ceil((last_year - first_year + 1) * min_coverage - 1e-9))
+
+
+def covers(bitmap: int, mask: int, required: int):
+    """
+    Tests if a station has at least the required number of complete years in the period of the mask.
+
+    :return: bool
+    """
+
+    return (bitmap & mask).bit_count() >= required
@@ -0,0 +1,65 @@
+# =========================================================
+# TESTS FOR .PY
+# -> async_data_services.py
+# =========================================================
+
+import asyncio
+from src import async_data_services as ads
+from src.queries import build_aggregation_queries
+
+
+def test_to_pyformat_escapes_modulo():
+    """Tests if literal percent signs are escaped while placeholders stay intact."""
+
+    query = "SELECT year % 4 FROM Datapoint WHERE SID = %s AND year BETWEEN %s AND %s;"
+    assert ads.to_pyformat(query) == "SELECT year %% 4 FROM Datapoint WHERE SID = %s AND year BETWEEN %s AND %s;"
+
+
+def test_to_pyformat_is_valid_for_percent_formatting():
+    """Tests if every aggregation query can be formatted by a %-style driver after escaping."""
+
+    for query, params in build_aggregation_queries(1, 2000, 2020):
+        assert "%s" not in ads.to_pyformat(query) % tuple("x" for _ in params)
+
+
+def test_get_datapoints_for_station_runs_queries_concurrently(mocker):
+    """Tests if the ten aggregation queries are in flight at the same time and keep their order."""
+
+    in_flight = 0
+    max_in_flight = 0
+
+    async def fake_fetch_all(query, params):
+        nonlocal in_flight, max_in_flight
+        if query.startswith("SELECT SID"):
+            return [(7,)]
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return [(2020, len(params))]
+
+    mocker.patch("src.async_data_services.fetch_all", side_effect=fake_fetch_all)
+
+    result = asyncio.run(ads.get_datapoints_for_station("GME00122458", 2020, 2020))
+
+    assert len(result) == 10, f"Error: Expected 10 datasets, got {len(result)}"
+    assert max_in_flight == 10, f"Error: Expected 10 concurrent queries, got {max_in_flight}"
+    # Annual and winter queries take 3 parameters, seasonal queries take 5
+    assert [dataset[0][1] for dataset in result] == [3, 3, 5, 5, 5, 5, 5, 5, 3, 3]
+
+
+def test_get_stations_in_radius_async(mocker):
+    """Tests if the async radius search filters and sorts like the synchronous version."""
+
+    async def fake_fetch_all(query, params):
+        return [
+            ("ST123", "Station A", 48.0, 8.0),
+            ("ST456", "Station B", 48.1, 8.1),
+            ("ST789", "Station C", 52.0, 13.0),
+        ]
+
+    mocker.patch("src.async_data_services.fetch_all", side_effect=fake_fetch_all)
+
+    stations = asyncio.run(ads.get_stations_in_radius(48.0, 8.0, 100, 2000, 2020, 5))
+
+    assert [station[0][0] for station in stations] == ["ST123", "ST456"]
@@ -0,0 +1,48 @@
+# =========================================================
+# TESTS FOR .PY
+# -> benchmarks/run_benchmarks.py
+# =========================================================
+
+from benchmarks.run_benchmarks import compare_results, run_benchmarks, main
+
+
+def result(median):
+    return {"median": median}
+
+
+def test_compare_results():
+    """Tests if slowdowns above the threshold are reported as regressions."""
+
+    baseline = {"results": {"a": result(1.0), "b": result(1.0), "removed": result(1.0)}}
+    current = {"results": {"a": result(1.05), "b": result(1.5), "new": result(1.0)}}
+
+    comparison = {name: (change, regression) for name, _, _, change, regression
+                  in compare_results(baseline, current, threshold=0.1)}
+
+    assert set(comparison) == {"a", "b"}, "Error: Only benchmarks present in both runs are compared"
+    assert comparison["a"][1] is False
+    assert comparison["b"] == (0.5, True)
+
+
+def test_run_benchmarks_quick():
+    """Tests if a selected benchmark runs and produces machine-readable statistics."""
+
+    results = run_benchmarks(selection=["find_stations_within_radius"], quick=True, repeat=2, min_time=0.001)
+
+    assert list(results["results"]) == ["calculations.find_stations_within_radius[1000]"]
+    stats = results["results"]["calculations.find_stations_within_radius[1000]"]
+    assert stats["repeat"] == 2
+    assert stats["min"] <= stats["median"]
+    assert results["meta"]["seed"] == 42
+
+
+def test_main_compare_exit_code(tmp_path):
+    """Tests if the comparison mode fails when a benchmark got slower than the threshold."""
+
+    import json
+
+    baseline = tmp_path / "baseline.json"
+    baseline.write_text(json.dumps({"results": {"parser.extract_average_value": result(1e-12)}}))
+
+    assert main(["--quick", "--repeat", "2", "--filter", "extract_average_value",
+                 "--compare", str(baseline)]) == 1
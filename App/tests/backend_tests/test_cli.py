@@ -0,0 +1,183 @@
+# =========================================================
+# TESTS FOR .PY
+# -> cli.py
+# =========================================================
+
+import os
+import tarfile
+import pytest
+from src import cli
+from src import synthetic_data
+
+
+@pytest.fixture
+def dataset(tmp_path, mocker):
+    """Creates a synthetic dataset with four stations and an empty SQLite backend for the CLI."""
+
+    stations = synthetic_data.write_dataset(str(tmp_path / "data"), stations=4, first_year=2015, last_year=2018,
+                                            missing_ratio=0.0, workers=1)
+    backend = cli.ds.SQLiteBackend(str(tmp_path / "weather.sqlite3"))
+    mocker.patch.object(cli.ds, "backend", backend)
+    return str(tmp_path / "data"), stations, backend
+
+
+def test_ingest_local(dataset, capsys):
+    """Tests if a local dataset is ingested, published and aggregated, and passes the verification."""
+
+    path, stations, backend = dataset
+
+    assert cli.main(["ingest", "--source", "local", "--path", path, "--workers", "1"]) == 0
+
+    assert backend.get_dataset_version() == 1
+    assert sorted(row[0] for row in backend.get_station_catalog()) == [station.id for station in stations]
+    months = sum((station.last_measure_tmax - station.first_measure_tmax + 1) * 12 for station in stations)
+    assert backend.fetch_all("SELECT COUNT(*) FROM Datapoint;")[0][0] == months
+    assert backend.fetch_all("SELECT COUNT(*) FROM YearlyAggregate WHERE period = 'annual';")[0][0] == months // 12
+
+    output = capsys.readouterr().out
+    assert f"4/4 stations, {months} datapoints" in output
+    assert "rows/s" in output
+
+    assert cli.main(["verify"]) == 0
+    assert "all checks passed" in capsys.readouterr().out
+
+    # Without missing values every measured year is complete
+    for station_id, *_, first_tmax, last_tmax, bitmap in backend.get_station_catalog():
+        assert cli.year_coverage.decode(bitmap) == cli.year_coverage.from_years(range(first_tmax, last_tmax + 1))
+
+
+def test_ingest_element_values(tmp_path, mocker):
+    """Tests if the configured elements are stored from the same pass as the datapoints."""
+
+    synthetic_data.write_dataset(str(tmp_path / "data"), stations=2, first_year=2019, last_year=2020,
+                                 missing_ratio=0.0, elements=("TMAX", "TMIN", "PRCP"), workers=1)
+    backend = cli.ds.SQLiteBackend(str(tmp_path / "weather.sqlite3"))
+    mocker.patch.object(cli.ds, "backend", backend)
+
+    cli.ingest("local", str(tmp_path / "data"), workers=1, aggregates=False)
+
+    counts = dict(backend.fetch_all("SELECT element, COUNT(*) FROM ElementValue GROUP BY element;"))
+    assert counts == {"PRCP": 48, "TMAX": 48, "TMIN": 48}
+    query = ("SELECT COUNT(*) FROM Datapoint JOIN ElementValue AS tmax USING (SID, year, month) "
+             "WHERE tmax.element = 'TMAX' AND tmax.value = Datapoint.tmax;")
+    assert backend.fetch_all(query)[0][0] == 48
+
+
+def test_ingest_daily_values(tmp_path, mocker):
+    """Tests if the daily values are stored per element and year and match the monthly means."""
+
+    stations = synthetic_data.write_dataset(str(tmp_path / "data"), stations=1, first_year=2019, last_year=2020,
+                                            missing_ratio=0.1, elements=("TMAX", "TMIN", "PRCP"), workers=1)
+    backend = cli.ds.SQLiteBackend(str(tmp_path / "weather.sqlite3"))
+    mocker.patch.object(cli.ds, "backend", backend)
+
+    cli.ingest("local", str(tmp_path / "data"), workers=1, aggregates=False)
+
+    rows = backend.fetch_all("SELECT element, year FROM DailyValue ORDER BY element, year;")
+    assert rows == [(element, year) for element in ("PRCP", "TMAX", "TMIN") for year in (2019, 2020)]
+
+    series = cli.ds.get_daily_values(stations[0].id, "TMAX", 2020, 2020)
+    assert all(date.startswith("2020-") for date, value in series)
+    for (month,) in backend.fetch_all("SELECT month FROM Datapoint WHERE year = 2020;"):
+        values = [value for date, value in series if date.startswith(f"2020-{month:02d}")]
+        expected = backend.fetch_all(f"SELECT tmax FROM Datapoint WHERE year = 2020 AND month = {month};")[0][0]
+        assert sum(values) / len(values) == pytest.approx(expected, abs=1e-3)
+
+
+def test_export(dataset, tmp_path, capsys):
+    """Tests if the export command writes the monthly series of the selected stations."""
+
+    path, stations, backend = dataset
+    cli.ingest("local", path, workers=1)
+    output = str(tmp_path / "export.csv")
+    selected = [station.id for station in stations[:2]]
+
+    assert cli.main(["export", "--stations", ",".join(selected), "--first-year", "2015", "--last-year", "2018",
+                     "--output", output]) == 0
+
+    with open(output) as file:
+        lines = file.read().splitlines()
+    assert lines[0] == "station_id,year,month,tmax,tmin"
+    assert sorted({line.split(",")[0] for line in lines[1:]}) == sorted(selected)
+    months = sum((station.last_measure_tmax - station.first_measure_tmax + 1) * 12 for station in stations[:2])
+    assert len(lines) - 1 == months
+    assert "Exported 2 stations" in capsys.readouterr().out
+
+    with pytest.raises(SystemExit):
+        cli.main(["export", "--first-year", "2015", "--last-year", "2018", "--output", output])
+
+
+def test_rebuild_coverage(dataset):
+    """Tests if the coverage bitmaps of existing data are recomputed from the datapoints."""
+
+    path, stations, backend = dataset
+    cli.ingest("local", path, workers=1, aggregates=False)
+    expected = sorted(backend.get_station_catalog())
+
+    connection = backend.connection()
+    connection.execute("UPDATE Station SET coverage = '';")
+    connection.commit()
+
+    assert cli.main(["rebuild-aggregates"]) == 0
+    assert sorted(backend.get_station_catalog()) == expected
+
+
+def test_ingest_tar_matches_local(dataset, tmp_path):
+    """Tests if streaming the .dly files from a tar archive in worker processes gives the same data."""
+
+    path, stations, backend = dataset
+    archive = str(tmp_path / "ghcnd_all.tar.gz")
+    with tarfile.open(archive, "w:gz") as tar:
+        tar.add(os.path.join(path, "ghcnd_all"), arcname="ghcnd_all")
+
+    query = "SELECT Station.station_id, year, month, tmax, tmin FROM Datapoint JOIN Station USING (SID) ORDER BY 1, 2, 3;"
+
+    cli.ingest("local", path, workers=1, aggregates=False)
+    local = backend.fetch_all(query)
+    cli.ingest("tar", path, archive=archive, workers=2, aggregates=False)
+
+    assert backend.get_dataset_version() == 2
+    assert backend.fetch_all(query) == local
+
+
+def test_update_skips_unchanged_inventory(dataset, capsys):
+    """Tests if update only ingests a new version after the inventory has changed."""
+
+    path, stations, backend = dataset
+    cli.ingest("local", path, workers=1)
+
+    assert cli.update("local", path) is None
+    assert "Dataset is up to date." in capsys.readouterr().out
+
+    inventory = os.path.join(path, "ghcnd-inventory.txt")
+    with open(inventory) as file:
+        lines = file.read().splitlines()
+    with open(inventory, "w") as file:
+        file.write("\n".join(lines[:-2]) + "\n")
+
+    assert cli.update("local", path) == 2
+    assert len(backend.get_station_catalog()) == 3
+
+
+def test_verify_reports_errors(dataset, capsys):
+    """Tests if an empty catalog and duplicate months fail the verification."""
+
+    path, stations, backend = dataset
+
+    assert cli.main(["verify"]) == 1
+    assert "verification failed: stations" in capsys.readouterr().out
+
+    cli.ingest("local", path, workers=1, limit=1)
+    connection = backend.connection()
+    connection.execute("INSERT INTO Datapoint (SID, year, month, tmax, tmin) "
+                       "SELECT SID, year, month, tmax, tmin FROM Datapoint LIMIT 1;")
+    connection.commit()
+
+    assert cli.verify() == ["duplicate_months"]
+
+
+def test_source_path_required():
+    """Tests if the local and tar sources need a data directory."""
+
+    with pytest.raises(SystemExit):
+        cli.main(["ingest", "--source", "local"])
@@ -0,0 +1,71 @@
+# =========================================================
+# TESTS FOR .PY
+# -> daily_store.py
+# =========================================================
+
+import numpy as np
+from src import daily_store
+
+
+def year_values(days):
+    """Creates the array of a year with the given {slot: value} days, the other days are missing."""
+
+    values = np.full(daily_store.DAYS_PER_YEAR, daily_store.MISSING, dtype=np.int16)
+    for slot, value in days.items():
+        values[slot] = value
+    return values
+
+
+def test_encode_decode_roundtrip():
+    """Tests if the delta encoding restores the values exactly, also across the int16 limits."""
+
+    rng = np.random.default_rng(0)
+    values = rng.integers(-400, 400, daily_store.DAYS_PER_YEAR).astype(np.int16)
+    values[::7] = daily_store.MISSING
+    values[:2] = [daily_store.INT16_MAX, daily_store.INT16_MIN]
+
+    assert np.array_equal(daily_store.decode(daily_store.encode(values)), values)
+
+
+def test_missing_days_compress_well():
+    """Tests if a year without values is stored in a few bytes."""
+
+    assert len(daily_store.encode(year_values({}))) < 32
+
+
+def test_put_month():
+    """Tests if the days of a month are placed at their slot in the leap-year calendar."""
+
+    years = {}
+    days = [daily_store.MISSING] * 31
+    days[0], days[28], days[30] = 5, 7, 9
+    daily_store.put_month(years, "TMAX", 2021, 2, days)
+    daily_store.put_month(years, "TMAX", 2021, 3, [40000] + [daily_store.MISSING] * 30)
+
+    values = daily_store.decode(daily_store.encode(years[("TMAX", 2021)]))
+    assert values[31] == 5
+    # February 29 exists as slot in every year, the day 31 of February is dropped
+    assert values[daily_store.LEAP_DAY] == 7
+    assert values[60] == daily_store.INT16_MAX
+    assert (values != daily_store.MISSING).sum() == 3
+
+
+def test_to_series_dates():
+    """Tests if February 29 is only a date in leap years and the following days keep their dates."""
+
+    values = year_values({daily_store.LEAP_DAY - 1: 10, daily_store.LEAP_DAY: 20, daily_store.LEAP_DAY + 1: 30,
+                          365: -5})
+
+    assert daily_store.to_series(2020, values, 10) == [("2020-02-28", 1.0), ("2020-02-29", 2.0),
+                                                       ("2020-03-01", 3.0), ("2020-12-31", -0.5)]
+    assert daily_store.to_series(2021, values, 10) == [("2021-02-28", 1.0), ("2021-03-01", 3.0),
+                                                       ("2021-12-31", -0.5)]
+
+
+def test_count_days():
+    """Tests if days above and below a threshold are counted with the number of valid days."""
+
+    values = year_values({0: -10, 1: 0, 2: 250, 3: 300})
+
+    assert daily_store.count_days(2021, values, 250) == (2, 4)
+    assert daily_store.count_days(2021, values, 0, above=False) == (1, 4)
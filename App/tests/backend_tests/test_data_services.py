@@ -10,11 +10,12 @@ from src.datapoint import download_and_create_datapoints
 from src.station import load_stations_from_url
 from src.calculations import haversine
 from unittest.mock import patch, MagicMock
+import pytest
 
 
 @patch("src.data_services.connection_pool.get_connection")
 @patch("src.data_services.st.load_stations_from_url")
-@patch("src.data_services.dp.download_and_create_datapoints")
+@patch("src.data_services.dp.download_and_create_records")
 def test_save_data_to_db(mock_download_datapoints, mock_load_stations, mock_get_connection):
     """Tests if save_data_to_db correctly initializes the database when empty"""
 
@@ -32,9 +33,9 @@ def test_save_data_to_db(mock_download_datapoints, mock_load_stations, mock_get_
                   first_measure_tmax=2000, last_measure_tmax=2020,
                   first_measure_tmin=2000, last_measure_tmin=2020)
     ]
-    mock_download_datapoints.return_value = [
+    mock_download_datapoints.return_value = ([
         MagicMock(date=202001, tmax=25.5, tmin=10.2)
-    ]
+    ], [], [])
 
     # Execute function
     save_data_to_db()
@@ -68,4 +69,287 @@ def test_get_stations_in_radius_order(mocker):
 
     expected_order = ["ST123", "ST456"]
     actual_order = [station[0][0] for station in stations]
-    assert actual_order == expected_order, f"Error: Expected order {expected_order}, got {actual_order}"
\ No newline at end of file
+    assert actual_order == expected_order, f"Error: Expected order {expected_order}, got {actual_order}"
+
+def test_get_stations_in_radius_uses_station_catalog(mocker):
+    """Tests if a preloaded station catalog is filtered in-process without a database query."""
+
+    catalog = (
+        ("ST123", "Station A", 48.0, 8.0, 1950, 2020, 1950, 2020, None),
+        ("ST456", "Station B", 48.1, 8.1, 2005, 2020, 2005, 2020, None),  # starts too late
+        ("ST789", "Station C", 48.2, 8.2, 1950, 2020, 1950, 2020, None),
+    )
+    mocker.patch("src.data_services.station_catalog", catalog)
+    mock_conn = mocker.patch("src.data_services.connection_pool.get_connection")
+
+    stations = get_stations_in_radius(48.0, 8.0, 100, 2000, 2020, -1)
+
+    mock_conn.assert_not_called()
+    assert [station[0][0] for station in stations] == ["ST123", "ST789"]
+
+
+def test_get_stations_in_radius_filters_year_coverage(mocker):
+    """Tests if stations with too many incomplete years in the period are filtered by their coverage bitmap."""
+
+    from src import year_coverage
+
+    catalog = (
+        ("ST123", "Station A", 48.0, 8.0, 1950, 2020, 1950, 2020, year_coverage.from_years(range(1950, 2021))),
+        # Measurements from 1950 to 2020, but a gap from 1960 to 2009
+        ("ST456", "Station B", 48.1, 8.1, 1950, 2020, 1950, 2020,
+         year_coverage.from_years(list(range(1950, 1960)) + list(range(2010, 2021)))),
+        # 18 of 21 years complete
+        ("ST789", "Station C", 48.2, 8.2, 1950, 2020, 1950, 2020,
+         year_coverage.from_years(set(range(1950, 2021)) - {2001, 2005, 2013})),
+    )
+    mocker.patch("src.data_services.station_catalog", catalog)
+
+    stations = get_stations_in_radius(48.0, 8.0, 100, 2000, 2020, -1, min_coverage=0.8)
+    assert [station[0][0] for station in stations] == ["ST123", "ST789"]
+
+    stations = get_stations_in_radius(48.0, 8.0, 100, 2000, 2020, -1, min_coverage=1.0)
+    assert [station[0][0] for station in stations] == ["ST123"]
+
+    stations = get_stations_in_radius(48.0, 8.0, 100, 1950, 1959, -1, min_coverage=1.0)
+    assert [station[0][0] for station in stations] == ["ST123", "ST456", "ST789"]
+
+
+def test_worker_pool_size():
+    """Tests if the connection budget is split evenly and bounded between the workers."""
+
+    from src.data_services import worker_pool_size
+
+    assert worker_pool_size(4, 151, reserved=11) == 35
+    assert worker_pool_size(9, 151, reserved=10) == 15
+    assert worker_pool_size(40, 50, reserved=10) == 1
+
+
+def test_run_ingest_records_failure(mocker):
+    """Tests if a failing ingestion is reported instead of crashing the background thread."""
+
+    from src import data_services
+
+    mocker.patch("src.data_services.ingest_status", {"state": "pending", "error": None})
+    mocker.patch("src.data_services.save_data_to_db", side_effect=RuntimeError("download failed"))
+    mocker.patch("src.data_services.load_station_catalog", return_value=0)
+
+    data_services.run_ingest()
+
+    assert data_services.ingest_status["state"] == "failed"
+    assert data_services.ingest_status["error"] == "download failed"
+
+
+def test_run_ingest_loads_station_catalog(mocker, tmp_path):
+    """Tests if the catalog of existing stations is loaded before the ingestion and reloaded only after an ingestion."""
+
+    import src.data_services as ds
+
+    backend = ds.SQLiteBackend(str(tmp_path / "weather.sqlite3"))
+    listener = mocker.Mock()
+    mocker.patch("src.data_services.backend", backend)
+    mocker.patch("src.data_services.station_catalog", None)
+    mocker.patch("src.data_services.dataset_version", None)
+    mocker.patch("src.data_services.ingest_status", {"state": "pending", "error": None})
+    mocker.patch("src.data_services.dataset_listeners", [listener])
+    with backend.write_session() as session:
+        session.insert_stations([ds.st.Station("ST1", "FREIBURG", 48.0, 7.8, 2020, 1950, 2020, 1950)])
+        session.commit()
+
+    # Data already complete: the catalog of the startup is kept
+    save = mocker.patch("src.data_services.save_data_to_db", return_value=False)
+    load = mocker.spy(ds, "load_station_catalog")
+    ds.run_ingest()
+    assert ds.ingest_status["state"] == "done"
+    assert load.call_count == 1 and listener.call_count == 1
+
+    def ingest():
+        # The existing stations are already searchable during the ingestion
+        assert [station[0] for station in ds.station_catalog] == ["ST1"]
+        with backend.write_session() as session:
+            session.insert_stations([ds.st.Station("ST2", "BUCHENBACH", 47.9, 8.0, 2020, 1950, 2020, 1950)])
+            session.commit()
+        return True
+    save.side_effect = ingest
+
+    ds.run_ingest()
+
+    assert ds.ingest_status["state"] == "done"
+    assert [station[0] for station in ds.station_catalog] == ["ST1", "ST2"]
+    assert load.call_count == 3 and listener.call_count == 3
+
+
+def test_catalog_load_on_startup_without_database(mocker):
+    """Tests if an unreachable database at startup leaves the catalog unloaded instead of failing."""
+
+    import src.data_services as ds
+
+    mocker.patch("src.data_services.station_catalog", None)
+    mocker.patch("src.data_services.backend.get_dataset_version",
+                 side_effect=ds.mysql.connector.Error(msg="Can't connect", errno=2003))
+
+    assert not ds.load_station_catalog_on_startup()
+    assert ds.station_catalog is None
+
+
+def test_reingest_dataset_swaps_version(mocker, tmp_path):
+    """Tests if a re-ingestion is published as new dataset version and the station catalog follows."""
+
+    import src.data_services as ds
+    from src.datapoint import DataPoint
+
+    backend = ds.SQLiteBackend(str(tmp_path / "weather.sqlite3"))
+    mocker.patch("src.data_services.backend", backend)
+    mocker.patch("src.data_services.station_catalog", None)
+    mocker.patch("src.data_services.dataset_version", None)
+    mocker.patch("src.data_services.dataset_version_checked", 0.0)
+    days = ds.daily_store.np.full(ds.daily_store.DAYS_PER_YEAR, ds.daily_store.MISSING, dtype="int16")
+    days[:2] = [40, -30]
+    mocker.patch("src.data_services.dp.download_and_create_records",
+                 return_value=([DataPoint(202001, tmax=4.0, tmin=-3.0)], [(2020, 1, "PRCP", 12.5, 31)],
+                               [("TMAX", 2020, ds.daily_store.encode(days))]))
+
+    first = [ds.st.Station("GME00122458", "FREIBURG", 48.0242, 7.8353, 2020, 1950, 2020, 1950)]
+    second = [ds.st.Station("GME00132346", "BUCHENBACH", 47.9631, 7.9989, 2020, 1950, 2020, 1950)]
+
+    assert ds.reingest_dataset(first) == 1
+    ds.load_station_catalog()
+    assert [station[0] for station in ds.station_catalog] == ["GME00122458"]
+
+    assert ds.get_element_values("GME00122458", "PRCP", 2020, 2020) == [(2020, 1, 12.5, 31)]
+    assert ds.get_daily_values("GME00122458", "TMAX", 2020, 2020) == [("2020-01-01", 4.0), ("2020-01-02", -3.0)]
+
+    assert ds.reingest_dataset(second) == 2
+    assert [station[0] for station in ds.station_catalog] == ["GME00132346"]
+    assert ds.dataset_version == 2
+    assert ds.get_element_values("GME00122458", "PRCP", 2020, 2020) == []
+    assert ds.get_daily_values("GME00122458", "TMAX", 2020, 2020) == []
+
+    assert ds.rollback_dataset() == 3
+    assert [station[0] for station in ds.station_catalog] == ["GME00122458"]
+    assert ds.get_element_values("GME00122458", "PRCP", 2020, 2020) == [(2020, 1, 12.5, 31)]
+    assert ds.get_threshold_days("GME00122458", "TMAX", 2020, 2020, 0.0, above=False) == [(2020, 1, 2)]
+
+
+def test_get_regional_aggregates(mocker, tmp_path):
+    """Tests if the regional series average the precomputed aggregates, equally or inverse distance weighted."""
+
+    import src.data_services as ds
+    from src.datapoint import DataPoint
+
+    backend = ds.SQLiteBackend(str(tmp_path / "weather.sqlite3"))
+    mocker.patch("src.data_services.backend", backend)
+    mocker.patch("src.data_services.station_catalog", None)
+    with backend.write_session() as session:
+        session.insert_stations([
+            ds.st.Station("ST1", "NEAR", 48.0, 8.0, 2020, 2019, 2020, 2019),
+            ds.st.Station("ST2", "FAR", 48.0, 8.1, 2020, 2019, 2020, 2019),
+            ds.st.Station("ST3", "OUTSIDE", 50.0, 8.0, 2020, 2019, 2020, 2019),
+        ])
+        for sid, station_id, *_ in session.get_stations():
+            offset = {"ST1": 0.0, "ST2": 10.0, "ST3": 100.0}[station_id]
+            session.insert_datapoints(sid, [DataPoint(year * 100 + month, tmax=offset + 20.0, tmin=offset)
+                                            for year in (2019, 2020) for month in range(1, 13)])
+        session.commit()
+    backend.rebuild_aggregates()
+
+    mocker.patch("src.data_services.calc.haversine", side_effect=lambda lat1, lon1, lat2, lon2:
+                 {8.0: 1.0, 8.1: 2.0}[lon2] if lat2 == 48.0 else 222.0)
+
+    count, datasets = ds.get_regional_aggregates(48.0, 8.0, 50, 2020, 2020, -1, min_coverage=1.0)
+    assert count == 2
+    assert len(datasets) == 10
+    assert datasets[0] == [(2020, 5.0)]
+    assert datasets[1] == [(2020, 25.0)]
+    # Winter 2020 = December 2019, January and February 2020
+    assert datasets[8] == [(2020, 5.0)]
+
+    count, datasets = ds.get_regional_aggregates(48.0, 8.0, 50, 2020, 2020, -1, idw=True, min_coverage=1.0)
+    # Weights 1 and 1/4
+    assert datasets[0] == [(2020, 2.0)]
+
+    assert ds.get_regional_aggregates(48.0, 8.0, 0.5, 2020, 2020, -1) == (0, [[] for _ in range(10)])
+
+
+
+def test_trend_statistics(mocker, tmp_path):
+    """Tests if trends and anomalies are computed from the aggregates, cached and ranked by warming rate."""
+
+    import src.data_services as ds
+    from src.datapoint import DataPoint
+
+    backend = ds.SQLiteBackend(str(tmp_path / "weather.sqlite3"))
+    mocker.patch("src.data_services.backend", backend)
+    mocker.patch("src.data_services.station_catalog", None)
+    mocker.patch("src.data_services.trend_cache", ds.VersionedLRUCache())
+    with backend.write_session() as session:
+        session.insert_stations([
+            ds.st.Station("ST1", "WARMING", 48.0, 8.0, 2020, 1991, 2020, 1991),
+            ds.st.Station("ST2", "STEADY", 48.0, 8.1, 2020, 1991, 2020, 1991),
+        ])
+        for sid, station_id, *_ in session.get_stations():
+            rate = {"ST1": 0.1, "ST2": 0.0}[station_id]
+            session.insert_datapoints(sid, [DataPoint(year * 100 + month, tmax=20.0 + rate * (year - 1991), tmin=5.0)
+                                            for year in range(1991, 2021) for month in range(1, 13)])
+        session.commit()
+    backend.rebuild_aggregates()
+
+    spy = mocker.spy(backend, "get_yearly_aggregates")
+    trends = ds.get_station_trends("ST1", 1991, 2020)
+    assert len(trends) == 10
+    assert trends[1]["trend"] == pytest.approx(1.0)
+    assert trends[1]["normal"] == pytest.approx(21.45)
+    assert trends[1]["anomalies"][0] == (1991, pytest.approx(-1.45))
+    assert trends[0] == {"trend": 0.0, "normal": 5.0, "anomalies": [(year, 0.0) for year in range(1991, 2021)]}
+
+    # The second request is answered from the cache
+    calls = spy.call_count
+    assert ds.get_station_trends("ST1", 1991, 2020) == trends
+    assert spy.call_count == calls
+
+    mocker.patch("src.data_services.calc.haversine", side_effect=lambda lat1, lon1, lat2, lon2: lon2 - 7.0)
+    ranking = ds.rank_stations_by_trend(48.0, 8.0, 50, 1991, 2020, -1, min_coverage=1.0)
+    assert [entry["stationId"] for entry in ranking] == ["ST1", "ST2"]
+    assert ranking[0]["trendTmax"] == pytest.approx(1.0)
+
+    # Less than MIN_TREND_YEARS years: no trend
+    assert ds.get_station_trends("ST2", 2015, 2020)[1]["trend"] is None
+
+
+def test_surface(mocker, tmp_path):
+    """Tests if the surfaces are interpolated from the aggregates of a year and cached per dataset version."""
+
+    import src.data_services as ds
+    from src.datapoint import DataPoint
+
+    backend = ds.SQLiteBackend(str(tmp_path / "weather.sqlite3"))
+    mocker.patch("src.data_services.backend", backend)
+    mocker.patch("src.data_services.station_catalog", None)
+    mocker.patch("src.data_services.surface_layers", ds.VersionedLRUCache())
+    mocker.patch("src.data_services.surface_tiles", ds.VersionedLRUCache())
+    with backend.write_session() as session:
+        session.insert_stations([
+            ds.st.Station("ST1", "WEST", 48.0, 8.0, 2020, 2020, 2020, 2020),
+            ds.st.Station("ST2", "EAST", 48.0, 9.0, 2020, 2020, 2020, 2020),
+        ])
+        for sid, station_id, *_ in session.get_stations():
+            tmax = {"ST1": 10.0, "ST2": 20.0}[station_id]
+            session.insert_datapoints(sid, [DataPoint(202000 + month, tmax=tmax, tmin=0.0) for month in range(1, 13)])
+        session.commit()
+    backend.rebuild_aggregates()
+
+    grid = ds.get_surface_grid(48.5, 47.5, 9.0, 8.0, 0.5, 2020)
+    assert grid["latitudes"] == [48.5, 48.0, 47.5]
+    assert grid["longitudes"] == [8.0, 8.5, 9.0]
+    assert grid["values"][3:6] == [pytest.approx(10.0, abs=0.01), 15.0, pytest.approx(20.0, abs=0.01)]
+
+    spy = mocker.spy(ds.surface, "interpolate_grid")
+    assert ds.get_surface_grid(48.5, 47.5, 9.0, 8.0, 0.5, 2020) == grid
+    assert spy.call_count == 0
+
+    tile = ds.get_surface_tile(6, 33, 22, 2020)
+    assert tile.startswith(b"\x89PNG")
+    assert ds.get_surface_tile(6, 33, 22, 2020) == tile
+    assert spy.call_count == 1
+
+    # No values in other years
+    assert set(ds.get_surface_grid(48.5, 47.5, 9.0, 8.0, 0.5, 2019)["values"]) == {None}
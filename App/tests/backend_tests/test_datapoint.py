@@ -7,6 +7,8 @@
 import pytest
 from src.data_services import get_datapoints_for_station
 from src.datapoint import DataPoint, extract_average_value, download_and_create_datapoints, download_and_create_datapoints_local
+from src.datapoint import parse_elements, create_datapoints_from_lines, create_records_from_lines, fetch_records
+from src import daily_store
 from mysql.connector import pooling
 from unittest import mock
 
@@ -95,14 +97,6 @@ def mock_db_cursor(mocker):
     return mock_cursor
 
 
-@pytest.fixture
-def mock_extract_average_value():
-    """Mock the extract_average_value function to return predefined values"""
-
-    with mock.patch("src.datapoint.extract_average_value", side_effect=[27.23, 21.02]):
-        yield
-
-
 @pytest.fixture
 def mock_path_exists():
     """Mock os.path.exists to always return True"""
@@ -123,7 +117,7 @@ def mock_open_file():
         yield
 
 
-def test_download_and_create_datapoints_local(mock_path_exists, mock_open_file, mock_extract_average_value):
+def test_download_and_create_datapoints_local(mock_path_exists, mock_open_file):
     """Tests if data is correctly extracted when the file exists"""
 
     station_id = "ACW00011604"
@@ -132,8 +126,8 @@ def test_download_and_create_datapoints_local(mock_path_exists, mock_open_file,
     # Ensure the function returns the expected list of DataPoint objects
     assert len(datapoints) == 1, f"Error: Expected 1 data point, got {len(datapoints)}"
     assert datapoints[0].date == 194901, f"Error: Expected date 194901, got {datapoints[0].date}"
-    assert datapoints[0].tmax == 27.23, f"Error: Expected tmax 27.23, got {datapoints[0].tmax}"
-    assert datapoints[0].tmin == 21.02, f"Error: Expected tmin 21.02, got {datapoints[0].tmin}"
+    assert datapoints[0].tmax == 27.461, f"Error: Expected tmax 27.461, got {datapoints[0].tmax}"
+    assert datapoints[0].tmin == 20.984, f"Error: Expected tmin 20.984, got {datapoints[0].tmin}"
     assert datapoints[0].station == station_id, f"Error: Expected station {station_id}, got {datapoints[0].station}"
 
 
@@ -152,6 +146,94 @@ def test_download_and_create_datapoints_local_not_existing_file(mock_print, mock
     mock_print.assert_called_once_with(f"Error: File /data/ghcnd_all/{station_id}.dly not found.")
 
 
+def test_fetch_records_by_source():
+    """Tests if the records of a station are downloaded for source url and read from the directory otherwise."""
+
+    with mock.patch("src.datapoint.download_and_create_records", return_value=([], [], [])) as download, \
+            mock.patch("src.datapoint.download_and_create_records_local", return_value=([], [], [])) as local:
+        fetch_records("url", None, "ST1")
+        download.assert_called_once_with("ST1")
+        fetch_records("local", "/data", "ST1")
+        local.assert_called_once_with("ST1", "/data")
+
+
+def dly_line(station_id, year, month, element, values):
+    """Formats a .dly line with the given daily values, the remaining days are missing."""
+
+    days = list(values) + [-9999] * (31 - len(values))
+    return f"{station_id:<11}{year}{month:02d}{element}" + "".join(f"{value:5d}   " for value in days) + "\n"
+
+
+def test_parse_elements():
+    """Tests if all configured elements are extracted in one pass with means, sums and valid days."""
+
+    lines = [
+        dly_line("ST123", 2020, 1, "TMAX", [10, 30]),
+        dly_line("ST123", 2020, 1, "PRCP", [5, 0, 15]),
+        dly_line("ST123", 2020, 1, "SNOW", [-9999]),
+        dly_line("ST123", 2020, 1, "WT01", [1]),
+    ]
+
+    assert parse_elements(lines, ("TMAX", "PRCP", "SNOW")) == [
+        (2020, 1, "TMAX", 2.0, 2),
+        (2020, 1, "PRCP", 2.0, 3),
+    ]
+
+
+def test_zero_degree_months_are_kept():
+    """Tests if a month with a mean of exactly 0.0 °C is not dropped and TMAX/TMIN are paired by month."""
+
+    lines = [
+        dly_line("ST123", 2020, 1, "TMAX", [10, -10]),
+        dly_line("ST123", 2020, 1, "TMIN", [-20, -40]),
+        dly_line("ST123", 2020, 2, "TMAX", [50]),
+        dly_line("ST123", 2020, 3, "TMIN", [-50]),
+        dly_line("ST123", 2020, 3, "TMAX", [0]),
+    ]
+
+    datapoints = create_datapoints_from_lines(lines, "ST123")
+
+    assert [(datapoint.date, datapoint.tmax, datapoint.tmin) for datapoint in datapoints] == [
+        (202001, 0.0, -3.0),
+        (202003, 0.0, -5.0),
+    ]
+
+
+def test_create_records_from_lines():
+    """Tests if the datapoints and the element values come from the same pass over the lines."""
+
+    lines = [
+        dly_line("ST123", 2020, 1, "TMAX", [100]),
+        dly_line("ST123", 2020, 1, "TMIN", [20]),
+        dly_line("ST123", 2020, 1, "PRCP", [12]),
+    ]
+
+    datapoints, element_values, daily_values = create_records_from_lines(lines, "ST123", ("PRCP",), ())
+
+    assert [(datapoint.date, datapoint.tmax, datapoint.tmin) for datapoint in datapoints] == [(202001, 10.0, 2.0)]
+    assert element_values == [(2020, 1, "PRCP", 1.2, 1)]
+    assert daily_values == []
+
+
+def test_create_daily_values_from_lines():
+    """Tests if the daily values are stored by day of the year from the same pass over the lines."""
+
+    lines = [
+        dly_line("ST123", 2021, 1, "TMAX", [100, -9999, -25]),
+        dly_line("ST123", 2021, 3, "TMAX", [7]),
+        dly_line("ST123", 2021, 3, "TMIN", [-30]),
+        dly_line("ST123", 2021, 3, "PRCP", [0, 12]),
+    ]
+
+    datapoints, element_values, daily_values = create_records_from_lines(lines, "ST123", ("PRCP",), ("TMAX",))
+
+    assert [(datapoint.date, datapoint.tmax, datapoint.tmin) for datapoint in datapoints] == [(202103, 0.7, -3.0)]
+    assert element_values == [(2021, 3, "PRCP", 1.2, 2)]
+    assert [(element, year) for element, year, blob in daily_values] == [("TMAX", 2021)]
+    values = daily_store.decode(daily_values[0][2])
+    assert daily_store.to_series(2021, values, 10) == [("2021-01-01", 10.0), ("2021-01-03", -2.5),
+                                                       ("2021-03-01", 0.7)]
+
 # Initialize the connection pool based on the configuration from the code
 dbconfig = {
     "user": "root",
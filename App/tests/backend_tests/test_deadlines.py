@@ -0,0 +1,79 @@
+# =========================================================
+# TESTS FOR .PY
+# -> deadlines.py
+# =========================================================
+
+import time
+import pytest
+from src import deadlines
+from src.sqlite_backend import SQLiteBackend
+from src import sqlite_backend, calculations
+
+
+def test_request_timeout():
+    """Tests if clients can only shorten the server-side time budget."""
+
+    assert deadlines.request_timeout(None, 30) == 30
+    assert deadlines.request_timeout("5", 30) == 5
+    assert deadlines.request_timeout(b"2.5", 30) == 2.5
+    assert deadlines.request_timeout("600", 30) == 30
+    assert deadlines.request_timeout("soon", 30) == 30
+
+
+def test_check_and_remaining():
+    """Tests if the deadline only applies inside its context."""
+
+    assert deadlines.remaining() is None
+    deadlines.check()
+
+    with deadlines.deadline(10):
+        assert 9 < deadlines.remaining() <= 10
+        deadlines.check()
+
+    with deadlines.deadline(0):
+        with pytest.raises(deadlines.DeadlineExceeded):
+            deadlines.check()
+
+    assert deadlines.remaining() is None
+
+
+def test_with_max_execution_time():
+    """Tests if SELECT statements get the MAX_EXECUTION_TIME hint with the remaining milliseconds."""
+
+    query = "\n    SELECT year, AVG(tmin) FROM Datapoint WHERE SID = %s"
+    assert deadlines.with_max_execution_time(query) == query
+
+    with deadlines.deadline(2):
+        hinted = deadlines.with_max_execution_time(query)
+        assert "SELECT /*+ MAX_EXECUTION_TIME(" in hinted
+        milliseconds = int(hinted.split("MAX_EXECUTION_TIME(")[1].split(")")[0])
+        assert 1900 < milliseconds <= 2000
+        assert deadlines.with_max_execution_time("SHOW VARIABLES;") == "SHOW VARIABLES;"
+
+
+def test_radius_search_aborts():
+    """Tests if the radius search stops when the deadline has passed."""
+
+    stations = [("ID", "NAME", 48.0, 7.8)] * 10
+
+    # calculations imports the module from the src directory, not as src.deadlines
+    with calculations.deadlines.deadline(0):
+        with pytest.raises(calculations.deadlines.DeadlineExceeded):
+            calculations.find_stations_within_radius(stations, 48.0, 7.8, 100, -1)
+
+
+def test_sqlite_query_interrupted(tmp_path):
+    """Tests if a running SQLite statement is aborted by the progress handler at the deadline."""
+
+    backend = SQLiteBackend(str(tmp_path / "weather.sqlite3"))
+    slow_query = ("WITH RECURSIVE numbers(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM numbers WHERE n < 100000000) "
+                  "SELECT COUNT(*) FROM numbers")
+
+    started = time.perf_counter()
+    with sqlite_backend.deadlines.deadline(0.2):
+        with pytest.raises(sqlite_backend.deadlines.DeadlineExceeded):
+            backend.fetch_all(slow_query)
+    assert time.perf_counter() - started < 5
+
+    # The connection is usable afterwards
+    assert backend.fetch_all("SELECT 1") == [(1,)]
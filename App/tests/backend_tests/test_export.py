@@ -0,0 +1,110 @@
+# =========================================================
+# TESTS FOR .PY
+# -> export.py
+# =========================================================
+
+import csv
+import io
+import pytest
+from src import export
+from src.datapoint import DataPoint
+
+
+@pytest.fixture
+def backend(tmp_path, mocker):
+    """Creates an SQLite backend with three stations, monthly datapoints for 2019-2020 and their aggregates."""
+
+    backend = export.ds.SQLiteBackend(str(tmp_path / "weather.sqlite3"))
+    mocker.patch.object(export.ds, "backend", backend)
+    with backend.write_session() as session:
+        session.insert_stations([
+            export.ds.st.Station(station_id, station_id, 48.0, 8.0, 2020, 2019, 2020, 2019)
+            for station_id in ("ST3", "ST1", "ST2")
+        ])
+        for sid, station_id, *_ in session.get_stations():
+            session.insert_datapoints(sid, [DataPoint(year * 100 + month, tmax=float(month), tmin=-float(month))
+                                            for year in (2019, 2020) for month in range(1, 13)])
+        session.commit()
+    backend.rebuild_aggregates()
+    return backend
+
+
+def read_csv(chunks):
+    return list(csv.reader(io.StringIO(b"".join(chunks).decode())))
+
+
+def test_monthly_csv_export(backend, mocker):
+    """Tests if the monthly rows of all stations are streamed in station and date order, batch by batch."""
+
+    mocker.patch.object(export, "STATION_IDS_PER_QUERY", 2)
+    chunks = list(export.export_chunks(["ST2", "ST1", "ST3", "ST1"], 2020, 2020, batch_size=5))
+
+    rows = read_csv(chunks)
+    assert rows[0] == ["station_id", "year", "month", "tmax", "tmin"]
+    assert rows[1] == ["ST1", "2020", "1", "1.0", "-1.0"]
+    assert [row[0] for row in rows[1:]] == ["ST1"] * 12 + ["ST2"] * 12 + ["ST3"] * 12
+    # Two station chunks of 24 and 12 rows in batches of up to 5 rows
+    assert len(chunks) == 5 + 3
+
+
+def test_yearly_csv_export(backend):
+    """Tests if a yearly export contains the requested periods of the aggregates."""
+
+    rows = read_csv(export.export_chunks(["ST1"], 2019, 2020, "yearly", ("annual", "summer")))
+
+    assert rows[0] == ["station_id", "year", "period", "tmin", "tmax"]
+    assert [(row[1], row[2]) for row in rows[1:]] == [("2019", "annual"), ("2019", "summer"),
+                                                      ("2020", "annual"), ("2020", "summer")]
+    assert float(rows[2][4]) == pytest.approx(7.0, abs=0.1)
+
+
+def test_empty_export(backend):
+    """Tests if an export without rows still has the header."""
+
+    assert read_csv(export.export_chunks([], 2019, 2020)) == [["station_id", "year", "month", "tmax", "tmin"]]
+    assert read_csv(export.export_chunks(["UNKNOWN"], 2019, 2020)) == [["station_id", "year", "month", "tmax", "tmin"]]
+
+
+def test_export_deadline(backend, mocker):
+    """Tests if the queries of an export run with the export deadline, and the command line export without."""
+
+    remaining = []
+    stream_rows = backend.stream_rows
+
+    def record_deadline(*args):
+        remaining.append(export.deadlines.remaining())
+        return stream_rows(*args)
+
+    mocker.patch.object(backend, "stream_rows", side_effect=record_deadline)
+    list(export.export_chunks(["ST1"], 2020, 2020, timeout=30))
+    list(export.export_chunks(["ST1"], 2020, 2020, timeout=None))
+    assert 0 < remaining[0] <= 30
+    assert remaining[1] is None
+    assert export.deadlines.remaining() is None
+
+    with pytest.raises(export.deadlines.DeadlineExceeded):
+        list(export.export_chunks(["ST1"], 2020, 2020, timeout=0))
+
+
+def test_chunk_sink():
+    """Tests if the sink hands out the written bytes once and keeps the absolute position."""
+
+    sink = export.ChunkSink()
+    sink.write(b"PAR1")
+    assert sink.take() == b"PAR1"
+    sink.write(memoryview(b"data"))
+    assert sink.tell() == 8
+    assert sink.take() == b"data"
+    assert sink.take() == b""
+
+
+def test_parquet_export(backend):
+    """Tests if the Parquet export has one row group per batch."""
+
+    pq = pytest.importorskip("pyarrow.parquet")
+    data = b"".join(export.export_chunks(["ST1", "ST2"], 2019, 2020, file_format="parquet", batch_size=10))
+
+    parquet_file = pq.ParquetFile(io.BytesIO(data))
+    assert parquet_file.metadata.num_rows == 48
+    assert parquet_file.num_row_groups == 5
+    assert parquet_file.read().column("station_id").to_pylist()[:1] == ["ST1"]
@@ -0,0 +1,138 @@
+# =========================================================
+# TESTS FOR .PY
+# -> jobs.py
+# =========================================================
+
+import json
+import threading
+import time
+import pytest
+from src import jobs
+
+
+REGION = {"latitude": 48.0, "longitude": "7.8", "radius": 50, "yearStart": 2000, "yearEnd": "2020"}
+
+
+@pytest.fixture
+def manager(tmp_path, mocker):
+    """Creates a job manager on an empty SQLite backend."""
+
+    backend = jobs.ds.SQLiteBackend(str(tmp_path / "weather.sqlite3"))
+    mocker.patch.object(jobs.ds, "backend", backend)
+    mocker.patch.object(jobs.ds, "current_dataset_version", return_value=1)
+    manager = jobs.JobManager(workers=2, max_pending=2, timeout=60, ttl=60, progress_interval=0)
+    yield manager
+    manager.executor.shutdown(wait=True)
+
+
+def wait(manager, job_id):
+    """Waits until a job has finished and returns its status."""
+
+    for _ in range(500):
+        job = manager.status(job_id)
+        if job["status"] in jobs.FINISHED:
+            return job
+        time.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+def test_job_result_and_deduplication(manager, mocker):
+    """Tests if a job runs in the background, stores its result and identical jobs are not run twice."""
+
+    aggregates = mocker.patch.object(jobs.ds, "get_regional_aggregates", return_value=(3, [[(2000, 9.5)]]))
+
+    job, created = manager.submit("regional_data", REGION)
+    assert created and job["status"] == "queued"
+    assert job["params"]["longitude"] == 7.8 and job["params"]["weighting"] == "mean"
+
+    assert wait(manager, job["jobId"])["progress"] == 1.0
+    status, body, error = manager.result(job["jobId"])
+    assert status == "done" and error is None
+    assert json.loads(body) == {"stationCount": 3, "weatherData": [[[2000, 9.5]]]}
+    assert aggregates.call_args.args == (48.0, 7.8, 50.0, 2000, 2020, -1, False, jobs.MIN_YEAR_COVERAGE)
+
+    # Equal after normalization, so the finished job is returned
+    same, created = manager.submit("regional_data", dict(REGION, yearEnd=2020, unknown=1))
+    assert not created and same["jobId"] == job["jobId"]
+    assert aggregates.call_count == 1
+
+    other, created = manager.submit("regional_data", dict(REGION, weighting="idw"))
+    assert created and other["jobId"] != job["jobId"]
+
+
+def test_failed_job_is_replaced(manager, mocker):
+    """Tests if a failed job reports its error and an identical submission runs it again."""
+
+    mocker.patch.object(jobs.ds, "get_datapoints_for_station", side_effect=[RuntimeError("database gone"), []])
+    params = {"stationNames": ["ST1"], "yearStart": 2000, "yearEnd": 2020}
+
+    job, _ = manager.submit("station_series", params)
+    failed = wait(manager, job["jobId"])
+    assert failed["status"] == "failed"
+    assert failed["error"] == "RuntimeError: database gone"
+
+    retry, created = manager.submit("station_series", params)
+    assert created and retry["jobId"] != job["jobId"]
+    assert wait(manager, retry["jobId"])["status"] == "done"
+    assert manager.status(job["jobId"]) is None
+
+
+def test_progress_and_queue_limit(manager, mocker):
+    """Tests if running jobs report their progress and submissions beyond max_pending are rejected."""
+
+    release = threading.Event()
+    reached = threading.Event()
+
+    def datapoints(station_id, first_year, last_year):
+        if station_id in ("ST3", "ST5"):
+            reached.set()
+            release.wait(5)
+        return [[2000, 1.0, 2.0]]
+
+    mocker.patch.object(jobs.ds, "get_datapoints_for_station", side_effect=datapoints)
+    job, _ = manager.submit("station_series", {"stationNames": ["ST1", "ST2", "ST3", "ST4"], "yearStart": 2000,
+                                               "yearEnd": 2020})
+    assert reached.wait(5)
+    running = manager.status(job["jobId"])
+    assert running["status"] == "running" and running["progress"] == 0.5
+
+    manager.submit("station_series", {"stationNames": ["ST5"], "yearStart": 2000, "yearEnd": 2020})
+    with pytest.raises(jobs.JobQueueFull):
+        manager.submit("station_series", {"stationNames": ["ST6"], "yearStart": 2000, "yearEnd": 2020})
+
+    release.set()
+    wait(manager, job["jobId"])
+    assert set(json.loads(manager.result(job["jobId"])[1])) == {"ST1", "ST2", "ST3", "ST4"}
+
+
+def test_finished_jobs_expire(tmp_path, mocker):
+    """Tests if finished jobs and their results are removed after the TTL."""
+
+    backend = jobs.ds.SQLiteBackend(str(tmp_path / "weather.sqlite3"))
+    mocker.patch.object(jobs.ds, "backend", backend)
+    mocker.patch.object(jobs.ds, "current_dataset_version", return_value=1)
+    mocker.patch.object(jobs.ds, "rank_stations_by_trend", return_value=[])
+    manager = jobs.JobManager(workers=1, max_pending=1, timeout=60, ttl=0)
+
+    assert manager.status("unknown") is None
+    job, _ = manager.submit("rank_stations", REGION)
+    manager.executor.shutdown(wait=True)
+
+    time.sleep(0.01)
+    assert manager.status(job["jobId"]) is None
+    assert manager.result(job["jobId"]) is None
+
+
+def test_normalize_errors():
+    """Tests if unknown kinds, missing and invalid parameters are rejected with the route messages."""
+
+    with pytest.raises(jobs.JobError, match="Ungültiger Parameter kind"):
+        jobs.normalize("export_everything", {})
+    with pytest.raises(jobs.JobError, match="Fehlende Parameter"):
+        jobs.normalize("regional_data", {"latitude": 48.0})
+    with pytest.raises(jobs.JobError, match="Ungültiger Parameter radius"):
+        jobs.normalize("regional_data", dict(REGION, radius="far"))
+    with pytest.raises(jobs.JobError, match="Ungültiger Parameter period"):
+        jobs.normalize("rank_stations", dict(REGION, period="monsoon"))
+    with pytest.raises(jobs.JobError, match="Ungültiger Parameter stationNames"):
+        jobs.normalize("station_series", {"stationNames": "ST1", "yearStart": 2000, "yearEnd": 2020})
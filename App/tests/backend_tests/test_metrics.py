@@ -0,0 +1,56 @@
+# =========================================================
+# TESTS FOR .PY
+# -> metrics.py
+# =========================================================
+
+import pytest
+from src import metrics
+
+
+def test_counter_render():
+    """Tests if counters are rendered per label combination and label values are escaped."""
+
+    counter = metrics.Counter("test_total", "Test counter.", ("cache", "result"))
+    counter.inc(cache="station_catalog", result="hit")
+    counter.inc(2, cache="station_catalog", result="hit")
+    counter.inc(cache='a"b', result="miss")
+
+    lines = counter.render()
+
+    assert lines[:2] == ["# HELP test_total Test counter.", "# TYPE test_total counter"]
+    assert 'test_total{cache="station_catalog",result="hit"} 3' in lines
+    assert 'test_total{cache="a\\"b",result="miss"} 1' in lines
+    assert metrics.Counter("plain_total", "No labels.").render()[-1] == "plain_total 0"
+
+
+def test_histogram_buckets_are_cumulative():
+    """Tests if the histogram buckets accumulate and the sum and count are exported."""
+
+    histogram = metrics.Histogram("test_seconds", "Test histogram.", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value, route="/submit")
+
+    lines = histogram.render()
+
+    assert 'test_seconds_bucket{route="/submit",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{route="/submit",le="1.0"} 3' in lines
+    assert 'test_seconds_bucket{route="/submit",le="+Inf"} 4' in lines
+    assert 'test_seconds_sum{route="/submit"} 6.05' in lines
+    assert 'test_seconds_count{route="/submit"} 4' in lines
+
+
+def test_query_timer_records_on_error():
+    """Tests if a failing query is timed and the row count is only recorded when set."""
+
+    before = metrics.QUERY_SECONDS.get_count(query="failing")
+
+    with pytest.raises(RuntimeError):
+        with metrics.query_timer("failing"):
+            raise RuntimeError("query failed")
+
+    with metrics.query_timer("with_rows") as result:
+        result["rows"] = 12
+
+    assert metrics.QUERY_SECONDS.get_count(query="failing") == before + 1
+    assert metrics.QUERY_ROWS.get_count(query="failing") == 0
+    assert metrics.QUERY_ROWS.get_count(query="with_rows") == 1
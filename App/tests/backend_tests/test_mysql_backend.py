@@ -0,0 +1,163 @@
+# =========================================================
+# TESTS FOR .PY
+# -> mysql_backend.py
+# =========================================================
+
+from unittest.mock import MagicMock
+import mysql.connector
+from src.mysql_backend import MySQLBackend, MySQLWriteSession, load_datapoints
+from src.pool_manager import PoolBusyError
+from src.datapoint import DataPoint
+
+
+def test_load_datapoints_csv(tmp_path):
+    """Tests if the rows are written as CSV and loaded with relaxed checks that are restored afterwards."""
+
+    cursor = MagicMock()
+    contents = {}
+
+    def execute(statement, params=()):
+        if "LOAD DATA" in statement:
+            contents["csv"] = open(params[0]).read()
+            contents["statement"] = statement
+    cursor.execute.side_effect = execute
+
+    load_datapoints(cursor, "Datapoint_new", [(1, "2020", "01", 4.5, -3.25), (1, "2020", "02", 6.0, -1.0)],
+                    directory=str(tmp_path))
+
+    assert contents["csv"] == "1,2020,01,4.5,-3.25\n1,2020,02,6.0,-1.0\n"
+    assert "INTO TABLE Datapoint_new" in contents["statement"]
+    statements = [call.args[0] for call in cursor.execute.call_args_list]
+    assert statements[0] == "SET SESSION foreign_key_checks = 0, unique_checks = 0;"
+    assert statements[-1] == "SET SESSION foreign_key_checks = 1, unique_checks = 1;"
+    assert list(tmp_path.iterdir()) == [], "Error: The temporary CSV file must be removed"
+
+
+def test_write_session_buffers_until_commit(mocker):
+    """Tests if datapoints are buffered, loaded in batches and flushed on commit."""
+
+    load = mocker.patch("src.mysql_backend.load_datapoints")
+    connection = MagicMock()
+    session = MySQLWriteSession(connection, MagicMock(), bulk_load=True, batch_size=3)
+
+    session.insert_datapoints(1, [DataPoint(202001, tmax=1.0, tmin=0.0), DataPoint(202002, tmax=2.0, tmin=0.0)])
+    load.assert_not_called()
+
+    session.insert_datapoints(2, [DataPoint(202001, tmax=3.0, tmin=0.0)])
+    assert load.call_count == 1
+    assert len(load.call_args.args[2]) == 3
+
+    session.insert_datapoints(3, [DataPoint(202001, tmax=4.0, tmin=0.0)])
+    session.commit()
+    assert load.call_count == 2
+    connection.commit.assert_called_once()
+
+
+def test_write_session_falls_back_to_insert(mocker):
+    """Tests if INSERT statements are used when the server rejects LOAD DATA LOCAL INFILE."""
+
+    mocker.patch("src.mysql_backend.load_datapoints",
+                 side_effect=mysql.connector.Error(msg="local infile disabled", errno=3948))
+    cursor = MagicMock()
+    session = MySQLWriteSession(MagicMock(), cursor, bulk_load=True, batch_size=1)
+
+    session.insert_datapoints(1, [DataPoint(202001, tmax=1.0, tmin=0.0)])
+    session.insert_datapoints(1, [DataPoint(202002, tmax=2.0, tmin=0.0)])
+
+    assert cursor.executemany.call_count == 2
+    assert session.bulk_load is False
+
+
+def test_write_session_loads_element_values(mocker):
+    """Tests if element values are buffered and loaded into the ElementValue table next to the datapoints."""
+
+    load = mocker.patch("src.mysql_backend.load_datapoints")
+    session = MySQLWriteSession(MagicMock(), MagicMock(), suffix="_new", bulk_load=True, batch_size=100)
+
+    session.insert_datapoints(1, [DataPoint(202001, tmax=1.0, tmin=0.0)])
+    session.insert_element_values(1, [(2020, 1, "PRCP", 12.5, 31), (2020, 1, "SNOW", 0.0, 30)])
+    session.commit()
+
+    assert [call.args[1] for call in load.call_args_list] == ["Datapoint_new", "ElementValue_new"]
+    assert load.call_args.args[2] == [(1, "PRCP", 2020, 1, 12.5, 31), (1, "SNOW", 2020, 1, 0.0, 30)]
+    assert load.call_args.kwargs["columns"] == "SID, element, year, month, value, days"
+
+
+def test_write_session_inserts_daily_values():
+    """Tests if the compressed daily values are inserted as parameters instead of the CSV bulk load."""
+
+    cursor = MagicMock()
+    session = MySQLWriteSession(MagicMock(), cursor, suffix="_new", bulk_load=True, batch_size=100)
+
+    session.insert_daily_values(1, [("TMAX", 2020, b"\x78\x9c")])
+    session.insert_daily_values(1, [])
+
+    cursor.executemany.assert_called_once()
+    assert "INSERT INTO DailyValue_new" in cursor.executemany.call_args.args[0]
+    assert cursor.executemany.call_args.args[1] == [(1, "TMAX", 2020, b"\x78\x9c")]
+
+
+def test_has_stations_fails_fast():
+    """Tests if the readiness probe uses the probe connection and answers False instead of raising."""
+
+    read = MagicMock(side_effect=AssertionError("the probe must not use the retrying read connection"))
+    probe = MagicMock()
+    probe.return_value.cursor.return_value.__enter__.return_value.fetchall.return_value = [(1,)]
+    backend = MySQLBackend(MagicMock(), read, probe)
+    assert backend.has_stations()
+    probe.return_value.close.assert_called_once()
+
+    probe.side_effect = mysql.connector.Error(msg="Can't connect", errno=2003)
+    assert not backend.has_stations()
+    probe.side_effect = PoolBusyError("busy")
+    assert not backend.has_stations()
+
+
+def test_job_writes_issue_no_schema_statements():
+    """Tests if the schema is created once and write transactions and sessions only run their own statements."""
+
+    connection = MagicMock()
+    cursor = connection.cursor.return_value.__enter__.return_value
+    backend = MySQLBackend(MagicMock(return_value=connection), MagicMock())
+
+    backend.ensure_schema()
+    backend.ensure_schema()
+    statements = [call.args[0] for call in cursor.execute.call_args_list]
+    assert any("CREATE TABLE IF NOT EXISTS Job" in statement for statement in statements)
+    assert any("CREATE TABLE IF NOT EXISTS RequestLog" in statement for statement in statements)
+    assert any("ADD COLUMN" in statement for statement in statements)
+    assert len(statements) == len(set(statements)), "Error: The schema must be created only once"
+
+    cursor.execute.reset_mock()
+    with backend.write_transaction() as session:
+        session.execute("UPDATE Job SET progress = %s WHERE job_id = %s;", (0.5, "job"))
+        session.commit()
+    assert [call.args[0] for call in cursor.execute.call_args_list] == [
+        "UPDATE Job SET progress = %s WHERE job_id = %s;"]
+    connection.close.assert_called()
+
+    with backend.write_session() as session:
+        session.commit()
+    assert [call.args[0] for call in cursor.execute.call_args_list] == [
+        "UPDATE Job SET progress = %s WHERE job_id = %s;"]
+
+
+def test_stream_rows_discards_connection_when_closed_early():
+    """Tests if an export closed before the last row drops its connection instead of reading the rest."""
+
+    connection = MagicMock()
+    connection.cursor.return_value.fetchmany.side_effect = [[(1,)], [(2,)], []]
+    backend = MySQLBackend(MagicMock(), MagicMock(return_value=connection))
+
+    rows = backend.stream_rows("SELECT 1;")
+    assert next(rows) == [(1,)]
+    connection.unread_result = True
+    rows.close()
+    connection.discard.assert_called_once()
+    connection.consume_results.assert_not_called()
+    connection.close.assert_not_called()
+
+    connection.cursor.return_value.fetchmany.side_effect = [[(1,)], []]
+    connection.unread_result = False
+    assert list(backend.stream_rows("SELECT 1;")) == [[(1,)]]
+    connection.close.assert_called_once()
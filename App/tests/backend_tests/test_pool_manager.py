@@ -0,0 +1,182 @@
+# =========================================================
+# TESTS FOR .PY
+# -> pool_manager.py
+# =========================================================
+
+import threading
+import time
+import pytest
+import mysql.connector
+from src.pool_manager import PoolManager, PoolBusyError
+from unittest.mock import MagicMock
+
+
+@pytest.fixture
+def mock_connect(mocker):
+    """Mocks mysql.connector.connect so every call returns a new fake connection."""
+
+    def new_connection(**kwargs):
+        connection = MagicMock()
+        connection.in_transaction = False
+        return connection
+
+    return mocker.patch("src.pool_manager.mysql.connector.connect", side_effect=new_connection)
+
+
+def test_connections_are_created_lazily_and_reused(mock_connect):
+    """Tests if connections are opened on first use and reused after close()."""
+
+    pool = PoolManager({}, pool_size=2)
+    mock_connect.assert_not_called()
+
+    connection = pool.get_connection()
+    raw_connection = connection._connection
+    connection.close()
+    connection.close()  # second close has no effect
+
+    assert pool.get_connection()._connection is raw_connection
+    assert mock_connect.call_count == 1
+    assert pool.metrics()["in_use"] == 1
+
+
+def test_first_connection_retries_with_backoff(mocker):
+    """Tests if the first connection is retried with exponential backoff while MySQL is unreachable."""
+
+    mock_sleep = mocker.patch("src.pool_manager.time.sleep")
+    mocker.patch("src.pool_manager.mysql.connector.connect", side_effect=[
+        mysql.connector.errors.InterfaceError("unreachable"),
+        mysql.connector.errors.InterfaceError("unreachable"),
+        MagicMock(),
+    ])
+
+    pool = PoolManager({}, pool_size=2, retries=3, backoff=0.5)
+    pool.get_connection()
+
+    assert [call.args[0] for call in mock_sleep.call_args_list] == [0.5, 1.0]
+
+
+def test_no_retry_for_health_probes(mocker):
+    """Tests if retry=False fails fast instead of waiting for the backoff."""
+
+    mock_sleep = mocker.patch("src.pool_manager.time.sleep")
+    mocker.patch("src.pool_manager.mysql.connector.connect",
+                 side_effect=mysql.connector.errors.InterfaceError("unreachable"))
+
+    pool = PoolManager({}, pool_size=2, retries=3)
+    with pytest.raises(mysql.connector.Error):
+        pool.get_connection(retry=False)
+
+    mock_sleep.assert_not_called()
+    assert pool.metrics()["size"] == 0, "Error: A failed connection must not occupy a pool slot"
+
+
+def test_waiting_caller_gets_released_connection(mock_connect):
+    """Tests if a caller waits for a busy pool instead of failing and is served after a release."""
+
+    pool = PoolManager({}, pool_size=1, acquire_timeout=2)
+    first = pool.get_connection()
+
+    threading.Timer(0.05, first.close).start()
+    second = pool.get_connection()
+
+    metrics = pool.metrics()
+    assert mock_connect.call_count == 1
+    assert metrics["waits_total"] == 1
+    assert metrics["wait_seconds_total"] > 0
+    second.close()
+
+
+def test_acquire_timeout(mock_connect):
+    """Tests if a caller gives up after the acquisition timeout."""
+
+    pool = PoolManager({}, pool_size=1, acquire_timeout=0.05)
+    pool.get_connection()
+
+    with pytest.raises(PoolBusyError):
+        pool.get_connection()
+    assert pool.metrics()["timeouts_total"] == 1
+
+
+def test_wait_queue_is_bounded(mock_connect):
+    """Tests if callers beyond max_waiters are rejected immediately."""
+
+    pool = PoolManager({}, pool_size=1, max_waiters=1, acquire_timeout=1)
+    connection = pool.get_connection()
+
+    waiter = threading.Thread(target=lambda: pool.get_connection().close())
+    waiter.start()
+    while pool.metrics()["waiting"] == 0:
+        time.sleep(0.001)
+
+    started = time.monotonic()
+    with pytest.raises(PoolBusyError):
+        pool.get_connection()
+    assert time.monotonic() - started < 0.5, "Error: Rejection should not wait for the timeout"
+    assert pool.metrics()["rejected_total"] == 1
+
+    connection.close()
+    waiter.join()
+
+
+def test_pool_grows_up_to_ceiling_and_shrinks(mock_connect, mocker):
+    """Tests if the pool grows up to max_size under load and closes surplus idle connections."""
+
+    pool = PoolManager({}, pool_size=1, max_size=3, acquire_timeout=0.05, idle_timeout=0)
+    connections = [pool.get_connection() for _ in range(3)]
+    assert pool.metrics()["size"] == 3
+
+    with pytest.raises(PoolBusyError):
+        pool.get_connection()
+
+    for connection in connections:
+        connection.close()
+    assert pool.metrics()["size"] == 1, "Error: Pool should shrink back to pool_size"
+
+
+def test_broken_connection_is_replaced(mock_connect):
+    """Tests if a connection failing the health check is closed and replaced."""
+
+    pool = PoolManager({}, pool_size=1, health_check_interval=0)
+    connection = pool.get_connection()
+    raw_connection = connection._connection
+    raw_connection.ping.side_effect = mysql.connector.errors.OperationalError("gone away")
+    connection.close()
+
+    replacement = pool.get_connection()
+
+    assert replacement._connection is not raw_connection
+    raw_connection.close.assert_called_once()
+    assert pool.metrics()["health_check_failures_total"] == 1
+    assert pool.metrics()["size"] == 1
+
+
+def test_discarded_connection_leaves_the_pool(mock_connect):
+    """Tests if a discarded connection is shut down without being reused and frees its slot."""
+
+    pool = PoolManager({}, pool_size=1, acquire_timeout=0.05)
+    connection = pool.get_connection()
+    raw_connection = connection._connection
+    connection.discard()
+    connection.close()  # no effect after discard()
+
+    raw_connection.shutdown.assert_called_once()
+    raw_connection.close.assert_not_called()
+    assert pool.metrics()["size"] == 0 and pool.metrics()["in_use"] == 0
+    assert pool.get_connection()._connection is not raw_connection
+
+
+def test_connections_in_use_are_closed_after_pool_close(mock_connect):
+    """Tests if close() closes idle connections at once and connections in use when they are returned."""
+
+    pool = PoolManager({}, pool_size=2)
+    idle, in_use = pool.get_connection(), pool.get_connection()
+    raw_idle, raw_in_use = idle._connection, in_use._connection
+    idle.close()
+
+    pool.close()
+    raw_idle.close.assert_called_once()
+    raw_in_use.close.assert_not_called()
+
+    in_use.close()
+    raw_in_use.close.assert_called_once()
+    assert pool.metrics()["size"] == 0 and pool.metrics()["idle"] == 0
@@ -0,0 +1,190 @@
+# =========================================================
+# TESTS FOR .PY
+# -> prewarm.py
+# =========================================================
+
+import json
+import pytest
+from src import prewarm
+from src.datapoint import DataPoint
+
+
+@pytest.fixture
+def backend(tmp_path, mocker):
+    """Creates an SQLite backend with two stations and their aggregates, loads the catalog and empties the caches."""
+
+    ds = prewarm.ds
+    backend = ds.SQLiteBackend(str(tmp_path / "weather.sqlite3"))
+    mocker.patch.object(ds, "backend", backend)
+    mocker.patch.object(ds, "station_catalog", None)
+    mocker.patch.object(ds, "dataset_version", None)
+    mocker.patch.object(ds, "dataset_version_checked", 0.0)
+    mocker.patch.object(ds, "radius_cache", ds.VersionedLRUCache(100))
+    mocker.patch.object(ds, "aggregate_cache", ds.VersionedLRUCache(100))
+    with backend.write_session() as session:
+        session.insert_stations([ds.st.Station(station_id, station_id, 48.0, 8.0, 2020, 2019, 2020, 2019)
+                                 for station_id in ("ST1", "ST2")])
+        for sid, station_id, *_ in session.get_stations():
+            session.insert_datapoints(sid, [DataPoint(year * 100 + month, tmax=float(month), tmin=-float(month))
+                                            for year in (2019, 2020) for month in range(1, 13)])
+        session.commit()
+    backend.rebuild_aggregates()
+    ds.load_station_catalog()
+    return backend
+
+
+def test_request_key():
+    """Tests if request bodies are reduced to the arguments of the data_services function."""
+
+    body = {"latitude": 48, "longitude": 7.8, "radius": 50, "yearStart": 2000, "yearEnd": 2020, "stations": 10,
+            "stationsInRadius": []}
+    assert json.loads(prewarm.request_key("/submit", body)) == [48.0, 7.8, 50.0, 2000, 2020, 10,
+                                                                prewarm.MIN_YEAR_COVERAGE]
+    assert prewarm.request_key("/submit", dict(body, latitude=48.0)) == prewarm.request_key("/submit", body)
+    assert prewarm.request_key("/get_weather_data", {"stationName": "ST1", "yearStart": 2000,
+                                                     "yearEnd": 2020}) == '["ST1", 2000, 2020]'
+
+    assert prewarm.request_key("/submit", dict(body, yearStart="2000")) is None
+    assert prewarm.request_key("/submit", dict(body, stations=True)) is None
+    assert prewarm.request_key("/get_weather_data", {"stationName": "ST1", "yearStart": 2000}) is None
+    assert prewarm.request_key("/get_weather_data", {"stationName": "S" * 300, "yearStart": 2000,
+                                                     "yearEnd": 2020}) is None
+    assert prewarm.request_key("/get_regional_data", body) is None
+    assert prewarm.request_key("/submit", None) is None
+
+
+def test_record_and_top_requests(backend, mocker):
+    """Tests if the counts of all flushes are added up and the most frequent keys come first."""
+
+    recorder = prewarm.RequestRecorder(enabled=True, flush_interval=3600, retention_days=1)
+    assert recorder.top_requests(10) == []
+
+    station = {"stationName": "ST1", "yearStart": 2000, "yearEnd": 2020}
+    for _ in range(2):
+        recorder.record("/get_weather_data", station)
+    recorder.record("/get_weather_data", dict(station, stationName="ST2"))
+    recorder.record("/get_weather_data", {"stationName": "ST3"})
+    assert recorder.flush() == 2
+    assert recorder.flush() == 0
+
+    for _ in range(3):
+        recorder.record("/get_weather_data", dict(station, stationName="ST2"))
+    assert recorder.flush() == 1
+    assert recorder.top_requests(10) == [("/get_weather_data", ["ST2", 2000, 2020]),
+                                         ("/get_weather_data", ["ST1", 2000, 2020])]
+    assert recorder.top_requests(1) == [("/get_weather_data", ["ST2", 2000, 2020])]
+
+    # Keys not requested within the retention period are removed with the next flush
+    mocker.patch.object(prewarm.time, "time", return_value=prewarm.time.time() + 2 * 86400)
+    recorder.record("/get_weather_data", dict(station, stationName="ST4"))
+    recorder.flush()
+    assert recorder.top_requests(10) == [("/get_weather_data", ["ST4", 2000, 2020])]
+    assert backend.fetch_all("SELECT COUNT(*) FROM RequestLog;") == [(1,)]
+
+
+def test_disabled_recorder():
+    """Tests if nothing is counted with prewarming disabled."""
+
+    recorder = prewarm.RequestRecorder(enabled=False)
+    recorder.record("/get_weather_data", {"stationName": "ST1", "yearStart": 2000, "yearEnd": 2020})
+    assert not recorder.pending
+
+
+def test_prewarm_fills_caches(backend, mocker):
+    """Tests if the replayed requests are answered from the result caches afterwards."""
+
+    recorder = prewarm.RequestRecorder(enabled=True, flush_interval=3600)
+    mocker.patch.object(prewarm, "recorder", recorder)
+    weather = {"stationName": "ST1", "yearStart": 2019, "yearEnd": 2020}
+    region = {"latitude": 48.0, "longitude": 8.0, "radius": 10, "yearStart": 2019, "yearEnd": 2020, "stations": 5,
+              "minCoverage": 0.0}
+    recorder.record("/get_weather_data", weather)
+    recorder.record("/submit", region)
+    recorder.flush()
+
+    assert prewarm.prewarm(top_n=10, workers=2, time_budget=60, cpu_budget=60) == 2
+
+    aggregates = mocker.spy(backend, "get_aggregates")
+    series = prewarm.ds.get_datapoints_for_station("ST1", 2019, 2020)
+    stations = prewarm.ds.get_stations_in_radius(48, 8, 10, 2019, 2020, 5, 0.0)
+    aggregates.assert_not_called()
+    assert len(series) == 10 and series[0][0][0] == 2019
+    assert [station[0][0] for station in stations] == ["ST1", "ST2"]
+    assert stations is prewarm.ds.radius_cache.get(prewarm.ds.dataset_version, (48, 8, 10, 2019, 2020, 5, 0.0))
+
+    # Another key is still read from the database
+    prewarm.ds.get_datapoints_for_station("ST2", 2019, 2020)
+    aggregates.assert_called_once()
+
+
+def test_prewarm_budgets(backend, mocker):
+    """Tests if no request is replayed without time or CPU budget, or without loaded catalog."""
+
+    recorder = prewarm.RequestRecorder(enabled=True, flush_interval=3600)
+    mocker.patch.object(prewarm, "recorder", recorder)
+    recorder.record("/get_weather_data", {"stationName": "ST1", "yearStart": 2019, "yearEnd": 2020})
+    recorder.flush()
+    replay = mocker.patch.object(prewarm.ds, "get_datapoints_for_station")
+
+    assert prewarm.prewarm(top_n=10, time_budget=0, cpu_budget=60) == 0
+    assert prewarm.prewarm(top_n=10, time_budget=60, cpu_budget=0) == 0
+    assert prewarm.prewarm(top_n=0) == 0
+    replay.assert_not_called()
+
+    replay.side_effect = RuntimeError("database gone")
+    assert prewarm.prewarm(top_n=10, time_budget=60, cpu_budget=60) == 0
+    replay.assert_called_once_with("ST1", 2019, 2020)
+
+    mocker.patch.object(prewarm.ds, "dataset_version", None)
+    assert prewarm.prewarm(top_n=10, time_budget=60, cpu_budget=60) == 0
+    replay.assert_called_once()
+
+
+def test_dataset_swap_notifies_listeners(backend, mocker):
+    """Tests if a detected dataset swap reloads the catalog and starts the prewarming."""
+
+    listener = mocker.Mock()
+    mocker.patch.object(prewarm.ds, "dataset_listeners", [listener])
+
+    prewarm.ds.check_dataset_version(force=True)
+    listener.assert_not_called()
+
+    mocker.patch.object(backend, "get_dataset_version", return_value=5)
+    prewarm.ds.check_dataset_version(force=True)
+    listener.assert_called_once_with(5)
+
+    start = mocker.patch.object(prewarm, "start_background_prewarm")
+    prewarm.on_catalog_loaded(5)
+    start.assert_called_once()
+
+
+def test_catalog_load_on_startup_starts_prewarm(backend, mocker):
+    """Tests if loading the catalog at startup notifies the listeners, and the background run replays the requests."""
+
+    listener = mocker.Mock()
+    mocker.patch.object(prewarm.ds, "dataset_listeners", [listener])
+    assert prewarm.ds.load_station_catalog_on_startup()
+    listener.assert_called_once_with(prewarm.ds.dataset_version)
+
+    run = mocker.patch.object(prewarm, "prewarm", return_value=0)
+    prewarm.start_background_prewarm().join(5)
+    run.assert_called_once_with()
+
+
+def test_request_during_run_is_repeated(backend, mocker):
+    """Tests if a prewarm requested while a run is in progress starts another run afterwards."""
+
+    runs = []
+
+    def run():
+        runs.append(prewarm.ds.dataset_version)
+        if len(runs) == 1:
+            with prewarm.running:
+                # Catalog reloaded during the run: its caches are cleared and a run is requested
+                prewarm.prewarm_current_version()
+        return 0
+
+    mocker.patch.object(prewarm, "prewarm", side_effect=run)
+    prewarm.prewarm_current_version()
+    assert len(runs) == 2
+    assert not prewarm.rerun.is_set()
@@ -0,0 +1,83 @@
+# =========================================================
+# TESTS FOR .PY
+# -> profiling.py
+# =========================================================
+
+import os
+from flask import Flask, jsonify
+from src.profiling import init_profiling
+
+
+def create_test_app(tmp_path, **settings):
+    app = Flask(__name__)
+
+    @app.route('/submit', methods=['POST'])
+    def submit():
+        return jsonify(sum(index * index for index in range(1000))), 200
+
+    @app.route('/healthz', methods=['GET'])
+    def healthz():
+        return jsonify({"status": "ok"}), 200
+
+    enabled = init_profiling(app, directory=str(tmp_path), **settings)
+    return app, enabled
+
+
+def test_disabled_registers_no_hooks(tmp_path):
+    """Tests if profiling without token and sample rate adds no request hooks."""
+
+    app, enabled = create_test_app(tmp_path, token="", sample_rate=0)
+
+    assert enabled is False
+    assert not app.before_request_funcs
+    assert "X-Profile-ID" not in app.test_client().post("/submit").headers
+
+
+def test_profile_with_header(tmp_path):
+    """Tests if a request with the privileged header is profiled and the report can be fetched."""
+
+    app, _ = create_test_app(tmp_path, token="secret", sample_rate=0)
+    client = app.test_client()
+
+    assert "X-Profile-ID" not in client.post("/submit", headers={"X-Profile": "wrong"}).headers
+
+    # The file name is generated by the server, never taken from the client
+    response = client.post("/submit", headers={"X-Profile": "secret", "X-Request-ID": "req-1"})
+    assert response.status_code == 200
+    profile_id = response.headers["X-Profile-ID"]
+    assert profile_id != "req-1"
+    assert [path.name for path in tmp_path.iterdir()] == [f"{profile_id}.prof"]
+
+    assert client.get(f"/profiles/{profile_id}").status_code == 403
+    report = client.get(f"/profiles/{profile_id}", headers={"X-Profile": "secret"})
+    assert report.status_code == 200
+    assert "submit" in report.get_data(as_text=True)
+
+    assert client.get("/profiles/unknown", headers={"X-Profile": "secret"}).status_code == 404
+
+
+def test_sampling_only_profiles_data_routes(tmp_path):
+    """Tests if sampled profiling covers the data routes but not the health checks."""
+
+    app, _ = create_test_app(tmp_path, token="", sample_rate=1.0)
+    client = app.test_client()
+
+    assert "X-Profile-ID" in client.post("/submit").headers
+    assert "X-Profile-ID" not in client.get("/healthz").headers
+    assert len(list(tmp_path.glob("*.prof"))) == 1
+
+
+def test_old_profiles_are_removed(tmp_path):
+    """Tests if only the newest max_files profiles are kept."""
+
+    app, _ = create_test_app(tmp_path, token="", sample_rate=1.0, max_files=2)
+    client = app.test_client()
+
+    profile_ids = []
+    for index in range(4):
+        profile_ids.append(client.post("/submit").headers["X-Profile-ID"])
+        # Distinct modification times, the oldest profiles are removed first
+        os.utime(tmp_path / f"{profile_ids[-1]}.prof", (index, index))
+
+    assert sorted(path.name for path in tmp_path.glob("*.prof")) == sorted(
+        f"{profile_id}.prof" for profile_id in profile_ids[2:])
@@ -0,0 +1,67 @@
+# =========================================================
+# TESTS FOR .PY
+# -> query_log.py
+# =========================================================
+
+import json
+import sqlite3
+from unittest.mock import MagicMock
+from src import query_log
+
+
+def test_fast_query_not_logged(mocker):
+    """Tests if queries below the threshold only return their rows."""
+
+    record = mocker.patch("src.query_log.record_slow_query")
+    cursor = MagicMock()
+    cursor.fetchall.return_value = [(1,), (2,)]
+
+    assert query_log.execute(cursor, "SELECT 1", (), threshold=10) == [(1,), (2,)]
+    record.assert_not_called()
+    cursor.execute.assert_called_once_with("SELECT 1", ())
+
+
+def test_slow_query_logged_with_mysql_plan(mocker, tmp_path):
+    """Tests if a slow query is written to the log with parameters, row count and the JSON plan."""
+
+    log_path = tmp_path / "slow.jsonl"
+    mocker.patch("src.query_log.SLOW_QUERY_LOG_PATH", str(log_path))
+    cursor = MagicMock()
+    cursor.fetchall.side_effect = [[(2020, 5.0)], [('{"query_block": {"select_id": 1}}',)]]
+
+    rows = query_log.execute(cursor, "SELECT year, AVG(tmin) FROM Datapoint WHERE SID = %s", (7,), threshold=0)
+
+    assert rows == [(2020, 5.0)]
+    cursor.execute.assert_called_with("EXPLAIN FORMAT=JSON SELECT year, AVG(tmin) FROM Datapoint WHERE SID = %s", (7,))
+
+    entry = json.loads(log_path.read_text().splitlines()[-1])
+    assert entry["rows"] == 1
+    assert entry["params"] == ["7"]
+    assert entry["plan"] == {"query_block": {"select_id": 1}}
+    assert query_log.recent_slow_queries[-1]["query"] == entry["query"]
+
+
+def test_explain_failure_does_not_fail_query(mocker):
+    """Tests if an error in the EXPLAIN statement is stored instead of raised."""
+
+    mocker.patch("src.query_log.SLOW_QUERY_LOG_PATH", "")
+    cursor = MagicMock()
+    cursor.fetchall.return_value = [(1,)]
+    cursor.execute.side_effect = [None, RuntimeError("EXPLAIN not allowed")]
+
+    assert query_log.execute(cursor, "SELECT 1", (), threshold=0) == [(1,)]
+    assert query_log.recent_slow_queries[-1]["plan"] == {"error": "EXPLAIN not allowed"}
+
+
+def test_sqlite_query_plan(mocker):
+    """Tests if the plan rows of SQLite's EXPLAIN QUERY PLAN are stored."""
+
+    mocker.patch("src.query_log.SLOW_QUERY_LOG_PATH", "")
+    connection = sqlite3.connect(":memory:")
+    connection.execute("CREATE TABLE Datapoint (SID INT, year INT)")
+
+    query_log.execute(connection.cursor(), "SELECT * FROM Datapoint WHERE SID = ?", (1,),
+                      explain_prefix="EXPLAIN QUERY PLAN ", threshold=0)
+
+    plan = query_log.recent_slow_queries[-1]["plan"]
+    assert any("SCAN" in row[-1] for row in plan)
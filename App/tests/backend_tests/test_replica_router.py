@@ -0,0 +1,183 @@
+# =========================================================
+# TESTS FOR .PY
+# -> replica_router.py
+# =========================================================
+
+import os
+import pytest
+import mysql.connector
+from src.replica_router import ReplicaRouter, PoolBusyError
+from unittest.mock import MagicMock
+
+
+def make_pool(in_use=0, max_size=10, lag=0.0):
+    """Creates a fake PoolManager with the given utilisation and replication lag."""
+
+    pool = MagicMock()
+    pool.metrics.return_value = {"in_use": in_use, "waiting": 0, "max_size": max_size}
+    pool.replication_lag = lag
+    return pool
+
+
+@pytest.fixture
+def lag(mocker):
+    """Mocks the lag measurement with the replication_lag of the fake pools."""
+
+    mocker.patch.object(ReplicaRouter, "measure_lag", autospec=True,
+                        side_effect=lambda router, pool: pool.replication_lag)
+
+
+def test_round_robin(lag):
+    """Tests if reads alternate between all replicas that are in sync."""
+
+    replicas = {"replica1": make_pool(lag=0.0), "replica2": make_pool(lag=1.0)}
+    router = ReplicaRouter(make_pool(), replicas)
+
+    connections = [router.get_read_connection() for _ in range(4)]
+
+    assert connections == [replicas["replica1"].get_connection.return_value,
+                           replicas["replica2"].get_connection.return_value] * 2
+
+
+def test_least_loaded(lag):
+    """Tests if the replica with the lowest utilisation is preferred."""
+
+    replicas = {"replica1": make_pool(in_use=8), "replica2": make_pool(in_use=2)}
+    router = ReplicaRouter(make_pool(), replicas, strategy="least_loaded")
+
+    assert router.get_read_connection() is replicas["replica2"].get_connection.return_value
+
+
+def test_lagging_replica_is_skipped(lag):
+    """Tests if replicas behind by more than max_lag or not replicating receive no reads."""
+
+    replicas = {"replica1": make_pool(lag=120.0), "replica2": make_pool(lag=None)}
+    primary = make_pool()
+    router = ReplicaRouter(primary, replicas, max_lag=30)
+
+    assert router.get_read_connection() is primary.get_connection.return_value
+    assert router.metrics()["primary_reads_total"] == 1
+
+
+def test_unreachable_replica_falls_back_to_primary(lag):
+    """Tests if a failing replica is skipped until the next lag check and reads go to the primary."""
+
+    replicas = {"replica1": make_pool()}
+    replicas["replica1"].get_connection.side_effect = mysql.connector.errors.InterfaceError("down")
+    primary = make_pool()
+    router = ReplicaRouter(primary, replicas, lag_check_interval=60)
+
+    assert router.get_read_connection() is primary.get_connection.return_value
+    assert router.get_read_connection() is primary.get_connection.return_value
+    assert replicas["replica1"].get_connection.call_count == 1
+    assert router.metrics()["lag_seconds"]["replica1"] is None
+
+
+def test_lag_check_runs_outside_the_lock(mocker):
+    """Tests if the lag queries run without the router lock, so other reads are not serialized behind them."""
+
+    replicas = {"replica1": make_pool(lag=0.0)}
+    router = ReplicaRouter(make_pool(), replicas, lag_check_interval=60)
+    locked = []
+
+    def measure(router, pool):
+        locked.append(router.lock.locked())
+        return pool.replication_lag
+    mocker.patch.object(ReplicaRouter, "measure_lag", autospec=True, side_effect=measure)
+
+    assert router.get_read_connection() is replicas["replica1"].get_connection.return_value
+    router.get_read_connection()
+    assert locked == [False], "Error: The lag must be measured once, without holding the lock"
+
+
+def test_primary_fallback_uses_the_timeout(lag):
+    """Tests if the wait for the primary is limited like the wait for a replica."""
+
+    replicas = {"replica1": make_pool(lag=None)}
+    primary = make_pool()
+    router = ReplicaRouter(primary, replicas)
+
+    router.get_read_connection(timeout=0.5)
+    assert primary.get_connection.call_args.kwargs["retry"] is False
+    assert 0 < primary.get_connection.call_args.kwargs["timeout"] <= 0.5
+
+    router.get_read_connection()
+    primary.get_connection.assert_called_with(retry=True, timeout=None)
+
+
+def test_timeout_is_shared_by_busy_replicas(lag, mocker):
+    """Tests if two busy replicas and the primary wait for one timeout together, not for one each."""
+
+    clock = [100.0]
+    mocker.patch("src.replica_router.time.monotonic", side_effect=lambda: clock[0])
+
+    def busy(retry, timeout):
+        clock[0] += timeout
+        raise PoolBusyError("busy")
+
+    replicas = {"replica1": make_pool(), "replica2": make_pool()}
+    for pool in replicas.values():
+        pool.get_connection.side_effect = busy
+    primary = make_pool()
+    router = ReplicaRouter(primary, replicas)
+
+    router.get_read_connection(timeout=1.0)
+    timeouts = [pool.get_connection.call_args.kwargs["timeout"] for pool in replicas.values()]
+    assert sorted(timeouts) == [0.0, 1.0]
+    primary.get_connection.assert_called_once_with(retry=False, timeout=0.0)
+    assert all(lag is not None for lag in router.metrics()["lag_seconds"].values())
+
+
+def test_measure_lag_reads_replica_status():
+    """Tests if the lag is read from SHOW REPLICA STATUS."""
+
+    pool = make_pool()
+    cursor = pool.get_connection.return_value.cursor.return_value.__enter__.return_value
+    cursor.fetchall.return_value = [{"Seconds_Behind_Source": 3}]
+
+    assert ReplicaRouter(make_pool(), {}).measure_lag(pool) == 3.0
+
+    cursor.fetchall.return_value = []  # not configured as replica
+    assert ReplicaRouter(make_pool(), {}).measure_lag(pool) is None
+
+
+def test_close_closes_replica_pools():
+    """Tests if closing the router closes the pools of the replicas but not the primary."""
+
+    replicas = {"replica1": make_pool(), "replica2": make_pool()}
+    primary = make_pool()
+    ReplicaRouter(primary, replicas).close()
+
+    for pool in replicas.values():
+        pool.close.assert_called_once()
+    primary.close.assert_not_called()
+
+
+def test_unknown_strategy():
+    """Tests if an invalid strategy is rejected."""
+
+    with pytest.raises(ValueError):
+        ReplicaRouter(make_pool(), {}, strategy="random")
+
+
+@pytest.mark.skipif("REPLICA_TEST_HOST" not in os.environ,
+                    reason="needs docker-compose.replica.yml, set REPLICA_TEST_HOST=localhost")
+def test_replication_with_two_containers():
+    """Tests read/write splitting against the primary (port 3306) and replica (port 3307) containers."""
+
+    from src.pool_manager import PoolManager
+
+    host = os.environ["REPLICA_TEST_HOST"]
+    config = {"user": "root", "password": "root", "database": "db", "host": host}
+    primary = PoolManager({**config, "port": "3306"}, pool_size=1, retries=0)
+    replica = PoolManager({**config, "port": "3307"}, pool_size=1, retries=0)
+    router = ReplicaRouter(primary, {"replica": replica})
+
+    assert router.measure_lag(replica) is not None, "Replica is not replicating"
+    assert router.measure_lag(primary) is None, "Primary must not be configured as replica"
+
+    connection = router.get_read_connection()
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT @@server_id;")
+        assert cursor.fetchall()[0][0] == 2, "Read was not routed to the replica"
+    connection.close()
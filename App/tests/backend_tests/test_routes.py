@@ -4,11 +4,12 @@
 # -> routes.py
 # =========================================================
 
+import json
 import pytest
 from flask import Flask
 from src.data_services import get_stations_in_radius, get_datapoints_for_station, save_data_to_db
 from src.datapoint import DataPoint, extract_average_value, download_and_create_datapoints, download_and_create_datapoints_local
-from src.routes import init_routes
+from src.routes import init_routes, jobs, prewarm
 from src.station import Station, load_stations_from_url
 from src.calculations import find_stations_within_radius, haversine
 from unittest.mock import patch
@@ -108,4 +109,346 @@ def test_get_weather_data(client, mocker):
     # Test completely empty request
     response = client.post("/get_weather_data", json={})
     assert response.status_code == 400, f"Expected 400, got {response.status_code}"
-    assert response.get_json() == {"message": "Fehlende Parameter"}
\ No newline at end of file
+    assert response.get_json() == {"message": "Fehlende Parameter"}
+
+def test_healthz(client):
+    """Tests if the liveness endpoint answers without touching the database."""
+
+    response = client.get("/healthz")
+    assert response.status_code == 200
+    assert response.get_json() == {"status": "ok"}
+
+
+def test_readyz(client, mocker):
+    """Tests if the readiness endpoint reports the ingest progress and the ready state."""
+
+    mocker.patch("src.routes.ds.ingest_status", {"state": "running", "stations_total": 10, "stations_done": 4,
+                                                 "datapoints_written": 1200, "error": None})
+
+    mocker.patch("src.routes.ds.is_ready", return_value=False)
+    response = client.get("/readyz")
+    assert response.status_code == 503, f"Expected 503, got {response.status_code}"
+    assert response.get_json()["ingest"]["stations_done"] == 4
+
+    mocker.patch("src.routes.ds.is_ready", return_value=True)
+    response = client.get("/readyz")
+    assert response.status_code == 200, f"Expected 200, got {response.status_code}"
+    assert response.get_json()["ready"] is True
+
+
+def test_pool_busy_returns_503(client, mocker):
+    """Tests if an exhausted connection pool results in a retryable 503 instead of a 500."""
+
+    from src.routes import PoolBusyError  # the class the error handler is registered for
+
+    mocker.patch("src.routes.ds.get_stations_in_radius", side_effect=PoolBusyError("busy"))
+
+    response = client.post("/submit", json={"latitude": 48.0, "longitude": 8.0, "radius": 100,
+                                            "yearStart": 2000, "yearEnd": 2020, "stations": 2})
+
+    assert response.status_code == 503, f"Expected 503, got {response.status_code}"
+    assert response.headers["Retry-After"] == "1"
+
+
+def test_submit_min_coverage(client, mocker):
+    """Tests if the minimum year coverage is passed on and invalid values are rejected."""
+
+    mocked_function = mocker.patch("src.routes.ds.get_stations_in_radius", return_value=[])
+    request = {"latitude": 48.0, "longitude": 8.0, "radius": 100, "yearStart": 2000, "yearEnd": 2020, "stations": 2}
+
+    assert client.post("/submit", json=dict(request, minCoverage=0.5)).status_code == 200
+    assert mocked_function.call_args.args[-1] == 0.5
+
+    response = client.post("/submit", json=dict(request, minCoverage=1.5))
+    assert response.status_code == 400
+    assert response.get_json() == {"message": "Ungültiger Parameter minCoverage"}
+
+
+def test_get_regional_data(client, mocker):
+    """Tests the parameters and the response of the regional aggregate endpoint."""
+
+    series = [[[2020, 5.0]]] + [[] for _ in range(9)]
+    mocked_function = mocker.patch("src.routes.ds.get_regional_aggregates", return_value=(2, series))
+    request = {"latitude": 48.0, "longitude": 8.0, "radius": 50, "yearStart": 2020, "yearEnd": 2020}
+
+    response = client.post("/get_regional_data", json=dict(request, weighting="idw"))
+    assert response.status_code == 200
+    assert response.get_json() == {"stationCount": 2, "weatherData": series}
+    assert mocked_function.call_args.args[5:7] == (-1, True)
+
+    assert client.post("/get_regional_data", json=dict(request, weighting="median")).status_code == 400
+    response = client.post("/get_regional_data", json=dict(request, yearStart="2000", yearEnd="2020"))
+    assert response.status_code == 200
+    assert mocked_function.call_args.args[3:5] == (2000, 2020)
+    response = client.post("/get_regional_data", json=dict(request, yearStart="x"))
+    assert response.get_json() == {"message": "Ungültiger Parameter yearStart/yearEnd"}
+    response = client.post("/get_regional_data", json=dict(request, minCoverage="x"))
+    assert response.get_json() == {"message": "Ungültiger Parameter minCoverage"}
+    response = client.post("/get_regional_data", json={"latitude": 48.0, "longitude": 8.0})
+    assert response.status_code == 400
+    assert response.get_json() == {"message": "Fehlende Parameter"}
+
+
+def test_metrics(client, mocker):
+    """Tests if the metrics endpoint exports the request latency of the routes in the Prometheus format."""
+
+    mocker.patch("src.routes.ds.get_stations_in_radius", return_value=[])
+    client.post("/submit", json={"latitude": 48.0, "longitude": 8.0, "radius": 100,
+                                 "yearStart": 2000, "yearEnd": 2020, "stations": 2})
+
+    response = client.get("/metrics")
+    body = response.get_data(as_text=True)
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    assert "# TYPE weather_http_request_duration_seconds histogram" in body
+    assert 'weather_http_request_duration_seconds_count{route="/submit",method="POST",status="200"}' in body
+    assert 'weather_db_pool_connections{pool="primary",state="max_size"}' in body
+
+
+def test_deadline_exceeded_returns_504(client, mocker):
+    """Tests if an expired request deadline results in a 504 and the deadline is set for the data routes."""
+
+    from src.routes import deadlines  # the module the error handler is registered for
+
+    def slow_lookup(*args):
+        assert deadlines.remaining() is not None and deadlines.remaining() <= 1
+        raise deadlines.DeadlineExceeded("timeout")
+
+    mocker.patch("src.routes.ds.get_datapoints_for_station", side_effect=slow_lookup)
+
+    response = client.post("/get_weather_data", json={"stationName": "GME00122458", "yearStart": 2000,
+                                                      "yearEnd": 2020}, headers={"X-Request-Timeout": "1"})
+
+    assert response.status_code == 504, f"Expected 504, got {response.status_code}"
+    assert deadlines.remaining() is None
+
+
+def test_get_station_trends(client, mocker):
+    """Tests the parameters of the trend endpoint and the default baseline period."""
+
+    trends = [{"trend": 0.3, "normal": 10.0, "anomalies": [[2020, 1.2]]}] * 10
+    mocked_function = mocker.patch("src.routes.ds.get_station_trends", return_value=trends)
+
+    response = client.post("/get_station_trends", json={"stationName": "GME00122458", "yearStart": "1980",
+                                                        "yearEnd": 2020})
+    assert response.status_code == 200
+    assert response.get_json() == trends
+    assert mocked_function.call_args.args == ("GME00122458", 1980, 2020, 1991, 2020)
+
+    response = client.post("/get_station_trends", json={"stationName": "GME00122458", "yearStart": "abc",
+                                                        "yearEnd": 2020})
+    assert response.status_code == 400
+    assert client.post("/get_station_trends", json={"stationName": "GME00122458"}).status_code == 400
+
+
+def test_rank_stations(client, mocker):
+    """Tests the parameters of the station ranking endpoint."""
+
+    mocked_function = mocker.patch("src.routes.ds.rank_stations_by_trend", return_value=[])
+    request = {"latitude": 48.0, "longitude": 8.0, "radius": 50, "yearStart": 1980, "yearEnd": 2020}
+
+    response = client.post("/rank_stations", json=dict(request, period="summer", element="tmin"))
+    assert response.status_code == 200
+    assert mocked_function.call_args.args[5:8] == (-1, "summer", "tmin")
+
+    response = client.post("/rank_stations", json=dict(request, period="monsoon"))
+    assert response.get_json() == {"message": "Ungültiger Parameter period"}
+    response = client.post("/rank_stations", json=dict(request, element="prcp"))
+    assert response.get_json() == {"message": "Ungültiger Parameter element"}
+    assert client.post("/rank_stations", json={"radius": 50}).status_code == 400
+    for min_coverage in (-0.5, 1.5, "x"):
+        response = client.post("/rank_stations", json=dict(request, minCoverage=min_coverage))
+        assert response.get_json() == {"message": "Ungültiger Parameter minCoverage"}
+
+
+def test_surface_tile(client, mocker):
+    """Tests the parameters and the PNG response of the surface tiles."""
+
+    mocked_function = mocker.patch("src.routes.ds.get_surface_tile", return_value=b"\x89PNG")
+
+    response = client.get("/surface/6/33/22.png?year=2020&period=summer")
+    assert response.status_code == 200
+    assert response.mimetype == "image/png"
+    assert response.data == b"\x89PNG"
+    assert mocked_function.call_args.args == (6, 33, 22, 2020, "summer", "tmax")
+
+    assert client.get("/surface/6/33/22.png").status_code == 400
+    assert client.get("/surface/6/64/22.png?year=2020").status_code == 400
+    assert client.get("/surface/6/33/22.png?year=2020&element=prcp").status_code == 400
+
+
+def test_get_surface(client, mocker):
+    """Tests the parameters of the surface grid endpoint."""
+
+    grid = {"latitudes": [48.0], "longitudes": [8.0], "values": [12.5]}
+    mocker.patch("src.routes.ds.get_surface_grid", return_value=grid)
+    request = {"north": 49.0, "south": 47.0, "east": 10.0, "west": 7.0, "year": 2020}
+
+    response = client.post("/get_surface", json=request)
+    assert response.status_code == 200
+    assert response.get_json() == grid
+
+    response = client.post("/get_surface", json=dict(request, south=50.0))
+    assert response.get_json() == {"message": "Ungültiger Parameter north/south/east/west"}
+    response = client.post("/get_surface", json=dict(request, resolution=0.001))
+    assert response.get_json() == {"message": "Ungültiger Parameter resolution"}
+    assert client.post("/get_surface", json={"north": 49.0}).status_code == 400
+
+
+def test_get_element_data(client, mocker):
+    """Tests the parameters of the element endpoint."""
+
+    mocked_function = mocker.patch("src.routes.ds.get_element_values", return_value=[(2020, 1, 12.5, 31)])
+    request = {"stationName": "GME00122458", "element": "PRCP", "yearStart": 2020, "yearEnd": 2020}
+
+    response = client.post("/get_element_data", json=request)
+    assert response.status_code == 200
+    assert response.get_json() == [[2020, 1, 12.5, 31]]
+    assert mocked_function.call_args.args == ("GME00122458", "PRCP", 2020, 2020)
+
+    response = client.post("/get_element_data", json=dict(request, element="XXXX"))
+    assert response.get_json() == {"message": "Ungültiger Parameter element"}
+    assert client.post("/get_element_data", json={"stationName": "GME00122458"}).status_code == 400
+
+
+def test_get_daily_data(client, mocker):
+    """Tests the parameters of the daily values endpoint."""
+
+    mocked_function = mocker.patch("src.routes.ds.get_daily_values", return_value=[("2020-01-01", 4.0)])
+    request = {"stationName": "GME00122458", "element": "TMAX", "yearStart": "2020", "yearEnd": 2020}
+
+    response = client.post("/get_daily_data", json=request)
+    assert response.status_code == 200
+    assert response.get_json() == [["2020-01-01", 4.0]]
+    assert mocked_function.call_args.args == ("GME00122458", "TMAX", 2020, 2020)
+
+    response = client.post("/get_daily_data", json=dict(request, element="WT01"))
+    assert response.get_json() == {"message": "Ungültiger Parameter element"}
+    assert client.post("/get_daily_data", json=dict(request, yearEnd="x")).status_code == 400
+
+
+def test_get_threshold_days(client, mocker):
+    """Tests the parameters of the threshold days endpoint."""
+
+    mocked_function = mocker.patch("src.routes.ds.get_threshold_days", return_value=[(2020, 12, 366)])
+    request = {"stationName": "GME00122458", "element": "TMIN", "yearStart": 2020, "yearEnd": 2020,
+               "threshold": 0, "condition": "below"}
+
+    response = client.post("/get_threshold_days", json=request)
+    assert response.status_code == 200
+    assert response.get_json() == [[2020, 12, 366]]
+    assert mocked_function.call_args.args == ("GME00122458", "TMIN", 2020, 2020, 0.0, False)
+
+    response = client.post("/get_threshold_days", json=dict(request, condition="equal"))
+    assert response.get_json() == {"message": "Ungültiger Parameter condition"}
+    response = client.post("/get_threshold_days", json=dict(request, threshold="warm"))
+    assert response.get_json() == {"message": "Ungültiger Parameter threshold"}
+    assert client.post("/get_threshold_days", json=dict(request, threshold=None)).status_code == 400
+
+
+def test_submit_job(client, mocker):
+    """Tests if jobs are submitted with 202, deduplicated with 200 and invalid jobs rejected."""
+
+    job = {"jobId": "abc", "status": "queued"}
+    submit = mocker.patch("src.routes.jobs.manager.submit", return_value=(job, True))
+
+    response = client.post("/jobs", json={"kind": "regional_data", "params": {"latitude": 48.0}})
+    assert response.status_code == 202
+    assert response.headers["Location"] == "/jobs/abc"
+    assert submit.call_args.args == ("regional_data", {"latitude": 48.0})
+
+    submit.return_value = (job, False)
+    assert client.post("/jobs", json={"kind": "regional_data"}).status_code == 200
+
+    submit.side_effect = jobs.JobError("Ungültiger Parameter kind")
+    response = client.post("/jobs", json={"kind": "export_everything"})
+    assert response.status_code == 400
+    assert response.get_json() == {"message": "Ungültiger Parameter kind"}
+
+    submit.side_effect = jobs.JobQueueFull()
+    response = client.post("/jobs", json={"kind": "regional_data"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
+    assert client.post("/jobs", json={}).status_code == 400
+
+
+def test_job_status_and_result(client, mocker):
+    """Tests the status, result and event endpoints of a job."""
+
+    status = mocker.patch("src.routes.jobs.manager.status", return_value=None)
+    result = mocker.patch("src.routes.jobs.manager.result", return_value=None)
+    assert client.get("/jobs/abc").status_code == 404
+    assert client.get("/jobs/abc/result").status_code == 404
+    assert client.get("/jobs/abc/events").status_code == 404
+
+    status.return_value = {"jobId": "abc", "status": "done", "progress": 1.0}
+    assert client.get("/jobs/abc").get_json() == status.return_value
+    response = client.get("/jobs/abc/events")
+    assert response.mimetype == "text/event-stream"
+    assert response.get_data(as_text=True) == f"retry: 1000\n\ndata: {json.dumps(status.return_value)}\n\n"
+
+    # The stream of a running job ends after JOB_EVENTS_MAX_SECONDS, the client reconnects
+    status.return_value = {"jobId": "abc", "status": "running", "progress": 0.5}
+    mocker.patch("src.routes.JOB_EVENTS_MAX_SECONDS", 0)
+    response = client.get("/jobs/abc/events")
+    assert response.get_data(as_text=True) == f"retry: 1000\n\ndata: {json.dumps(status.return_value)}\n\n"
+
+    result.return_value = ("running", None, None)
+    response = client.get("/jobs/abc/result")
+    assert response.status_code == 409
+    assert response.get_json()["status"] == "running"
+
+    result.return_value = ("failed", None, "DeadlineExceeded: budget")
+    assert client.get("/jobs/abc/result").status_code == 500
+
+    result.return_value = ("done", '{"stationCount": 3}', None)
+    response = client.get("/jobs/abc/result")
+    assert response.status_code == 200
+    assert response.get_json() == {"stationCount": 3}
+
+
+def test_export(client, mocker):
+    """Tests if the export streams the chunks and selects the stations of a region."""
+
+    chunks = mocker.patch("src.routes.export.export_chunks", return_value=iter([b"station_id\n", b"ST1\n"]))
+    region = mocker.patch("src.routes.export.region_station_ids", return_value=["ST2"])
+    request = {"stationNames": ["ST1"], "yearStart": 2000, "yearEnd": "2020"}
+
+    response = client.post("/export", json=request)
+    assert response.status_code == 200
+    assert response.mimetype == "text/csv"
+    assert response.get_data() == b"station_id\nST1\n"
+    assert chunks.call_args.args == (["ST1"], 2000, 2020, "monthly", ["annual"], "csv")
+
+    client.post("/export", json={"latitude": 48.0, "longitude": 7.8, "radius": 50, "yearStart": 2000,
+                                 "yearEnd": 2020, "resolution": "yearly", "periods": ["summer"]})
+    assert region.call_args.args[:5] == (48.0, 7.8, 50, 2000, 2020)
+    assert chunks.call_args.args == (["ST2"], 2000, 2020, "yearly", ["summer"], "csv")
+
+    assert client.post("/export", json={"yearStart": 2000, "yearEnd": 2020}).status_code == 400
+    response = client.post("/export", json=dict(request, periods=["monsoon"]))
+    assert response.get_json() == {"message": "Ungültiger Parameter periods"}
+    response = client.post("/export", json=dict(request, format="xlsx"))
+    assert response.get_json() == {"message": "Ungültiger Parameter format"}
+    response = client.post("/export", json=dict(request, minCoverage=2))
+    assert response.get_json() == {"message": "Ungültiger Parameter minCoverage"}
+
+    mocker.patch("src.routes.export.parquet_available", return_value=False)
+    assert client.post("/export", json=dict(request, format="parquet")).status_code == 501
+
+
+def test_successful_requests_are_recorded(client, mocker):
+    """Tests if only successful requests of /submit and /get_weather_data are counted for the prewarming."""
+
+    record = mocker.patch.object(prewarm.recorder, "record")
+    mocker.patch("src.routes.ds.get_datapoints_for_station", return_value=[])
+    body = {"stationName": "GME00122458", "yearStart": 2020, "yearEnd": 2020}
+
+    assert client.post("/get_weather_data", json=body).status_code == 200
+    record.assert_called_once()
+    assert prewarm.request_key(*record.call_args.args) == '["GME00122458", 2020, 2020]'
+
+    assert client.post("/get_weather_data", json={"stationName": "GME00122458"}).status_code == 400
+    client.get("/healthz")
+    record.assert_called_once()
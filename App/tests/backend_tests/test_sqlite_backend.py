@@ -0,0 +1,165 @@
+# =========================================================
+# TESTS FOR .PY
+# -> sqlite_backend.py
+# =========================================================
+
+import pytest
+from src.sqlite_backend import SQLiteBackend, to_qmark
+from src.station import Station
+from src.datapoint import DataPoint
+
+
+@pytest.fixture
+def backend(tmp_path):
+    """Creates an SQLite backend with two stations and one year of datapoints for the first one."""
+
+    backend = SQLiteBackend(str(tmp_path / "weather.sqlite3"))
+    with backend.write_session() as session:
+        session.insert_stations([
+            Station("GME00122458", "FREIBURG", 48.0242, 7.8353, last_measure_tmax=2020, first_measure_tmax=1950,
+                    last_measure_tmin=2020, first_measure_tmin=1950),
+            Station("GME00132346", "BUCHENBACH", 47.9631, 7.9989, last_measure_tmax=2020, first_measure_tmax=2010,
+                    last_measure_tmin=2020, first_measure_tmin=2010),
+        ])
+        sid = session.get_stations()[0][0]
+        session.insert_datapoints(sid, [DataPoint(int(f"2020{month:02d}"), tmax=month + 10.0, tmin=float(month))
+                                        for month in range(1, 13)]
+                                  + [DataPoint(201912, tmax=5.0, tmin=-3.0)])
+        session.commit()
+    return backend
+
+
+def test_to_qmark():
+    """Tests if %s placeholders are converted while the modulo operator is kept."""
+
+    assert to_qmark("SELECT year % 4 FROM Datapoint WHERE SID = %s;") == "SELECT year % 4 FROM Datapoint WHERE SID = ?;"
+
+
+def test_station_catalog_and_period_filter(backend):
+    """Tests if the catalog contains all stations and the period filter uses the measurement years."""
+
+    assert len(backend.get_station_catalog()) == 2
+    assert backend.has_stations()
+
+    stations = backend.get_stations_for_period(2000, 2020)
+    assert stations == [("GME00122458", "FREIBURG", 48.0242, 7.8353)]
+
+
+def test_write_session(backend):
+    """Tests if the write session reports stored datapoints."""
+
+    with backend.write_session() as session:
+        assert session.has_datapoints()
+        assert len(session.get_stations()) == 2
+
+
+def test_aggregates(backend):
+    """Tests if the aggregation SQL shared with MySQL produces the ten day-weighted series."""
+
+    datasets = backend.get_aggregates("GME00122458", 2020, 2020)
+
+    assert len(datasets) == 10, f"Error: Expected 10 datasets, got {len(datasets)}"
+
+    # Annual Tmin: months weighted by their number of days (2020 is a leap year)
+    days = [31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
+    expected_tmin = sum(month * day for month, day in zip(range(1, 13), days)) / sum(days)
+    assert datasets[0][0][0] == 2020
+    assert datasets[0][0][1] == pytest.approx(expected_tmin)
+    assert datasets[1][0][1] == pytest.approx(expected_tmin + 10)
+
+    # Summer Tmax (June - August)
+    assert datasets[5][0][1] == pytest.approx((16 * 30 + 17 * 31 + 18 * 31) / 92)
+
+    # Winter 2020 = December 2019, January and February 2020
+    assert datasets[8][0][0] == 2020
+    assert datasets[8][0][1] == pytest.approx((-3 * 31 + 1 * 31 + 2 * 29) / 91)
+
+
+def test_rebuild_aggregates(backend):
+    """Tests if the precomputed aggregates match the per-station aggregation queries."""
+
+    # annual 2019/2020, spring, summer, autumn 2020, winter 2020/2021 (December 2020)
+    assert backend.rebuild_aggregates() == 7
+
+    rows = {(period, year): (tmin, tmax) for _, year, period, tmin, tmax
+            in backend.fetch_all("SELECT station_id, year, period, tmin, tmax FROM YearlyAggregate;")}
+    datasets = backend.get_aggregates("GME00122458", 2020, 2020)
+
+    assert rows[("annual", 2020)] == pytest.approx((datasets[0][0][1], datasets[1][0][1]))
+    assert rows[("summer", 2020)] == pytest.approx((datasets[4][0][1], datasets[5][0][1]))
+    assert rows[("winter", 2020)] == pytest.approx((datasets[8][0][1], datasets[9][0][1]))
+    # December 2019 alone forms the annual value of 2019
+    assert rows[("annual", 2019)] == pytest.approx((-3.0, 5.0))
+
+    # A second rebuild replaces the table
+    assert backend.rebuild_aggregates() == 7
+
+
+def test_coverage_column_added_to_existing_database(tmp_path):
+    """Tests if a database file created before the coverage column existed is migrated."""
+
+    import sqlite3
+
+    path = str(tmp_path / "old.sqlite3")
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE Station (SID INTEGER PRIMARY KEY AUTOINCREMENT, station_id VARCHAR(50), "
+                       "station_name VARCHAR(50), latitude FLOAT NOT NULL, longitude FLOAT NOT NULL, "
+                       "first_tmax INT NOT NULL, latest_tmax INT NOT NULL, first_tmin INT NOT NULL, "
+                       "latest_tmin INT NOT NULL);")
+    connection.execute("INSERT INTO Station VALUES (1, 'GME00122458', 'FREIBURG', 48.0, 7.8, 1950, 2020, 1950, 2020);")
+    connection.commit()
+    connection.close()
+
+    backend = SQLiteBackend(path)
+    assert backend.get_station_catalog() == [("GME00122458", "FREIBURG", 48.0, 7.8, 1950, 2020, 1950, 2020, "")]
+
+
+def test_empty_backend(tmp_path):
+    """Tests if a new database file is created with the schema but without data."""
+
+    backend = SQLiteBackend(str(tmp_path / "empty.sqlite3"))
+
+    assert not backend.has_stations()
+    with backend.write_session() as session:
+        assert not session.has_datapoints()
+
+
+def test_shadow_publish_and_rollback(backend):
+    """Tests if a new dataset version is loaded into shadow tables and swapped in and back out."""
+
+    assert backend.get_dataset_version() == 0
+
+    with backend.shadow_session() as session:
+        session.insert_stations([Station("USW00094728", "NEW YORK", 40.7789, -73.9692, last_measure_tmax=2020,
+                                         first_measure_tmax=1900, last_measure_tmin=2020, first_measure_tmin=1900)])
+        session.commit()
+        sid = session.get_stations()[0][0]
+        session.insert_datapoints(sid, [DataPoint(202001, tmax=4.0, tmin=-3.0)])
+        session.commit()
+
+        # The live tables are unchanged while the new version is loading
+        assert [row[0] for row in backend.get_station_catalog()] == ["GME00122458", "GME00132346"]
+
+    assert backend.publish_shadow() == 1
+    assert backend.get_dataset_version() == 1
+    assert [row[0] for row in backend.get_station_catalog()] == ["USW00094728"]
+    assert backend.get_aggregates("USW00094728", 2020, 2020)[0] == [(2020, -3.0)]
+
+    # The indexes are built after the load
+    index_names = [row[0] for row in backend.fetch_all("SELECT name FROM sqlite_master WHERE type = 'index'")]
+    assert "idx_datapoint_sid_year_v1" in index_names
+
+    assert backend.rollback_version() == 2
+    assert [row[0] for row in backend.get_station_catalog()] == ["GME00122458", "GME00132346"]
+    assert len(backend.get_aggregates("GME00122458", 2020, 2020)[0]) == 1
+
+    # Rolling back again restores the newer version
+    assert backend.rollback_version() == 3
+    assert [row[0] for row in backend.get_station_catalog()] == ["USW00094728"]
+
+
+def test_rollback_without_previous_version(backend):
+    """Tests if a rollback without a previous version is rejected."""
+
+    with pytest.raises(ValueError):
+        backend.rollback_version()
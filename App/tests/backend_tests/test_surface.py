@@ -0,0 +1,91 @@
+# =========================================================
+# TESTS FOR .PY
+# -> surface.py
+# =========================================================
+
+import struct
+import zlib
+import numpy as np
+import pytest
+from src import surface
+
+
+def test_spatial_index_query():
+    """Tests if a query returns the stations of all overlapping cells and no distant ones."""
+
+    latitudes = np.array([48.2, 48.9, 50.5, -33.0])
+    longitudes = np.array([8.1, 9.7, 8.0, 151.0])
+    index = surface.SpatialIndex(latitudes, longitudes)
+
+    assert sorted(index.query(48.0, 49.5, 7.5, 10.0).tolist()) == [0, 1]
+    assert sorted(index.query(-90, 90, -180, 180).tolist()) == [0, 1, 2, 3]
+    assert index.query(0.0, 1.0, 0.0, 1.0).tolist() == []
+
+
+def test_interpolate():
+    """Tests if the grid values are inverse distance weighted and missing outside the search radius."""
+
+    latitudes = np.array([48.0, 48.0])
+    longitudes = np.array([8.0, 9.0])
+    values = np.array([10.0, 20.0])
+    index = surface.SpatialIndex(latitudes, longitudes)
+
+    grid = surface.interpolate(index, latitudes, longitudes, values, np.array([48.0, 48.0, 48.0, 10.0]),
+                               np.array([8.0, 8.5, 9.0, 8.0]), radius=300, neighbours=8)
+
+    assert grid[0] == pytest.approx(10.0, abs=0.01)
+    assert grid[1] == pytest.approx(15.0)
+    assert grid[2] == pytest.approx(20.0, abs=0.01)
+    assert np.isnan(grid[3])
+
+    # Only the nearest station
+    grid = surface.interpolate(index, latitudes, longitudes, values, np.array([48.0]), np.array([8.4]),
+                               radius=300, neighbours=1)
+    assert grid[0] == 10.0
+
+
+def test_interpolate_grid_matches_points():
+    """Tests if the block-wise grid interpolation gives the same values as single points."""
+
+    rng = np.random.default_rng(1)
+    latitudes = rng.uniform(40, 55, 200)
+    longitudes = rng.uniform(0, 20, 200)
+    values = rng.uniform(-5, 25, 200)
+    index = surface.SpatialIndex(latitudes, longitudes)
+    grid_latitudes, grid_longitudes = surface.bbox_grid(56, 39, 21, -1, 0.5)
+
+    grid = surface.interpolate_grid(index, latitudes, longitudes, values, grid_latitudes, grid_longitudes, 150, 4)
+
+    assert grid.shape == (35, 45)
+    expected = surface.interpolate(index, latitudes, longitudes, values, np.array([grid_latitudes[7]]),
+                                   np.array([grid_longitudes[40]]), 150, 4)
+    assert grid[7, 40] == pytest.approx(expected[0])
+
+
+def test_tile_grid():
+    """Tests if the tile grid covers the Web Mercator tile."""
+
+    latitudes, longitudes = surface.tile_grid(1, 1, 0, size=4)
+
+    assert longitudes.tolist() == [22.5, 67.5, 112.5, 157.5]
+    assert latitudes[0] > latitudes[-1] > 0
+    assert latitudes[0] < 85.06
+
+
+def test_render_tile():
+    """Tests if a tile is encoded as RGBA PNG with transparent missing values."""
+
+    grid = np.array([[0.0, np.nan], [40.0, -50.0]])
+    png = surface.render_tile(grid, pixels=4)
+
+    assert png.startswith(b"\x89PNG\r\n\x1a\n")
+    width, height = struct.unpack(">II", png[16:24])
+    assert (width, height) == (4, 4)
+
+    length = struct.unpack(">I", png[33:37])[0]
+    raw = np.frombuffer(zlib.decompress(png[41:41 + length]), dtype=np.uint8).reshape(4, 17)
+    pixels = raw[:, 1:].reshape(4, 4, 4)
+    assert pixels[0, 0].tolist() == [171, 217, 233, surface.TILE_ALPHA]
+    assert pixels[0, 3, 3] == 0
+    assert pixels[3, 0].tolist() == [165, 0, 38, surface.TILE_ALPHA]
+    assert pixels[3, 3].tolist() == [49, 54, 149, surface.TILE_ALPHA]
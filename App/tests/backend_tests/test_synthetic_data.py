@@ -0,0 +1,90 @@
+# =========================================================
+# TESTS FOR .PY
+# -> synthetic_data.py
+# =========================================================
+
+from unittest import mock
+from src import synthetic_data
+from src.datapoint import extract_average_value, create_datapoints_from_lines
+from src.station import load_stations_from_url
+
+
+def test_generate_stations_deterministic():
+    """Tests if the same seed creates the same catalog and the years stay in the requested span."""
+
+    first = synthetic_data.generate_stations(200, 1900, 2020, seed=7)
+    second = synthetic_data.generate_stations(200, 1900, 2020, seed=7)
+    other = synthetic_data.generate_stations(200, 1900, 2020, seed=8)
+
+    assert [vars(station) for station in first] == [vars(station) for station in second]
+    assert [station.latitude for station in first] != [station.latitude for station in other]
+    assert all(1900 <= station.first_measure_tmax <= station.last_measure_tmax <= 2020 for station in first)
+    assert all(-90 < station.latitude < 90 and -180 <= station.longitude < 180 for station in first)
+
+
+def test_station_files_parsed_by_loader():
+    """Tests if ghcnd-stations.txt and ghcnd-inventory.txt are read by station.load_stations_from_url."""
+
+    stations = synthetic_data.generate_stations(5, 1950, 2020, seed=1)
+    stations_txt = "\n".join(synthetic_data.format_station_line(station) for station in stations)
+    inventory_txt = "\n".join(line for station in stations
+                              for line in synthetic_data.format_inventory_lines(station, ("TMAX", "TMIN", "PRCP")))
+
+    with mock.patch("requests.get", side_effect=[
+        mock.Mock(status_code=200, text=stations_txt),
+        mock.Mock(status_code=200, text=inventory_txt),
+    ]):
+        loaded = load_stations_from_url("inventory", "stations")
+
+    assert len(loaded) == 5
+    for expected, station in zip(stations, loaded):
+        assert station.id == expected.id
+        assert station.name == expected.name
+        assert station.latitude == expected.latitude
+        assert station.longitude == expected.longitude
+        assert station.first_measure_tmax == expected.first_measure_tmax
+        assert station.last_measure_tmin == expected.last_measure_tmin
+
+
+def test_generate_dly_layout():
+    """Tests the fixed-width layout, the missing values and the parsing of the .dly contents."""
+
+    station = synthetic_data.generate_stations(1, 2000, 2001, seed=3)[0]
+    station.first_measure_tmax, station.last_measure_tmax = 2000, 2001
+
+    contents = synthetic_data.generate_dly(station, 0, seed=3, missing_ratio=0.2)
+    lines = contents.decode().splitlines(keepends=True)
+
+    assert len(lines) == 2 * 12 * 2
+    assert all(len(line) == synthetic_data.LINE_WIDTH for line in lines)
+    assert lines[0][:21] == f"{station.id}200001TMAX"
+    assert lines[1][:21] == f"{station.id}200001TMIN"
+
+    # February 2000 has 29 days, the remaining fields are missing
+    february = lines[2]
+    assert february[21 + 29 * 8:21 + 30 * 8] == "-9999   "
+    assert february[21 + 30 * 8:21 + 31 * 8] == "-9999   "
+
+    values = [line[start:start + 5] for line in lines for start in range(21, 269, 8)]
+    missing = sum(value == "-9999" for value in values)
+    assert 0.2 < missing / len(values) < 0.35
+
+    assert extract_average_value(lines[0]) != 0
+    datapoints = create_datapoints_from_lines(lines, station.id)
+    assert len(datapoints) == 24
+    assert all(datapoint.tmax > datapoint.tmin for datapoint in datapoints)
+
+    assert synthetic_data.generate_dly(station, 0, seed=3, missing_ratio=0.2) == contents
+
+
+def test_write_dataset(tmp_path):
+    """Tests if a complete dataset with one .dly file per station is written."""
+
+    stations = synthetic_data.write_dataset(str(tmp_path), stations=3, first_year=2010, last_year=2012, workers=1)
+
+    assert (tmp_path / "ghcnd-stations.txt").read_text().count("\n") == 3
+    assert (tmp_path / "ghcnd-inventory.txt").read_text().count("\n") == 6
+    for station in stations:
+        dly = tmp_path / "ghcnd_all" / f"{station.id}.dly"
+        years = station.last_measure_tmax - station.first_measure_tmax + 1
+        assert dly.read_bytes().count(b"\n") == years * 12 * 2
@@ -0,0 +1,50 @@
+# =========================================================
+# TESTS FOR .PY
+# -> trends.py
+# =========================================================
+
+import numpy as np
+import pytest
+from src import trends
+
+
+def test_station_matrix():
+    """Tests if the rows are arranged per station and year, missing years are NaN."""
+
+    rows = [("B", 2001, 1.0, 11.0), ("A", 2000, 2.0, 12.0), ("A", 1990, 3.0, 13.0)]
+    years, tmin, tmax = trends.station_matrix(rows, ["A", "B"], 2000, 2001)
+
+    assert years.tolist() == [2000, 2001]
+    assert tmin[0, 0] == 2.0 and np.isnan(tmin[0, 1])
+    assert tmax[1, 1] == 11.0 and np.isnan(tmax[1, 0])
+
+
+def test_linear_trends():
+    """Tests if the slopes skip missing years and need MIN_TREND_YEARS values."""
+
+    years = np.arange(2000, 2012)
+    values = np.vstack([0.05 * (years - 2000), 0.05 * (years - 2000), np.full(len(years), np.nan)])
+    values[1, 3] = np.nan
+    values[1, 7] = np.nan
+
+    slopes = trends.linear_trends(values, years)
+
+    assert slopes[0] == pytest.approx(0.5)
+    assert slopes[1] == pytest.approx(0.5)
+    assert np.isnan(slopes[2])
+    assert np.isnan(trends.linear_trends(values, years, min_years=11)[1])
+
+
+def test_normals_and_anomalies():
+    """Tests if normals need MIN_NORMAL_SHARE of the baseline years and anomalies subtract them."""
+
+    years = np.arange(2000, 2010)
+    values = np.vstack([np.arange(10.0), np.arange(10.0)])
+    values[1, :3] = np.nan
+
+    station_normals = trends.normals(values, years, 2000, 2009)
+    assert station_normals[0] == pytest.approx(4.5)
+    assert np.isnan(station_normals[1])
+
+    assert trends.anomalies(values, station_normals)[0].tolist() == pytest.approx(np.arange(10.0) - 4.5)
+    assert trends.to_value(station_normals[1]) is None
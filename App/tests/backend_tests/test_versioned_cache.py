@@ -0,0 +1,22 @@
+# =========================================================
+# TESTS FOR .PY
+# -> versioned_cache.py
+# =========================================================
+
+from src.versioned_cache import VersionedLRUCache
+
+
+def test_versioned_lru_cache():
+    """Tests if the cache evicts the least recently used entry and is cleared by a new dataset version."""
+
+    cache = VersionedLRUCache(max_entries=2)
+    cache.put(1, "a", 1)
+    cache.put(1, "b", 2)
+    assert cache.get(1, "a") == 1
+    cache.put(1, "c", 3)
+
+    assert cache.get(1, "b") is None
+    assert cache.get(2, "a") is None
+    cache.put(2, "d", 4)
+    assert cache.get(1, "a") is None
+    assert cache.get(2, "d") == 4
@@ -0,0 +1,87 @@
+# =========================================================
+# TESTS FOR .PY
+# -> work_queue.py
+# =========================================================
+
+import pytest
+from src import cli
+from src import synthetic_data
+
+work_queue = cli.work_queue
+
+
+@pytest.fixture
+def session(tmp_path):
+    """Opens a shadow session on an SQLite backend with a queue of four stations."""
+
+    backend = cli.ds.SQLiteBackend(str(tmp_path / "weather.sqlite3"))
+    with backend.shadow_session() as session:
+        work_queue.fill(session, ["A", "B", "C", "D"])
+        yield session
+
+
+def test_claim_is_exclusive(session):
+    """Tests if two workers never lease the same station and the progress counts all items."""
+
+    first_token, first = work_queue.claim(session, "one", count=3)
+    second_token, second = work_queue.claim(session, "two", count=3)
+
+    assert first == ["A", "B", "C"]
+    assert second == ["D"]
+    assert first_token != second_token
+    assert work_queue.claim(session, "three")[1] == []
+
+    assert work_queue.complete(session, first_token, "A", 12)
+    # Only the worker holding the lease can complete a station
+    assert not work_queue.complete(session, second_token, "B", 12)
+    session.commit()
+
+    counts = work_queue.progress(session)
+    assert counts["done"] == (1, 12)
+    assert counts["leased"][0] == 3
+    assert counts["pending"] == (0, 0)
+
+
+def test_retries_and_expired_leases(session):
+    """Tests if failed stations are retried up to max_attempts and expired leases are taken over."""
+
+    for attempt in range(2):
+        token, claimed = work_queue.claim(session, "one", count=1, max_attempts=2)
+        assert claimed == ["A"]
+        work_queue.release(session, token, "A", "ConnectionError: timeout", max_attempts=2)
+        session.commit()
+
+    counts = work_queue.progress(session)
+    assert counts["failed"][0] == 1
+    assert session.fetch_all("SELECT status, attempts, error FROM IngestQueue WHERE station_id = 'A';") == [
+        ("failed", 2, "ConnectionError: timeout")]
+
+    # A crashed worker: the lease expires and another worker takes the station over
+    lost_token, claimed = work_queue.claim(session, "crashed", count=1, lease_seconds=-1)
+    assert claimed == ["B"]
+    token, claimed = work_queue.claim(session, "two", count=1)
+    assert claimed == ["B"]
+    assert not work_queue.complete(session, lost_token, "B", 1)
+    assert work_queue.complete(session, token, "B", 1)
+
+
+def test_distributed_ingest(tmp_path, mocker, monkeypatch, capsys):
+    """Tests if worker processes with their own connections ingest the queued stations exactly once."""
+
+    path = str(tmp_path / "data")
+    stations = synthetic_data.write_dataset(path, stations=6, first_year=2016, last_year=2018, workers=1)
+    database = str(tmp_path / "weather.sqlite3")
+    monkeypatch.setenv("STORAGE_BACKEND", "sqlite")
+    monkeypatch.setenv("SQLITE_PATH", database)
+    monkeypatch.setenv("INGEST_CLAIM_BATCH", "2")
+    backend = cli.ds.SQLiteBackend(database)
+    mocker.patch.object(cli.ds, "backend", backend)
+
+    assert cli.coordinate("local", path, workers=2, poll_interval=0.1) == 1
+
+    output = capsys.readouterr().out
+    assert "6/6 stations (0 leased, 0 failed)" in output
+
+    months = sum((station.last_measure_tmax - station.first_measure_tmax + 1) * 12 for station in stations)
+    assert backend.fetch_all("SELECT COUNT(*) FROM Datapoint;")[0][0] == months
+    assert cli.verify() == []
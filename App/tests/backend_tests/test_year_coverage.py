@@ -0,0 +1,38 @@
+# =========================================================
+# TESTS FOR .PY
+# -> year_coverage.py
+# =========================================================
+
+from src import year_coverage
+from src.datapoint import DataPoint
+
+
+def test_from_datapoints_only_counts_complete_years():
+    """Tests if only years with all twelve months of Tmin/Tmax data are set in the bitmap."""
+
+    datapoints = [DataPoint(int(f"2000{month:02d}"), 10.0, 0.0) for month in range(1, 13)]
+    datapoints += [DataPoint(int(f"2001{month:02d}"), 10.0, 0.0) for month in range(1, 12)]
+    datapoints += [DataPoint(int(f"2002{month:02d}"), 10.0, 0.0) for month in range(1, 13)]
+
+    bitmap = year_coverage.from_datapoints(datapoints)
+
+    assert bitmap == year_coverage.from_years([2000, 2002])
+    assert year_coverage.decode(year_coverage.encode(bitmap)) == bitmap
+    assert year_coverage.decode("") is None
+    assert year_coverage.from_datapoints([]) == 0
+
+
+def test_range_tests():
+    """Tests the period mask and the completeness threshold."""
+
+    bitmap = year_coverage.from_years(range(1990, 2000))
+    mask = year_coverage.range_mask(1995, 2004)
+
+    assert mask == year_coverage.from_years(range(1995, 2005))
+    assert (bitmap & mask).bit_count() == 5
+    assert year_coverage.required_years(1995, 2004, 0.5) == 5
+    assert year_coverage.covers(bitmap, mask, year_coverage.required_years(1995, 2004, 0.5))
+    assert not year_coverage.covers(bitmap, mask, year_coverage.required_years(1995, 2004, 0.6))
+    # At least one complete year is always required
+    assert year_coverage.required_years(1995, 2004, 0.0) == 1
+    assert year_coverage.range_mask(2000, 1990) == 0
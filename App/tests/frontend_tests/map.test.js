@@ -59,11 +59,21 @@ describe("Tests for map.js", () => {
 
     global.google = {
       maps: {
-        Map: jest.fn().mockImplementation(() => ({
-          setCenter: jest.fn(),
-          setZoom: jest.fn(),
-          addListener: jest.fn()
-        })),
+        Map: jest.fn().mockImplementation(() => {
+          const overlays = [];
+          return {
+            setCenter: jest.fn(),
+            setZoom: jest.fn(),
+            addListener: jest.fn(),
+            overlayMapTypes: {
+              push: jest.fn((layer) => overlays.push(layer)),
+              getArray: jest.fn(() => overlays),
+              removeAt: jest.fn((index) => overlays.splice(index, 1))
+            }
+          };
+        }),
+        ImageMapType: jest.fn().mockImplementation((options) => ({options})),
+        Size: jest.fn(),
         Circle: jest.fn().mockImplementation(() => ({
           setMap: jest.fn()
         })),
@@ -192,4 +202,25 @@ describe("Tests for map.js", () => {
       expect(mockMarker.addListener).toHaveBeenCalledWith("gmp-click", expect.any(Function));
     });
   });
-});
\ No newline at end of file
+
+  describe("showSurface()", () => {
+    test("builds tile URLs and wraps the columns around the world", () => {
+      expect(global.surfaceTileUrl({x: -1, y: 0}, 1, 2020, "annual", "tmax"))
+          .toBe("/surface/1/1/0.png?year=2020&period=annual&element=tmax");
+      expect(global.surfaceTileUrl({x: 0, y: 2}, 1, 2020, "annual", "tmax")).toBeNull();
+    });
+
+    test("replaces the surface overlay", () => {
+      global.showSurface(2020, "summer", "tmin");
+      global.showSurface(2021);
+      expect(global.google.maps.ImageMapType).toHaveBeenCalledTimes(2);
+      const overlays = global.google.maps.Map.mock.results[0].value.overlayMapTypes;
+      expect(overlays.getArray()).toHaveLength(1);
+      const layer = overlays.getArray()[0];
+      expect(layer.options.getTileUrl({x: 3, y: 1}, 2)).toBe("/surface/2/3/1.png?year=2021&period=annual&element=tmax");
+
+      global.clearSurface();
+      expect(overlays.getArray()).toHaveLength(0);
+    });
+  });
+});
@@ -10,7 +10,8 @@ CREATE TABLE IF NOT EXISTS Station (
     first_tmax INT NOT NULL,
     latest_tmax INT NOT NULL,
     first_tmin INT NOT NULL,
-    latest_tmin INT NOT NULL
+    latest_tmin INT NOT NULL,
+    coverage VARCHAR(128) NOT NULL DEFAULT ''
 );
 
 CREATE TABLE IF NOT EXISTS Datapoint (
@@ -23,3 +24,70 @@ CREATE TABLE IF NOT EXISTS Datapoint (
     FOREIGN KEY (SID) REFERENCES Station(SID) ON DELETE CASCADE
 );
 
+CREATE TABLE IF NOT EXISTS ElementValue (
+    SID INT NOT NULL,
+    element CHAR(4) NOT NULL,
+    year INT NOT NULL,
+    month INT NOT NULL,
+    value FLOAT NOT NULL,
+    days INT NOT NULL,
+    PRIMARY KEY (SID, element, year, month),
+    FOREIGN KEY (SID) REFERENCES Station(SID) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS DailyValue (
+    SID INT NOT NULL,
+    element CHAR(4) NOT NULL,
+    year INT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (SID, element, year),
+    FOREIGN KEY (SID) REFERENCES Station(SID) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS DatasetVersion (
+    version INT PRIMARY KEY,
+    action VARCHAR(20) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS YearlyAggregate (
+    station_id VARCHAR(50) NOT NULL,
+    year INT NOT NULL,
+    period VARCHAR(10) NOT NULL,
+    tmin FLOAT NOT NULL,
+    tmax FLOAT NOT NULL,
+    PRIMARY KEY (station_id, period, year),
+    INDEX idx_aggregate_period_year (period, year)
+);
+
+CREATE TABLE IF NOT EXISTS IngestQueue (
+    station_id VARCHAR(50) PRIMARY KEY,
+    status VARCHAR(10) NOT NULL,
+    claim VARCHAR(100),
+    lease_until DOUBLE,
+    attempts INT NOT NULL DEFAULT 0,
+    datapoints INT NOT NULL DEFAULT 0,
+    error VARCHAR(255)
+);
+
+CREATE TABLE IF NOT EXISTS Job (
+    job_id CHAR(32) PRIMARY KEY,
+    job_key CHAR(64) NOT NULL UNIQUE,
+    kind VARCHAR(20) NOT NULL,
+    params TEXT NOT NULL,
+    status VARCHAR(10) NOT NULL,
+    progress FLOAT NOT NULL DEFAULT 0,
+    result LONGTEXT,
+    error VARCHAR(255),
+    created_at DOUBLE NOT NULL,
+    updated_at DOUBLE NOT NULL,
+    expires_at DOUBLE NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS RequestLog (
+    route VARCHAR(32) NOT NULL,
+    request_key VARCHAR(255) NOT NULL,
+    hits BIGINT NOT NULL,
+    last_seen DOUBLE NOT NULL,
+    PRIMARY KEY (route, request_key)
+);
@@ -0,0 +1,15 @@
+-- Connects the replica container to the primary and starts replication.
+-- Executed once by the "replica-setup" service in docker-compose.replica.yml.
+
+STOP REPLICA;
+CHANGE REPLICATION SOURCE TO
+    SOURCE_HOST = 'mysql',
+    SOURCE_PORT = 3306,
+    SOURCE_USER = 'root',
+    SOURCE_PASSWORD = 'root',
+    SOURCE_AUTO_POSITION = 1,
+    GET_SOURCE_PUBLIC_KEY = 1;
+START REPLICA;
+
+-- Only the replication thread may write to the replica
+SET GLOBAL super_read_only = ON;